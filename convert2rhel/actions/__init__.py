@@ -18,17 +18,25 @@ __metaclass__ = type
 
 import abc
 import collections
+import heapq
 import importlib
 import itertools
 import pkgutil
+import resource
+import threading
+import timeit
 import traceback
 
 from functools import wraps
 
 import six
 
+from six.moves import queue
+
 from convert2rhel import utils
+from convert2rhel.actions import registry
 from convert2rhel.logger import root_logger
+from convert2rhel.toolopts import tool_opts
 
 
 logger = root_logger.getChild(__name__)
@@ -189,6 +197,9 @@ class Action:
         self._has_run = False
         self._result = None
         self.messages = []
+        #: :class:`ActionTiming` of the run of the Action. None until the
+        #: Action is run by a :class:`Stage`.
+        self.timing = None
 
     @_action_defaults_to_success
     @abc.abstractmethod
@@ -398,6 +409,89 @@ class ActionResult(ActionMessageBase):
         super(ActionResult, self).__init__(level, id, title, description, diagnosis, remediations, variables)
 
 
+class ActionTiming:
+    """
+    Time and resources spent while running an Action.
+
+    The measurement starts when the object is created and ends with
+    :meth:`stop`.  The CPU time of the Action itself is measured for the
+    thread running it where the platform supports it, so Actions running
+    concurrently don't count each other's time.  The CPU time of the child
+    processes can only be measured for the whole process, so it is
+    approximate when Actions run concurrently.  The peak memory usage is the
+    lifetime peak of the whole process, not of the Action.
+
+    :ivar wall_time: Seconds elapsed while running the Action.
+    :ivar cpu_time: Seconds of CPU time used by the Action itself.
+    :ivar children_cpu_time: Seconds of CPU time used by the child processes
+        of convert2rhel which finished while running the Action, including
+        those of concurrently running Actions.
+    :ivar process_peak_rss: Peak resident set size of the convert2rhel
+        process in kilobytes since it started, read when the Action finished.
+        This is not a per-Action value: it grows only when the Action (or one
+        running at the same time) raised the peak.
+    :ivar process_children_peak_rss: Peak resident set size of the largest
+        child process of convert2rhel finished since it started, in kilobytes,
+        read when the Action finished. This is not a per-Action value either.
+    :ivar subprocesses: Number of child processes spawned by the Action.
+    """
+
+    # Measure just the current thread as Actions may run on worker threads.
+    _RUSAGE_SELF = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.children_cpu_time = 0.0
+        self.process_peak_rss = 0
+        self.process_children_peak_rss = 0
+        self.subprocesses = 0
+
+        self._start_time = timeit.default_timer()
+        self._start_usage = resource.getrusage(self._RUSAGE_SELF)
+        self._start_children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._start_subprocesses = utils.get_spawned_subprocesses_count()
+
+    def stop(self):
+        """
+        Finish the measurement.
+
+        :returns: The object itself so the call can be chained.
+        :rtype: ActionTiming
+        """
+        usage = resource.getrusage(self._RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        self.wall_time = timeit.default_timer() - self._start_time
+        self.cpu_time = _cpu_time(usage) - _cpu_time(self._start_usage)
+        self.children_cpu_time = _cpu_time(children_usage) - _cpu_time(self._start_children_usage)
+        self.process_peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.process_children_peak_rss = children_usage.ru_maxrss
+        self.subprocesses = utils.get_spawned_subprocesses_count() - self._start_subprocesses
+        return self
+
+    def to_dict(self):
+        """
+        Returns a dictionary representation of the :class:`ActionTiming`.
+
+        :returns: The measured values expressed as a dictionary
+        :rtype: dict
+        """
+        return {
+            "wall_time": round(self.wall_time, 6),
+            "cpu_time": round(self.cpu_time, 6),
+            "children_cpu_time": round(self.children_cpu_time, 6),
+            "process_peak_rss": self.process_peak_rss,
+            "process_children_peak_rss": self.process_children_peak_rss,
+            "subprocesses": self.subprocesses,
+        }
+
+
+def _cpu_time(usage):
+    """Sum the user and system CPU time of a resource usage."""
+    return usage.ru_utime + usage.ru_stime
+
+
 def get_actions(actions_path, prefix):
     """
     Determine the list of actions that exist at a path.
@@ -450,7 +544,7 @@ class Stage:
     #: Private attribute to allow unittests to override this dir
     _actions_dir = "convert2rhel.actions.%s"
 
-    def __init__(self, stage_name, task_header=None, next_stage=None):
+    def __init__(self, stage_name, task_header=None, next_stage=None, parallel=False):
         """
         Stages define a set of Actions which should be executed as a group.
 
@@ -464,6 +558,11 @@ class Stage:
         :param next_stage: A Stage which will automatically be run after the
             Actions in this Stage have had a change to run.
         :type next_stage: str
+        :param parallel: Whether the Actions in this Stage may be run
+            concurrently.  When True, up to ``tool_opts.jobs`` Actions whose
+            dependencies have finished are run at the same time.  Only set
+            this for Stages whose Actions do not change the system.
+        :type parallel: bool
 
         Stages are used for ordering only. This is different from
         Action.dependencies which are used for both ordering and to determine
@@ -476,10 +575,19 @@ class Stage:
         self.stage_name = stage_name
         self.task_header = task_header if task_header else stage_name
         self.next_stage = next_stage
+        self.parallel = parallel
         self._has_run = False
-
-        python_package = importlib.import_module(self._actions_dir % self.stage_name)
-        self.actions = get_actions(python_package.__path__, python_package.__name__ + ".")
+        # 2-tuple of the ids of the Actions resolved before this Stage and the
+        # order of the Actions of this Stage computed for them
+        self._resolved_order = None
+
+        # Plan from the registry generated at build time so the modules of
+        # the Actions are only imported when the Actions are run.
+        stage_package = self._actions_dir % self.stage_name
+        self.actions = registry.get_registered_actions(stage_package)
+        if self.actions is None:
+            python_package = importlib.import_module(stage_package)
+            self.actions = get_actions(python_package.__path__, python_package.__name__ + ".")
 
     def check_dependencies(self, _previous_stage_actions=None):
         """
@@ -493,14 +601,35 @@ class Stage:
         :raises DependencyError: when there is an unresolvable dependency in
             the set of actions.
         """
-        # We want to throw an exception if one of the actions fails to resolve
-        # its deps.  We don't care about the return value here.
-        actions_so_far = list(resolve_action_order(self.actions, _previous_stage_actions))
+        previous_stage_actions = [] if _previous_stage_actions is None else list(_previous_stage_actions)
+        actions_so_far = previous_stage_actions + self._resolve_order(previous_stage_actions)
 
         if self.next_stage:
             self.next_stage.check_dependencies(actions_so_far)
 
-    def run(self, successes=None, failures=None, skips=None):
+    def _resolve_order(self, previously_resolved_actions):
+        """
+        Order the Actions of this Stage.
+
+        The order is computed once and shared by :meth:`check_dependencies`
+        and :meth:`run` as long as the same Actions were resolved before this
+        Stage.
+
+        :param previously_resolved_actions: Actions of the previous Stages.
+        :type previously_resolved_actions: Sequence
+        :raises DependencyError: when there is an unresolvable dependency in
+            the set of actions.
+        :returns: The Actions of this Stage in the order they need to run.
+        :rtype: list
+        """
+        previous_action_ids = frozenset(action.id for action in previously_resolved_actions)
+        if self._resolved_order is None or self._resolved_order[0] != previous_action_ids:
+            ordered_actions = list(resolve_action_order(self.actions, previously_resolved_actions))
+            self._resolved_order = (previous_action_ids, ordered_actions)
+
+        return self._resolved_order[1]
+
+    def run(self, successes=None, failures=None, skips=None, on_action_finished=None):
         """
         Run all the actions in Stage and other linked Stages.
 
@@ -510,6 +639,10 @@ class Stage:
         :type failures: Sequence
         :keyword skips: Actions which have already run and have been skipped.
         :type skips: Sequence
+        :keyword on_action_finished: Called with each Action of this and the
+            linked Stages as soon as it has run or has been skipped, for
+            instance to write the Action to the report right away.
+        :type on_action_finished: Callable[[Action], None]
         :return: 2-tuple consisting of two lists.  One with Actions that
             have succeeded and one of Actions that have failed.  These
             lists contain the Actions passed in via successes and failures
@@ -532,59 +665,20 @@ class Stage:
         failures = [] if failures is None else list(failures)
         skips = [] if skips is None else list(skips)
 
-        # When testing for failed dependencies, we need the Action ids of failures and skips so
-        # record those separately
-        failed_action_ids = set()
+        ordered_actions = self._resolve_order(successes + failures + skips)
 
-        for action_class in resolve_action_order(
-            self.actions, previously_resolved_actions=successes + failures + skips
-        ):
-            # Decide if we need to skip because deps have failed
-            failed_deps = [d for d in action_class.dependencies if d in failed_action_ids]
-
-            action = action_class()
-
-            if failed_deps:
-                to_be = "was"
-                if len(failed_deps) > 1:
-                    to_be = "were"
-                diagnosis = "Skipped because {} {} not successful".format(
-                    utils.format_sequence_as_message(failed_deps),
-                    to_be,
-                )
+        if self.parallel and tool_opts.jobs > 1:
+            executed_actions = self._run_actions_concurrently(ordered_actions, tool_opts.jobs, on_action_finished)
+        else:
+            executed_actions = self._run_actions_sequentially(ordered_actions, on_action_finished)
 
-                action.set_result(
-                    level="SKIP",
-                    id="SKIP",
-                    title="Skipped action",
-                    description="This action was skipped due to another action failing.",
-                    diagnosis=diagnosis,
-                    remediations="Please ensure that the {} check passes so that this Action can evaluate your system".format(
-                        utils.format_sequence_as_message(failed_deps)
-                    ),
-                )
+        for action, skipped in executed_actions:
+            # Categorize the results
+            if skipped:
                 skips.append(action)
-                failed_action_ids.add(action.id)
-                logger.error("Skipped {}. {}".format(action.id, diagnosis))
+                logger.error("Skipped {}. {}".format(action.id, action.result.diagnosis))
                 continue
 
-            # Run the Action
-            try:
-                action.run()
-            except (Exception, SystemExit) as e:
-                # Uncaught exceptions are handled by constructing a generic
-                # failure message here that should be reported
-                description = (
-                    "Unhandled exception was caught: {}\n"
-                    "Please file a bug at https://issues.redhat.com/ to have this"
-                    " fixed or a specific error message added.\n"
-                    "Traceback: {}".format(e, traceback.format_exc())
-                )
-                action.set_result(
-                    level="ERROR", id="UNEXPECTED_ERROR", title="Unhandled exception caught", description=description
-                )
-
-            # Categorize the results
             if action.result.level <= STATUS_CODE["WARNING"]:
                 logger.info("{} has succeeded".format(action.id))
                 successes.append(action)
@@ -595,13 +689,189 @@ class Stage:
                 )
                 logger.error(message)
                 failures.append(action)
-                failed_action_ids.add(action.id)
 
         if self.next_stage:
-            successes, failures, skips = self.next_stage.run(successes, failures, skips)
+            successes, failures, skips = self.next_stage.run(successes, failures, skips, on_action_finished)
 
         return FinishedActions(successes, failures, skips)
 
+    def _run_actions_sequentially(self, ordered_actions, on_action_finished=None):
+        """
+        Run the Actions one after another.
+
+        :param ordered_actions: Iterable of Action classes in the order that
+            they need to run.
+        :type ordered_actions: Iterable
+        :param on_action_finished: Called with each Action once it has run.
+        :type on_action_finished: Callable[[Action], None]
+        :returns: Iterator of 2-tuples of the executed Action and whether it
+            was skipped, in the same order.
+        :rtype: Iterator
+        """
+        # When testing for failed dependencies, we need the Action ids of failures and skips so
+        # record those separately
+        failed_action_ids = set()
+
+        for action_class in ordered_actions:
+            action, skipped = _execute_action(action_class, failed_action_ids)
+            if action.result.level > STATUS_CODE["WARNING"]:
+                failed_action_ids.add(action.id)
+
+            if on_action_finished:
+                on_action_finished(action)
+
+            yield action, skipped
+
+    def _run_actions_concurrently(self, ordered_actions, max_workers, on_action_finished=None):
+        """
+        Run the Actions on a pool of at most ``max_workers`` threads.
+
+        An Action is started as soon as every Action of this Stage that it
+        depends on has finished.  Dependencies on Actions from previous Stages
+        are already satisfied at this point.
+
+        :param ordered_actions: List of Action classes in the order that they
+            need to run.
+        :type ordered_actions: list
+        :param max_workers: Maximum number of Actions running at the same time.
+        :type max_workers: int
+        :param on_action_finished: Called with each Action once it has run,
+            in the order the Actions finish.  Always called from this thread.
+        :type on_action_finished: Callable[[Action], None]
+        :returns: List of 2-tuples of the executed Action and whether it was
+            skipped, in the same order as ``ordered_actions`` so that the
+            results do not depend on which Action happened to finish first.
+        :rtype: list
+        """
+        logger.debug("Running up to {} actions concurrently.".format(max_workers))
+        # Fork the child process worker before the threads are started, the
+        # Actions share it instead of forking child processes of their own.
+        utils.child_process_worker.start()
+
+        stage_action_ids = set(action_class.id for action_class in ordered_actions)
+        pending_actions = list(ordered_actions)
+        finished_actions = {}
+        failed_action_ids = set()
+        finished_queue = queue.Queue()
+        running = 0
+
+        def worker(action_class, failed_action_ids):
+            try:
+                finished_queue.put((action_class, _execute_action(action_class, failed_action_ids), None))
+            except BaseException as e:
+                # Hand anything that escaped the Action framework over to the
+                # scheduling thread so it is raised the same way as when the
+                # Actions are run sequentially.
+                finished_queue.put((action_class, None, e))
+
+        while pending_actions or running:
+            for action_class in pending_actions[:]:
+                if running >= max_workers:
+                    break
+
+                if not all(d in finished_actions or d not in stage_action_ids for d in action_class.dependencies):
+                    continue
+
+                pending_actions.remove(action_class)
+                # Pass a snapshot of the failures so the worker does not read
+                # the set while we are updating it.
+                thread = threading.Thread(
+                    target=worker,
+                    args=(action_class, frozenset(failed_action_ids)),
+                    name="action-{}".format(action_class.id),
+                )
+                # Don't keep the process alive on Ctrl-C because of a hanging
+                # Action.
+                thread.daemon = True
+                thread.start()
+                running += 1
+
+            # Python 2's Queue.get() can't be interrupted unless a timeout is
+            # given.
+            while True:
+                try:
+                    action_class, execution, exception = finished_queue.get(timeout=1)
+                    break
+                except queue.Empty:
+                    continue
+
+            running -= 1
+            if exception is not None:
+                raise exception
+
+            finished_actions[action_class.id] = execution
+            if execution[0].result.level > STATUS_CODE["WARNING"]:
+                failed_action_ids.add(action_class.id)
+
+            if on_action_finished:
+                on_action_finished(execution[0])
+
+        return [finished_actions[action_class.id] for action_class in ordered_actions]
+
+
+def _execute_action(action_class, failed_action_ids):
+    """
+    Instantiate and run a single Action.
+
+    :param action_class: The Action to run.
+    :type action_class: type
+    :param failed_action_ids: Ids of the Actions which have failed or were
+        skipped so far.  If the Action depends on any of them, it is skipped
+        instead of run.
+    :type failed_action_ids: Container
+    :returns: 2-tuple of the Action with its result set and whether the
+        Action was skipped instead of run.
+    :rtype: tuple[Action, bool]
+    """
+    # Decide if we need to skip because deps have failed
+    failed_deps = [d for d in action_class.dependencies if d in failed_action_ids]
+
+    action = action_class()
+
+    if failed_deps:
+        to_be = "was"
+        if len(failed_deps) > 1:
+            to_be = "were"
+        diagnosis = "Skipped because {} {} not successful".format(
+            utils.format_sequence_as_message(failed_deps),
+            to_be,
+        )
+
+        action.set_result(
+            level="SKIP",
+            id="SKIP",
+            title="Skipped action",
+            description="This action was skipped due to another action failing.",
+            diagnosis=diagnosis,
+            remediations="Please ensure that the {} check passes so that this Action can evaluate your system".format(
+                utils.format_sequence_as_message(failed_deps)
+            ),
+        )
+        return action, True
+
+    # Run the Action
+    timing = ActionTiming()
+    try:
+        with utils.trace.command_trace.action(action.id):
+            action.run()
+    except (Exception, SystemExit) as e:
+        # Uncaught exceptions are handled by constructing a generic
+        # failure message here that should be reported
+        description = (
+            "Unhandled exception was caught: {}\n"
+            "Please file a bug at https://issues.redhat.com/ to have this"
+            " fixed or a specific error message added.\n"
+            "Traceback: {}".format(e, traceback.format_exc())
+        )
+        action.set_result(
+            level="ERROR", id="UNEXPECTED_ERROR", title="Unhandled exception caught", description=description
+        )
+
+    action.timing = timing.stop()
+    logger.debug("{} finished in {:.2f} seconds.".format(action.id, action.timing.wall_time))
+
+    return action, False
+
 
 def resolve_action_order(potential_actions, previously_resolved_actions=None):
     """
@@ -633,60 +903,69 @@ def resolve_action_order(potential_actions, previously_resolved_actions=None):
     # algorithm has not changed)
     potential_actions = sorted(potential_actions, key=lambda action: action.id)
 
-    # We have pre-sorted action by their id so that there is a stable sort order.
-    # Now we have to sort them further so that dependencies are run before
-    # the Actions which depend upon them.
-
-    # Actions which have yet to be resolved.  A resolved Action has been sorted
-    # into its final order and yielded to the caller.
-    unresolved_actions = []
-    # ids of the actions which have already been resolved
+    # ids of the actions which have already been resolved.  A resolved Action
+    # has been sorted into its final order and yielded to the caller.
     resolved_action_ids = set(action.id for action in previously_resolved_actions)
 
-    for action in potential_actions:
-        if not action.dependencies:
-            # No dependencies so we can perform this immediately.
+    # Indexes of the Actions (in potential_actions) which are waiting for an
+    # id to be resolved
+    dependents = collections.defaultdict(list)
+    # Number of dependencies of each Action which have yet to be resolved
+    unresolved_deps_count = []
+    # The order is the one of the original algorithm which repeatedly scanned
+    # the unresolved Actions in id order: Actions without dependencies come
+    # first, then every scan (pass) resolved the Actions whose dependencies
+    # were resolved in the previous passes or earlier in the same pass.  We
+    # compute the pass of each Action from the passes of its dependencies and
+    # resolve the Actions by (pass, index) which gives the same order.
+    passes = []
+    # Actions whose dependencies have all been resolved, as (pass, index)
+    ready = []
+
+    for index, action in enumerate(potential_actions):
+        unresolved_deps = set(action.dependencies) - resolved_action_ids
+        for dependency in unresolved_deps:
+            dependents[dependency].append(index)
+
+        unresolved_deps_count.append(len(unresolved_deps))
+        passes.append(1 if action.dependencies else 0)
+        if not unresolved_deps:
+            ready.append((passes[index], index))
+
+    heapq.heapify(ready)
+    unresolved_count = len(potential_actions)
+
+    while ready:
+        action_pass, index = heapq.heappop(ready)
+        action = potential_actions[index]
+        unresolved_count -= 1
+
+        # Several Actions may share an id.  The dependencies on it are
+        # satisfied by the first one.
+        if action.id not in resolved_action_ids:
             resolved_action_ids.add(action.id)
-            yield action
-        else:
-            # There are dependencies so we will have to make sure that its
-            # dependencies have been been run first.
-            unresolved_actions.append(action)
-
-    # Add the length of all actions passed in together.  We decide whether
-    # we're done sorting by comparing the previous unresolved actions to the
-    # current number of unresolved_actions so we want this to be more than the
-    # length of unresolved_actions to start with.
-    previous_number_of_unresolved_actions = len(potential_actions) + len(previously_resolved_actions)
-
-    # Keep trying to sort the actions until we haven't resolved any actions
-    # since the last iteration of the while loop (each while loop examines
-    # all of the unresolved actions once)
-    while previous_number_of_unresolved_actions != len(unresolved_actions):
-        previous_number_of_unresolved_actions = len(unresolved_actions)
-
-        # Examine each action.  (Utilize a copy of unresolved_actions for the
-        # loop since we add to unresolved_actions inside of the loop)
-        for action in unresolved_actions[:]:
-            # We can only run the action if all of its dependencies have
-            # previously been run
-            if all(d in resolved_action_ids for d in action.dependencies):
-                # Mark the action as being sorted by removing it from the
-                # list of unresolved actions and adding its id to the set of
-                # resolved actions.
-                unresolved_actions.remove(action)
-                resolved_action_ids.add(action.id)
-
-                # Yield the action so that it will be run now.
-                yield action
-
-    # After exiting the while loop we know that we cannot run anymore actions
-    # because there are no more whose dependencies have all been run.  If
+            for dependent_index in dependents.pop(action.id, ()):
+                # An Action examined before this one in a pass had to wait for
+                # the next pass.
+                dependent_pass = action_pass + 1 if index > dependent_index else action_pass
+                passes[dependent_index] = max(passes[dependent_index], dependent_pass)
+
+                unresolved_deps_count[dependent_index] -= 1
+                if unresolved_deps_count[dependent_index] == 0:
+                    heapq.heappush(ready, (passes[dependent_index], dependent_index))
+
+        # Yield the action so that it will be run now.
+        yield action
+
+    # There are no more actions whose dependencies have all been resolved.  If
     # there are any actions which are still unresolved at this point, it means
     # that some of them have unsatisfied dependencies.  This could mean the
     # dependencies aren't present, there was a typo in a dependency id, or
     # that there is a circular dependency that needs to be broken.
-    if previous_number_of_unresolved_actions != 0:
+    if unresolved_count != 0:
+        unresolved_actions = [
+            action for index, action in enumerate(potential_actions) if unresolved_deps_count[index] != 0
+        ]
         raise DependencyError(
             "Unsatisfied dependencies in these actions: {}".format(
                 ", ".join(action.id for action in unresolved_actions)
@@ -714,6 +993,11 @@ def parse_action_results(results):
                     "id": "$id",
                     "message": "" or "$message"
                 },
+                # Only for the Actions which were run, see ActionTiming.to_dict()
+                "timing": {
+                    "wall_time": float,
+                    ...
+                },
             },
         }
 
@@ -724,16 +1008,35 @@ def parse_action_results(results):
     """
     formatted_results = {}
     for action in itertools.chain(*results):
-        msgs = [msg.to_dict() for msg in action.messages]
-        formatted_results[action.id] = {"messages": msgs, "result": action.result.to_dict()}
+        formatted_results[action.id] = format_action_results(action)
     return formatted_results
 
 
-def run_pre_actions():
+def format_action_results(action):
+    """
+    Format the results of a single Action.
+
+    :param action: An Action which has been run or skipped.
+    :type action: Action
+    :return: The entry of the Action in the dictionary returned by
+        :func:`parse_action_results`.
+    :rtype: dict[str, list | dict]
+    """
+    action_results = {"messages": [msg.to_dict() for msg in action.messages], "result": action.result.to_dict()}
+    if action.timing is not None:
+        action_results["timing"] = action.timing.to_dict()
+    return action_results
+
+
+def run_pre_actions(on_action_finished=None):
     """
     Run all of the pre-ponr Actions.
 
     This function runs the Actions that occur before the Point of no Return.
+
+    :keyword on_action_finished: Called with each Action as soon as it has
+        run, see :meth:`Stage.run`.
+    :type on_action_finished: Callable[[Action], None]
     """
     # Stages are created in the opposite order that they are run in so that
     # each Stage can know about the Stage that comes after it (via the
@@ -743,7 +1046,11 @@ def run_pre_actions():
     # (system_checks), it will operate on the first Stage and then recursively
     # call check_dependencies() or run() on the next_stage.
     pre_ponr_changes = Stage("pre_ponr_changes", "Making recoverable changes")
-    system_checks = Stage("system_checks", "Check whether system is ready for conversion", next_stage=pre_ponr_changes)
+    # The system checks only inspect the system so they are safe to run
+    # concurrently when the user asks for it with --jobs.
+    system_checks = Stage(
+        "system_checks", "Check whether system is ready for conversion", next_stage=pre_ponr_changes, parallel=True
+    )
 
     try:
         # Check dependencies are satisfied for system_checks and all subsequent
@@ -755,14 +1062,18 @@ def run_pre_actions():
         logger.critical("Some dependencies were set on Actions but not present in convert2rhel: {}".format(e))
 
     # Run the Actions in system_checks and all subsequent Stages.
-    results = system_checks.run()
+    results = system_checks.run(on_action_finished=on_action_finished)
 
     return parse_action_results(results)
 
 
-def run_post_actions():
+def run_post_actions(on_action_finished=None):
     """
     This function runs the Actions that occur after the Point of no Return.
+
+    :keyword on_action_finished: Called with each Action as soon as it has
+        run, see :meth:`Stage.run`.
+    :type on_action_finished: Callable[[Action], None]
     """
     # Stages are created in the opposite order that they are run in so that
     # each Stage can know about the Stage that comes after it (via the
@@ -784,7 +1095,7 @@ def run_post_actions():
         logger.critical("Some dependencies were set on Actions but not present in convert2rhel: {}".format(e))
 
     # Run the Actions in conversion and all subsequent Stages.
-    results = conversion.run()
+    results = conversion.run(on_action_finished=on_action_finished)
 
     return parse_action_results(results)
 
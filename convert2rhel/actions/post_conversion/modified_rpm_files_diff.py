@@ -38,7 +38,9 @@ class ModifiedRPMFilesDiff(actions.Action):
 
         logger.task("Show RPM files modified by the conversion")
 
-        system_info.generate_rpm_va(log_filename=utils.rpm.POST_RPM_VA_LOG_FILENAME)
+        # Most of the packages are not touched by the conversion so verify
+        # only what changed since the rpm -Va run before the conversion
+        system_info.generate_rpm_va(log_filename=utils.rpm.POST_RPM_VA_LOG_FILENAME, incremental=True)
 
         pre_rpm_va_log_path = os.path.join(LOG_DIR, utils.rpm.PRE_RPM_VA_LOG_FILENAME)
         if not os.path.exists(pre_rpm_va_log_path):
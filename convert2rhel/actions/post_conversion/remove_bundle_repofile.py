@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+from convert2rhel import actions, bundle
+from convert2rhel.logger import root_logger
+from convert2rhel.toolopts import tool_opts
+
+
+loggerinst = root_logger.getChild(__name__)
+
+
+class RemoveBundleRepofile(actions.Action):
+    id = "REMOVE_BUNDLE_REPOFILE"
+
+    def run(self):
+        """Remove the repositories of the conversion bundle after the conversion is done.
+
+        The repositories point to the extracted bundle, which is removed
+        together with the temporary folder. Warns if the removal fails.
+        """
+        super(RemoveBundleRepofile, self).run()
+
+        if not tool_opts.bundle:
+            return
+
+        loggerinst.task("Remove the repositories of the conversion bundle")
+
+        try:
+            bundle.remove_repofile()
+            loggerinst.info("Repofile {} removed".format(bundle.BUNDLE_REPOFILE))
+        except OSError as exc:
+            warning_message = "Unable to remove {}: {}. Remove the repofile manually.".format(
+                bundle.BUNDLE_REPOFILE, exc
+            )
+            loggerinst.warning(warning_message)
+
+            self.add_message(
+                level="WARNING",
+                id="UNSUCCESSFUL_REMOVE_BUNDLE_REPOFILE",
+                title="Repofile {repofile} wasn't removed.".format(repofile=bundle.BUNDLE_REPOFILE),
+                description=warning_message,
+            )
@@ -16,9 +16,9 @@
 __metaclass__ = type
 
 
-from convert2rhel import actions
+from convert2rhel import actions, repometa
 from convert2rhel.logger import root_logger
-from convert2rhel.pkgmanager import call_yum_cmd
+from convert2rhel.systeminfo import system_info
 from convert2rhel.toolopts import tool_opts
 
 
@@ -42,21 +42,24 @@ class CustomReposAreValid(actions.Action):
             logger.info("Did not perform the check of repositories due to the use of RHSM for the conversion.")
             return
 
-        output, ret_code = call_yum_cmd(
-            command="makecache",
-            args=["-v", "--setopt=*.skip_if_unavailable=False"],
-            print_output=False,
-        )
-        if ret_code != 0:
+        # The loaded metadata is kept for the later checks querying the same repositories
+        try:
+            metadata = repometa.get_repo_metadata(
+                disable_repos=tool_opts.disablerepo,
+                enable_repos=system_info.get_enabled_rhel_repos(),
+                releasever=system_info.releasever,
+                skip_if_unavailable=False,
+            )
+        except repometa.RepoMetadataError as err:
             self.set_result(
                 level="ERROR",
                 id="UNABLE_TO_ACCESS_REPOSITORIES",
                 title="Unable to access repositories",
                 description="Access could not be made to the custom repositories.",
                 diagnosis="Unable to access the repositories passed through the --enablerepo option.",
-                remediations="For more details, see YUM/DNF output:\n{0}".format(output),
+                remediations="For more details, see the YUM/DNF error:\n{0}".format(err),
             )
             return
 
-        logger.debug("Output of the previous yum command:\n{0}".format(output))
+        logger.debug("Loaded the metadata of the repositories: {0}".format(", ".join(metadata.repoids)))
         logger.info("The repositories passed through the --enablerepo option are all accessible.")
@@ -16,11 +16,10 @@
 __metaclass__ = type
 
 import itertools
+import os
 import re
 
-from functools import cmp_to_key
-
-from convert2rhel import actions, pkghandler
+from convert2rhel import actions, pkghandler, repometa
 from convert2rhel.logger import root_logger
 from convert2rhel.systeminfo import system_info
 from convert2rhel.toolopts import tool_opts
@@ -31,6 +30,14 @@ logger = root_logger.getChild(__name__)
 
 LINK_PREVENT_KMODS_FROM_LOADING = "https://access.redhat.com/solutions/41278"
 
+# List of the loaded kernel modules, the same source lsmod reads
+PROC_MODULES = "/proc/modules"
+# Directory with the kernel modules and the modules.dep and modules.builtin
+# indexes generated by depmod for each kernel release
+MODULES_DIR = "/lib/modules"
+
+_KMOD_FILE_SUFFIX = re.compile(r"\.ko(\.[a-z]+)?$")
+
 
 class RHELKernelModuleNotFound(Exception):
     pass
@@ -40,9 +47,34 @@ class PackageRepositoryError(Exception):
     pass
 
 
+def _normalize_kmod_name(name):
+    """Dashes and underscores are interchangeable in the kernel module names."""
+    return name.replace("-", "_")
+
+
+def _kmod_name_from_path(path):
+    """Get the normalized module name from the path to its file, e.g. kernel/fs/fat/vfat.ko.xz -> vfat."""
+    return _normalize_kmod_name(_KMOD_FILE_SUFFIX.sub("", os.path.basename(path.strip())))
+
+
+def _read_index(path):
+    """Get the non-empty lines of a module index or nothing if it cannot be read."""
+    try:
+        with open(path, "r") as index:
+            return [line.strip() for line in index if line.strip() and not line.startswith("#")]
+    except (IOError, OSError) as err:
+        logger.debug("Unable to read {}: {}".format(path, err))
+        return []
+
+
 class EnsureKernelModulesCompatibility(actions.Action):
     id = "ENSURE_KERNEL_MODULES_COMPATIBILITY"
-    dependencies = ("SUBSCRIBE_SYSTEM",)
+    dependencies = (
+        "SUBSCRIBE_SYSTEM",
+        # Look the kernel modules up while the packages of the transaction are
+        # downloaded in the background.
+        "PREFETCH_TRANSACTION_PACKAGES",
+    )
 
     def _get_loaded_kmods(self):
         """Get a set of kernel modules loaded on host.
@@ -51,94 +83,106 @@ class EnsureKernelModulesCompatibility(actions.Action):
         (i.e. /lib/modules/5.8.0-7642-generic/kernel/lib/a.ko.xz ->
         kernel/lib/a.ko.xz) in order to be able to compare with RHEL
         kernel modules in case of different kernel release
+
+        The paths are looked up in the modules.dep index of the booted kernel.
+        modinfo is called only for the modules that cannot be found there.
         """
         logger.debug("Getting a list of loaded kernel modules.")
-        lsmod_output, _ = run_subprocess(["/usr/sbin/lsmod"], print_output=False)
-        modules = re.findall(r"^(\w+)\s.+$", lsmod_output, flags=re.MULTILINE)[1:]
-        kernel_modules = [
-            self._get_kmod_comparison_key(
-                run_subprocess(["/usr/sbin/modinfo", "-F", "filename", module], print_output=False)[0]
-            )
-            for module in modules
-        ]
-        return set(kernel_modules)
+        modules = self._get_loaded_kmod_names()
+        kmod_keys, builtin_kmods = self._read_kmod_indexes(system_info.booted_kernel)
+
+        kernel_modules = set()
+        for module in modules:
+            name = _normalize_kmod_name(module)
+            if name in builtin_kmods:
+                # Built-in modules are part of the kernel image, not files
+                continue
+
+            key = kmod_keys.get(name)
+            if key is None:
+                key = self._get_kmod_comparison_key(
+                    run_subprocess(["/usr/sbin/modinfo", "-F", "filename", module], print_output=False)[0]
+                )
+            kernel_modules.add(key)
 
-    def _get_rhel_supported_kmods(self):
-        """Return set of target RHEL supported kernel modules."""
-        precache = [
-            "yum",
-            "makecache",
-            "--releasever={}".format(system_info.releasever),
-            "--setopt=*.skip_if_unavailable=False",
-        ]
-        # Clearing the exclude field with setopt to prevent kernel being
-        # excluded in the config.
-        # https://issues.redhat.com/browse/RHELC-774
-        basecmd = [
-            "repoquery",
-            "--releasever={}".format(system_info.releasever),
-            "--setopt=exclude=",
-            "--archlist={}".format(system_info.arch),
-        ]
+        return kernel_modules
 
-        if system_info.version.major >= 8:
-            basecmd.append("--setopt=module_platform_id=platform:el" + str(system_info.version.major))
-            precache.append("--setopt=module_platform_id=platform:el" + str(system_info.version.major))
+    def _get_loaded_kmod_names(self):
+        """Get the names of the loaded kernel modules.
 
-        active_repos = ["--disablerepo=*"]
-        for repoid in system_info.get_enabled_rhel_repos():
-            active_repos.extend(("--enablerepo", repoid))
-        precache.extend(active_repos)
-        basecmd.extend(active_repos)
+        :return: The names as listed in /proc/modules, or by lsmod if the file
+            cannot be read.
+        :rtype: list[str]
+        """
+        try:
+            with open(PROC_MODULES, "r") as proc_modules:
+                return [line.split()[0] for line in proc_modules if line.strip()]
+        except (IOError, OSError) as err:
+            logger.debug("Unable to read {}: {}".format(PROC_MODULES, err))
 
-        # Retrieve the yum metadata for the repos we use.  yum makecache will
-        # error out if there is a problem downloading the metadata (for instance,
-        # no disk space left to save it) whereas repoquery will return no results
-        # if there is already some metadata available.
+        lsmod_output, _ = run_subprocess(["/usr/sbin/lsmod"], print_output=False)
+        return re.findall(r"^(\w+)\s.+$", lsmod_output, flags=re.MULTILINE)[1:]
+
+    def _read_kmod_indexes(self, kernel_release):
+        """Read the module indexes generated by depmod for a kernel release.
+
+        :param kernel_release: The kernel release, as printed by uname -r.
+        :type kernel_release: str
+        :return: 2-tuple with the comparison key of each module file (indexed
+            by the normalized module name), see _get_kmod_comparison_key(),
+            and the set of normalized names of the modules built into the
+            kernel.
+        :rtype: tuple[dict[str, str], set[str]]
+        """
+        modules_dir = os.path.join(MODULES_DIR, kernel_release)
+        kmod_keys = {}
+        builtin_kmods = set()
 
-        precache_out, precache_exit_code = run_subprocess(precache, print_output=False)
-        if precache_exit_code != 0:
+        for line in _read_index(os.path.join(modules_dir, "modules.dep")):
+            # kernel/drivers/net/tun.ko.xz: kernel/drivers/net/foo.ko.xz ...
+            path = line.split(":", 1)[0]
+            # The paths are relative to the modules directory of the kernel
+            # release, except for those written by old versions of depmod
+            key = self._get_kmod_comparison_key(path) if path.startswith("/") else path
+            kmod_keys[_kmod_name_from_path(path)] = key
+
+        for line in _read_index(os.path.join(modules_dir, "modules.builtin")):
+            builtin_kmods.add(_kmod_name_from_path(line))
+
+        return kmod_keys, builtin_kmods
+
+    def _get_rhel_supported_kmods(self):
+        """Return set of target RHEL supported kernel modules."""
+        enabled_repos = system_info.get_enabled_rhel_repos()
+        try:
+            # Raises an error if there is a problem downloading the metadata
+            # (for instance, no disk space left to save it) of any of the
+            # repos, as opposed to silently skipping the repository.
+            metadata = repometa.get_repo_metadata(
+                disable_repos=["*"],
+                enable_repos=enabled_repos,
+                releasever=system_info.releasever,
+                filelists=True,
+                skip_if_unavailable=False,
+            )
+            # All the packages which are the source of kmods
+            repo_pkgs = metadata.get_packages_by_file("/lib/modules/*.ko*", arches=[system_info.arch])
+        except repometa.RepoMetadataError as err:
             raise PackageRepositoryError(
                 "We were unable to download the repository metadata for ({}) to"
                 " determine packages containing kernel modules.  Can be caused by"
                 " not enough disk space in /var/cache or too little memory.  The"
-                " yum output below may have a clue for what went wrong in this"
-                " case:\n\n{}".format(", ".join(system_info.get_enabled_rhel_repos()), precache_out)
+                " error below may have a clue for what went wrong in this"
+                " case:\n\n{}".format(", ".join(enabled_repos), err)
             )
 
-        cmd = basecmd[:]
-
-        if system_info.version.major >= 8:
-            cmd.extend(["-f", "/lib/modules/*.ko*"])
-        else:
-            # On EL7, `repoquery -f` uses yum's searchPackageProvides which
-            # loads all package provides into memory. For large repos like
-            # rhel-7-server-rpms this causes MemoryError on memory-constrained
-            # systems. Query by name pattern instead - all RHEL kernel module
-            # packages start with kernel* or kmod* (enforced by
-            # _get_most_recent_unique_kernel_pkgs).
-            cmd.extend(["kernel*", "kmod*"])
-
-        # Without the release package installed, dnf can't determine the
-        # modularity platform ID. get output of a command to get all
-        # packages which are the source of kmods
-        kmod_pkgs_str, repoquery_exit_code = run_subprocess(cmd, print_output=False)
-
-        if repoquery_exit_code != 0:
-            raise PackageRepositoryError(
-                "We were unable to query the repositories ({}) to"
-                " determine packages containing kernel modules."
-                " Output from the failed repoquery command:\n\n{}".format(
-                    ", ".join(system_info.get_enabled_rhel_repos()), kmod_pkgs_str
-                )
-            )
+        repo_pkgs = dict((pkg.nevra, pkg) for pkg in repo_pkgs)
         # from these packages we select only the latest one
-        kmod_pkgs = self._get_most_recent_unique_kernel_pkgs(kmod_pkgs_str.rstrip("\n").split())
+        kmod_pkgs = self._get_most_recent_unique_kernel_pkgs(list(repo_pkgs))
         if not kmod_pkgs:
-            logger.debug("Output of the previous repoquery command:\n{0}".format(kmod_pkgs_str))
             raise RHELKernelModuleNotFound(
                 "No packages containing kernel modules available in the enabled repositories ({}).".format(
-                    ", ".join(system_info.get_enabled_rhel_repos())
+                    ", ".join(enabled_repos)
                 )
             )
 
@@ -147,13 +191,9 @@ class EnsureKernelModulesCompatibility(actions.Action):
             " kernel packages available in the enabled repositories:\n {0}".format("\n ".join(kmod_pkgs))
         )
 
-        # querying obtained packages for files they produces
-        cmd = basecmd[:]
-        cmd.append("-l")
-        cmd.extend(kmod_pkgs)
-        rhel_kmods_str, _ = run_subprocess(cmd, print_output=False)
-
-        return self._get_rhel_kmods_keys(rhel_kmods_str)
+        # The file lists have been parsed by the previous query already
+        kmod_paths = metadata.get_files([repo_pkgs[nevra] for nevra in kmod_pkgs])
+        return self._get_rhel_kmods_keys("\n".join(kmod_paths))
 
     def _get_most_recent_unique_kernel_pkgs(self, pkgs):
         """Return the most recent versions of all kernel packages.
@@ -195,12 +235,7 @@ class EnsureKernelModulesCompatibility(actions.Action):
         list_of_sorted_pkgs = []
         for distinct_kernel_pkgs in pkgs_groups:
             if distinct_kernel_pkgs[0].startswith(("kernel", "kmod")):
-                list_of_sorted_pkgs.append(
-                    max(
-                        distinct_kernel_pkgs[1],
-                        key=cmp_to_key(pkghandler.compare_package_versions),
-                    )
-                )
+                list_of_sorted_pkgs.append(pkghandler.sort_pkgs_by_version(distinct_kernel_pkgs[1])[-1])
 
         return tuple(list_of_sorted_pkgs)
 
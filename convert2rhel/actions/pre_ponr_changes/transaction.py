@@ -16,13 +16,27 @@
 __metaclass__ = type
 
 
-from convert2rhel import actions, exceptions, pkgmanager
+from convert2rhel import actions, exceptions, pkgmanager, utils
 from convert2rhel.logger import root_logger
+from convert2rhel.pkgmanager import prefetch
 
 
 logger = root_logger.getChild(__name__)
 
 
+class PrefetchTransactionPackages(actions.Action):
+    id = "PREFETCH_TRANSACTION_PACKAGES"
+    # The packages are downloaded to a package manager cache of their own, so
+    # the download only needs the RHEL repositories to be enabled.
+    dependencies = ("SUBSCRIBE_SYSTEM",)
+
+    def run(self):
+        """Start downloading the packages of the transaction while the other actions run."""
+        super(PrefetchTransactionPackages, self).run()
+
+        prefetch.package_prefetch.start()
+
+
 class ValidatePackageManagerTransaction(actions.Action):
     id = "VALIDATE_PACKAGE_MANAGER_TRANSACTION"
     dependencies = (
@@ -35,6 +49,7 @@ class ValidatePackageManagerTransaction(actions.Action):
         "ENSURE_KERNEL_MODULES_COMPATIBILITY",
         "SUBSCRIBE_SYSTEM",
         "BACKUP_PACKAGE_FILES",
+        "PREFETCH_TRANSACTION_PACKAGES",
     )
 
     def run(self):
@@ -43,6 +58,12 @@ class ValidatePackageManagerTransaction(actions.Action):
 
         try:
             logger.task("Validate the %s transaction", pkgmanager.TYPE)
+            # Download the packages still missing at full speed, the ones
+            # already downloaded in the background are imported.
+            prefetch.package_prefetch.finish()
+            # The child process worker may have been started before the
+            # previous actions changed the rpmdb, validate in a fresh one.
+            utils.child_process_worker.stop()
             transaction_handler = pkgmanager.create_transaction_handler()
             transaction_handler.run_transaction(
                 validate_transaction=True,
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Registry of the Actions shipped with convert2rhel.
+
+The registry lists the id, dependencies, module and class of every Action in
+each Stage.  It is generated when convert2rhel is built by reading the source
+of the Action modules, without importing them, and it is stored as the
+:data:`REGISTRY_MODULE` python module.  :class:`convert2rhel.actions.Stage`
+plans the run from the registry so that the modules of the Actions (and the
+heavy modules they import) are only imported when the Actions are run.
+
+When the registry has not been generated, like in a git checkout, the Stages
+discover their Actions by importing all of their modules instead.
+
+This module must only use the standard library as it is run by ``setup.py``
+to generate the registry::
+
+    python convert2rhel/actions/registry.py build/lib/convert2rhel/actions
+"""
+
+__metaclass__ = type
+
+import ast
+import importlib
+import os
+import pprint
+import sys
+
+
+#: Name of the generated module holding the registry
+REGISTRY_MODULE = "convert2rhel.actions._registry"
+#: Filename of the generated module holding the registry
+REGISTRY_FILENAME = "_registry.py"
+
+_REGISTRY_TEMPLATE = """\
+# This file is generated by convert2rhel/actions/registry.py when convert2rhel
+# is built.  Do not edit it.
+#
+# Mapping of the python package of a Stage to the tuple of its Actions:
+# (id, dependencies, module, class name)
+
+__metaclass__ = type
+
+ACTIONS = {actions}
+"""
+
+
+class RegistryError(Exception):
+    """Raised when the registry cannot be generated from the Action modules."""
+
+
+class RegisteredAction:
+    """
+    An Action known from the registry whose module has not been imported yet.
+
+    It provides the class attributes of the Action needed to order the Actions.
+    Calling it imports the module of the Action and instantiates the Action
+    class, so it can be used in place of the class.
+    """
+
+    def __init__(self, id, dependencies, module_name, class_name):
+        self.id = id
+        self.dependencies = tuple(dependencies)
+        self.module_name = module_name
+        self.class_name = class_name
+
+    def __repr__(self):
+        return "<{} {} ({}.{})>".format(self.__class__.__name__, self.id, self.module_name, self.class_name)
+
+    def load(self):
+        """
+        Import the Action class.
+
+        :returns: The Action class.
+        :rtype: type
+        """
+        module = importlib.import_module(self.module_name)
+        return getattr(module, self.class_name)
+
+    def __call__(self):
+        return self.load()()
+
+
+def get_registered_actions(stage_package):
+    """
+    Get the Actions of a Stage from the generated registry.
+
+    :param stage_package: Python package holding the Actions of the Stage,
+        for instance ``convert2rhel.actions.system_checks``.
+    :type stage_package: str
+    :returns: Set of :class:`RegisteredAction` or None if the registry has not
+        been generated or the Stage is not in it.
+    :rtype: set[RegisteredAction] | None
+    """
+    try:
+        registry = importlib.import_module(REGISTRY_MODULE)
+    except ImportError:
+        return None
+
+    if stage_package not in registry.ACTIONS:
+        return None
+
+    return set(RegisteredAction(*entry) for entry in registry.ACTIONS[stage_package])
+
+
+def _literal_class_attributes(class_node):
+    attributes = {}
+    for statement in class_node.body:
+        if not isinstance(statement, ast.Assign):
+            continue
+        for target in statement.targets:
+            if isinstance(target, ast.Name) and target.id in ("id", "dependencies"):
+                try:
+                    attributes[target.id] = ast.literal_eval(statement.value)
+                except ValueError:
+                    attributes[target.id] = ValueError
+    return attributes
+
+
+def _is_action_base(base):
+    # class MyAction(actions.Action) or class MyAction(Action)
+    if isinstance(base, ast.Attribute):
+        return base.attr == "Action"
+    return isinstance(base, ast.Name) and base.id == "Action"
+
+
+def scan_module(path, module_name):
+    """
+    Find the Actions defined in a module without importing it.
+
+    :param path: Path to the source of the module.
+    :type path: str
+    :param module_name: Python dotted name of the module.
+    :type module_name: str
+    :raises RegistryError: If the id or the dependencies of an Action are not
+        literals.
+    :returns: List of (id, dependencies, module, class name) tuples.
+    :rtype: list[tuple]
+    """
+    with open(path) as source_file:
+        tree = ast.parse(source_file.read(), path)
+
+    entries = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or not any(_is_action_base(base) for base in node.bases):
+            continue
+
+        attributes = _literal_class_attributes(node)
+        action_id = attributes.get("id")
+        dependencies = attributes.get("dependencies", ())
+        if not isinstance(action_id, str) or dependencies is ValueError:
+            raise RegistryError(
+                "The id and dependencies of {}.{} must be literals to be registered.".format(module_name, node.name)
+            )
+
+        entries.append((action_id, tuple(dependencies), module_name, node.name))
+
+    return entries
+
+
+def scan_actions(actions_dir, package="convert2rhel.actions"):
+    """
+    Find the Actions of all the Stages in a directory.
+
+    Every python package in ``actions_dir`` is a Stage.  Like
+    :func:`convert2rhel.actions.get_actions`, only the modules directly in
+    the package of a Stage are searched.
+
+    :param actions_dir: Directory of the ``convert2rhel.actions`` package.
+    :type actions_dir: str
+    :keyword package: Python dotted name of the package in ``actions_dir``.
+    :type package: str
+    :returns: Mapping of the package of each Stage to the tuple of its Actions.
+    :rtype: dict
+    """
+    registry = {}
+    for stage_name in sorted(os.listdir(actions_dir)):
+        stage_dir = os.path.join(actions_dir, stage_name)
+        if not os.path.isfile(os.path.join(stage_dir, "__init__.py")):
+            continue
+
+        stage_package = "{}.{}".format(package, stage_name)
+        entries = []
+        for filename in sorted(os.listdir(stage_dir)):
+            module, extension = os.path.splitext(filename)
+            if extension != ".py" or module == "__init__":
+                continue
+            entries.extend(scan_module(os.path.join(stage_dir, filename), "{}.{}".format(stage_package, module)))
+
+        registry[stage_package] = tuple(sorted(entries))
+
+    return registry
+
+
+def write_registry(actions_dir):
+    """
+    Generate the registry module for the Actions in a directory.
+
+    :param actions_dir: Directory of the ``convert2rhel.actions`` package. The
+        registry is written to it.
+    :type actions_dir: str
+    :returns: Path to the generated module.
+    :rtype: str
+    """
+    registry = scan_actions(actions_dir)
+    path = os.path.join(actions_dir, REGISTRY_FILENAME)
+    with open(path, "w") as registry_file:
+        registry_file.write(_REGISTRY_TEMPLATE.format(actions=pprint.pformat(registry, width=120)))
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: {} ACTIONS_DIR\n".format(sys.argv[0]))
+        sys.exit(2)
+
+    sys.stdout.write("Generated {}\n".format(write_registry(sys.argv[1])))
@@ -15,8 +15,9 @@
 
 __metaclass__ = type
 
-import copy
+import errno
 import json
+import os
 import textwrap
 
 from convert2rhel import utils
@@ -25,10 +26,12 @@ from convert2rhel.actions import (
     STATUS_CODE,
     STATUS_HEADER,
     find_actions_of_severity,
+    format_action_results,
     format_action_status_message,
     level_for_combined_action_data,
 )
 from convert2rhel.logger import colorize, root_logger
+from convert2rhel.systeminfo import system_info
 
 
 logger = root_logger.getChild(__name__)
@@ -39,6 +42,13 @@ CONVERT2RHEL_PRE_CONVERSION_TXT_RESULTS = "/var/log/convert2rhel/convert2rhel-pr
 #: The filename to store the results of the post conversion report
 CONVERT2RHEL_POST_CONVERSION_JSON_RESULTS = "/var/log/convert2rhel/convert2rhel-post-conversion.json"
 CONVERT2RHEL_POST_CONVERSION_TXT_RESULTS = "/var/log/convert2rhel/convert2rhel-post-conversion.txt"
+#: Which report the json reports are, by the name of their file
+_REPORT_NAMES = {
+    os.path.basename(CONVERT2RHEL_PRE_CONVERSION_JSON_RESULTS): "pre-conversion",
+    os.path.basename(CONVERT2RHEL_POST_CONVERSION_JSON_RESULTS): "post-conversion",
+}
+#: Number of the slowest Actions to list at the end of the txt report
+SLOWEST_ACTIONS_IN_TXT_REPORT = 10
 
 #: Map Status codes (from convert2rhel.actions.STATUS_CODE) to color name (from
 #: convert2rhel.logger.bcolor)
@@ -70,33 +80,182 @@ def summary_as_json(results, json_file):
 
     The json output is a slight modification to the results data that is passed in:
 
-    * The outermost container is a dictionary.  The current two fields are:
-        :format_version: This is currently "1.0".  It will be increased
+    * The outermost container is a dictionary.  The current fields are:
+        :format_version: This is currently "1.4".  It will be increased
             whenever the version changes.
+        :status: The highest level of the results.
+        :report: Either "pre-conversion" or "post-conversion", when the
+            report is written to the file of one of them.
+        :system: The distribution, version and architecture of the system,
+            when they are known.  Used to tell the reports of many systems
+            apart.
         :actions: This contains a modified copy of the results
 
     * The results are modified so that status codes use their symbolic names
       instead of the numeric values.
+
+    The results are written one action at a time by :class:`JsonReportWriter`
+    so that the whole report is never held in memory as a single string.
     """
-    # Collect the highest report level to use as status key
-    highest_level = find_highest_report_level(results)
-
-    # Use an envelope so we can add other, non-result info if necessary.
-    envelope = {
-        "format_version": "1.1",
-        "status": highest_level,
-        "actions": copy.deepcopy(results),
-    }
+    report_writer = JsonReportWriter(json_file)
+    try:
+        for action_id, action_results in results.items():
+            report_writer.add_action_results(action_id, action_results)
+        report_writer.finish()
+    except BaseException:
+        report_writer.discard()
+        raise
 
-    # Use the symbolic name in the json output
-    for action in envelope["actions"].values():
-        action["result"]["level"] = _STATUS_NAME_FROM_CODE[action["result"]["level"]]
 
-        for message in action["messages"]:
-            message["level"] = _STATUS_NAME_FROM_CODE[message["level"]]
+def _with_symbolic_levels(action_results):
+    """Copy the results of an action using the symbolic names of the levels, the texts are not copied."""
+    action_results = dict(action_results)
+    action_results["result"] = dict(action_results["result"])
+    action_results["result"]["level"] = _STATUS_NAME_FROM_CODE[action_results["result"]["level"]]
 
-    with open(json_file, "w") as f:
-        json.dump(envelope, f)
+    messages = []
+    for message in action_results["messages"]:
+        message = dict(message)
+        message["level"] = _STATUS_NAME_FROM_CODE[message["level"]]
+        messages.append(message)
+    action_results["messages"] = messages
+
+    return action_results
+
+
+class JsonReportWriter:
+    """
+    Write the json report one action at a time.
+
+    The report is written to a ``.partial`` file next to the report and
+    renamed to the report once it is finished, so that the report is never
+    seen half written.  The closing of the json document, along with the
+    status of the actions written so far, is rewritten after every action.
+    The partial file is therefore a valid report of the actions which have
+    finished if convert2rhel is killed while running the actions.
+    """
+
+    def __init__(self, json_file):
+        """
+        :param json_file: Filename of the json report.
+        :type json_file: str
+        """
+        self.json_file = json_file
+        self.partial_file = json_file + ".partial"
+        self._file = None
+        # Where the closing of the document starts, the next action is written there
+        self._end_offset = None
+        self._highest_level = STATUS_CODE["SUCCESS"]
+        self._failed = False
+
+    def _open(self):
+        self._file = open(self.partial_file, "w")
+
+        envelope_start = '{"format_version": "1.4", '
+        report_name = _REPORT_NAMES.get(os.path.basename(self.json_file))
+        if report_name:
+            envelope_start += '"report": {}, '.format(json.dumps(report_name))
+        system = get_system_description()
+        if system:
+            envelope_start += '"system": {}, '.format(json.dumps(system))
+        self._file.write(envelope_start + '"actions": {')
+
+    def _write_end(self):
+        """Close the json document after the last action written."""
+        self._file.write('}}, "status": {}}}'.format(json.dumps(_STATUS_NAME_FROM_CODE[self._highest_level])))
+        self._file.flush()
+
+    def add_action_results(self, action_id, action_results):
+        """
+        Write the results of one action to the report.
+
+        :param action_id: The id of the action.
+        :type action_id: str
+        :param action_results: The results of the action as in the dictionary
+            returned by :func:`convert2rhel.actions.parse_action_results`.
+        :type action_results: dict
+        """
+        if self._file is None:
+            self._open()
+        else:
+            self._file.seek(self._end_offset)
+            self._file.truncate()
+            self._file.write(", ")
+
+        self._file.write(json.dumps(action_id) + ": ")
+        json.dump(_with_symbolic_levels(action_results), self._file)
+        self._end_offset = self._file.tell()
+
+        # The status is the highest level of the results, see find_highest_report_level()
+        levels = [action_results["result"]["level"]] + [message["level"] for message in action_results["messages"]]
+        self._highest_level = max(
+            [self._highest_level] + [level for level in levels if level in _STATUS_NAME_FROM_CODE]
+        )
+        self._write_end()
+
+    def add_finished_action(self, action):
+        """
+        Write an action to the report as soon as it has finished.
+
+        Meant to be passed as the ``on_action_finished`` callback of
+        :func:`convert2rhel.actions.run_pre_actions`.  A report which can't be
+        written doesn't stop the actions, the full report is written once they
+        have all finished.
+
+        :param action: The action which has finished.
+        :type action: convert2rhel.actions.Action
+        """
+        if self._failed:
+            return
+
+        try:
+            self.add_action_results(action.id, format_action_results(action))
+        except (IOError, OSError) as e:
+            logger.warning("Unable to write the results of {} to {}: {}".format(action.id, self.partial_file, e))
+            self._failed = True
+            self.close()
+
+    def close(self):
+        """Stop writing to the report, the partial file is left in place and no more actions can be added."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self):
+        """Move the finished report in place of the previous report."""
+        if self._file is None:
+            self._open()
+            self._write_end()
+        self.close()
+        os.rename(self.partial_file, self.json_file)
+
+    def discard(self):
+        """Remove the partial report."""
+        self.close()
+        try:
+            os.remove(self.partial_file)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+def get_system_description():
+    """
+    Describe the system the results are for.
+
+    :return: The id, name, version and architecture of the system or None if
+        they have not been gathered yet.
+    :rtype: dict[str, str] | None
+    """
+    if not system_info.name or not system_info.version:
+        return None
+
+    return {
+        "id": system_info.id,
+        "name": system_info.name,
+        "version": "{0.major}.{0.minor}".format(system_info.version),
+        "arch": system_info.arch,
+    }
 
 
 def wrap_paragraphs(text, width=70, **kwargs):
@@ -322,16 +481,80 @@ def find_highest_report_level(results):
     return highest_action_level
 
 
-def summary_as_txt(results, txt_file):
+def format_slowest_actions(results, count):
+    """
+    Format a section listing the Actions which took the longest to run.
+
+    :param results: The results from the Actions which have been run.
+    :type results: dict
+    :param count: The maximum number of Actions to list.
+    :type count: int
+    :return: The formatted section or an empty string if no Action has timing
+        data.
+    :rtype: str
+    """
+    timed_actions = [(action_id, value["timing"]) for action_id, value in results.items() if "timing" in value]
+    if not timed_actions:
+        return ""
+
+    timed_actions = sorted(timed_actions, key=lambda item: item[1]["wall_time"], reverse=True)[:count]
+
+    section = ["{highlight} Slowest actions {highlight}".format(highlight="=" * 10)]
+    for action_id, timing in timed_actions:
+        section.append(
+            "{action_id}: {wall_time:.2f}s wall, {cpu_time:.2f}s CPU, {children_cpu_time:.2f}s CPU in"
+            " {subprocesses} subprocesses".format(action_id=action_id, **timing)
+        )
+
+    return "\n".join(section)
+
+
+class _StrippedTextWriter:
+    """
+    Write text to a file as if the whole text was stripped of the leading and
+    trailing whitespace.
+
+    The whitespace at the end of the text written so far is only written once
+    more text follows it.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        # None until the first text which is not whitespace is written
+        self._pending_whitespace = None
+
+    @property
+    def empty(self):
+        """Whether nothing but whitespace has been written."""
+        return self._pending_whitespace is None
+
+    def write(self, text):
+        if self._pending_whitespace is None:
+            text = text.lstrip()
+            if not text:
+                return
+            self._pending_whitespace = ""
+
+        content = text.rstrip()
+        if content:
+            self._file.write(self._pending_whitespace + content)
+            self._pending_whitespace = text[len(content) :]
+        else:
+            self._pending_whitespace += text
+
+
+def summary_as_txt(results, txt_file, slowest_actions=0):
     """
     Print the report to txt file. Used mainly by Satellite.
     Accepts the data preformatted by summary function.
 
     There is no special formatting needed, just the output of the checks.
     The data are sorted from ERROR to INFO, SUCCESS aren't included.
-    """
-    txt_result = ""
 
+    :keyword slowest_actions: If set, list this many of the slowest Actions at
+        the end of the report.
+    :type slowest_actions: int
+    """
     combined_results_and_message = get_combined_results_and_message(results)
 
     combined_results_and_message = find_actions_of_severity(
@@ -339,14 +562,25 @@ def summary_as_txt(results, txt_file):
     )
     combined_results_and_message = sorted(combined_results_and_message, key=lambda item: item[1]["level"], reverse=True)
 
-    for message_id, combined_result in combined_results_and_message:
-        entry = format_action_status_message(combined_result["level"], message_id[0], message_id[1], combined_result)
-        entry = colorize(entry, _STATUS_TO_COLOR[combined_result["level"]])
-        entry += "\n"
-        txt_result += entry
-
-    txt_result = txt_result.strip()
-
-    # We need info from the last run, any old results are discarded
-    with open(txt_file, "w") as file:
-        file.write(txt_result)
+    # We need info from the last run, any old results are discarded.  Write
+    # each entry as soon as it is formatted and replace the old results only
+    # once the report is complete.
+    partial_file = txt_file + ".partial"
+    try:
+        with open(partial_file, "w") as file:
+            txt_result = _StrippedTextWriter(file)
+            for message_id, combined_result in combined_results_and_message:
+                entry = format_action_status_message(
+                    combined_result["level"], message_id[0], message_id[1], combined_result
+                )
+                txt_result.write(colorize(entry, _STATUS_TO_COLOR[combined_result["level"]]) + "\n")
+
+            if slowest_actions:
+                slowest_actions_section = format_slowest_actions(results, slowest_actions)
+                if slowest_actions_section:
+                    file.write(("" if txt_result.empty else "\n\n") + slowest_actions_section)
+        os.rename(partial_file, txt_file)
+    except BaseException:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
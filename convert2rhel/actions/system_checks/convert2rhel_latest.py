@@ -22,7 +22,7 @@ import rpm
 
 from convert2rhel import __file__ as convert2rhel_file
 from convert2rhel import __version__ as running_convert2rhel_version
-from convert2rhel import actions, exceptions, repo, utils
+from convert2rhel import actions, exceptions, repo, repometa, utils
 from convert2rhel.logger import root_logger
 from convert2rhel.pkghandler import parse_pkg_string
 from convert2rhel.systeminfo import system_info
@@ -53,22 +53,15 @@ class Convert2rhelLatest(actions.Action):
         if not repofile_path:
             return
 
-        cmd = [
-            "repoquery",
-            "--releasever={}".format(system_info.version.major),
-            "--setopt=reposdir={}".format(os.path.dirname(repofile_path)),
-            "--setopt=exclude=",
-            "--qf",
-            "C2R %{NAME}-%{EPOCH}:%{VERSION}-%{RELEASE}.%{ARCH}",
-            "convert2rhel",
-        ]
-
-        raw_output_convert2rhel_versions, return_code = utils.run_subprocess(cmd, print_output=False)
-
-        if return_code != 0:
+        try:
+            metadata = repometa.get_repo_metadata(
+                reposdir=os.path.dirname(repofile_path), releasever=str(system_info.version.major)
+            )
+            convert2rhel_packages = metadata.get_packages(["convert2rhel"])
+        except repometa.RepoMetadataError as err:
             diagnosis = (
                 "Couldn't check if the current installed convert2rhel is the latest version.\n"
-                "repoquery failed with the following output:\n{}".format(raw_output_convert2rhel_versions)
+                "Loading the repository metadata failed with the following error:\n{}".format(err)
             )
             logger.warning(diagnosis)
             self.add_message(
@@ -80,34 +73,19 @@ class Convert2rhelLatest(actions.Action):
             )
             return
 
-        raw_output_convert2rhel_versions = _extract_convert2rhel_versions(raw_output_convert2rhel_versions)
-
         latest_available_version = ("0", "0.00", "0")
-        convert2rhel_versions = []
-
-        # add each tuple of fields obtained from parse_pkg_string() to convert2rhel_versions
-        for raw_pkg in raw_output_convert2rhel_versions:
-            try:
-                parsed_pkg = parse_pkg_string(raw_pkg)
-            except ValueError as exc:
-                # Not a valid package string input
-                logger.debug(exc)
-                continue
-            convert2rhel_versions.append(parsed_pkg)
 
-        logger.debug("Found {} convert2rhel package(s)".format(len(convert2rhel_versions)))
+        logger.debug("Found {} convert2rhel package(s)".format(len(convert2rhel_packages)))
 
         # This loop will determine the latest available convert2rhel version in the yum repo.
         # It assigns the epoch, version, and release ex: ("0", "0.26", "1.el7") to the latest_available_version variable.
-        for package_version in convert2rhel_versions:
+        for package in convert2rhel_packages:
             # rpm.labelCompare(pkg1, pkg2) compare two package version strings and return
             # -1 if latest_version is greater than package_version, 0 if they are equal, 1 if package_version is greater than latest_version
-            ver_compare = rpm.labelCompare(
-                (package_version[1], package_version[2], package_version[3]), latest_available_version
-            )
+            ver_compare = rpm.labelCompare(package.evr, latest_available_version)
 
             if ver_compare > 0:
-                latest_available_version = (package_version[1], package_version[2], package_version[3])
+                latest_available_version = package.evr
 
         logger.debug("Found {} to be latest available version".format(latest_available_version[1]))
         precise_available_version = ("0", latest_available_version[1], "0")
@@ -252,11 +230,11 @@ def _extract_convert2rhel_versions(raw_versions):
     # convert the raw output of convert2rhel version strings into a list
     precise_raw_version = raw_versions.splitlines()
 
-    # We are expecting an repoquery output to be similar to this:
+    # We are expecting an rpm -qf output to be similar to this:
     # C2R convert2rhel-0:0.17-1.el7.noarch
     # We need the `C2R` identifier to be present on the line so we can know for
     # sure that the line we are working with is the a line that contains
-    # relevant repoquery information to our check, otherwise, we just log the
+    # relevant rpm information to our check, otherwise, we just log the
     # information as debug and do nothing with it.
     for raw_version in precise_raw_version:
         if raw_version.startswith("C2R "):
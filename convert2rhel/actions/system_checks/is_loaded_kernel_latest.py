@@ -16,7 +16,7 @@
 __metaclass__ = type
 
 
-from convert2rhel import actions, repo
+from convert2rhel import actions, repo, repometa
 from convert2rhel.logger import root_logger
 from convert2rhel.pkghandler import compare_package_versions
 from convert2rhel.systeminfo import system_info
@@ -46,24 +46,12 @@ class IsLoadedKernelLatest(actions.Action):
 
         # RHELC-884 disable the RHEL repos to avoid reaching them when checking original system.
         repos_to_disable = repo.DisableReposDuringAnalysis().get_rhel_repos_to_disable()
-        disable_repo_command = repo.get_rhel_disable_repos_command(repos_to_disable)
-
-        cmd = [
-            "repoquery",
-            "--setopt=exclude=",
-            "--quiet",
-        ]
-        cmd.extend(disable_repo_command)
-        cmd.extend(["--qf", "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}"])
 
         # For Oracle/CentOS Linux 8 the `kernel` is just a meta package, instead,
         # we check for `kernel-core`. But 7 releases, the correct way to check is
         # using `kernel`.
         package_to_check = "kernel-core" if system_info.version.major >= 8 else "kernel"
 
-        # Append the package name as the last item on the list
-        cmd.append(package_to_check)
-
         # Repoquery failed to detected any kernel or kernel-core packages in it's repositories
         # we allow the user to provide a environment variable to override the functionality and proceed
         # with the conversion, otherwise, we just throw a critical logging to them.
@@ -85,15 +73,19 @@ class IsLoadedKernelLatest(actions.Action):
             return
 
         # Look up for available kernel (or kernel-core) packages versions available
-        # in different repositories using the `repoquery` command.  If convert2rhel
-        # detects that it is running on a EUS system, then repoquery will use the
-        # hardcoded repofiles available under `/usr/share/convert2rhel/repos`,
+        # in different repositories in their metadata.  If convert2rhel
+        # detects that it is running on a EUS system, then the metadata of the
+        # hardcoded repofiles available under `/usr/share/convert2rhel/repos` is used,
         # meaning that the tool will fetch only the latest kernels available for
         # that EUS version, and not the most updated version from other newer
-        # versions.
-        repoquery_output, return_code = run_subprocess(cmd, print_output=False)
-        if return_code != 0:
-            logger.debug("Got the following output: %s", repoquery_output)
+        # versions. The kernels of other architectures are ignored, the same
+        # as repoquery does.
+        try:
+            packages = repometa.get_repo_metadata(disable_repos=repos_to_disable).get_packages(
+                [package_to_check], arches=[system_info.arch, "noarch"]
+            )
+        except repometa.RepoMetadataError as err:
+            logger.debug("Unable to load the repository metadata: %s", err)
             logger.warning(
                 "Couldn't fetch the list of the most recent kernels available in "
                 "the repositories. Did not perform the loaded kernel check."
@@ -109,23 +101,6 @@ class IsLoadedKernelLatest(actions.Action):
             )
             return
 
-        packages = []
-        # We are expecting a repoquery output to be similar to this:
-        #   C2R     1671212820      3.10.0-1160.81.1.el7    updates
-        # We need the `C2R` identifier to be present on the line so we can know for
-        # sure that the line we are working with is a line that contains
-        # relevant repoquery information to our check, otherwise, we just log the
-        # information as debug and do nothing with it.
-        for line in repoquery_output.split("\n"):
-            if line.strip() and "C2R" in line:
-                _, build_time, latest_kernel, repoid = tuple(str(line).split("\t"))
-                packages.append((build_time, latest_kernel, repoid))
-            else:
-                # Mainly for debugging purposes to see what is happening if we got
-                # anything else that does not have the C2R identifier at the start
-                # of the line.
-                logger.debug("Got a line without the C2R identifier: {}".format(line))
-
         # If we don't have any packages, then something went wrong, bail out by default
         if not packages:
             self.set_result(
@@ -146,8 +121,9 @@ class IsLoadedKernelLatest(actions.Action):
             )
             return
 
-        packages.sort(key=lambda x: x[0], reverse=True)
-        _, latest_kernel, repoid = packages[0]
+        latest_pkg = max(packages, key=lambda pkg: pkg.buildtime)
+        latest_kernel = "{}-{}".format(latest_pkg.version, latest_pkg.release)
+        repoid = latest_pkg.repoid
 
         uname_output, _ = run_subprocess(["uname", "-r"], print_output=False)
         loaded_kernel = uname_output.rsplit(".", 1)[0]
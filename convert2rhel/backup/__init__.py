@@ -19,10 +19,14 @@ __metaclass__ = type
 
 import abc
 import hashlib
+import logging
 import os
+import threading
 
 import six
 
+from six.moves import queue
+
 from convert2rhel.logger import root_logger
 from convert2rhel.repo import DEFAULT_YUM_REPOFILE_DIR, DEFAULT_YUM_VARS_DIR, DEFAULT_DNF_VARS_DIR
 from convert2rhel.utils import TMP_DIR
@@ -31,6 +35,10 @@ from convert2rhel.utils import TMP_DIR
 # Directory for temporary backing up files, packages and other relevant stuff.
 BACKUP_DIR = os.path.join(TMP_DIR, "backup")
 
+# Maximum number of threads restoring independent files at the same time
+# during the rollback.
+MAX_ROLLBACK_WORKERS = 8
+
 logger = root_logger.getChild(__name__)
 
 
@@ -68,11 +76,22 @@ class BackupController:
     onto the stack, it is backed up.  When it is popped off of the stack, it is
     restored.  Changes are restored in the reverse order that that they were
     added.  Changes cannot be retrieved and restored out of order.
+
+    The Controller may be used from the worker threads which run Actions
+    concurrently so all access to the stack is serialized by a lock.
+
+    Next to the stack, the Controller keeps a set of the pushed restorables so
+    that detecting an already backed up change doesn't need to walk the whole
+    stack.  Restorables which define their own ``__eq__`` must define a
+    matching ``__hash__`` for the detection to work.
     """
 
     def __init__(self):
         self._restorables = []  # type: list[RestorableChange]
+        self._registry = set()  # type: set[RestorableChange]
         self._rollback_failures = []
+        # Reentrant because enabling a restorable may push other restorables.
+        self._lock = threading.RLock()
 
     def push(self, restorable):
         """
@@ -83,16 +102,17 @@ class BackupController:
         if not isinstance(restorable, RestorableChange):
             raise TypeError("`{}` is not a RestorableChange object".format(restorable))
 
-        # Check if the restorable is already backed up
-        # if it is, we skip it
-        for r in self._restorables:
-            if r == restorable:
+        with self._lock:
+            # Check if the restorable is already backed up
+            # if it is, we skip it
+            if restorable in self._registry:
                 logger.debug("Skipping: {} has already been backed up".format(restorable.__class__.__name__))
                 return
 
-        restorable.enable()
+            restorable.enable()
 
-        self._restorables.append(restorable)
+            self._restorables.append(restorable)
+            self._registry.add(restorable)
 
     def pop(self):
         """
@@ -101,16 +121,18 @@ class BackupController:
         :returns: RestorableChange object that was last added.
         :raises IndexError: If there are no RestorableChanges currently known to the Controller.
         """
-        try:
-            restorable = self._restorables.pop()
-        except IndexError as e:
-            # Use a more specific error message
-            args = list(e.args)
-            args[0] = "No backups to restore"
-            e.args = tuple(args)
-            raise e
+        with self._lock:
+            try:
+                restorable = self._restorables.pop()
+            except IndexError as e:
+                # Use a more specific error message
+                args = list(e.args)
+                args[0] = "No backups to restore"
+                e.args = tuple(args)
+                raise e
 
-        restorable.restore()
+            self._registry.discard(restorable)
+            restorable.restore()
 
         return restorable
 
@@ -123,31 +145,30 @@ class BackupController:
 
         After running, the Controller object will not know about any RestorableChanges.
         """
-        # Only raise IndexError if there are no restorables registered.
-        if not self._restorables:
-            raise IndexError("No backups to restore")
-
-        processed_restorables = []
-
-        # Restore the Changes in the reverse order the changes were enabled.
-        while True:
-            try:
-                restorable = self._restorables.pop()
-            except IndexError:
-                break
-
-            try:
-                restorable.restore()
-            # Catch SystemExit too because we might still be calling
-            # logger.critical in some places.
-            except (Exception, SystemExit) as e:
-                # Don't let a failure in one restore influence the others
-                message = "Error while rolling back a {}: {}".format(restorable.__class__.__name__, str(e))
-                logger.warning(message)
-                # Add the rollback failures to the list
-                self._rollback_failures.append(message)
-
-            processed_restorables.append(restorable)
+        with self._lock:
+            # Only raise IndexError if there are no restorables registered.
+            if not self._restorables:
+                raise IndexError("No backups to restore")
+
+            processed_restorables = []
+
+            # Restore the Changes in the reverse order the changes were enabled.
+            for batch in _plan_rollback(self._restorables[::-1]):
+                del self._restorables[-len(batch) :]
+                for restorable in batch:
+                    self._registry.discard(restorable)
+
+                # Report the messages and the failures in the same order as
+                # when restoring the batch one by one.
+                for restorable, (message, records) in zip(batch, _restore_batch(batch)):
+                    for record in records:
+                        logging.getLogger(record.name).handle(record)
+                    if message:
+                        logger.warning(message)
+                        # Add the rollback failures to the list
+                        self._rollback_failures.append(message)
+
+                    processed_restorables.append(restorable)
 
         return processed_restorables
 
@@ -174,12 +195,168 @@ class BackupController:
         return len(self._restorables)
 
 
+def _plan_rollback(restorables):
+    """
+    Split the restorables into batches which can be restored concurrently.
+
+    Consecutive restorables which are :attr:`RestorableChange.parallel_safe`
+    and touch different paths end up in the same batch.  Every other
+    restorable is a batch on its own so it acts as a barrier: everything
+    before it is restored before it and everything after it only once it is
+    restored.
+
+    :param restorables: Restorables in the order they need to be restored.
+    :type restorables: list[RestorableChange]
+    :returns: Batches of restorables, keeping the order of ``restorables``.
+    :rtype: list[list[RestorableChange]]
+    """
+    batches = []
+    # Paths restored by the last batch, None when it can't be extended.
+    batch_paths = None
+
+    for restorable in restorables:
+        if not restorable.parallel_safe:
+            batches.append([restorable])
+            batch_paths = None
+            continue
+
+        # A path which is already restored in the current batch has to wait
+        # for it, e.g. a file which was backed up and later removed.
+        if batch_paths is None or restorable.filepath in batch_paths:
+            batches.append([])
+            batch_paths = set()
+
+        batches[-1].append(restorable)
+        batch_paths.add(restorable.filepath)
+
+    return batches
+
+
+def _restore(restorable):
+    """
+    Restore a single restorable without letting its failure stop the rollback.
+
+    :returns: Message describing the failure or None when the restore succeeded.
+    :rtype: str | None
+    """
+    try:
+        restorable.restore()
+    # Catch SystemExit too because we might still be calling
+    # logger.critical in some places.
+    except (Exception, SystemExit) as e:
+        # Don't let a failure in one restore influence the others
+        return "Error while rolling back a {}: {}".format(restorable.__class__.__name__, str(e))
+
+    return None
+
+
+class _HeldLogRecords(logging.Filter):
+    """
+    Hold back the log records of the threads restoring a batch.
+
+    The restorables print a task header followed by their messages.  Added to
+    the log handlers, this filter keeps the records of each restorable aside
+    so they can be logged from the coordinating thread once the batch is
+    restored, instead of being mixed with those of the other restorables.
+    """
+
+    def __init__(self):
+        super(_HeldLogRecords, self).__init__()
+        # Records of the restorable each thread is restoring, by thread ID.
+        self._records = {}
+
+    def hold(self, records):
+        """Append the records logged by the current thread to the records list from now on."""
+        self._records[threading.current_thread().ident] = records
+
+    def filter(self, record):
+        records = self._records.get(record.thread)
+        if records is None:
+            return True
+
+        # Every handler calls the filter, keep the record only once.
+        if not records or records[-1] is not record:
+            records.append(record)
+        return False
+
+
+def _get_log_handlers():
+    """Get the handlers the records of our loggers are passed to."""
+    handlers = []
+    current = root_logger
+    while current:
+        handlers.extend(current.handlers)
+        current = current.parent if current.propagate else None
+    return handlers
+
+
+def _restore_batch(batch):
+    """
+    Restore a batch of independent restorables on a pool of threads.
+
+    The log records of each restorable are held back while the batch is
+    restored so that the caller can log them in the order of the batch.
+
+    :param batch: Restorables which can be restored in any order.
+    :type batch: list[RestorableChange]
+    :returns: Failure message or None and the held back log records for
+        each of the restorables, in the order of ``batch``.
+    :rtype: list[tuple[str | None, list[logging.LogRecord]]]
+    """
+    if len(batch) == 1:
+        return [(_restore(batch[0]), [])]
+
+    messages = [None] * len(batch)
+    records = [[] for _ in batch]
+    held_log_records = _HeldLogRecords()
+    pending = queue.Queue()
+    for index, restorable in enumerate(batch):
+        pending.put((index, restorable))
+
+    def worker():
+        while True:
+            try:
+                index, restorable = pending.get_nowait()
+            except queue.Empty:
+                return
+            held_log_records.hold(records[index])
+            messages[index] = _restore(restorable)
+
+    handlers = _get_log_handlers()
+    for handler in handlers:
+        handler.addFilter(held_log_records)
+
+    try:
+        threads = []
+        for number in range(min(MAX_ROLLBACK_WORKERS, len(batch))):
+            thread = threading.Thread(target=worker, name="rollback-{}".format(number))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            # Python 2's Thread.join() can't be interrupted unless a timeout is
+            # given.
+            while thread.is_alive():
+                thread.join(1)
+    finally:
+        for handler in handlers:
+            handler.removeFilter(held_log_records)
+
+    return list(zip(messages, records))
+
+
 @six.add_metaclass(abc.ABCMeta)
 class RestorableChange:
     """
     Interface definition for types which can be restored.
     """
 
+    #: Whether the change can be restored concurrently with other parallel
+    #: safe changes during the rollback.  Only set it for changes which touch
+    #: nothing but the single path stored in their ``filepath`` attribute.
+    parallel_safe = False
+
     @abc.abstractmethod
     def __init__(self):
         self.enabled = False
@@ -17,9 +17,11 @@
 
 __metaclass__ = type
 
+import fcntl
 import hashlib
 import os
 import shutil
+import stat
 
 from convert2rhel import exceptions
 from convert2rhel.backup import BACKUP_DIR, RestorableChange
@@ -28,8 +30,89 @@ from convert2rhel.logger import root_logger
 
 logger = root_logger.getChild(__name__)
 
+# ioctl request number of FICLONE from linux/fs.h. It makes a copy-on-write
+# clone (reflink) of a file on filesystems that support it, like XFS or btrfs.
+_FICLONE = 0x40049409
+
+# Size of the blocks in which the files are read when hashing their content.
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def _get_content_store_dir():
+    """Directory of the content-addressed store of the backed up files."""
+    return os.path.join(BACKUP_DIR, "content")
+
+
+def _hash_file_content(filepath):
+    """Compute the sha256 checksum of the content of a file.
+
+    :param filepath: Path to the file to be hashed.
+    :type filepath: str
+    :returns str: Hexadecimal digest of the file content.
+    """
+    checksum = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b""):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _clone_file(src, dst):
+    """Copy the content of src to dst, as a reflink if the filesystem supports it."""
+    with open(src, "rb") as src_file:
+        with open(dst, "wb") as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+                return
+            except (OSError, IOError):
+                # Not supported by the filesystem or src and dst are on
+                # different filesystems
+                pass
+            shutil.copyfileobj(src_file, dst_file)
+
+
+def store_file_content(filepath):
+    """Store the content of a file in the content-addressed backup store.
+
+    The content is stored only once no matter how many files share it. The
+    store keeps just the content, the metadata of the file (permissions and
+    timestamps) need to be kept by the caller.
+
+    :param filepath: Path to the file to be stored.
+    :type filepath: str
+    :returns str: Path to the stored content.
+    :raises OSError: When the file can't be read or the store can't be written.
+    :raises IOError: When the file can't be read or the store can't be written.
+    """
+    digest = _hash_file_content(filepath)
+    content_dir = os.path.join(_get_content_store_dir(), digest[:2])
+    content_path = os.path.join(content_dir, digest)
+
+    if os.path.exists(content_path):
+        logger.debug("Content of {} is already stored in {}.".format(filepath, content_path))
+        return content_path
+
+    if not os.path.exists(content_dir):
+        os.makedirs(content_dir, mode=0o700)
+
+    # Write to a temporary file first so that an interrupted copy can't be
+    # mistaken for the stored content later
+    partial_path = content_path + ".partial"
+    try:
+        _clone_file(filepath, partial_path)
+        os.chmod(partial_path, 0o600)
+        os.rename(partial_path, content_path)
+    except (OSError, IOError):
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return content_path
+
 
 class RestorableFile(RestorableChange):
+    parallel_safe = True
+
     def __init__(self, filepath):
         super(RestorableFile, self).__init__()
         # The filepath we want to back up needs to start with at least a `/`,
@@ -46,6 +129,11 @@ class RestorableFile(RestorableChange):
 
         self.filepath = filepath
         self.backup_path = None
+        # Path to the content of the file in the content-addressed store
+        self.content_path = None
+        # Permissions and timestamps of the original file. They are kept here
+        # because the backups with the same content share a single inode.
+        self._file_stat = None
 
     def enable(self):
         """Save current version of a file"""
@@ -58,7 +146,10 @@ class RestorableFile(RestorableChange):
             try:
                 backup_path = self._hash_backup_path()
                 self.backup_path = backup_path
-                shutil.copy2(self.filepath, backup_path)
+                file_stat = os.stat(self.filepath)
+                self._file_stat = (file_stat.st_mode, file_stat.st_atime, file_stat.st_mtime)
+                self.content_path = store_file_content(self.filepath)
+                self._link_backup_path()
                 logger.debug("Copied {} to {}.".format(self.filepath, backup_path))
             except (OSError, IOError) as err:
                 # IOError for py2 and OSError for py3
@@ -83,6 +174,34 @@ class RestorableFile(RestorableChange):
         # Set the enabled value
         super(RestorableFile, self).enable()
 
+    def _link_backup_path(self):
+        """Make the backup path point to the stored content of the file.
+
+        The backup path is kept next to the content store as other parts of
+        convert2rhel read the backed up files from there, e.g. the backed up
+        repofiles are used as a reposdir.
+        """
+        if os.path.lexists(self.backup_path):
+            os.remove(self.backup_path)
+
+        try:
+            os.link(self.content_path, self.backup_path)
+        except (OSError, IOError):
+            # Hardlinks are not supported by the filesystem
+            shutil.copyfile(self.content_path, self.backup_path)
+
+    def _release_content(self):
+        """Remove the stored content once no backup path points to it anymore."""
+        if not self.content_path:
+            return
+
+        try:
+            if os.stat(self.content_path).st_nlink == 1:
+                os.remove(self.content_path)
+        except (OSError, IOError):
+            # Already removed by a backup of a file with the same content
+            pass
+
     def _hash_backup_path(self):
         """Hash the backup path for a given file based on its directory path.
 
@@ -131,10 +250,18 @@ class RestorableFile(RestorableChange):
             return
 
         # Possible exceptions will be handled in the BackupController
-        shutil.copy2(self.backup_path, self.filepath)
+        shutil.copyfile(self.backup_path, self.filepath)
+        if self._file_stat:
+            mode, atime, mtime = self._file_stat
+            os.chmod(self.filepath, stat.S_IMODE(mode))
+            os.utime(self.filepath, (atime, mtime))
+        else:
+            shutil.copystat(self.backup_path, self.filepath)
+
         if rollback:
             # Remove the backed up file only when processing rollback
             os.remove(self.backup_path)
+            self._release_content()
 
         if rollback:
             logger.info("File {} restored.".format(self.filepath))
@@ -167,6 +294,8 @@ class MissingFile(RestorableChange):
     conversion so should be removed in rollback.
     """
 
+    parallel_safe = True
+
     def __init__(self, filepath):
         super(MissingFile, self).__init__()
         self.filepath = filepath
@@ -216,6 +345,8 @@ class InstalledFile(RestorableChange):
     conversion, depending on what purpose the planted file serves.
     """
 
+    parallel_safe = True
+
     def __init__(self, filepath):
         super(InstalledFile, self).__init__()
         self.filepath = filepath
@@ -95,17 +95,16 @@ class RestorablePackage(RestorableChange):
                 logger.info("The repository directory %s seems to be empty or non-existent.")
                 self.reposdir = None
 
-        for pkg in self.pkgs:
-            self._backedup_pkgs_paths.append(
-                utils.download_pkg(
-                    pkg=pkg,
-                    dest=BACKUP_DIR,
-                    disable_repos=self.disable_repos,
-                    set_releasever=self.set_releasever,
-                    custom_releasever=self.custom_releasever,
-                    reposdir=self.reposdir,
-                )
+        self._backedup_pkgs_paths.extend(
+            utils.download_pkgs(
+                pkgs=self.pkgs,
+                dest=BACKUP_DIR,
+                disable_repos=self.disable_repos,
+                set_releasever=self.set_releasever,
+                custom_releasever=self.custom_releasever,
+                reposdir=self.reposdir,
             )
+        )
 
         # TODO(r0x0d): Maybe we want to set the enabled value only when we
         # backup something?
@@ -17,6 +17,7 @@
 
 __metaclass__ = type
 
+import collections
 import json
 import os
 import re
@@ -243,37 +244,58 @@ def _write_obj_to_array_json(path, new_object, key):
     If the file doesn't exist, create new one and create key for inserting.
     If the file is corrupted, append complete object (with key) as if it was new file and the
     original content of file stays there.
+
+    The new content is written to a temporary file which then replaces the file, so the file is
+    never left half written.
+    """
+    content = ""
+    if os.path.exists(path):
+        # the file can be changed just by root
+        os.chmod(path, 0o600)
+        with open(path) as file:
+            content = file.read()
+
+    try:
+        file_content = json.loads(content, object_pairs_hook=collections.OrderedDict) if content else {}
+    except ValueError:  # we cannot use json.decoder.JSONDecodeError due python 2.7 compatibility
+        file_content = None
+
+    # The file contains something that isn't a json object.
+    # Create activities and append to the file, JSON won't be valid, but the content of the file stays there
+    # for administrators, etc.
+    if not isinstance(file_content, dict):
+        _replace_file(path, content + json.dumps({key: [new_object]}, indent=4))
+        return
+
+    # valid json: update the JSON structure and rewrite the file
+    file_content.setdefault(key, []).append(new_object)
+    _replace_file(path, json.dumps(file_content, indent=4))
+
+
+def _replace_file(path, content):
+    """Replace the content of a file, the file is never seen half written.
+
+    The content is written to a temporary file next to the file, synced to the
+    disk and renamed over the file.
+
+    :param path: Path of the file.
+    :type path: str
+    :param content: The new content of the file.
+    :type content: str
     """
-    if not (os.path.exists(path)):
-        with open(path, "a") as file:
-            file_content = {key: []}
-            json.dump(file_content, file, indent=4)
-
-    # the file can be changed just by root
-    os.chmod(path, 0o600)
-
-    with open(path, "r+") as file:
-        try:
-            file_content = json.load(file)  # load data
-            # valid json: update the JSON structure and rewrite the file
-            file.seek(0)
-        # The file contains something that isn't json.
-        # Create activities and append to the file, JSON won't be valid, but the content of the file stays there
-        # for administrators, etc.
-        except ValueError:  # we cannot use json.decoder.JSONDecodeError due python 2.7 compatibility
-            file_content = {key: []}
-
-        try:
-            file_content[key].append(new_object)  # append new_object to activities
-        # valid json, but no 'activities' key there
-        except KeyError:
-            # create new 'activities' key which contains new_object
-            file_content[key] = [new_object]
-            # valid json: update the JSON structure and rewrite the file
-            file.seek(0)
-
-        # write the json to the file
-        json.dump(file_content, file, indent=4)
+    partial_file = path + ".partial"
+    try:
+        with open(partial_file, "w") as file:
+            # the file can be changed just by root
+            os.chmod(partial_file, 0o600)
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.rename(partial_file, path)
+    except BaseException:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
 
 
 # Code to be executed upon module import
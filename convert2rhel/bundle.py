@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Conversion bundles for converting systems without downloading from the RHEL repositories.
+
+``convert2rhel bundle create PATH`` analyzes a reference system and packs the
+metadata of the enabled RHEL repositories, the packages of the validated
+transaction and the Red Hat GPG keys into a single archive. The systems built
+from the same image are then converted with ``--bundle PATH``, which serves
+the content of the archive as local ``file://`` repositories used in place of
+the RHEL repositories.
+
+The archive is an uncompressed tar file as the packages and the metadata are
+compressed already. Its first member is a manifest listing the SHA-256
+checksum of each of the other members.
+"""
+
+__metaclass__ = type
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+from convert2rhel import __version__, backup, repometa, utils
+from convert2rhel.backup.files import InstalledFile
+from convert2rhel.logger import root_logger
+from convert2rhel.pkgmanager.handlers.base import ValidatedTransaction
+from convert2rhel.systeminfo import system_info
+from convert2rhel.toolopts import tool_opts
+from convert2rhel.utils import files
+
+
+logger = root_logger.getChild(__name__)
+"""Instance of the logger used in this module."""
+
+BUNDLE_FORMAT_VERSION = 1
+"""Version of the layout of the bundle. Bundles of other versions are refused."""
+
+MANIFEST_FILENAME = "manifest.json"
+"""Name of the manifest, the first member of the bundle."""
+
+BUNDLE_DIR = os.path.join(utils.TMP_DIR, "bundle")
+"""Where the bundle is extracted to on the converted system."""
+
+BUNDLE_REPOFILE = "/etc/yum.repos.d/convert2rhel-bundle.repo"
+"""Repofile with the repositories served from the extracted bundle."""
+
+_REPOS_DIR = "repos"
+_GPG_KEYS_DIR = "gpg-keys"
+
+_REPO_NS = "http://linux.duke.edu/metadata/repo"
+_RPM_NS = "http://linux.duke.edu/metadata/rpm"
+
+# Keep the namespace prefixes of the repomd.xml files we write
+ElementTree.register_namespace("", _REPO_NS)
+ElementTree.register_namespace("rpm", _RPM_NS)
+
+
+class BundleError(Exception):
+    """Raised when a conversion bundle cannot be created or used."""
+
+
+def _get_system():
+    """Get the description of this system, the bundle can be used only on the same ones.
+
+    :rtype: dict[str, str]
+    """
+    return {
+        "id": system_info.id,
+        "version": "{0.major}.{0.minor}".format(system_info.version),
+        "arch": system_info.arch,
+    }
+
+
+def _get_checksum(fileobj):
+    checksum = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+        checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _write_repomd(metadata_dir, path):
+    """Write the repomd.xml of a repository listing only the metadata downloaded to the cache.
+
+    The package managers download only the types of metadata they need so the
+    other types are left out of the bundle and of the repomd.xml.
+
+    :param metadata_dir: Directory with the downloaded metadata of the
+        repository, including the repomd.xml.
+    :type metadata_dir: str
+    :param path: Where to write the repomd.xml to.
+    :type path: str
+    :return: The path to each listed metadata file indexed by its location in
+        the repository.
+    :rtype: dict[str, str]
+    """
+    repomd_path = os.path.join(metadata_dir, "repomd.xml")
+    try:
+        repomd = ElementTree.parse(repomd_path).getroot()
+    except (EnvironmentError, SyntaxError) as err:
+        # ElementTree.ParseError is a subclass of SyntaxError
+        raise BundleError("Unable to read the repository metadata {}: {}".format(repomd_path, err))
+
+    locations = {}
+    for data in repomd.findall("{{{}}}data".format(_REPO_NS)):
+        href = data.find("{{{}}}location".format(_REPO_NS)).get("href")
+        local_path = os.path.join(metadata_dir, os.path.basename(href))
+        if os.path.exists(local_path):
+            locations[href] = local_path
+        else:
+            repomd.remove(data)
+
+    ElementTree.ElementTree(repomd).write(path, encoding="utf-8", xml_declaration=True)
+    return locations
+
+
+def _get_members(metadata_files, validated_transaction, staging_dir):
+    """Collect the content of the bundle.
+
+    :type metadata_files: list[repometa.RepoMetadataFiles]
+    :type validated_transaction: ValidatedTransaction
+    :param staging_dir: Where to write the files created for the bundle to.
+    :type staging_dir: str
+    :return: The path to the content of each member of the bundle indexed by
+        the name of the member.
+    :rtype: dict[str, str]
+    """
+    members = {}
+    packages = dict(
+        (os.path.basename(local_pkg), local_pkg) for _, _, local_pkg in validated_transaction.packages if local_pkg
+    )
+    found_packages = set()
+
+    for metadata in metadata_files:
+        repo_dir = os.path.join(_REPOS_DIR, metadata.repoid)
+        metadata_dir = os.path.dirname(metadata.primary)
+        repomd_name = os.path.join(repo_dir, "repodata", "repomd.xml")
+        repomd_path = os.path.join(staging_dir, repomd_name)
+        files.mkdir_p(os.path.dirname(repomd_path))
+        locations = _write_repomd(metadata_dir, repomd_path)
+        members[repomd_name] = repomd_path
+        for href, path in locations.items():
+            members[os.path.join(repo_dir, href)] = path
+
+        # The packages have to be at the locations listed in the metadata
+        for filename, href in repometa.get_package_locations(metadata.primary).items():
+            if filename in packages:
+                members[os.path.join(repo_dir, href)] = packages[filename]
+                found_packages.add(filename)
+
+    missing_packages = sorted(set(packages) - found_packages)
+    if missing_packages:
+        raise BundleError(
+            "The following packages of the transaction are not available in the enabled repositories: {}".format(
+                ", ".join(missing_packages)
+            )
+        )
+
+    gpg_keys_dir = os.path.join(utils.DATA_DIR, "gpg-keys")
+    for filename in sorted(os.listdir(gpg_keys_dir)):
+        members[os.path.join(_GPG_KEYS_DIR, filename)] = os.path.join(gpg_keys_dir, filename)
+
+    return members
+
+
+def _add_member(archive, name, path):
+    """Add a file to the bundle as a regular file readable by everyone."""
+    info = archive.gettarinfo(path, name)
+    info.mode = 0o644
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    with open(path, "rb") as fileobj:
+        archive.addfile(info, fileobj)
+
+
+def create_bundle(path):
+    """Create a conversion bundle from the transaction validated on this system.
+
+    :param path: Where to write the bundle to.
+    :type path: str
+    :raises BundleError: When the bundle cannot be created.
+    """
+    validated_transaction = ValidatedTransaction.load()
+    if validated_transaction is None:
+        raise BundleError("The bundle can be created only after the transaction is validated on this system.")
+
+    repoids = system_info.get_enabled_rhel_repos()
+    logger.info("Collecting the metadata of the {} repositories.".format(", ".join(repoids)))
+    try:
+        metadata_files = repometa.get_metadata_files(
+            disable_repos=tool_opts.disablerepo,
+            enable_repos=repoids,
+            releasever=system_info.releasever,
+            filelists=True,
+        )
+    except repometa.RepoMetadataError as err:
+        raise BundleError(str(err))
+
+    staging_dir = path + ".staging"
+    files.mkdir_p(staging_dir)
+    try:
+        _write_bundle(path, metadata_files, validated_transaction, staging_dir)
+    except EnvironmentError as err:
+        raise BundleError("Unable to create the conversion bundle {}: {}".format(path, err))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _write_bundle(path, metadata_files, validated_transaction, staging_dir):
+    members = _get_members(metadata_files, validated_transaction, staging_dir)
+
+    checksums = {}
+    for name, member_path in members.items():
+        with open(member_path, "rb") as fileobj:
+            checksums[name] = _get_checksum(fileobj)
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "convert2rhel_version": __version__,
+        "system": _get_system(),
+        "repos": [metadata.repoid for metadata in metadata_files],
+        # Only the action and the NEVRA, the paths are meaningless elsewhere
+        "packages": [package[:2] for package in validated_transaction.packages],
+        "files": checksums,
+    }
+
+    manifest_path = os.path.join(staging_dir, MANIFEST_FILENAME)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+
+    logger.info("Writing the conversion bundle to {}.".format(path))
+    new_path = path + ".new"
+    try:
+        with tarfile.open(new_path, "w") as archive:
+            _add_member(archive, MANIFEST_FILENAME, manifest_path)
+            for name in sorted(members):
+                _add_member(archive, name, members[name])
+        os.rename(new_path, path)
+    except (EnvironmentError, tarfile.TarError) as err:
+        if os.path.exists(new_path):
+            os.remove(new_path)
+        raise BundleError("Unable to write the conversion bundle to {}: {}".format(path, err))
+
+    downloaded_packages = [package for package in validated_transaction.packages if package[2]]
+    logger.info(
+        "Created the conversion bundle {} with {} packages from the {} repositories.".format(
+            path, len(downloaded_packages), ", ".join(manifest["repos"])
+        )
+    )
+
+
+def _read_manifest(archive, member):
+    if member.name != MANIFEST_FILENAME or not member.isfile():
+        raise BundleError("The file does not start with the manifest of a conversion bundle.")
+
+    manifest = json.loads(archive.extractfile(member).read().decode("utf-8"))
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(
+            "Unsupported version {} of the conversion bundle. Create the bundle with this version of"
+            " convert2rhel.".format(manifest.get("format_version"))
+        )
+
+    return manifest
+
+
+def _get_member_path(directory, name):
+    """Get the path to extract a member of the bundle to, refusing the ones outside of the directory."""
+    normalized_name = os.path.normpath(name)
+    if os.path.isabs(normalized_name) or normalized_name.split(os.sep)[0] == os.pardir:
+        raise BundleError("The bundle contains the file {} outside of the bundle.".format(name))
+
+    return os.path.join(directory, normalized_name)
+
+
+def extract_bundle(path, directory):
+    """Extract a conversion bundle, verifying the checksums of its content.
+
+    :param path: Path to the bundle.
+    :type path: str
+    :param directory: Where to extract the bundle to. Its previous content is
+        removed.
+    :type directory: str
+    :raises BundleError: When the bundle cannot be read or its content does
+        not match the manifest.
+    :return: The manifest of the bundle.
+    :rtype: dict
+    """
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    files.mkdir_p(directory)
+
+    manifest = None
+    extracted = set()
+    try:
+        with tarfile.open(path, "r:") as archive:
+            for member in archive:
+                if manifest is None:
+                    manifest = _read_manifest(archive, member)
+                    continue
+
+                if member.isdir():
+                    continue
+                if not member.isfile() or member.name not in manifest["files"]:
+                    raise BundleError("The file {} is not listed in the manifest.".format(member.name))
+
+                target = _get_member_path(directory, member.name)
+                files.mkdir_p(os.path.dirname(target))
+                with open(target, "wb") as extracted_file:
+                    shutil.copyfileobj(archive.extractfile(member), extracted_file)
+                with open(target, "rb") as extracted_file:
+                    if _get_checksum(extracted_file) != manifest["files"][member.name]:
+                        raise BundleError("The checksum of {} does not match the manifest.".format(member.name))
+                extracted.add(member.name)
+    except (EnvironmentError, tarfile.TarError, ValueError, KeyError) as err:
+        # ValueError for a manifest that is not a valid JSON
+        raise BundleError("Unable to read the conversion bundle {}: {}".format(path, err))
+    except BundleError as err:
+        raise BundleError("Invalid conversion bundle {}: {}".format(path, err))
+
+    if manifest is None:
+        raise BundleError("The conversion bundle {} is empty.".format(path))
+
+    missing = sorted(set(manifest["files"]) - extracted)
+    if missing:
+        raise BundleError("The conversion bundle {} is missing the files: {}".format(path, ", ".join(missing)))
+
+    return manifest
+
+
+def _write_repofile(manifest, directory):
+    """Write the repofile with the repositories of an extracted bundle."""
+    gpg_keys = sorted(
+        "file://" + os.path.join(directory, name)
+        for name in manifest["files"]
+        if name.startswith(_GPG_KEYS_DIR + os.sep)
+    )
+
+    repos = []
+    for repoid in manifest["repos"]:
+        repos.append(
+            "[{repoid}]\n"
+            "name={repoid} from the conversion bundle\n"
+            "baseurl=file://{baseurl}\n"
+            "enabled=0\n"
+            "gpgcheck=1\n"
+            "gpgkey={gpgkey}\n".format(
+                repoid=repoid, baseurl=os.path.join(directory, _REPOS_DIR, repoid), gpgkey=" ".join(gpg_keys)
+            )
+        )
+
+    with open(BUNDLE_REPOFILE, "w") as repofile:
+        repofile.write("\n".join(repos))
+
+
+def use_bundle(path):
+    """Serve the content of a conversion bundle as local repositories.
+
+    The bundle is extracted to :data:`BUNDLE_DIR` and its repositories are
+    written to :data:`BUNDLE_REPOFILE`, which is removed on rollback.
+
+    :param path: Path to the bundle.
+    :type path: str
+    :raises BundleError: When the bundle cannot be used on this system.
+    :return: IDs of the repositories in the bundle.
+    :rtype: list[str]
+    """
+    logger.info("Extracting the conversion bundle {} to {}.".format(path, BUNDLE_DIR))
+    manifest = extract_bundle(path, BUNDLE_DIR)
+
+    bundle_system = manifest["system"]
+    if bundle_system != _get_system():
+        raise BundleError(
+            "The conversion bundle {} was created for {} {} {}, it cannot be used on this system.".format(
+                path, bundle_system["id"], bundle_system["version"], bundle_system["arch"]
+            )
+        )
+
+    _write_repofile(manifest, BUNDLE_DIR)
+    backup.backup_control.push(InstalledFile(BUNDLE_REPOFILE))
+    logger.info(
+        "Using the {} repositories from the conversion bundle created by convert2rhel {}.".format(
+            ", ".join(manifest["repos"]), manifest["convert2rhel_version"]
+        )
+    )
+
+    return manifest["repos"]
+
+
+def remove_repofile():
+    """Remove the repofile with the repositories of the extracted bundle.
+
+    The extracted bundle is removed together with the temporary folder after
+    the conversion so the repositories would not be usable anymore.
+
+    :raises OSError: When the removal of the repofile fails.
+    """
+    try:
+        os.remove(BUNDLE_REPOFILE)
+    except OSError as err:
+        # Nothing to do when the bundle was not used
+        if err.errno != errno.ENOENT:
+            raise
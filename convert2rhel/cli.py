@@ -40,6 +40,9 @@ ARGS_WITH_VALUES = [
     "--org",
     "--pool",
     "--serverurl",
+    "-j",
+    "--jobs",
+    "--bundle",
 ]
 PARENT_ARGS = ["--debug", "--help", "-h", "--version"]
 
@@ -74,10 +77,11 @@ class CLI:
             "  convert2rhel {subcommand} [--no-rhsm] [--disablerepo repoid] [--enablerepo repoid] [--no-rpm-va] [--eus] [--els] [--debug] [--restart] [-y]\n"
             "  convert2rhel {subcommand} [-k activation_key | -c conf_file_path] [-o organization] [--pool pool_id | -a] [--disablerepo repoid] [--enablerepo"
             " repoid] [--serverurl url] [--no-rpm-va] [--eus] [--els] [--debug] [--restart] [-y]\n"
+            "  convert2rhel {subcommand} [--bundle path] [--no-rpm-va] [--eus] [--els] [--debug] [--restart] [-y]\n"
         ).format(subcommand=subcommand_to_print)
 
         if subcommand_not_used_on_cli:
-            usage = usage + "\n  Subcommands: analyze, convert"
+            usage = usage + "\n  Subcommands: analyze, convert, bundle"
         return usage
 
     def _get_argparser(self):
@@ -101,6 +105,29 @@ class CLI:
             parents=[self._shared_options_parser],
             usage=self.usage(subcommand_to_print="convert"),
         )
+        bundle_parser = subparsers.add_parser(
+            "bundle",
+            help="Manage conversion bundles, archives with everything needed to convert systems identical to this one"
+            " without access to the RHEL repositories. See the --bundle option.",
+            usage=self.usage(subcommand_to_print="bundle create PATH"),
+        )
+        bundle_subparsers = bundle_parser.add_subparsers(
+            title="Bundle subcommands", dest="bundle_command", metavar="{create}"
+        )
+        bundle_subparsers.required = True
+        self._bundle_create_parser = bundle_subparsers.add_parser(
+            "create",
+            help="Run the analysis and, if the system can be converted, save the RHEL repository metadata, the RHEL"
+            " packages the conversion installs and the Red Hat GPG keys to a conversion bundle. A rollback is"
+            " initiated afterwards to put the system back in the original state.",
+            parents=[self._shared_options_parser],
+            usage=self.usage(subcommand_to_print="bundle create PATH"),
+        )
+        self._bundle_create_parser.add_argument(
+            "bundle_output",
+            metavar="PATH",
+            help="Where to save the conversion bundle to.",
+        )
 
     @staticmethod
     def _register_parent_options(parser):
@@ -179,6 +206,15 @@ class CLI:
             dest="auto_accept",
             action="store_true",
         )
+        self._shared_options_parser.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            type=int,
+            default=1,
+            help="Run up to N of the independent system checks concurrently. Checks that depend on each other are"
+            " still run in order. The default is 1, which runs all checks one after another.",
+        )
         self._add_subscription_manager_options()
         self._add_alternative_installation_options()
         self._register_commands()
@@ -196,6 +232,13 @@ class CLI:
             " options. Without this option, the subscription-manager is used to access RHEL repositories by default."
             " Using this option requires to have the --enablerepo specified.",
         )
+        group.add_argument(
+            "--bundle",
+            metavar="PATH",
+            help="Use the RHEL repository metadata and packages from a conversion bundle created by"
+            " 'convert2rhel bundle create' on an identical system instead of downloading them. The subscription-manager"
+            " is not used and the repositories of the bundle are enabled in place of the --enablerepo repositories.",
+        )
 
     def _add_subscription_manager_options(self):
         """Prescribe what subscription manager command line options the tool accepts."""
@@ -312,7 +355,7 @@ def _add_default_command(argv):
 def _subcommand_used(args):
     """Return what subcommand has been used by the user. Return None if no subcommand has been used."""
     for index, argument in enumerate(args):
-        if argument in ("convert", "analyze"):
+        if argument in ("convert", "analyze", "bundle"):
             return argument
 
         if argument not in PARENT_ARGS and args[index - 1] in ARGS_WITH_VALUES:
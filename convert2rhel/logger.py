@@ -21,6 +21,7 @@ import logging
 import os
 import shutil
 import sys
+import threading
 
 from logging.handlers import BufferingHandler
 from time import gmtime, strftime
@@ -261,6 +262,12 @@ class CustomFormatter(logging.Formatter):
 
     color_disabled = False
 
+    def __init__(self, *args, **kwargs):
+        super(CustomFormatter, self).__init__(*args, **kwargs)
+        # format() swaps the format string on the instance for every record so
+        # records logged from concurrently running Actions must not interleave.
+        self._format_lock = threading.RLock()
+
     def disable_colors(self, value):
         self.color_disabled = value
 
@@ -271,6 +278,10 @@ class CustomFormatter(logging.Formatter):
         provided when we use logging.warning() etc.
         :return str: The formatted log message
         """
+        with self._format_lock:
+            return self._format(record)
+
+    def _format(self, record):
         fmt_orig = "[%(asctime)s] %(levelname)s - %(message)s"  # DEBUG default
         self.datefmt = "%Y-%m-%dT%H:%M:%S%z"  # DEBUG default
 
@@ -20,10 +20,11 @@ __metaclass__ = type
 
 import os
 
-from convert2rhel import actions, applock, backup, breadcrumbs, cli, exceptions
+from convert2rhel import actions, applock, backup, breadcrumbs, bundle, cli, exceptions
 from convert2rhel import logger as logger_module
 from convert2rhel import pkghandler, pkgmanager, subscription, systeminfo, utils
 from convert2rhel.actions import level_for_raw_action_data, report
+from convert2rhel.pkgmanager import prefetch
 from convert2rhel.phase import ConversionPhase, ConversionPhases  # noqa: F401 ignoring due to type comments
 from convert2rhel.toolopts import tool_opts
 
@@ -122,6 +123,10 @@ def main_locked():
 
     pre_conversion_results = None
     post_conversion_results = None
+    # The json reports are written as the Actions finish so that a killed
+    # convert2rhel still leaves the results gathered until then
+    pre_conversion_json_report = report.JsonReportWriter(report.CONVERT2RHEL_PRE_CONVERSION_JSON_RESULTS)
+    post_conversion_json_report = report.JsonReportWriter(report.CONVERT2RHEL_POST_CONVERSION_JSON_RESULTS)
     ConversionPhases.set_current(ConversionPhases.POST_CLI)
 
     # since we now have root, we can add the FileLogging
@@ -140,7 +145,9 @@ def main_locked():
         # actions.run_pre_actions() (either from a bug or from the user hitting
         # Ctrl-C)
         ConversionPhases.set_current(ConversionPhases.PRE_PONR_CHANGES)
-        pre_conversion_results = actions.run_pre_actions()
+        pre_conversion_results = actions.run_pre_actions(
+            on_action_finished=pre_conversion_json_report.add_finished_action
+        )
 
         if tool_opts.activity == "analysis":
             ConversionPhases.set_current(ConversionPhases.ANALYZE_EXIT)
@@ -165,8 +172,14 @@ def main_locked():
         loggerinst.warning("********************************************************")
         utils.ask_to_continue()
 
+        # The conversion changes the system the child process worker was
+        # started on. Start a new one for the conversion.
+        utils.child_process_worker.stop()
+
         ConversionPhases.set_current(ConversionPhases.POST_PONR_CHANGES)
-        post_conversion_results = actions.run_post_actions()
+        post_conversion_results = actions.run_post_actions(
+            on_action_finished=post_conversion_json_report.add_finished_action
+        )
 
         _raise_for_skipped_failures(post_conversion_results)
         report.post_conversion_report(
@@ -186,6 +199,9 @@ def main_locked():
         if not subscription.should_subscribe():
             subscription.update_rhsm_custom_facts()
 
+        # The bundle is created from the validated transaction, which needs the RHEL repositories enabled
+        bundle_created = create_bundle(pre_conversion_results) if tool_opts.bundle_output else True
+
         rollback_changes()
         provide_status_after_rollback(pre_conversion_results, include_all_reports=True)
 
@@ -195,6 +211,9 @@ def main_locked():
         if _get_failed_actions(pre_conversion_results):
             return ConversionExitCodes.INHIBITORS_FOUND
 
+        if not bundle_created:
+            return ConversionExitCodes.FAILURE
+
         return ConversionExitCodes.SUCCESSFUL
     except _InhibitorsFound as err:
         loggerinst.critical_no_exit(str(err))
@@ -210,6 +229,9 @@ def main_locked():
         results = _pick_conversion_results(pre_conversion_results, post_conversion_results)
         return _handle_main_exceptions(current_phase=ConversionPhases.current_phase, results=results)
     finally:
+        pre_conversion_json_report.close()
+        post_conversion_json_report.close()
+
         if not backup.backup_control.rollback_failed:
             # Write the assessment to a file as json data so that other tools can
             # parse and act upon it.
@@ -227,11 +249,27 @@ def main_locked():
                 json_report, txt_report = _REPORT_MAPPING[execution_phase.name]
 
                 report.summary_as_json(results, json_report)
-                report.summary_as_txt(results, txt_report)
+                report.summary_as_txt(results, txt_report, slowest_actions=report.SLOWEST_ACTIONS_IN_TXT_REPORT)
+
+                # The full report replaces the partial ones
+                pre_conversion_json_report.discard()
+                post_conversion_json_report.discard()
+
+        _write_command_trace()
+        prefetch.package_prefetch.cancel()
+        utils.child_process_worker.stop()
 
     return ConversionExitCodes.SUCCESSFUL
 
 
+def _write_command_trace():
+    """Write the trace of the external commands run by convert2rhel to the log directory."""
+    try:
+        utils.trace.command_trace.write(logger_module.LOG_DIR)
+    except (IOError, OSError) as err:
+        loggerinst.warning("Unable to write the trace of the executed commands: {}".format(err))
+
+
 def _get_failed_actions(results):
     return actions.find_actions_of_severity(results, "SKIP", level_for_raw_action_data)
 
@@ -389,6 +427,39 @@ def prepare_system():
     loggerinst.task("Clean yum cache metadata")
     pkgmanager.clean_yum_metadata()
 
+    if tool_opts.bundle:
+        loggerinst.task("Use the conversion bundle")
+        try:
+            repoids = bundle.use_bundle(tool_opts.bundle)
+        except bundle.BundleError as err:
+            loggerinst.critical(str(err))
+        tool_opts.update_opts("enablerepo", repoids)
+
+
+def create_bundle(pre_conversion_results):
+    """Create the conversion bundle requested by the bundle create subcommand.
+
+    :param pre_conversion_results: Results of the analysis of the system.
+    :type pre_conversion_results: dict
+    :return: Whether the bundle was created.
+    :rtype: bool
+    """
+    loggerinst.task("Create the conversion bundle")
+    if _get_failed_actions(pre_conversion_results):
+        loggerinst.warning(
+            "The conversion bundle was not created as the analysis found problems preventing the conversion."
+            " Resolve them and create the bundle again."
+        )
+        return False
+
+    try:
+        bundle.create_bundle(tool_opts.bundle_output)
+    except bundle.BundleError as err:
+        loggerinst.critical_no_exit(str(err))
+        return False
+
+    return True
+
 
 #
 # Cleanup and exit
@@ -401,6 +472,10 @@ def rollback_changes():
     loggerinst.warning("Abnormal exit! Performing rollback ...")
     ConversionPhases.set_current(ConversionPhases.ROLLBACK)
 
+    # The packages are not needed anymore and the rollback removes the
+    # repositories they are downloaded from.
+    prefetch.package_prefetch.cancel()
+
     try:
         backup.backup_control.pop_all()
     except IndexError as e:
@@ -18,15 +18,21 @@
 __metaclass__ = type
 
 
+import contextlib
+import fnmatch
+import hashlib
+import multiprocessing
 import os
 import os.path
 import re
+import threading
 
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from functools import cmp_to_key
 
 import rpm
 
-from convert2rhel import backup, pkgmanager, repo, utils
+from convert2rhel import backup, pkgmanager, repo, repometa, utils
 from convert2rhel.backup.certs import RestorableRpmKey
 from convert2rhel.backup.files import RestorableFile
 from convert2rhel.logger import root_logger
@@ -67,6 +73,27 @@ PKG_RELEASE = PKG_VERSION
 # Set of valid arches
 PKG_ARCH = ("x86_64", "s390x", "i686", "i86", "ppc64le", "aarch64", "noarch")
 
+# Maximum number of parsed package strings kept by parse_pkg_string()
+PARSED_PKGS_CACHE_SIZE = 100000
+
+# Package strings parsed by parse_pkg_string(), from the least to the most recently used
+_parsed_pkgs = OrderedDict()
+_parsed_pkgs_lock = threading.Lock()
+
+# Sort key comparing (epoch, version, release) tuples the way rpm does
+_EVR_KEY = cmp_to_key(rpm.labelCompare)
+
+# Query format used to gather the information stored in PackageInformation
+# from the rpmdb. Each formatted header is parsed by
+# _parse_installed_pkg_information().
+_INSTALLED_PKG_QUERY_FORMAT = (
+    "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n"
+)
+
+# Directory holding the rpmdb. Changes to the files in it tell us that the
+# installed packages have changed.
+RPMDB_PATH = "/var/lib/rpm"
+
 # Namedtuple to represent a package NEVRA.
 PackageNevra = namedtuple(
     "PackageNevra",
@@ -128,24 +155,27 @@ def get_installed_pkg_information(pkg_name="*"):
     Get information about a package, such as signature from the RPM database,
     packager, vendor, NEVRA and key_id.
 
+    The information is served from :data:`installed_package_index` so the
+    rpmdb is only read again once it has changed.
+
     :param pkg_name: Full name of a package to check their signature.  If not given, information about all installed packages is returned.
     :type pkg_obj: str
     :return: Return a list of PackageInformation objects holding information about matching packages.
     :rtype: list[PackageInformation]
     """
-    cmd = [
-        "rpm",
-        "--qf",
-        "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-    ]
-
-    if "*" in pkg_name:
-        cmd.extend(["-qa", pkg_name])
-    else:
-        cmd.extend(["-q", pkg_name])
+    return installed_package_index.query(pkg_name)
+
 
-    output, _ = utils.run_subprocess(cmd, print_cmd=False, print_output=False)
+def _parse_installed_pkg_information(output):
+    """
+    Parse the rpmdb output formatted with :data:`_INSTALLED_PKG_QUERY_FORMAT`.
 
+    :param output: Formatted rpm headers, one package per line.
+    :type output: str
+    :return: Return a list of PackageInformation objects, one for each package
+        that could be parsed.
+    :rtype: list[PackageInformation]
+    """
     # Filter out the empty values, u''
     split_output = [value for value in output.split("\n") if value]
 
@@ -180,6 +210,438 @@ def get_installed_pkg_information(pkg_name="*"):
     return normalized_list
 
 
+def _read_rpmdb():
+    """
+    Read the headers of all installed packages from the rpmdb.
+
+    .. important::
+        rpm installs its own signal handlers once the rpmdb is opened so
+        outside of a child process this function needs to be called through
+        :func:`convert2rhel.utils.run_as_child_process`.
+
+    :return: List of 2-tuples with the rpmdb instance number of each package
+        header and the header formatted with :data:`_INSTALLED_PKG_QUERY_FORMAT`.
+    :rtype: list[tuple[int, str]]
+    """
+    ts = rpm.TransactionSet()
+    match_iterator = ts.dbMatch()
+
+    headers = []
+    for header in match_iterator:
+        formatted_header = header.sprintf(_INSTALLED_PKG_QUERY_FORMAT)
+        if isinstance(formatted_header, bytes):
+            formatted_header = formatted_header.decode("utf-8")
+        headers.append((match_iterator.instance(), formatted_header))
+
+    return headers
+
+
+# Registered when imported, registering it when the index is first built
+# would restart the child process worker, maybe while the checks run in
+# threads.
+utils.child_process_worker.register(_read_rpmdb)
+
+
+def get_rpmdb_fingerprint(rpmdb_path=RPMDB_PATH):
+    """
+    Compute a value that changes whenever the rpmdb is written to.
+
+    :param rpmdb_path: Directory of the rpmdb.
+    :type rpmdb_path: str
+    :return: The name, inode, size and modification time of each file in
+        the rpmdb directory or None if the directory cannot be read.
+    :rtype: tuple | None
+    """
+    fingerprint = []
+    try:
+        filenames = sorted(os.listdir(rpmdb_path))
+    except OSError:
+        return None
+
+    for filename in filenames:
+        try:
+            stat = os.stat(os.path.join(rpmdb_path, filename))
+        except OSError:
+            # The file was removed in the meantime (e.g. a lock file)
+            continue
+        fingerprint.append((filename, stat.st_ino, stat.st_size, stat.st_mtime))
+
+    return tuple(fingerprint)
+
+
+class InstalledPackageIndex:
+    """
+    In-process index of the packages installed on the system.
+
+    The rpmdb is read once through the rpm Python bindings and the packages
+    are indexed by name, by ``name.arch`` and by the id of the key they are
+    signed with.  Every query first checks whether the files of the rpmdb
+    changed since the index was built and rebuilds it if they did, so
+    packages installed or removed during the conversion are picked up
+    automatically.
+    """
+
+    def __init__(self, rpmdb_path=RPMDB_PATH):
+        self._rpmdb_path = rpmdb_path
+        self._lock = threading.RLock()
+        self._fingerprint = None
+        self._packages = []  # type: list[PackageInformation]
+        self._instances = {}  # type: dict[PackageInformation, int]
+        self._by_name = {}  # type: dict[str, list[PackageInformation]]
+        self._by_name_arch = {}  # type: dict[str, list[PackageInformation]]
+        self._by_key_id = {}  # type: dict[str, list[PackageInformation]]
+        self._by_label = {}  # type: dict[str, list[PackageInformation]]
+        self._header_instances = []  # type: list[int]
+
+    def _rpmdb_fingerprint(self):
+        return get_rpmdb_fingerprint(self._rpmdb_path)
+
+    def invalidate(self):
+        """Drop the index so that the next query reads the rpmdb again."""
+        with self._lock:
+            self._fingerprint = None
+            self._packages = []
+
+    def _refresh(self):
+        """Rebuild the index if the rpmdb changed since it was last read."""
+        with self._lock:
+            fingerprint = self._rpmdb_fingerprint()
+            if fingerprint is not None and fingerprint == self._fingerprint:
+                return
+
+            # A daemonic child process is not allowed to spawn children of its
+            # own so read the rpmdb directly when we are already in one.
+            if multiprocessing.current_process().daemon:
+                headers = _read_rpmdb()
+            else:
+                headers = utils.run_as_child_process(_read_rpmdb)()
+
+            self._build(headers or [])
+            self._fingerprint = fingerprint
+
+    def _build(self, headers):
+        """
+        Populate the index from the formatted rpmdb headers.
+
+        :param headers: Output of :func:`_read_rpmdb`.
+        :type headers: list[tuple[int, str]]
+        """
+        self._packages = []
+        self._instances = {}
+        self._by_name = {}
+        self._by_name_arch = {}
+        self._by_key_id = {}
+        self._by_label = {}
+        self._header_instances = []
+
+        for instance, formatted_header in headers:
+            self._header_instances.append(instance)
+            for pkg in _parse_installed_pkg_information(formatted_header):
+                self._packages.append(pkg)
+                self._instances[pkg] = instance
+                self._by_name.setdefault(pkg.nevra.name, []).append(pkg)
+                if pkg.nevra.arch:
+                    self._by_name_arch.setdefault("{}.{}".format(pkg.nevra.name, pkg.nevra.arch), []).append(pkg)
+                self._by_key_id.setdefault(pkg.key_id, []).append(pkg)
+                for label in _get_pkg_labels(pkg.nevra):
+                    self._by_label.setdefault(label, []).append(pkg)
+
+        logger.debug("Indexed {} installed packages.".format(len(self._packages)))
+
+    @property
+    def packages(self):
+        """All installed packages in the rpmdb order."""
+        self._refresh()
+        return list(self._packages)
+
+    @property
+    def instances(self):
+        """The rpmdb instance numbers of all installed packages in the rpmdb order."""
+        self._refresh()
+        return list(self._header_instances)
+
+    def get_by_name(self, name):
+        """
+        :param name: Name of the package, e.g. ``kernel``.
+        :type name: str
+        :rtype: list[PackageInformation]
+        """
+        self._refresh()
+        return list(self._by_name.get(name, []))
+
+    def get_by_name_arch(self, name_arch):
+        """
+        :param name_arch: Name and arch of the package, e.g. ``json-c.i686``.
+        :type name_arch: str
+        :rtype: list[PackageInformation]
+        """
+        self._refresh()
+        return list(self._by_name_arch.get(name_arch, []))
+
+    def get_by_key_id(self, key_id):
+        """
+        :param key_id: Id of the GPG key the packages are signed with.
+        :type key_id: str | None
+        :rtype: list[PackageInformation]
+        """
+        self._refresh()
+        return list(self._by_key_id.get(key_id, []))
+
+    def query(self, pattern="*"):
+        """
+        Find installed packages the same way ``rpm -q`` and ``rpm -qa`` do.
+
+        :param pattern: Either a shell-style glob matched against the package
+            names (like ``rpm -qa PATTERN``) or a package label (name,
+            name.arch, NVR, NVRA, NEVR or NEVRA) as accepted by ``rpm -q``.
+        :type pattern: str
+        :return: Matching packages in the rpmdb order.
+        :rtype: list[PackageInformation]
+        """
+        self._refresh()
+
+        if "*" in pattern or "?" in pattern or "[" in pattern:
+            if pattern == "*":
+                return list(self._packages)
+
+            return [
+                pkg
+                for pkg in self._packages
+                if fnmatch.fnmatchcase(pkg.nevra.name, pattern)
+                or any(fnmatch.fnmatchcase(label, pattern) for label in _get_pkg_labels(pkg.nevra))
+            ]
+
+        return list(self._by_label.get(pattern, []))
+
+    def is_installed(self, pattern):
+        """
+        :param pattern: A package label or a glob as accepted by :meth:`query`.
+        :type pattern: str
+        :return: Whether at least one installed package matches the pattern.
+        :rtype: bool
+        """
+        return bool(self.query(pattern))
+
+    def get_header(self, pkg):
+        """
+        Get the rpm header of an indexed package.
+
+        .. warning::
+            Opening the rpmdb installs the rpm signal handlers in the calling
+            process. Call this from a child process.
+
+        :param pkg: Package returned by this index.
+        :type pkg: PackageInformation
+        :return: The rpm header of the package or None if the package is not
+            installed anymore.
+        :rtype: rpm.hdr | None
+        """
+        self._refresh()
+        instance = self._instances.get(pkg)
+        if instance is None:
+            return None
+
+        ts = rpm.TransactionSet()
+        for header in ts.dbMatch(rpm.RPMDBI_PACKAGES, instance):
+            return header
+
+        return None
+
+
+def _get_pkg_labels(nevra):
+    """
+    Get the labels through which ``rpm -q`` can address an installed package.
+
+    :param nevra: The NEVRA of the package.
+    :type nevra: PackageNevra
+    :rtype: set[str]
+    """
+    labels = set([nevra.name])
+    labels.add("{}-{}".format(nevra.name, nevra.version))
+
+    nvr = "{}-{}-{}".format(nevra.name, nevra.version, nevra.release)
+    nevr = "{}-{}:{}-{}".format(nevra.name, nevra.epoch or "0", nevra.version, nevra.release)
+    labels.update((nvr, nevr))
+    if nevra.arch:
+        labels.add("{}.{}".format(nevra.name, nevra.arch))
+        labels.add("{}.{}".format(nvr, nevra.arch))
+        labels.add("{}.{}".format(nevr, nevra.arch))
+
+    return labels
+
+
+#: Index of the installed packages shared by the whole run.
+installed_package_index = InstalledPackageIndex()
+
+
+def get_installed_packages_checksum():
+    """
+    Compute a checksum of the set of installed packages.
+
+    Unlike :func:`get_rpmdb_fingerprint`, it changes only when packages are
+    installed or removed, not whenever the files of the rpmdb are written to,
+    which rpm does even when it only reads the rpmdb.
+
+    :return: SHA-256 of the sorted NEVRAs of the installed packages or None if
+        no installed package could be read.
+    :rtype: str | None
+    """
+    nevras = sorted(
+        "{}-{}:{}-{}.{}".format(
+            pkg.nevra.name, pkg.nevra.epoch or "0", pkg.nevra.version, pkg.nevra.release, pkg.nevra.arch
+        )
+        for pkg in installed_package_index.packages
+    )
+    if not nevras:
+        return None
+
+    return hashlib.sha256("\n".join(nevras).encode("utf-8")).hexdigest()
+
+
+class SackSession:
+    """A yum/dnf base with its package sack loaded, shared through :class:`SackSessionManager`."""
+
+    def __init__(self, base, fingerprint):
+        self.base = base
+        self.fingerprint = fingerprint
+        # yum and dnf are not thread safe, serialize the use of the base
+        self.lock = threading.RLock()
+        self.refcount = 0
+        self.stale = False
+
+    def close(self):
+        self.base.close()
+
+
+class SackSessionManager:
+    """
+    Share the yum/dnf bases and their loaded package sacks across the run.
+
+    Creating a base, reading the repositories and loading the package sack
+    takes seconds on large systems. The manager does it once per
+    configuration and hands the base out to the queries of the packages.
+    Like with :class:`InstalledPackageIndex`, a session is not reused once
+    the rpmdb changed so packages installed or removed during the conversion
+    are picked up. A session still in use when it becomes stale is closed
+    once the last user releases it.
+    """
+
+    def __init__(self, rpmdb_path=RPMDB_PATH):
+        self._rpmdb_path = rpmdb_path
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    @contextlib.contextmanager
+    def session(self, load_available_repos=True, disable_repos=None, releasever=None):
+        """
+        Use the shared base for a configuration.
+
+        .. important::
+            The base is shared with the other queries. Do not change its
+            configuration and reset its goal when done with it.
+
+        :param load_available_repos: Whether to load the packages of the
+            enabled repositories or only the installed packages.
+        :type load_available_repos: bool
+        :param disable_repos: Patterns of repository IDs to disable.
+        :type disable_repos: list[str] | None
+        :param releasever: Value of the $releasever variable in the repofiles.
+            By default, it is determined by the package manager.
+        :type releasever: str | None
+        :return: The yum.YumBase or dnf.Base of the session.
+        :rtype: Iterator[yum.YumBase | dnf.Base]
+        """
+        key = (load_available_repos, tuple(sorted(disable_repos or ())), releasever)
+        session = self._acquire(key)
+        try:
+            with session.lock:
+                yield session.base
+        finally:
+            self._release(session)
+
+    def invalidate(self):
+        """Drop all the sessions so that the next queries load the package sacks again."""
+        with self._lock:
+            for session in self._sessions.values():
+                self._drop(session)
+            self._sessions = {}
+
+    def _acquire(self, key):
+        fingerprint = get_rpmdb_fingerprint(self._rpmdb_path)
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is not None and (fingerprint is None or fingerprint != session.fingerprint):
+                self._drop(session)
+                session = None
+
+            if session is None:
+                session = SackSession(_create_base(*key), fingerprint)
+
+            self._sessions[key] = session
+            session.refcount += 1
+            return session
+
+    def _release(self, session):
+        with self._lock:
+            session.refcount -= 1
+            if session.stale and session.refcount == 0:
+                session.close()
+
+    def _drop(self, session):
+        session.stale = True
+        if session.refcount == 0:
+            session.close()
+
+
+def _create_base(load_available_repos, disable_repos, releasever):
+    """
+    Create a yum/dnf base for a :class:`SackSession`.
+
+    See :meth:`SackSessionManager.session` for the parameters.
+    """
+    if pkgmanager.TYPE == "yum":
+        base = pkgmanager.YumBase()
+        if not load_available_repos:
+            # Disable plugins (when kept enabled yum outputs useless text every call)
+            base.disablePlugins()
+        if releasever:
+            base.conf.yumvar["releasever"] = releasever
+
+        for repo_to_disable in disable_repos:
+            base.repos.disableRepo(repo_to_disable)
+
+        # yum loads the package sacks the first time they are used
+        return base
+
+    base = pkgmanager.Base()
+    if releasever:
+        base.conf.substitutions["releasever"] = releasever
+
+    if not load_available_repos:
+        base.conf.module_platform_id = "platform:el" + str(system_info.version.major)
+        base.fill_sack(load_system_repo=True, load_available_repos=False)
+        return base
+
+    # Set DNF to read from the proper config files, at this moment, DNF can't
+    # automatically read and load the config files so we have to specify it to
+    # him. We set the PRIO_MAINCONFIG as the base config file to be read. We
+    # also set the folder /etc/dnf/vars as the main point for vars replacement
+    # in repo files. See this bugzilla comment:
+    # https://bugzilla.redhat.com/show_bug.cgi?id=1920735#c2
+    base.conf.read(priority=pkgmanager.conf.PRIO_MAINCONFIG)
+    base.conf.substitutions.update_from_etc(installroot=base.conf.installroot)
+    base.read_all_repos()
+
+    for repo_to_disable in disable_repos:
+        base.repos.get_matching(repo_to_disable).disable()
+
+    base.fill_sack()
+    return base
+
+
+sack_sessions = SackSessionManager()
+
+
 def get_rpm_header(pkg_obj):
     """The dnf python API does not provide the package rpm header:
       https://bugzilla.redhat.com/show_bug.cgi?id=1876606.
@@ -210,60 +672,52 @@ def get_installed_pkg_objects(name=None, version=None, release=None, arch=None):
 
 
 def _get_installed_pkg_objects_yum(name=None, version=None, release=None, arch=None):
-    yum_base = pkgmanager.YumBase()
-    # Disable plugins (when kept enabled yum outputs useless text every call)
-    yum_base.disablePlugins()
-
-    if name:
-        pattern = name
-        if version:
-            pattern += "-{}".format(version)
+    with sack_sessions.session(load_available_repos=False) as yum_base:
+        if name:
+            pattern = name
+            if version:
+                pattern += "-{}".format(version)
 
-        if release:
-            pattern += "-{}".format(release)
+            if release:
+                pattern += "-{}".format(release)
 
-        if arch:
-            pattern += ".{}".format(arch)
+            if arch:
+                pattern += ".{}".format(arch)
 
-        return yum_base.rpmdb.returnPackages(patterns=[pattern])
+            return yum_base.rpmdb.returnPackages(patterns=[pattern])
 
-    installed_packages = yum_base.rpmdb.returnPackages()
-    yum_base.close()
-    del yum_base
-    return installed_packages
+        return yum_base.rpmdb.returnPackages()
 
 
 def _get_installed_pkg_objects_dnf(name=None, version=None, release=None, arch=None):
-    dnf_base = pkgmanager.Base()
-    dnf_base.conf.module_platform_id = "platform:el" + str(system_info.version.major)
-    dnf_base.fill_sack(load_system_repo=True, load_available_repos=False)
-    query = dnf_base.sack.query()
-    installed = query.installed()
+    with sack_sessions.session(load_available_repos=False) as dnf_base:
+        query = dnf_base.sack.query()
+        installed = query.installed()
 
-    if name:
-        # Appending the kwargs here dynamically based if they exist or not
-        # because the query filter cannot handle properly the situation where
-        # any of those parameters are "empty". Basically, dnf thinks that if you
-        # specified an empty string in any of those parameters, then it should
-        # "match" exactly that, and then to avoid extra logic to play with
-        # `__glob`, `__neq` and so on, it's easier to build the `kwargs`
-        # dinamycally.
-        kwargs = {}
+        if name:
+            # Appending the kwargs here dynamically based if they exist or not
+            # because the query filter cannot handle properly the situation where
+            # any of those parameters are "empty". Basically, dnf thinks that if you
+            # specified an empty string in any of those parameters, then it should
+            # "match" exactly that, and then to avoid extra logic to play with
+            # `__glob`, `__neq` and so on, it's easier to build the `kwargs`
+            # dinamycally.
+            kwargs = {}
 
-        if version:
-            kwargs.update({"version__glob": version})
+            if version:
+                kwargs.update({"version__glob": version})
 
-        if release:
-            kwargs.update({"release__glob": release})
+            if release:
+                kwargs.update({"release__glob": release})
 
-        if arch:
-            kwargs.update({"arch__glob": arch})
+            if arch:
+                kwargs.update({"arch__glob": arch})
 
-        # name provides "shell-style wildcard match" per
-        # https://dnf.readthedocs.io/en/latest/api_queries.html#dnf.query.Query.filter
-        installed = installed.filter(name__glob=name, **kwargs)
+            # name provides "shell-style wildcard match" per
+            # https://dnf.readthedocs.io/en/latest/api_queries.html#dnf.query.Query.filter
+            installed = installed.filter(name__glob=name, **kwargs)
 
-    return list(installed)
+        return list(installed)
 
 
 def get_third_party_pkgs():
@@ -295,11 +749,16 @@ def get_installed_pkgs_w_different_key_id(key_ids, name="*"):
 @utils.run_as_child_process
 def get_files_owned_by_package(installed_pkg_name):
     """Get a list of files that are owned by an installed package."""
-    output, ret_code = utils.run_subprocess(["/usr/bin/rpm", "-ql", installed_pkg_name])
+    # Collect the lines as rpm prints them instead of keeping the whole output and splitting it afterwards. Packages
+    # like kernel-firmware own tens of thousands of files.
+    lines = []
+    _, ret_code = utils.run_subprocess(
+        ["/usr/bin/rpm", "-ql", installed_pkg_name], callback=lines.append, keep_output=False
+    )
     if ret_code != 0:
-        logger.warning("Failed to list files for package {0}: {1}".format(installed_pkg_name, output))
+        logger.warning("Failed to list files for package {0}: {1}".format(installed_pkg_name, "".join(lines)))
         return []
-    return output.decode("utf-8").splitlines() if isinstance(output, bytes) else output.splitlines()
+    return [line.rstrip("\n") for line in lines]
 
 
 @utils.run_as_child_process
@@ -390,8 +849,11 @@ def print_pkg_info(pkgs, disable_repos=None):
 def _get_package_repositories(pkgs, disable_repos=None):
     """Retrieve repository information from packages.
 
-    :param pkgs: List of packages to get their associated repositories
-    :type pkgs: list[PackageInformation]
+    A package is mapped to the first enabled repository offering the same
+    NEVRA. Packages not available in any repository are left out.
+
+    :param pkgs: List of package NEVRAs to get their associated repositories
+    :type pkgs: list[str]
     :param disable_repos: List of repo IDs to be disabled when retrieving repository information from packages.
     :type disable_repos: List[str]
     :return: Mapping of packages with their repositories names
@@ -399,47 +861,34 @@ def _get_package_repositories(pkgs, disable_repos=None):
     """
     repositories_mapping = {}
 
-    query_format = "C2R %{EPOCH}:%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}&%{REPOID}\n"
-    if system_info.version.major >= 8:
-        query_format = "C2R %{NAME}-%{EPOCH}:%{VERSION}-%{RELEASE}.%{ARCH}&%{REPOID}\n"
-
-    # If needed, disable some repos for the repoquery
-    disable_repo_command = repo.get_rhel_disable_repos_command(disable_repos)
-
-    cmd = [
-        "repoquery",
-        "--quiet",
-        "-q",
-        "--installed",
-        "--setopt=exclude=",
-    ]
-    cmd.extend(disable_repo_command)
-    cmd.extend(pkgs)
-    cmd.extend(["--qf", query_format])
-
-    output, retcode = utils.run_subprocess(
-        cmd,
-        print_cmd=True,
-        print_output=False,
-    )
-    output = [line for line in output.split("\n") if line]
-
-    # In case of repoquery returning an retcode different from 0, let's log the
-    # output as a debug and return N/A for the caller.
-    if retcode != 0:
-        logger.debug("Repoquery exited with return code %s and with output: %s", retcode, " ".join(output))
+    names = set()
+    for pkg in pkgs:
+        # On yum, the epoch is printed before the name
+        if pkgmanager.TYPE == "yum":
+            pkg = pkg.split(":", 1)[-1]
+        names.add(pkg.rsplit("-", 2)[0])
+
+    try:
+        repo_pkgs = repometa.get_repo_metadata(disable_repos=disable_repos).get_packages(sorted(names))
+    except repometa.RepoMetadataError as err:
+        # Let's log the error as a debug and return N/A for the caller.
+        logger.debug("Unable to load the repository metadata: %s", err)
         for package in pkgs:
             repositories_mapping[package] = "N/A"
-    else:
-        for line in output:
-            line = line.lstrip()
-            if line.startswith("C2R "):
-                split_output = line[4:].split("&")
-                nevra = split_output[0]
-                repoid = split_output[1]
-                repositories_mapping[nevra] = repoid if repoid else "N/A"
-            else:
-                logger.debug("Got a line without the C2R identifier: %s", line)
+        return repositories_mapping
+
+    # Format the available packages the same way as the packages we got
+    available = {}
+    for repo_pkg in repo_pkgs:
+        if pkgmanager.TYPE == "yum":
+            nevra = "{0.epoch}:{0.name}-{0.version}-{0.release}.{0.arch}".format(repo_pkg)
+        else:
+            nevra = repo_pkg.nevra
+        available.setdefault(nevra, repo_pkg.repoid)
+
+    for package in pkgs:
+        if package in available:
+            repositories_mapping[package] = available[package]
 
     return repositories_mapping
 
@@ -771,21 +1220,13 @@ def _get_packages_to_update_yum(disable_repos=None):
     :return: Return a list of packages that needs to be updated.
     :rtype: list[str] | list
     """
-    disable_repos = disable_repos or []
     all_packages = []
 
-    base = pkgmanager.YumBase()
+    with sack_sessions.session(disable_repos=disable_repos) as base:
+        packages = base.doPackageLists(pkgnarrow="updates")
+        for package in packages.updates:
+            all_packages.append(package.name)
 
-    # Disable rhel repos during checks if system is up-to-date
-    for repo_to_disable in disable_repos:
-        base.repos.disableRepo(repo_to_disable)
-
-    packages = base.doPackageLists(pkgnarrow="updates")
-    for package in packages.updates:
-        all_packages.append(package.name)
-
-    base.close()
-    del base
     return all_packages
 
 
@@ -795,34 +1236,20 @@ def _get_packages_to_update_dnf(disable_repos=None):
     :param disable_repos: Repositories to disable during command execution. Defaults to None.
     :type disable_repos: list[str]
     """
-    disable_repos = disable_repos or []
     packages = []
 
-    base = pkgmanager.Base()
-
-    # Set DNF to read from the proper config files, at this moment, DNF can't
-    # automatically read and load the config files so we have to specify it to
-    # him. We set the PRIO_MAINCONFIG as the base config file to be read. We
-    # also set the folder /etc/dnf/vars as the main point for vars replacement
-    # in repo files. See this bugzilla comment:
-    # https://bugzilla.redhat.com/show_bug.cgi?id=1920735#c2
-    base.conf.read(priority=pkgmanager.conf.PRIO_MAINCONFIG)
-    base.conf.substitutions.update_from_etc(installroot=base.conf.installroot)
-    base.read_all_repos()
-    base.fill_sack()
-
-    # Disable rhel repos during checks if system is up-to-date
-    for disable_repo in disable_repos:
-        repos_for_disable = base.repos.get_matching(disable_repo)
-        repos_for_disable.disable()
-
-    # Get a list of all packages to upgrade in the system
-    base.upgrade_all()
-    base.resolve()
+    with sack_sessions.session(disable_repos=disable_repos) as base:
+        try:
+            # Get a list of all packages to upgrade in the system
+            base.upgrade_all()
+            base.resolve()
 
-    # Iterate over each and every one of them and append to the packages list
-    for package in base.transaction:
-        packages.append(package.name)
+            # Iterate over each and every one of them and append to the packages list
+            for package in base.transaction:
+                packages.append(package.name)
+        finally:
+            # Leave the shared base without a goal for the next queries
+            base.reset(goal=True)
 
     return packages
 
@@ -889,22 +1316,140 @@ def compare_package_versions(version1, version2):
 
 def parse_pkg_string(pkg):
     """
-    This function takes a version string in NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR and decides whether
-    to parse with a yum/dnf module based on the package manager type of the system.
+    This function takes a version string in NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR and splits it into its fields.
+
+    The string is parsed natively, without the help of yum or dnf.  The results are memoized as the same packages
+    are parsed over and over during the conversion.
     :param pkg: The package to be parsed.
     :type pkg: str
-    :return: Return a Return a list containing name, epoch, version, release, arch
-    :rtype: list[str | None]
-    """
-    if pkgmanager.TYPE == "yum":
-        pkg_ver_components = _parse_pkg_with_yum(pkg)
-    else:
-        pkg_ver_components = _parse_pkg_with_dnf(pkg)
+    :return: Return a Return a tuple containing name, epoch, version, release, arch
+    :rtype: tuple[str | None]
 
+    :raises ValueError: If the package is not in one of the supported formats or any of the fields is invalid.
+    """
+    with _parsed_pkgs_lock:
+        pkg_ver_components = _parsed_pkgs.get(pkg)
+        if pkg_ver_components is not None:
+            # Mark the package as the most recently used one
+            del _parsed_pkgs[pkg]
+            _parsed_pkgs[pkg] = pkg_ver_components
+            return pkg_ver_components
+
+    pkg_ver_components = _parse_pkg(pkg)
     _validate_parsed_fields(pkg, *pkg_ver_components)
+
+    with _parsed_pkgs_lock:
+        _parsed_pkgs[pkg] = pkg_ver_components
+        while len(_parsed_pkgs) > PARSED_PKGS_CACHE_SIZE:
+            _parsed_pkgs.popitem(last=False)
+
     return pkg_ver_components
 
 
+def parse_pkg_strings(pkgs):
+    """
+    Parse a list of package strings.
+
+    :param pkgs: The packages to be parsed, in any of the formats accepted by :func:`parse_pkg_string`.
+    :type pkgs: Iterable[str]
+    :return: The name, epoch, version, release and arch of each package, in the same order.
+    :rtype: list[tuple[str | None]]
+
+    :raises ValueError: If any of the packages is invalid.
+    """
+    return [parse_pkg_string(pkg) for pkg in pkgs]
+
+
+def sort_pkgs_by_version(pkgs, reverse=False):
+    """
+    Sort versions of a package from the oldest to the newest.
+
+    Each package string is parsed once and the versions are compared with :func:`rpm.labelCompare`, so this is
+    considerably faster than sorting with :func:`compare_package_versions`.
+
+    :param pkgs: Versions of the same package, in any of the formats accepted by :func:`parse_pkg_string`.
+    :type pkgs: Iterable[str]
+    :param reverse: Sort from the newest to the oldest version instead.
+    :type reverse: bool
+    :return: The package strings sorted by their version.
+    :rtype: list[str]
+
+    :raises ValueError: In case of packages names or architectures being different.
+    """
+    pkgs = list(pkgs)
+    parsed_pkgs = parse_pkg_strings(pkgs)
+
+    names = set(parsed_pkg[0] for parsed_pkg in parsed_pkgs)
+    if len(names) > 1:
+        raise ValueError(
+            "The package names ({}) do not match. Can only compare versions for the same packages.".format(
+                ", ".join("'{}'".format(name) for name in sorted(names))
+            )
+        )
+
+    arches = set(parsed_pkg[4] for parsed_pkg in parsed_pkgs if parsed_pkg[4])
+    if len(arches) > 1:
+        raise ValueError(
+            "The arches ({}) do not match. Can only compare versions for the same arches. There is an architecture"
+            " mismatch likely due to incorrectly defined repositories on the system.".format(
+                ", ".join("'{}'".format(arch) for arch in sorted(arches))
+            )
+        )
+
+    evr_keys = [_EVR_KEY(parsed_pkg[1:4]) for parsed_pkg in parsed_pkgs]
+    order = sorted(range(len(pkgs)), key=evr_keys.__getitem__, reverse=reverse)
+    return [pkgs[index] for index in order]
+
+
+def _parse_pkg(pkg):
+    """
+    Split a package string into its fields.
+
+    :param pkg: The package to be parsed.
+    :type pkg: str
+    :return: Return a tuple containing name, epoch, version, release, arch (may contain null values)
+    :rtype: tuple[str | None]
+
+    :raises ValueError: If the package is not in one of the supported formats.
+    """
+    epoch = None
+    nvra = pkg
+
+    # package is in ENVR/ENVRA format
+    if ENVRA_ENVR_FORMAT.match(pkg):
+        epoch, nvra = pkg.split(":", 1)
+
+    # The arch is optional.  It is only recognized if it is one of the valid arches so that the last part of a
+    # release like "1.el8_3" is not mistaken for one.
+    arch = None
+    name_version_release, _, last_field = nvra.rpartition(".")
+    if last_field in PKG_ARCH:
+        nvra = name_version_release
+        arch = last_field
+
+    fields = nvra.rsplit("-", 2)
+    if len(fields) != 3:
+        raise ValueError(
+            "Invalid package - {}, packages need to be in one of the following"
+            " formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR.".format(pkg)
+        )
+    name, version, release = fields
+
+    # package is in NEVRA/NEVR format, the epoch is part of the version field
+    if epoch is None and NEVRA_NEVR_FORMAT.search(pkg):
+        epoch, version = version.split(":", 1)
+
+    # Any other colon means that the package string is malformed
+    if ":" in name or ":" in version or ":" in release:
+        raise ValueError(
+            "Invalid package - {}, packages need to be in one of the following"
+            " formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR.".format(pkg)
+        )
+
+    # convert any empty strings to None for consistency
+    return tuple((i or None) for i in (name, epoch, version, release, arch))
+
+
 def _validate_parsed_fields(package, name, epoch, version, release, arch):
     """
     Validation for each field contained in pkg_ver_components from the package
@@ -966,108 +1511,6 @@ def _validate_parsed_fields(package, name, epoch, version, release, arch):
         )
 
 
-def _parse_pkg_with_yum(pkg):
-    """Parse verison string using yum and rpmUtils splitFilename
-    :param pkg: The package to be parsed.
-    :type pkg: str
-    :return: Return a list containing name, epoch, version, release, arch (may contain null values)
-    :rtype: list[str]
-    """
-
-    # package is in NEVRA/NEVR format
-    if NEVRA_NEVR_FORMAT.findall(pkg):
-        name, epoch_version, release_arch = pkg.rsplit("-", 2)
-        epoch, version = epoch_version.split(":", 1)
-        # package is in NEVRA format
-        if release_arch.endswith(PKG_ARCH):
-            release, arch = release_arch.rsplit(".", 1)
-        # package is in NEVR format
-        else:
-            release = release_arch
-            arch = None
-
-    # package is in either ENVR, ENVRA, NVR or NVRA
-    else:
-        # splitFilename doesn't work with packages in NEVRA/NEVR format, that's why we are using it only here.
-        (name, version, release, epoch, arch) = pkgmanager.splitFilename(pkg)
-
-        # splitFilename places part of the release in the arch field when no arch is present
-        # if arch field is invalid, append contents to release field
-        if arch not in PKG_ARCH:
-            temp_release = arch
-            arch = None
-            release = "{}.{}".format(release, temp_release)
-
-    # convert any empty strings to None for consistency
-    pkg_ver_components = tuple((i or None) for i in (name, epoch, version, release, arch))
-
-    return pkg_ver_components
-
-
-def _parse_pkg_with_dnf(pkg):
-    """
-    Parse verison string using hawkey and dnf.
-    :param pkg: The package to be parsed.
-    :type pkg: str
-    :return: Return a list containing name, epoch, version, release, arch (may contain null values)
-    :rtype: list[str]
-
-    :raises ValueError: If any of the fields are invalid, raise ValueError.
-    """
-
-    name = epoch = version = release = arch = None
-    no_arch_data = None
-
-    # if format is ENVR/ENVRA, store and remove epoch and evaluate as NVR/NVRA
-    if ENVRA_ENVR_FORMAT.findall(pkg):
-        pkg = pkg.split(":")
-        epoch = pkg[0]
-        pkg = pkg[1]
-
-    # returns generator for every possible nevra
-    subject = pkgmanager.dnf.subject.Subject(pkg)
-    possible_nevra = subject.get_nevra_possibilities(forms=[pkgmanager.hawkey.FORM_NEVRA, pkgmanager.hawkey.FORM_NEVR])
-
-    # loop through each possible set of nevra fields and select the valid one
-    for nevra in possible_nevra:
-        # current arch is valid
-        if str(nevra.arch) in PKG_ARCH:
-            name = nevra.name
-            epoch = epoch or nevra.epoch
-            version = nevra.version
-            release = nevra.release
-            arch = nevra.arch
-            break
-
-        # there is no arch present and current arch is None
-        if nevra.arch is None:
-            no_arch_data = nevra
-
-        # arch is not valid, move on to next iteration
-
-    else:  # This else goes with the for loop
-        # if no_arch_data is still None by this point, the parser wasn't able to find valid fields
-        # therefore the package entered is invalid and/or in the wrong format
-        if no_arch_data is None:
-            raise ValueError(
-                "Invalid package - {}, packages need to be in one of the following"
-                " formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR.".format(pkg)
-            )
-
-        name = no_arch_data.name
-        epoch = epoch or no_arch_data.epoch
-        version = no_arch_data.version
-        release = no_arch_data.release
-        arch = no_arch_data.arch
-
-    # convert epoch from integer to string for consistency
-    if epoch is not None:
-        epoch = str(epoch)
-
-    pkg_ver_components = (name, epoch, version, release, arch)
-    return pkg_ver_components
-
-
 def get_highest_package_version(pkgs):
     """
     Get the highest version from the provided list of packages.
@@ -1084,9 +1527,4 @@ def get_highest_package_version(pkgs):
         logger.debug("The list of {} packages is empty.".format(name))
         raise ValueError
 
-    highest_version = nevra_list[0]
-
-    for nevra in nevra_list[1:]:
-        highest_version = nevra if compare_package_versions(nevra, highest_version) == 1 else highest_version
-
-    return highest_version
+    return sort_pkgs_by_version(nevra_list)[-1]
@@ -29,8 +29,6 @@ from convert2rhel.toolopts import tool_opts
 logger = root_logger.getChild(__name__)
 
 try:
-    # this is used in pkghandler.py to parse version strings in the _parse_pkg_with_yum function
-    from rpmUtils.miscutils import splitFilename  # type: ignore  # noqa: F401
     from yum import *  # type: ignore # noqa: F403
     from yum.callbacks import DownloadBaseCallback as DownloadProgress  # type: ignore
 
@@ -18,9 +18,125 @@
 __metaclass__ = type
 
 import abc
+import json
+import os
 
 import six
 
+from convert2rhel import pkghandler, utils
+from convert2rhel.logger import root_logger
+from convert2rhel.utils import files
+
+
+logger = root_logger.getChild(__name__)
+"""Instance of the logger used in this module."""
+
+VALIDATED_TRANSACTION_FILE = os.path.join(utils.TMP_DIR, "validated-transaction.json")
+"""Where the transaction validated before the point of no return is recorded."""
+
+
+class ValidatedTransaction:
+    """Record of the transaction validated before the point of no return.
+
+    The conversion replays the recorded transaction instead of resolving it
+    again as long as neither the set of installed packages nor the metadata of
+    the enabled repositories changed since the validation.
+
+    installed_packages: str
+        :func:`convert2rhel.pkghandler.get_installed_packages_checksum` at the
+        time of the validation.
+    repo_checksums: dict[str, str]
+        Checksum of the metadata of each enabled repository.
+    packages: list[list[str]]
+        The action, the NEVRA and the path to the downloaded package of each
+        member of the transaction.
+    transaction_file: str | None
+        Transaction saved by the package manager itself, if it can.
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, installed_packages, repo_checksums, packages, transaction_file=None):
+        self.installed_packages = installed_packages
+        self.repo_checksums = repo_checksums
+        self.packages = packages
+        self.transaction_file = transaction_file
+
+    def save(self, path=None):
+        """Record the transaction.
+
+        :param path: Where to record it. :data:`VALIDATED_TRANSACTION_FILE` by default.
+        :type path: str | None
+        """
+        path = path or VALIDATED_TRANSACTION_FILE
+        files.mkdir_p(os.path.dirname(path))
+        with open(path, "w") as transaction_file:
+            json.dump(
+                {
+                    "format_version": self.FORMAT_VERSION,
+                    "installed_packages": self.installed_packages,
+                    "repo_checksums": self.repo_checksums,
+                    "packages": self.packages,
+                    "transaction_file": self.transaction_file,
+                },
+                transaction_file,
+            )
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the recorded transaction.
+
+        :param path: Where it is recorded. :data:`VALIDATED_TRANSACTION_FILE` by default.
+        :type path: str | None
+        :return: The recorded transaction or None if there is none.
+        :rtype: ValidatedTransaction | None
+        """
+        path = path or VALIDATED_TRANSACTION_FILE
+        try:
+            with open(path) as transaction_file:
+                data = json.load(transaction_file)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug("No usable validated transaction in {}: {}".format(path, e))
+            return None
+
+        if data.get("format_version") != cls.FORMAT_VERSION:
+            return None
+
+        return cls(data["installed_packages"], data["repo_checksums"], data["packages"], data["transaction_file"])
+
+    @staticmethod
+    def discard(path=None):
+        """Remove the recorded transaction, if any.
+
+        :param path: Where it is recorded. :data:`VALIDATED_TRANSACTION_FILE` by default.
+        :type path: str | None
+        """
+        path = path or VALIDATED_TRANSACTION_FILE
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def is_current(self, installed_packages, repo_checksums):
+        """Check that the system did not change since the transaction was validated.
+
+        :param installed_packages: The current checksum of the set of installed packages.
+        :type installed_packages: str | None
+        :param repo_checksums: The current checksum of the metadata of each enabled repository.
+        :type repo_checksums: dict[str, str]
+        :rtype: bool
+        """
+        if installed_packages is None or installed_packages != self.installed_packages:
+            return False
+
+        if repo_checksums != self.repo_checksums:
+            return False
+
+        if self.transaction_file and not os.path.exists(self.transaction_file):
+            return False
+
+        return True
+
 
 @six.add_metaclass(abc.ABCMeta)
 class TransactionHandlerBase:
@@ -50,3 +166,62 @@ class TransactionHandlerBase:
         :type validate_transaction: bool
         """
         pass
+
+    @abc.abstractmethod
+    def prefetch_packages(self, max_parallel_downloads, bandwidth_limit):
+        """Download the RHEL packages likely to be in the transaction.
+
+        The latest RHEL packages with the name and architecture of the
+        packages to be replaced are downloaded in batches to the package cache
+        of :data:`convert2rhel.pkgmanager.prefetch.PREFETCH_CACHE_DIR`. Each
+        completely downloaded package is handed over with
+        :func:`convert2rhel.pkgmanager.prefetch.hand_over` so that the
+        transaction imports it to its package cache later.
+
+        :param max_parallel_downloads: How many packages to download at once.
+        :type max_parallel_downloads: int
+        :param bandwidth_limit: Limit of the download speed in bytes per
+            second. Yum applies it to each repository and dnf to all the
+            downloads.
+        :type bandwidth_limit: int
+        """
+        pass
+
+    @abc.abstractmethod
+    def _get_repo_checksums(self):
+        """Get the checksum of the metadata of each enabled repository.
+
+        :rtype: dict[str, str]
+        """
+        pass
+
+    def _record_validated_transaction(self, packages, transaction_file=None):
+        """Record the validated transaction so that the conversion can replay it.
+
+        :param packages: The action, the NEVRA and the path to the downloaded
+            package of each member of the transaction.
+        :type packages: list[list[str]]
+        :param transaction_file: Transaction saved by the package manager itself.
+        :type transaction_file: str | None
+        """
+        validated_transaction = ValidatedTransaction(
+            pkghandler.get_installed_packages_checksum(), self._get_repo_checksums(), packages, transaction_file
+        )
+        try:
+            validated_transaction.save()
+        except (IOError, OSError) as e:
+            # The conversion resolves the transaction again
+            logger.warning("Unable to record the validated transaction: {}".format(e))
+
+    def _can_replay(self, validated_transaction):
+        """Check that the system did not change since the transaction was validated.
+
+        :param validated_transaction: The transaction recorded by the validation.
+        :type validated_transaction: ValidatedTransaction
+        :rtype: bool
+        """
+        if validated_transaction.is_current(pkghandler.get_installed_packages_checksum(), self._get_repo_checksums()):
+            return True
+
+        logger.info("The system changed since the transaction was validated. Resolving the transaction again.")
+        return False
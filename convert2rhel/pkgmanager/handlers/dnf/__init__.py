@@ -17,11 +17,13 @@
 
 __metaclass__ = type
 
+import os
 
-from convert2rhel import exceptions, pkgmanager
+from convert2rhel import exceptions, pkghandler, pkgmanager, repometa
 from convert2rhel.logger import root_logger
 from convert2rhel.pkghandler import get_system_packages_for_replacement
-from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase, ValidatedTransaction
 from convert2rhel.pkgmanager.handlers.dnf.callback import (
     DependencySolverProgressIndicatorCallback,
     PackageDownloadCallback,
@@ -72,6 +74,10 @@ class DnfTransactionHandler(TransactionHandlerBase):
             of the packages, we use this internal method to make it easier to
             re-initialize it again.
         """
+        # Close the bases shared by the package queries, the transaction
+        # changes the rpmdb they have loaded.
+        pkghandler.sack_sessions.invalidate()
+
         self._base = pkgmanager.Base()
         self._base.conf.substitutions["releasever"] = system_info.releasever
         self._base.conf.module_platform_id = "platform:el" + str(system_info.version.major)
@@ -173,6 +179,96 @@ class DnfTransactionHandler(TransactionHandlerBase):
 
         self._swap_base_os_specific_packages()
 
+    def _replay_validated_transaction(self, validated_transaction):
+        """Add the packages of the validated transaction to the transaction.
+
+        The exact packages the validation resolved are added instead of
+        looking for the packages to replace again.
+
+        :param validated_transaction: The transaction recorded by the validation.
+        :type validated_transaction: ValidatedTransaction
+        :return: Whether all the packages could be added to the transaction.
+        :rtype: bool
+        """
+        installed = self._base.sack.query().installed()
+        available = self._base.sack.query().available()
+
+        for action, nevra, _ in validated_transaction.packages:
+            query = installed if action == "remove" else available
+            pkg = next(iter(query.filter(nevra_strict=nevra)), None)
+            if pkg is None:
+                logger.info("Package %s of the validated transaction is not available anymore.", nevra)
+                self._base.reset(goal=True)
+                return False
+
+            getattr(self._base, "package_{}".format(action))(pkg)
+
+        return True
+
+    def _get_transaction_packages(self):
+        """Get the members of the resolved transaction to record them.
+
+        :return: The action, the NEVRA and the path to the downloaded package
+            of each member of the transaction.
+        :rtype: list[list[str]]
+        """
+        installed = dict(((pkg.name, pkg.arch), pkg) for pkg in self._base.sack.query().installed())
+
+        packages = []
+        replaced = set()
+        for pkg in self._base.transaction.install_set:
+            installed_pkg = installed.get((pkg.name, pkg.arch))
+            if installed_pkg is None:
+                action = "install"
+            else:
+                replaced.add((pkg.name, pkg.arch))
+                comparison = pkg.evr_cmp(installed_pkg)
+                action = "upgrade" if comparison > 0 else "downgrade" if comparison < 0 else "reinstall"
+            packages.append([action, str(pkg), pkg.localPkg()])
+
+        for pkg in self._base.transaction.remove_set:
+            # The replaced packages are removed by their upgrade, downgrade or reinstall
+            if (pkg.name, pkg.arch) not in replaced:
+                packages.append(["remove", str(pkg), None])
+
+        return packages
+
+    def prefetch_packages(self, max_parallel_downloads, bandwidth_limit):
+        self._set_up_base()
+        self._base.conf.cachedir = prefetch.PREFETCH_CACHE_DIR
+        self._base.conf.max_parallel_downloads = max_parallel_downloads
+        self._base.conf.throttle = bandwidth_limit
+        try:
+            self._enable_repos()
+
+            original_os_pkgs = set(get_system_packages_for_replacement())
+            pkgs = [
+                pkg
+                for pkg in self._base.sack.query().available().latest()
+                if "{}.{}".format(pkg.name, pkg.arch) in original_os_pkgs
+            ]
+            logger.debug("Prefetching %s packages of the dnf transaction.", len(pkgs))
+            for start in range(0, len(pkgs), prefetch.PREFETCH_BATCH_SIZE):
+                batch = pkgs[start : start + prefetch.PREFETCH_BATCH_SIZE]
+                try:
+                    self._base.download_packages(batch)
+                except pkgmanager.exceptions.DownloadError as e:
+                    logger.debug("Failed to prefetch some packages: %s", e)
+
+                for pkg in batch:
+                    # The packages that failed to download are left out
+                    if os.path.exists(pkg.localPkg()) and pkg.verifyLocalPkg():
+                        prefetch.hand_over(pkg.localPkg(), pkg.repoid)
+        finally:
+            self._base.close()
+            del self._base
+
+    def _get_repo_checksums(self):
+        return dict(
+            (repo.id, repometa.get_metadata_checksum(repo.get_metadata_path("primary")))
+            for repo in self._base.repos.iter_enabled()
+        )
+
     def _resolve_dependencies(self):
         """Resolve the dependencies for the transaction.
 
@@ -259,10 +355,28 @@ class DnfTransactionHandler(TransactionHandlerBase):
         self._set_up_base()
         self._enable_repos()
 
-        self._perform_operations()
+        # Replay the transaction validated before the point of no return so
+        # that the conversion does not look for the packages to replace again.
+        validated_transaction = None if validate_transaction else ValidatedTransaction.load()
+        # A recorded transaction is replayed at most once
+        ValidatedTransaction.discard()
+
+        if (
+            validated_transaction
+            and self._can_replay(validated_transaction)
+            and self._replay_validated_transaction(validated_transaction)
+        ):
+            logger.info("Replaying the dnf transaction validated before the point of no return.")
+        else:
+            self._perform_operations()
+
+        prefetch.import_packages(dict((repo.id, repo.pkgdir) for repo in self._base.repos.iter_enabled()))
         self._resolve_dependencies()
         self._process_transaction(validate_transaction)
 
+        if validate_transaction:
+            self._record_validated_transaction(self._get_transaction_packages())
+
         # Because we call the same thing multiple times, the rpm database is not
         # properly closed at the end of it, thus, having the need to call
         # `self._base.close()` explicitly before we delete the object. If we use
@@ -17,13 +17,15 @@
 
 __metaclass__ = type
 
+import os
 import re
 
-from convert2rhel import backup, exceptions, pkgmanager, utils
+from convert2rhel import backup, exceptions, pkghandler, pkgmanager, repometa, utils
 from convert2rhel.backup.packages import RestorablePackage
 from convert2rhel.logger import root_logger
 from convert2rhel.pkghandler import get_system_packages_for_replacement
-from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase, ValidatedTransaction
 from convert2rhel.pkgmanager.handlers.yum.callback import PackageDownloadCallback, TransactionDisplayCallback
 from convert2rhel.systeminfo import system_info
 from convert2rhel.utils import remove_pkgs
@@ -38,6 +40,29 @@ MAX_NUM_OF_ATTEMPTS_TO_RESOLVE_DEPS = 3
 EXTRACT_PKG_FROM_YUM_DEPSOLVE = re.compile(r".*?(?=requires)")
 """Extract the first package that appears in the yum depsolve error."""
 
+VALIDATED_YUM_TRANSACTION_FILE = os.path.join(utils.TMP_DIR, "validated-transaction.yumtx")
+"""Where yum saves the transaction validated before the point of no return."""
+
+_previous_attempt = None
+"""Handler with the yum base of the previous attempt to resolve the transaction.
+
+It is kept by the process running the attempts so that the next attempt can
+resume from it. See :meth:`YumTransactionHandler._run_transaction_subprocess`.
+"""
+
+
+@utils.run_as_child_process
+def _discard_previous_attempt():
+    """Close the yum base of the previous attempt to resolve the transaction, if any.
+
+    It runs in the process running the attempts, where the handler is kept.
+    """
+    global _previous_attempt
+
+    handler, _previous_attempt = _previous_attempt, None
+    if handler is not None:
+        handler._close_yum_base()
+
 
 def _resolve_yum_problematic_dependencies(output):
     """Internal function to parse yum resolve dependencies errors.
@@ -50,6 +75,8 @@ def _resolve_yum_problematic_dependencies(output):
     :param output: A list of strings with packages names that had a dependency
     error.
     :type output: list[bytes]
+    :return: The packages removed from the system.
+    :rtype: list[str]
     """
     packages_to_remove = []
     if output:
@@ -86,6 +113,8 @@ def _resolve_yum_problematic_dependencies(output):
     else:
         logger.warning("Unable to resolve dependency issues.")
 
+    return packages_to_remove
+
 
 class YumTransactionHandler(TransactionHandlerBase):
     """Implementation of the YUM transaction handler.
@@ -120,8 +149,11 @@ class YumTransactionHandler(TransactionHandlerBase):
             use only `del self._base`, it seems that yum is not able to
             properly clean everything in the database.
         """
+        if self._base is None:
+            return
+
         self._base.close()
-        del self._base
+        self._base = None
 
     def _set_up_base(self):
         """Create a new instance of the yum.YumBase() class
@@ -137,12 +169,19 @@ class YumTransactionHandler(TransactionHandlerBase):
             of the packages, we use this internal method to make it easier to
             re-initialize it again.
         """
+        # Close the bases shared by the package queries, the transaction
+        # changes the rpmdb they have loaded.
+        pkghandler.sack_sessions.invalidate()
+
         pkgmanager.misc.setup_locale(override_time=True)
         self._base = pkgmanager.YumBase()
         # Empty out the exclude list to avoid dependency problems during the
         # transaction validation.
         self._base.conf.exclude = []
         self._base.conf.yumvar["releasever"] = system_info.releasever
+        # Keep the packages downloaded in the background and by the
+        # validation of the transaction for the transaction itself.
+        self._base.conf.keepcache = True
 
     def _enable_repos(self):
         """Enable a list of required repositories.
@@ -236,6 +275,129 @@ class YumTransactionHandler(TransactionHandlerBase):
                 diagnosis="Repository mirrors failed with error {}.".format(str(e)),
             )
 
+    def _load_validated_transaction(self):
+        """Load the transaction validated before the point of no return.
+
+        The transaction yum saved during the validation is loaded instead of
+        looking for the packages to replace again.
+
+        :return: Whether the transaction was loaded. If it was not, the yum
+            base is set up again to build the transaction from scratch.
+        :rtype: bool
+        """
+        validated_transaction = ValidatedTransaction.load()
+        # A recorded transaction is replayed at most once
+        ValidatedTransaction.discard()
+        if validated_transaction is None:
+            return False
+
+        self._enable_repos()
+        if self._can_replay(validated_transaction):
+            try:
+                self._base.load_ts(validated_transaction.transaction_file)
+            except pkgmanager.Errors.YumBaseError as e:
+                logger.info("Unable to load the validated yum transaction: %s", e)
+            else:
+                logger.info("Replaying the yum transaction validated before the point of no return.")
+                return True
+
+        # Start over with a base without any repository enabled nor package
+        # in the transaction set.
+        self._close_yum_base()
+        self._set_up_base()
+        return False
+
+    def _save_transaction(self):
+        """Save the resolved transaction so that the conversion can load it.
+
+        :return: The path to the saved transaction or None if yum could not
+            save it.
+        :rtype: str | None
+        """
+        try:
+            self._base.save_ts(filename=VALIDATED_YUM_TRANSACTION_FILE, auto=False)
+        except pkgmanager.Errors.YumBaseError as e:
+            logger.warning("Unable to save the yum transaction: %s", e)
+            return None
+
+        return VALIDATED_YUM_TRANSACTION_FILE
+
+    def _get_transaction_packages(self):
+        """Get the members of the resolved transaction to record them.
+
+        :return: The state, the NEVRA and the path to the downloaded package
+            of each member of the transaction.
+        :rtype: list[list[str]]
+        """
+        packages = []
+        for txmbr in self._base.tsInfo.getMembers():
+            local_pkg = txmbr.po.localPkg() if txmbr.ts_state in ("i", "u") else None
+            packages.append([txmbr.ts_state, str(txmbr.po), local_pkg])
+        return packages
+
+    def prefetch_packages(self, max_parallel_downloads, bandwidth_limit):
+        self._set_up_base()
+        self._base.conf.cachedir = prefetch.PREFETCH_CACHE_DIR
+        self._base.conf.max_connections = max_parallel_downloads
+        try:
+            self._enable_repos()
+            # Do not display the progress of the downloads
+            self._base.repos.setProgressBar(None)
+            for repo in self._base.repos.listEnabled():
+                repo.throttle = bandwidth_limit
+
+            original_os_pkgs = set(get_system_packages_for_replacement())
+            pkgs = [
+                pkg
+                for pkg in self._base.pkgSack.returnNewestByNameArch()
+                if "{}.{}".format(pkg.name, pkg.arch) in original_os_pkgs
+            ]
+            logger.debug("Prefetching %s packages of the yum transaction.", len(pkgs))
+            for start in range(0, len(pkgs), prefetch.PREFETCH_BATCH_SIZE):
+                batch = pkgs[start : start + prefetch.PREFETCH_BATCH_SIZE]
+                errors = self._base.downloadPkgs(batch)
+                for pkg in batch:
+                    if pkg in errors:
+                        logger.debug("Failed to prefetch %s: %s", pkg, ", ".join(errors[pkg]))
+                    else:
+                        prefetch.hand_over(pkg.localPkg(), pkg.repoid)
+        finally:
+            self._close_yum_base()
+
+    def _get_repo_checksums(self):
+        return dict(
+            (repo.id, repometa.get_metadata_checksum(repo.retrieveMD("primary")))
+            for repo in self._base.repos.listEnabled()
+        )
+
+    def _forget_removed_packages(self, removed_pkgs):
+        """Drop the packages removed from the system from the transaction set.
+
+        The repositories and the transaction set of the previous attempt to
+        resolve the transaction are kept. Only the installed packages are
+        loaded again from the rpmdb, as yum does not notice the packages
+        removed by rpm, and the removed packages are dropped from the
+        transaction set.
+
+        :param removed_pkgs: The packages removed from the system since the
+            previous attempt.
+        :type removed_pkgs: list[str]
+        """
+        tsinfo = self._base.tsInfo
+        # Closing the rpmdb throws the transaction set away too
+        self._base.closeRpmDB()
+        self._base.tsInfo = tsinfo
+        tsinfo.setDatabases(self._base.rpmdb, self._base.pkgSack)
+
+        for pkg in removed_pkgs:
+            name, _, _, _, arch = pkghandler.parse_pkg_string(pkg)
+            for txmbr in tsinfo.matchNaevr(name=name, arch=arch):
+                logger.debug("Dropping %s from the yum transaction set.", txmbr.po)
+                tsinfo.remove(txmbr.pkgtup)
+
+        # Check the dependencies of all the members again
+        tsinfo.resetResolved(hard=True)
+
     def _resolve_dependencies(self):
         """Try to resolve the transaction dependencies.
 
@@ -338,16 +500,23 @@ class YumTransactionHandler(TransactionHandlerBase):
         :type validate_transaction: bool
         :raises CriticalError: If we can't resolve the transaction dependencies.
         """
+        # Close the bases shared by the package queries, the transaction
+        # changes the rpmdb they have loaded.
+        pkghandler.sack_sessions.invalidate()
+
         resolve_deps_finished = False
+        removed_pkgs = None
         # Do not allow this to loop until eternity.
         attempts = 0
+        # Never resume from an attempt of a previous transaction
+        _discard_previous_attempt()
         try:
             while attempts <= MAX_NUM_OF_ATTEMPTS_TO_RESOLVE_DEPS:
-                self._set_up_base()
-                messages = self._run_transaction_subprocess(validate_transaction)
+                messages = self._run_transaction_subprocess(validate_transaction, removed_pkgs)
                 if messages:
+                    removed_pkgs = None
                     if "Depsolving loop limit reached" not in messages and validate_transaction:
-                        _resolve_yum_problematic_dependencies(messages)
+                        removed_pkgs = _resolve_yum_problematic_dependencies(messages)
 
                     logger.info("Retrying to resolve dependencies %s", attempts)
                     attempts += 1
@@ -362,11 +531,15 @@ class YumTransactionHandler(TransactionHandlerBase):
                     title="Failed to resolve dependencies.",
                     description="During package transaction yum failed to resolve the necessary dependencies needed for a package replacement.",
                 )
+        except (Exception, SystemExit):
+            # Do not keep the yum base of the unfinished resolution open
+            _discard_previous_attempt()
+            raise
         finally:
             self._close_yum_base()
 
     @utils.run_as_child_process
-    def _run_transaction_subprocess(self, validate_transaction):
+    def _run_transaction_subprocess(self, validate_transaction, removed_pkgs=None):
         """Run the necessary transaction operations under a subprocess.
 
         .. important::
@@ -386,35 +559,70 @@ class YumTransactionHandler(TransactionHandlerBase):
             this, we need to loop through a couple of times until we know that
             all of the dependencies are resolved without problems.
 
-            You might wonder "why not remove the packages that caused a failure
-            and loop through the dep solving again?" Well. Since we are
-            removing the problematic packages using `rpm` and not some specific
-            method in the transaction itself, yum doesn't know that something
-            has changed (The resolveDeps() function doesn't refresh if
-            something else happens outside the transaction), in order to make
-            sure that we won't have any problems with our transaction, it is
-            easier to loop through everything again and just recreate the
-            transaction, so yum will keep track of what's changed.
+            Since we are removing the problematic packages using `rpm` and not
+            some specific method in the transaction itself, yum doesn't know
+            that something has changed (The resolveDeps() function doesn't
+            refresh if something else happens outside the transaction). When
+            the process running this function still has the yum base of the
+            previous attempt, which is the case when it is the long-lived child
+            process worker, the installed packages are loaded again and the
+            removed packages are dropped from the transaction set before
+            resolving it again. Otherwise the transaction is built from
+            scratch.
 
             This function should loop max 3 times to get to the point where our
-            transaction doesn't have any problematic packages in there, and the
-            subsequent transactions are "faster" because of some yum internal
-            cache mechanism.
-
-            This might be optimized in the future, but for now, it's somewhat
-            reliable.
+            transaction doesn't have any problematic packages in there.
 
         :param vaidate_transaction: Determines if the transaction needs to be
             validated or not.
         :type validate_transaction: bool
+        :param removed_pkgs: The packages removed from the system since the
+            previous attempt to resolve the transaction. None to build the
+            transaction from scratch.
+        :type removed_pkgs: list[str] | None
         :returns str | None: If any messages are raised from the dependency
             resolve methods, we return that to the caller. Otherwise, we return
             None.
         """
-        self._perform_operations()
-        messages = self._resolve_dependencies()
+        global _previous_attempt
+
+        # The child process might have shared bases of its own
+        pkghandler.sack_sessions.invalidate()
+
+        handler, _previous_attempt = _previous_attempt, None
+        if handler is not None and not removed_pkgs:
+            handler._close_yum_base()
+            handler = None
 
-        if not messages:
-            self._process_transaction(validate_transaction)
+        try:
+            if handler is not None:
+                logger.info("Resuming the resolution of the yum transaction set without the removed packages.")
+                handler._forget_removed_packages(removed_pkgs)
+            else:
+                handler = self
+                handler._set_up_base()
+
+                if validate_transaction:
+                    # The transaction validated now supersedes any recorded one
+                    ValidatedTransaction.discard()
+
+                if validate_transaction or not handler._load_validated_transaction():
+                    handler._perform_operations()
+
+            messages = handler._resolve_dependencies()
+            if messages:
+                # The next attempt resumes from this one
+                _previous_attempt = handler
+                return messages
+
+            transaction_file = handler._save_transaction() if validate_transaction else None
+            prefetch.import_packages(dict((repo.id, repo.pkgdir) for repo in handler._base.repos.listEnabled()))
+            handler._process_transaction(validate_transaction)
+
+            if transaction_file:
+                handler._record_validated_transaction(handler._get_transaction_packages(), transaction_file)
+        finally:
+            if handler is not _previous_attempt:
+                handler._close_yum_base()
 
         return messages
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Download the RHEL packages of the transaction in the background.
+
+Downloading the packages the transaction replaces the original packages with
+is usually the longest wait of the conversion. Once the RHEL repositories are
+enabled, the packages likely to be in the transaction are downloaded by a
+background process while the rest of the pre-PONR actions run.
+
+The background process uses a package manager cache of its own so that it does
+not interfere with the package manager calls of the other actions. Every
+completely downloaded batch of packages is handed over to a directory from
+which the transaction imports them to its package cache. The validation of the
+transaction stops whatever is still being downloaded and downloads the rest
+itself.
+"""
+
+__metaclass__ = type
+
+import logging
+import os
+import shutil
+
+from convert2rhel import pkgmanager, utils
+from convert2rhel.logger import root_logger
+from convert2rhel.utils import files
+
+
+logger = root_logger.getChild(__name__)
+"""Instance of the logger used in this module."""
+
+PREFETCH_DIR = os.path.join(utils.TMP_DIR, "prefetch")
+"""Directory holding everything downloaded in the background."""
+
+PREFETCH_CACHE_DIR = os.path.join(PREFETCH_DIR, "cache")
+"""Package manager cache the background process downloads the metadata and the packages to."""
+
+PREFETCHED_PACKAGES_DIR = os.path.join(PREFETCH_DIR, "packages")
+"""Completely downloaded packages waiting for the transaction, in a directory per repository."""
+
+PREFETCH_MAX_PARALLEL_DOWNLOADS = 2
+"""How many packages are downloaded at once, where the package manager supports it."""
+
+PREFETCH_BANDWIDTH_LIMIT = 10 * 1024 * 1024
+"""Limit of the download speed in bytes per second, per repository with yum and overall with dnf."""
+
+PREFETCH_BATCH_SIZE = 10
+"""How many packages are downloaded before they are handed over. Stopping the download loses at most one batch."""
+
+
+def _prefetch_packages():
+    """Download the packages likely to be in the transaction.
+
+    This is run in the background process. A failure to download the packages
+    is not fatal, the transaction downloads whatever is missing.
+    """
+    # Do not mix the messages of the package manager with the ones of the
+    # actions running in the meantime.
+    logging.disable(logging.INFO)
+
+    try:
+        transaction_handler = pkgmanager.create_transaction_handler()
+        transaction_handler.prefetch_packages(PREFETCH_MAX_PARALLEL_DOWNLOADS, PREFETCH_BANDWIDTH_LIMIT)
+    except (Exception, SystemExit) as e:
+        logger.warning("Unable to download the packages of the transaction in the background: {}".format(e))
+
+
+def hand_over(package_path, repoid):
+    """Hand a completely downloaded package over to the transaction.
+
+    :param package_path: Path to the package in the package cache of the
+        background process.
+    :type package_path: str
+    :param repoid: ID of the repository the package is downloaded from.
+    :type repoid: str
+    """
+    destination = os.path.join(PREFETCHED_PACKAGES_DIR, repoid)
+    files.mkdir_p(destination)
+    os.rename(package_path, os.path.join(destination, os.path.basename(package_path)))
+
+
+def import_packages(package_dirs):
+    """Move the packages handed over by the background process to the package cache of the transaction.
+
+    :param package_dirs: The package cache directory of each enabled
+        repository of the transaction, by repository ID.
+    :type package_dirs: dict[str, str]
+    :return: How many packages were imported.
+    :rtype: int
+    """
+    imported = 0
+    for repoid, package_dir in package_dirs.items():
+        source = os.path.join(PREFETCHED_PACKAGES_DIR, repoid)
+        if not os.path.isdir(source):
+            continue
+
+        files.mkdir_p(package_dir)
+        for filename in os.listdir(source):
+            shutil.move(os.path.join(source, filename), os.path.join(package_dir, filename))
+            imported += 1
+
+    if imported:
+        logger.info("Using {} packages downloaded in the background.".format(imported))
+    return imported
+
+
+class PackagePrefetch:
+    """The background process downloading the packages of the transaction."""
+
+    def __init__(self):
+        self._process = None
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        """Start downloading the packages in the background.
+
+        Nothing happens if the packages are already being downloaded.
+        """
+        if self.running:
+            return
+
+        logger.info("Downloading the packages of the transaction in the background.")
+        self._process = utils.Process(target=_prefetch_packages)
+        # Do not keep convert2rhel running because of the downloads
+        self._process.daemon = True
+        self._process.start()
+
+    def _stop(self):
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        self._process = None
+
+    def finish(self):
+        """Stop downloading the packages and leave the downloaded ones to the transaction.
+
+        The transaction downloads the packages that are still missing at full
+        speed instead of waiting for the limited background download.
+        """
+        if self._process is None:
+            return
+
+        if self._process.is_alive():
+            logger.info("Stopping the download of the packages of the transaction in the background.")
+        self._stop()
+        # Only the packages handed over are complete
+        shutil.rmtree(PREFETCH_CACHE_DIR, ignore_errors=True)
+
+    def cancel(self):
+        """Stop downloading the packages and remove everything downloaded."""
+        if self._process is None:
+            return
+
+        if self._process.is_alive():
+            logger.debug("Cancelling the download of the packages of the transaction.")
+        self._stop()
+        shutil.rmtree(PREFETCH_DIR, ignore_errors=True)
+
+
+package_prefetch = PackagePrefetch()
+"""The prefetch of the packages of the conversion."""
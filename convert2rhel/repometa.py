@@ -0,0 +1,687 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Queries of the packages available in the yum/dnf repositories, replacing ``repoquery``.
+
+The package manager is used only to download the repository metadata. The
+primary (and, when needed, filelists) metadata of each repository is then
+parsed once into an indexed SQLite database stored under :data:`REPOMETA_DIR`
+and named after the checksum of the repository metadata. The database is
+reused for as long as the repository metadata does not change, also by later
+runs of convert2rhel.
+
+The checks that query the same set of repositories share a single
+:class:`RepoMetadata` instance, see :func:`get_repo_metadata`.
+"""
+
+__metaclass__ = type
+
+import bz2
+import collections
+import fnmatch
+import gzip
+import hashlib
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+
+from collections import namedtuple
+from functools import cmp_to_key
+
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+import rpm
+
+from convert2rhel import pkgmanager, utils
+from convert2rhel.logger import root_logger
+from convert2rhel.utils import files
+
+
+logger = root_logger.getChild(__name__)
+
+# Directory holding the databases with the parsed repository metadata
+REPOMETA_DIR = os.path.join(utils.TMP_DIR, "repometa")
+
+_COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+_RPM_NS = "{http://linux.duke.edu/metadata/rpm}"
+_FILELISTS_NS = "{http://linux.duke.edu/metadata/filelists}"
+
+_SCHEMA = (
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE packages (pkgkey INTEGER PRIMARY KEY, pkgid TEXT, name TEXT, epoch TEXT, version TEXT,"
+    " release TEXT, arch TEXT, buildtime INTEGER)",
+    # Both the provided capabilities and the files listed in the primary metadata
+    "CREATE TABLE provides (name TEXT, pkgkey INTEGER)",
+    # The complete file lists, filled in only when a file query is made
+    "CREATE TABLE files (path TEXT, pkgkey INTEGER)",
+)
+_INDEXES = (
+    "CREATE INDEX packages_name ON packages (name)",
+    "CREATE INDEX provides_name ON provides (name)",
+)
+
+_PACKAGE_COLUMNS = "p.name, p.epoch, p.version, p.release, p.arch, p.buildtime"
+
+_STORE_FILENAME = re.compile(r"^(?P<repoid>.+)-[0-9a-f]{64}\.sqlite$")
+
+
+class RepoMetadataError(Exception):
+    """Raised when the metadata of the repositories cannot be downloaded or read."""
+
+
+class RepoPackage(namedtuple("RepoPackage", ["name", "epoch", "version", "release", "arch", "buildtime", "repoid"])):
+    """
+    A package available in a repository.
+
+    Example:
+    >>> pkg = RepoPackage("kernel", "0", "3.10.0", "1160.el7", "x86_64", 1597234567, "base")
+    >>> pkg.nevra
+    'kernel-0:3.10.0-1160.el7.x86_64'
+    """
+
+    __slots__ = ()
+
+    @property
+    def evr(self):
+        """The (epoch, version, release) tuple as accepted by rpm.labelCompare()."""
+        return (self.epoch, self.version, self.release)
+
+    @property
+    def nevra(self):
+        return "{0.name}-{0.epoch}:{0.version}-{0.release}.{0.arch}".format(self)
+
+
+class RepoMetadataFiles(namedtuple("RepoMetadataFiles", ("repoid", "primary", "filelists", "excludes"))):
+    """The local paths to the downloaded metadata of a repository and the exclude option of the repository."""
+
+    __slots__ = ()
+
+    def __new__(cls, repoid, primary, filelists, excludes=()):
+        return super(RepoMetadataFiles, cls).__new__(cls, repoid, primary, filelists, tuple(excludes))
+
+
+def _is_excluded(package, excludes):
+    """Whether a package matches any of the exclude patterns of its repository.
+
+    The patterns are matched against the same forms of the package NEVRA as yum and dnf match them.
+    """
+    forms = (
+        package.name,
+        "{0.name}.{0.arch}".format(package),
+        "{0.name}-{0.version}".format(package),
+        "{0.name}-{0.version}-{0.release}".format(package),
+        "{0.name}-{0.version}-{0.release}.{0.arch}".format(package),
+        "{0.name}-{0.epoch}:{0.version}-{0.release}.{0.arch}".format(package),
+        "{0.epoch}:{0.name}-{0.version}-{0.release}.{0.arch}".format(package),
+    )
+    return any(fnmatch.fnmatchcase(form, pattern) for pattern in excludes for form in forms)
+
+
+def _open_metadata(path):
+    """Open a possibly compressed repository metadata file for reading."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.BZ2File(path, "rb")
+    if path.endswith(".xz"):
+        try:
+            import lzma
+        except ImportError:
+            raise RepoMetadataError("Unable to decompress the repository metadata file {}.".format(path))
+        return lzma.open(path, "rb")
+    if path.endswith(".xml"):
+        return open(path, "rb")
+
+    raise RepoMetadataError("Unsupported format of the repository metadata file {}.".format(path))
+
+
+def _iterparse(path, tag):
+    """Iterate over the elements with the given tag without keeping the whole document in memory."""
+    with _open_metadata(path) as metadata:
+        context = iter(ElementTree.iterparse(metadata, events=("start", "end")))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag == tag:
+                yield elem
+                # Drop the elements we have processed already
+                root.clear()
+
+
+def _iter_primary(path):
+    """
+    Iterate over the packages listed in the primary metadata of a repository.
+
+    :return: 2-tuples with the packages table row (without pkgkey) and the
+        names of the capabilities and files the package provides.
+    :rtype: Iterator[tuple[tuple, list[str]]]
+    """
+    format_ = _COMMON_NS + "format/"
+    for elem in _iterparse(path, _COMMON_NS + "package"):
+        version = elem.find(_COMMON_NS + "version")
+        time = elem.find(_COMMON_NS + "time")
+        provides = [entry.get("name") for entry in elem.iterfind(format_ + _RPM_NS + "provides/" + _RPM_NS + "entry")]
+        provides.extend(file_elem.text for file_elem in elem.iterfind(format_ + _COMMON_NS + "file"))
+        row = (
+            elem.findtext(_COMMON_NS + "checksum"),
+            elem.findtext(_COMMON_NS + "name"),
+            version.get("epoch") or "0",
+            version.get("ver"),
+            version.get("rel"),
+            elem.findtext(_COMMON_NS + "arch"),
+            int(time.get("build") or 0) if time is not None else 0,
+        )
+        yield row, provides
+
+
+def _iter_filelists(path, pkgkeys):
+    """
+    Iterate over the files listed in the filelists metadata of a repository.
+
+    :param pkgkeys: The pkgkey of each package indexed by its pkgid.
+    :type pkgkeys: dict[str, int]
+    :return: The (path, pkgkey) rows of the files table.
+    :rtype: Iterator[tuple[str, int]]
+    """
+    for elem in _iterparse(path, _FILELISTS_NS + "package"):
+        pkgkey = pkgkeys.get(elem.get("pkgid"))
+        if pkgkey is None:
+            continue
+        for path_elem in elem.iterfind(_FILELISTS_NS + "file"):
+            yield path_elem.text, pkgkey
+
+
+def get_package_locations(primary):
+    """Get the locations of the packages listed in the primary metadata of a repository.
+
+    :param primary: Path to the downloaded primary metadata.
+    :type primary: str
+    :return: The location of each package relative to the base URL of the
+        repository, indexed by the file name of the package.
+    :rtype: dict[str, str]
+    """
+    locations = {}
+    for elem in _iterparse(primary, _COMMON_NS + "package"):
+        href = elem.find(_COMMON_NS + "location").get("href")
+        locations[os.path.basename(href)] = href
+    return locations
+
+
+def get_metadata_checksum(metadata_path):
+    """Get a checksum identifying the current metadata of a repository.
+
+    The repomd.xml file stored next to the metadata files lists the checksums
+    of all of them so it is enough to hash that one.
+    """
+    repomd = os.path.join(os.path.dirname(metadata_path), "repomd.xml")
+    path = repomd if os.path.exists(repomd) else metadata_path
+    checksum = hashlib.sha256()
+    with open(path, "rb") as metadata:
+        for chunk in iter(lambda: metadata.read(1024 * 1024), b""):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
+class RepoMetadataStore:
+    """The packages of a single repository stored in an indexed SQLite database."""
+
+    def __init__(self, repoid, primary, filelists=None, excludes=(), store_dir=None):
+        """
+        :param repoid: ID of the repository.
+        :type repoid: str
+        :param primary: Path to the downloaded primary metadata.
+        :type primary: str
+        :param filelists: Path to the downloaded filelists metadata, if any.
+        :type filelists: str | None
+        :param excludes: Patterns of the packages the queries do not return,
+            the same as the exclude option of the repository.
+        :type excludes: Sequence[str]
+        :param store_dir: Directory to keep the database in. Defaults to
+            REPOMETA_DIR.
+        :type store_dir: str | None
+        """
+        self.repoid = repoid
+        self.filelists = filelists
+        self.excludes = tuple(excludes)
+        self._store_dir = store_dir or REPOMETA_DIR
+        self.path = os.path.join(self._store_dir, "{}-{}.sqlite".format(repoid, get_metadata_checksum(primary)))
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            self._build(primary)
+        else:
+            logger.debug("Using the already parsed metadata of the {} repository.".format(repoid))
+
+        # The actions may run in threads, see the --jobs option. All access
+        # to the connection is serialized through self._lock.
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+    def _build(self, primary):
+        """Parse the primary metadata into a new database."""
+        logger.info("Loading the metadata of the {} repository.".format(self.repoid))
+        files.mkdir_p(self._store_dir)
+        self._remove_outdated()
+
+        new_path = self.path + ".new"
+        if os.path.exists(new_path):
+            os.remove(new_path)
+
+        connection = sqlite3.connect(new_path)
+        try:
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+                cursor = connection.cursor()
+                for row, provides in _iter_primary(primary):
+                    cursor.execute("INSERT INTO packages VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)", row)
+                    pkgkey = cursor.lastrowid
+                    cursor.executemany("INSERT INTO provides VALUES (?, ?)", ((name, pkgkey) for name in provides))
+                for statement in _INDEXES:
+                    connection.execute(statement)
+        except (EnvironmentError, SyntaxError) as err:
+            # ElementTree.ParseError is a subclass of SyntaxError
+            connection.close()
+            os.remove(new_path)
+            raise RepoMetadataError(
+                "Unable to read the metadata of the {} repository from {}: {}".format(self.repoid, primary, err)
+            )
+        connection.close()
+
+        # Only complete databases are ever found under the final name
+        os.rename(new_path, self.path)
+
+    def _remove_outdated(self):
+        """Remove the databases of the previous versions of the repository metadata."""
+        for filename in os.listdir(self._store_dir):
+            match = _STORE_FILENAME.match(filename)
+            if match and match.group("repoid") == self.repoid:
+                os.remove(os.path.join(self._store_dir, filename))
+
+    @property
+    def has_filelists(self):
+        """Whether file queries can be answered, i.e. the file lists are either parsed already or downloaded."""
+        return bool(self.filelists) or self._filelists_loaded()
+
+    def _filelists_loaded(self):
+        with self._lock:
+            return self._is_filelists_loaded()
+
+    def _is_filelists_loaded(self):
+        return self._connection.execute("SELECT value FROM meta WHERE key = 'filelists'").fetchone() is not None
+
+    def _load_filelists(self):
+        """Parse the filelists metadata into the database unless that has been done already."""
+        with self._lock:
+            if self._is_filelists_loaded():
+                return
+
+            if not self.filelists:
+                raise RepoMetadataError(
+                    "The file lists of the {} repository have not been downloaded.".format(self.repoid)
+                )
+
+            logger.info("Loading the file lists of the {} repository.".format(self.repoid))
+            try:
+                with self._connection:
+                    pkgkeys = dict(self._connection.execute("SELECT pkgid, pkgkey FROM packages"))
+                    self._connection.executemany(
+                        "INSERT INTO files VALUES (?, ?)", _iter_filelists(self.filelists, pkgkeys)
+                    )
+                    self._connection.execute("CREATE INDEX files_path ON files (path)")
+                    self._connection.execute("INSERT INTO meta VALUES ('filelists', '1')")
+            except (EnvironmentError, SyntaxError) as err:
+                raise RepoMetadataError(
+                    "Unable to read the file lists of the {} repository from {}: {}".format(
+                        self.repoid, self.filelists, err
+                    )
+                )
+
+    def _query_packages(self, sql, params):
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        packages = [RepoPackage(*(tuple(row) + (self.repoid,))) for row in rows]
+        if self.excludes:
+            packages = [pkg for pkg in packages if not _is_excluded(pkg, self.excludes)]
+        return packages
+
+    def get_packages(self, pattern):
+        """Get the packages with a name matching a glob pattern."""
+        return self._query_packages(
+            "SELECT {} FROM packages p WHERE p.name GLOB ?".format(_PACKAGE_COLUMNS), (pattern,)
+        )
+
+    def get_packages_by_provide(self, name):
+        """Get the packages providing a capability or a file listed in the primary metadata."""
+        return self._query_packages(
+            "SELECT DISTINCT {} FROM packages p JOIN provides r ON r.pkgkey = p.pkgkey WHERE r.name = ?".format(
+                _PACKAGE_COLUMNS
+            ),
+            (name,),
+        )
+
+    def get_packages_by_file(self, pattern):
+        """Get the packages containing a file with a path matching a glob pattern."""
+        self._load_filelists()
+        return self._query_packages(
+            "SELECT DISTINCT {} FROM packages p JOIN files f ON f.pkgkey = p.pkgkey WHERE f.path GLOB ?".format(
+                _PACKAGE_COLUMNS
+            ),
+            (pattern,),
+        )
+
+    def get_files(self, package):
+        """Get the paths of the files of a package."""
+        self._load_filelists()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT f.path FROM files f JOIN packages p ON f.pkgkey = p.pkgkey"
+                " WHERE p.name = ? AND p.epoch = ? AND p.version = ? AND p.release = ? AND p.arch = ?",
+                (package.name, package.epoch, package.version, package.release, package.arch),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class RepoMetadata:
+    """
+    Query the packages available in a set of repositories.
+
+    The queries return a list of :class:`RepoPackage`, including all the
+    available versions of the packages from all the repositories.
+
+    Unlike repoquery, the queries return the packages of all architectures
+    unless the arches argument is passed, and do not apply the modular
+    filtering of dnf. The exclude option of each repository is honored. The
+    global exclude option is ignored, the same as with the
+    --setopt=exclude= option we pass to yum.
+    """
+
+    def __init__(self, stores):
+        """
+        :param stores: The parsed metadata of each of the repositories.
+        :type stores: list[RepoMetadataStore]
+        """
+        self._stores = stores
+
+    @property
+    def repoids(self):
+        return [store.repoid for store in self._stores]
+
+    @property
+    def has_filelists(self):
+        return all(store.has_filelists for store in self._stores)
+
+    def _query(self, method, arg, arches=None):
+        packages = []
+        for store in self._stores:
+            packages.extend(getattr(store, method)(arg))
+        if arches:
+            packages = [pkg for pkg in packages if pkg.arch in arches]
+        return packages
+
+    def get_packages(self, patterns, arches=None):
+        """
+        Get the packages by name.
+
+        :param patterns: Package names, which can contain glob characters.
+        :type patterns: list[str]
+        :param arches: Only return packages of these architectures.
+        :type arches: list[str] | None
+        :rtype: list[RepoPackage]
+        """
+        packages = []
+        for pattern in patterns:
+            packages.extend(self._query("get_packages", pattern, arches))
+        return packages
+
+    def get_latest(self, name, arches=None):
+        """
+        Get the most recent version of a package.
+
+        :return: The package or None if no repository provides it.
+        :rtype: RepoPackage | None
+        """
+        packages = self._query("get_packages", name, arches)
+        if not packages:
+            return None
+
+        return max(packages, key=cmp_to_key(lambda pkg1, pkg2: rpm.labelCompare(pkg1.evr, pkg2.evr)))
+
+    def get_packages_by_provide(self, name, arches=None):
+        """Get the packages providing a capability, e.g. 'config(bash)' or '/usr/bin/bash'."""
+        return self._query("get_packages_by_provide", name, arches)
+
+    def get_packages_by_file(self, pattern, arches=None):
+        """
+        Get the packages containing a file.
+
+        .. note::
+            The file lists of the repositories are parsed on the first call.
+
+        :param pattern: Path of the file, which can contain glob characters.
+        :type pattern: str
+        """
+        return self._query("get_packages_by_file", pattern, arches)
+
+    def get_files(self, packages):
+        """
+        Get the paths of the files of packages.
+
+        :param packages: Packages returned by the queries of this instance.
+        :type packages: list[RepoPackage]
+        :rtype: list[str]
+        """
+        stores = dict((store.repoid, store) for store in self._stores)
+        paths = []
+        for package in packages:
+            paths.extend(stores[package.repoid].get_files(package))
+        return paths
+
+    def close(self):
+        for store in self._stores:
+            store.close()
+
+
+def _download_yum_metadata(disable_repos, enable_repos, reposdir, releasever, filelists, skip_if_unavailable):
+    pkgmanager.misc.setup_locale(override_time=True)
+    base = pkgmanager.YumBase()
+    try:
+        base.conf.exclude = []
+        if reposdir:
+            base.conf.reposdir = [reposdir]
+        if releasever:
+            base.conf.yumvar["releasever"] = releasever
+
+        for pattern in disable_repos:
+            base.repos.disableRepo(pattern)
+        for pattern in enable_repos:
+            base.repos.enableRepo(pattern)
+
+        metadata_files = []
+        for repo in base.repos.listEnabled():
+            if skip_if_unavailable is not None:
+                repo.skip_if_unavailable = skip_if_unavailable
+            try:
+                metadata_files.append(
+                    RepoMetadataFiles(
+                        repo.id,
+                        repo.retrieveMD("primary"),
+                        repo.retrieveMD("filelists") if filelists else None,
+                        repo.exclude,
+                    )
+                )
+            except pkgmanager.Errors.YumBaseError as err:
+                if not repo.skip_if_unavailable:
+                    raise RepoMetadataError("Error getting repository data for {}: {}".format(repo.id, err))
+                logger.warning("Skipping the unavailable {} repository: {}".format(repo.id, err))
+        return metadata_files
+    finally:
+        base.close()
+
+
+def _download_dnf_metadata(disable_repos, enable_repos, reposdir, releasever, filelists, skip_if_unavailable):
+    base = pkgmanager.Base()
+    try:
+        base.conf.exclude = []
+        if reposdir:
+            base.conf.reposdir = [reposdir]
+        if releasever:
+            base.conf.substitutions["releasever"] = releasever
+        if filelists:
+            base.conf.optional_metadata_types = ["filelists"]
+
+        base.read_all_repos()
+        for pattern in disable_repos:
+            base.repos.get_matching(pattern).disable()
+        for pattern in enable_repos:
+            base.repos.get_matching(pattern).enable()
+
+        metadata_files = []
+        for repo in base.repos.iter_enabled():
+            if skip_if_unavailable is not None:
+                repo.skip_if_unavailable = skip_if_unavailable
+            try:
+                repo.load()
+            except pkgmanager.exceptions.RepoError as err:
+                if not repo.skip_if_unavailable:
+                    raise RepoMetadataError("Error getting repository data for {}: {}".format(repo.id, err))
+                logger.warning("Skipping the unavailable {} repository: {}".format(repo.id, err))
+                continue
+            metadata_files.append(
+                RepoMetadataFiles(
+                    repo.id,
+                    repo.get_metadata_path("primary"),
+                    repo.get_metadata_path("filelists") if filelists else None,
+                    repo.excludepkgs,
+                )
+            )
+        return metadata_files
+    finally:
+        base.close()
+
+
+def _download_metadata(*args):
+    """Download the metadata of the enabled repositories with yum or dnf.
+
+    :return: The local paths to the metadata of each enabled repository.
+    :rtype: list[RepoMetadataFiles]
+    """
+    if pkgmanager.TYPE == "yum":
+        return _download_yum_metadata(*args)
+    return _download_dnf_metadata(*args)
+
+
+# Registered when imported, see the registration of pkghandler._read_rpmdb.
+utils.child_process_worker.register(_download_metadata)
+
+
+def get_metadata_files(
+    disable_repos=None,
+    enable_repos=None,
+    reposdir=None,
+    releasever=None,
+    filelists=False,
+    skip_if_unavailable=None,
+):
+    """
+    Download the metadata of the enabled repositories.
+
+    The parameters are the same as the ones of :func:`get_repo_metadata`.
+
+    :raises RepoMetadataError: When the metadata of a repository cannot be
+        downloaded.
+    :return: The local paths to the metadata of each enabled repository.
+    :rtype: list[RepoMetadataFiles]
+    """
+    args = (list(disable_repos or ()), list(enable_repos or ()), reposdir, releasever, filelists, skip_if_unavailable)
+    # A daemonic child process is not allowed to spawn children of its own
+    # so download the metadata directly when we are already in one.
+    if multiprocessing.current_process().daemon:
+        return _download_metadata(*args)
+    return utils.run_as_child_process(_download_metadata)(*args) or []
+
+
+# One RepoMetadata per set of repository options. The lock of each key makes
+# sure the metadata is loaded only once when the checks run concurrently.
+_sessions = {}
+_session_locks = collections.defaultdict(threading.Lock)
+_sessions_lock = threading.Lock()
+
+
+def get_repo_metadata(
+    disable_repos=None,
+    enable_repos=None,
+    reposdir=None,
+    releasever=None,
+    filelists=False,
+    skip_if_unavailable=None,
+):
+    """
+    Get the packages available in the enabled repositories.
+
+    The repositories are configured the same way as with the yum command line
+    options of the same names. Calls with the same options share the same
+    instance so the metadata is downloaded and parsed at most once.
+
+    :param disable_repos: Patterns of repository IDs to disable, e.g. ['*'].
+    :type disable_repos: list[str] | None
+    :param enable_repos: Patterns of repository IDs to enable.
+    :type enable_repos: list[str] | None
+    :param reposdir: Directory with the repofiles to use instead of the
+        system ones.
+    :type reposdir: str | None
+    :param releasever: Value of the $releasever variable in the repofiles.
+        By default, it is determined by the package manager.
+    :type releasever: str | None
+    :param filelists: Whether to download the file lists as well. Needed for
+        the file queries.
+    :type filelists: bool
+    :param skip_if_unavailable: Override the skip_if_unavailable option of
+        the repositories.
+    :type skip_if_unavailable: bool | None
+
+    :raises RepoMetadataError: When the metadata of a repository cannot be
+        downloaded or read.
+    :rtype: RepoMetadata
+    """
+    key = (tuple(disable_repos or ()), tuple(enable_repos or ()), reposdir, releasever, skip_if_unavailable)
+    with _sessions_lock:
+        key_lock = _session_locks[key]
+
+    with key_lock:
+        session = _sessions.get(key)
+        if session is not None and (session.has_filelists or not filelists):
+            return session
+
+        metadata_files = get_metadata_files(
+            disable_repos, enable_repos, reposdir, releasever, filelists, skip_if_unavailable
+        )
+        session = RepoMetadata(
+            [RepoMetadataStore(*files_) for files_ in metadata_files]
+        )
+        _sessions[key] = session
+        return session
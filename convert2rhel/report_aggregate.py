@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Aggregate the pre-conversion assessment reports of many systems.
+
+This is the ``convert2rhel-report aggregate`` command. It is run on the
+assessment reports collected from a fleet of systems, not on the systems
+themselves, and summarizes which problems block the conversions, on how many
+systems and on which distributions.
+
+The reports are parsed by a pool of processes. Each process reduces a report
+to the few fields the summary needs so that only the counters of the summary
+grow with the number of reports, and only up to the number of distinct
+messages.
+
+This module is run where convert2rhel itself may not be able to run, it must
+only use the standard library.
+"""
+
+__metaclass__ = type
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+
+
+REPORT_FILENAME = "convert2rhel-pre-conversion.json"
+"""Name of the assessment report as written by convert2rhel."""
+
+PRE_CONVERSION_REPORT = "pre-conversion"
+"""The ``report`` field of the assessment reports, the other reports are not aggregated."""
+
+STATUS_CODE = {
+    "SUCCESS": 0,
+    "INFO": 25,
+    "WARNING": 51,
+    "SKIP": 101,
+    "OVERRIDABLE": 152,
+    "ERROR": 202,
+}
+"""The levels of the results as in :data:`convert2rhel.actions.STATUS_CODE`."""
+
+_STATUS_NAME_FROM_CODE = dict((value, key) for key, value in STATUS_CODE.items())
+"""The names of the levels of the results by their code."""
+
+AGGREGATE_FORMAT_VERSION = "1.0"
+"""Version of the format of the json summary."""
+
+UNKNOWN_DISTRO = "unknown"
+"""Distribution of the reports written before the system was recorded in them."""
+
+DEFAULT_TOP_INHIBITORS = 10
+"""How many of the most common inhibitors are listed by default."""
+
+MAX_EXAMPLE_HOSTS = 10
+"""How many systems are named for each remediation, the rest are only counted."""
+
+MAX_UNREADABLE_EXAMPLES = 10
+"""How many of the reports which could not be read are named, the rest are only counted."""
+
+REPORTS_PER_TASK = 64
+"""How many reports are sent to a process of the pool at once."""
+
+HostSummary = collections.namedtuple("HostSummary", ["host", "path", "distro", "status", "findings", "error"])
+"""The fields of one assessment report the summary needs.
+
+:findings: The messages of WARNING level or higher as tuples of the message
+    id, level code, title and remediations.
+:error: Why the report could not be read, None if it could.
+"""
+
+
+def get_host_name(path):
+    """Name the system a report was collected from.
+
+    The reports are usually collected either to a directory per system, keeping
+    the name convert2rhel gave to them, or to a single directory, renamed after
+    the system.
+
+    :param path: Path of the assessment report.
+    :type path: str
+    :rtype: str
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    if filename == REPORT_FILENAME:
+        return os.path.basename(directory)
+    return os.path.splitext(filename)[0]
+
+
+def find_reports(paths):
+    """Find the assessment reports to aggregate.
+
+    :param paths: Paths of reports or of directories searched for the reports
+        named :data:`REPORT_FILENAME` in them.
+    :type paths: Iterable[str]
+    :return: The paths of the reports, found lazily.
+    :rtype: Iterator[str]
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            # Walk the directories in a predictable order
+            dirnames.sort()
+            if REPORT_FILENAME in filenames:
+                yield os.path.join(dirpath, REPORT_FILENAME)
+
+
+def _get_distro(envelope):
+    system = envelope.get("system")
+    if not system:
+        return UNKNOWN_DISTRO
+    return "{} {}".format(system["name"], system["version"])
+
+
+def _get_findings(envelope):
+    """Get the messages of WARNING level or higher of a report.
+
+    The result of an action counts as one of its messages.
+
+    :return: The message id, level code, title and remediations of each message.
+    :rtype: list[tuple[str, int, str, str]]
+    """
+    messages = {}
+    for action_id, action in envelope["actions"].items():
+        for message in [action["result"]] + action["messages"]:
+            messages[(action_id, message["id"])] = message
+
+    findings = []
+    for (action_id, message_id), message in messages.items():
+        level = STATUS_CODE[message["level"]]
+        if level >= STATUS_CODE["WARNING"]:
+            findings.append(("{}::{}".format(action_id, message_id), level, message["title"], message["remediations"]))
+    return findings
+
+
+def summarize_report(path):
+    """Reduce an assessment report to the fields the summary needs.
+
+    Run in the processes of the pool, only the returned summary is sent back.
+
+    :param path: Path of the assessment report.
+    :type path: str
+    :return: The summary of the report, None if it is another report of
+        convert2rhel, like the post-conversion report.
+    :rtype: HostSummary | None
+    """
+    host = get_host_name(path)
+
+    try:
+        with open(path) as f:
+            envelope = json.load(f)
+
+        # The reports written before the report field was added are taken for
+        # assessment reports.
+        if envelope.get("report", PRE_CONVERSION_REPORT) != PRE_CONVERSION_REPORT:
+            return None
+
+        findings = _get_findings(envelope)
+        return HostSummary(host, path, _get_distro(envelope), envelope["status"], findings, None)
+    except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        return HostSummary(host, path, None, None, None, "{}: {}".format(type(e).__name__, e))
+
+
+class AssessmentAggregate:
+    """Counters summarizing the assessment reports of many systems."""
+
+    def __init__(self, max_example_hosts=MAX_EXAMPLE_HOSTS):
+        self.max_example_hosts = max_example_hosts
+        self.hosts = 0
+        self.statuses = collections.Counter()
+        # Message id -> {"level": highest level code, "title": str, "hosts": int}
+        self.messages = {}
+        # Distribution -> {"hosts": int, "inhibited": int, "statuses": Counter, "messages": Counter}
+        self.distros = {}
+        # Message id -> {"remediations": str, "hosts": int, "example_hosts": [str]}
+        self.remediations = {}
+        self.unreadable = 0
+        self.unreadable_examples = []
+
+    def add(self, summary):
+        """Count one assessment report.
+
+        :param summary: The summary of the report, the reports which are not
+            assessment reports are not counted.
+        :type summary: HostSummary | None
+        """
+        if summary is None:
+            return
+
+        if summary.error:
+            self.unreadable += 1
+            if len(self.unreadable_examples) < MAX_UNREADABLE_EXAMPLES:
+                self.unreadable_examples.append({"path": summary.path, "error": summary.error})
+            return
+
+        self.hosts += 1
+        self.statuses[summary.status] += 1
+
+        distro = self.distros.setdefault(
+            summary.distro,
+            {"hosts": 0, "inhibited": 0, "statuses": collections.Counter(), "messages": collections.Counter()},
+        )
+        distro["hosts"] += 1
+        distro["statuses"][summary.status] += 1
+        if STATUS_CODE.get(summary.status, 0) >= STATUS_CODE["SKIP"]:
+            distro["inhibited"] += 1
+
+        for message_id, level, title, remediations in summary.findings:
+            message = self.messages.setdefault(message_id, {"level": level, "title": title, "hosts": 0})
+            message["level"] = max(message["level"], level)
+            message["hosts"] += 1
+            distro["messages"][message_id] += 1
+
+            if not remediations:
+                continue
+
+            # The remediations of the first system stand for the others,
+            # they only differ in the details of the particular system.
+            remediation = self.remediations.setdefault(
+                message_id, {"remediations": remediations, "hosts": 0, "example_hosts": []}
+            )
+            remediation["hosts"] += 1
+            if len(remediation["example_hosts"]) < self.max_example_hosts:
+                remediation["example_hosts"].append(summary.host)
+
+    def to_dict(self, top=DEFAULT_TOP_INHIBITORS):
+        """Output the summary as a json serializable dictionary.
+
+        The messages, inhibitors and remediations are sorted from the ones
+        affecting the most systems.
+
+        :param top: How many of the most common inhibitors to list.
+        :type top: int
+        :rtype: dict
+        """
+
+        def by_hosts(item):
+            return (-item["hosts"], item["id"])
+
+        messages = sorted(
+            (
+                {
+                    "id": message_id,
+                    "level": _STATUS_NAME_FROM_CODE[message["level"]],
+                    "title": message["title"],
+                    "hosts": message["hosts"],
+                }
+                for message_id, message in self.messages.items()
+            ),
+            key=by_hosts,
+        )
+        inhibitors = [message for message in messages if STATUS_CODE[message["level"]] >= STATUS_CODE["SKIP"]]
+        remediations = sorted(
+            (dict(remediation, id=message_id) for message_id, remediation in self.remediations.items()),
+            key=by_hosts,
+        )
+
+        return {
+            "format_version": AGGREGATE_FORMAT_VERSION,
+            "hosts": self.hosts,
+            "unreadable": {"count": self.unreadable, "examples": self.unreadable_examples},
+            "statuses": dict(self.statuses),
+            "distros": dict(
+                (
+                    name,
+                    {
+                        "hosts": distro["hosts"],
+                        "inhibited": distro["inhibited"],
+                        "statuses": dict(distro["statuses"]),
+                        "messages": dict(distro["messages"]),
+                    },
+                )
+                for name, distro in self.distros.items()
+            ),
+            "messages": messages,
+            "top_inhibitors": inhibitors[:top],
+            "remediations": remediations,
+        }
+
+
+def aggregate_reports(paths, jobs=None, max_example_hosts=MAX_EXAMPLE_HOSTS):
+    """Summarize the assessment reports of many systems.
+
+    :param paths: Paths of the assessment reports.
+    :type paths: Iterable[str]
+    :param jobs: Number of processes parsing the reports. Defaults to the
+        number of CPUs, the reports are parsed in this process if it is 1.
+    :type jobs: int | None
+    :param max_example_hosts: How many systems to name for each remediation.
+    :type max_example_hosts: int
+    :rtype: AssessmentAggregate
+    """
+    aggregate = AssessmentAggregate(max_example_hosts)
+
+    if jobs == 1:
+        for path in paths:
+            aggregate.add(summarize_report(path))
+        return aggregate
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for summary in pool.imap_unordered(summarize_report, paths, REPORTS_PER_TASK):
+            aggregate.add(summary)
+    finally:
+        pool.close()
+        pool.join()
+
+    return aggregate
+
+
+def _format_heading(title):
+    highlight = "=" * 10
+    return "{highlight} {title} {highlight}".format(highlight=highlight, title=title)
+
+
+def _format_counts(counts, indent="    "):
+    return ["{}{}: {}".format(indent, name, count) for name, count in sorted(counts.items(), key=lambda c: -c[1])]
+
+
+def summary_as_txt(summary):
+    """Format the summary of the assessment reports for reading.
+
+    :param summary: The summary as returned by :meth:`AssessmentAggregate.to_dict`.
+    :type summary: dict
+    :rtype: str
+    """
+    lines = [_format_heading("Assessed systems"), "Systems: {}".format(summary["hosts"])]
+    lines.extend(_format_counts(summary["statuses"]))
+
+    if summary["unreadable"]["count"]:
+        lines.append("Unreadable reports: {}".format(summary["unreadable"]["count"]))
+        lines.extend("    {path}: {error}".format(**example) for example in summary["unreadable"]["examples"])
+
+    lines.extend(["", _format_heading("Systems per distribution")])
+    for name, distro in sorted(summary["distros"].items(), key=lambda d: (-d[1]["hosts"], d[0])):
+        lines.append("{}: {} systems, {} inhibited".format(name, distro["hosts"], distro["inhibited"]))
+        lines.extend(_format_counts(distro["statuses"]))
+
+    lines.extend(["", _format_heading("Top inhibitors")])
+    lines.extend(
+        "{hosts} systems - ({level}) {id} - {title}".format(**inhibitor) for inhibitor in summary["top_inhibitors"]
+    )
+    if not summary["top_inhibitors"]:
+        lines.append("No inhibitors found!")
+
+    lines.extend(["", _format_heading("Messages")])
+    lines.extend("{hosts} systems - ({level}) {id} - {title}".format(**message) for message in summary["messages"])
+
+    lines.extend(["", _format_heading("Systems per remediation")])
+    for remediation in summary["remediations"]:
+        lines.append("{hosts} systems - {id}".format(**remediation))
+        lines.append("    Remediations: {}".format(remediation["remediations"]))
+        example_hosts = ", ".join(remediation["example_hosts"])
+        if remediation["hosts"] > len(remediation["example_hosts"]):
+            example_hosts += ", ..."
+        lines.append("    Systems: {}".format(example_hosts))
+
+    return "\n".join(lines) + "\n"
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog="convert2rhel-report", description="Work with the assessment reports convert2rhel analyze writes."
+    )
+    subparsers = parser.add_subparsers(title="Subcommands", dest="command", metavar="{aggregate}")
+    subparsers.required = True
+
+    aggregate_parser = subparsers.add_parser(
+        "aggregate",
+        help="Summarize the assessment reports collected from many systems: how many systems each message and"
+        " inhibitor affects, per distribution, and which systems need each remediation.",
+    )
+    aggregate_parser.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="An assessment report or a directory searched for the reports named "
+        + REPORT_FILENAME
+        + " in it. A report with this name is named after the directory it is in, any other after the file.",
+    )
+    aggregate_parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Parse the reports in N processes. The default is the number of CPUs.",
+    )
+    aggregate_parser.add_argument(
+        "--top",
+        metavar="N",
+        type=int,
+        default=DEFAULT_TOP_INHIBITORS,
+        help="List the N inhibitors affecting the most systems. The default is {}.".format(DEFAULT_TOP_INHIBITORS),
+    )
+    aggregate_parser.add_argument(
+        "--json-output",
+        metavar="FILE",
+        help="Write the summary as json to FILE.",
+    )
+    aggregate_parser.add_argument(
+        "--txt-output",
+        metavar="FILE",
+        help="Write the summary as text to FILE. The text is printed if no output file is given.",
+    )
+    return parser
+
+
+def run(argv=None):
+    """Entry point of the convert2rhel-report command.
+
+    :param argv: The command line arguments, defaults to the ones of the process.
+    :type argv: list[str] | None
+    :return: The exit code.
+    :rtype: int
+    """
+    args = _get_parser().parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        sys.stderr.write("convert2rhel-report: error: --jobs must be at least 1.\n")
+        return 2
+
+    summary = aggregate_reports(find_reports(args.paths), jobs=args.jobs).to_dict(top=args.top)
+
+    if args.json_output:
+        with open(args.json_output, "w") as f:
+            json.dump(summary, f, indent=4)
+    if args.txt_output:
+        with open(args.txt_output, "w") as f:
+            f.write(summary_as_txt(summary))
+    if not args.json_output and not args.txt_output:
+        sys.stdout.write(summary_as_txt(summary))
+
+    return 0
@@ -0,0 +1,690 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Verification of the installed packages, equivalent to ``rpm -Va --nodeps``.
+
+The files of each installed package are compared with the metadata stored in
+the rpmdb the same way ``rpm -V`` does it (see ``rpmVerifyFile()`` in rpm's
+``lib/verify.c``) and the results are printed in the very same format so the
+output can be parsed by :class:`convert2rhel.actions.pre_ponr_changes.backup_system.BackupPackageFiles`
+and compared by :class:`convert2rhel.actions.post_conversion.modified_rpm_files_diff.ModifiedRPMFilesDiff`.
+
+The packages are verified in a pool of worker processes and the results are
+written to the output file in the rpmdb order as soon as they are available.
+"""
+
+__metaclass__ = type
+
+import errno
+import grp
+import hashlib
+import json
+import multiprocessing
+import os
+import pwd
+import signal
+import stat
+
+from collections import namedtuple
+
+import rpm
+import six
+
+from convert2rhel import pkghandler, utils
+from convert2rhel.logger import root_logger
+from convert2rhel.utils import files
+
+
+logger = root_logger.getChild(__name__)
+
+# File attributes, see rpmfileAttrs_e in rpm's rpmfiles.h
+RPMFILE_CONFIG = 1 << 0
+RPMFILE_DOC = 1 << 1
+RPMFILE_MISSINGOK = 1 << 3
+RPMFILE_NOREPLACE = 1 << 4
+RPMFILE_SPECFILE = 1 << 5
+RPMFILE_GHOST = 1 << 6
+RPMFILE_LICENSE = 1 << 7
+RPMFILE_README = 1 << 8
+RPMFILE_ARTIFACT = 1 << 12
+
+# Characters rpm uses to show the file attributes, in the order it checks them
+_FILE_ATTR_CHARS = (
+    (RPMFILE_DOC, "d"),
+    (RPMFILE_CONFIG, "c"),
+    (RPMFILE_SPECFILE, "s"),
+    (RPMFILE_MISSINGOK, "m"),
+    (RPMFILE_NOREPLACE, "n"),
+    (RPMFILE_GHOST, "g"),
+    (RPMFILE_LICENSE, "l"),
+    (RPMFILE_README, "r"),
+    (RPMFILE_ARTIFACT, "a"),
+)
+
+# File states, see rpmfileState_e in rpm's rpmfiles.h
+RPMFILE_STATE_NORMAL = 0
+
+# Verification flags and results, see rpmVerifyAttrs_e in rpm's rpmfiles.h
+RPMVERIFY_FILEDIGEST = 1 << 0
+RPMVERIFY_FILESIZE = 1 << 1
+RPMVERIFY_LINKTO = 1 << 2
+RPMVERIFY_USER = 1 << 3
+RPMVERIFY_GROUP = 1 << 4
+RPMVERIFY_MTIME = 1 << 5
+RPMVERIFY_MODE = 1 << 6
+RPMVERIFY_RDEV = 1 << 7
+RPMVERIFY_CAPS = 1 << 8
+RPMVERIFY_READLINKFAIL = 1 << 28
+RPMVERIFY_READFAIL = 1 << 29
+RPMVERIFY_LSTATFAIL = 1 << 30
+
+# Attributes that cannot be verified for anything but regular files
+_CONTENT_ATTRS = RPMVERIFY_FILEDIGEST | RPMVERIFY_FILESIZE | RPMVERIFY_MTIME | RPMVERIFY_LINKTO | RPMVERIFY_CAPS
+
+# Digest algorithms, see pgpHashAlgo_e in rpm's rpmpgp.h
+_DIGEST_ALGORITHMS = {
+    1: "md5",
+    2: "sha1",
+    8: "sha256",
+    9: "sha384",
+    10: "sha512",
+    11: "sha224",
+}
+_DEFAULT_DIGEST_ALGORITHM = 1
+
+# Number of packages handed to a worker process at once
+_CHUNK_SIZE = 8
+
+# Results of the last verification, used to verify only the changed files
+# after the conversion
+RPM_VA_CACHE_FILE = os.path.join(utils.TMP_DIR, "rpm_va_cache.jsonl")
+
+# Metadata of a single file of a package as stored in the rpmdb
+RpmFile = namedtuple(
+    "RpmFile",
+    ("path", "mode", "size", "mtime", "digest", "linkto", "user", "group", "flags", "verify_flags", "state", "rdev"),
+)
+
+
+class _UseRpmVerify(Exception):
+    """Raised when a package needs checks only rpm itself can do (verify scripts, file capabilities, ...)."""
+
+
+def _to_native_str(value):
+    """Convert the bytes returned by some versions of the rpm bindings to str."""
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode("utf-8")
+    return value
+
+
+def _to_int(value):
+    """Convert a value of an RPM_CHAR_TYPE tag to int."""
+    if isinstance(value, (bytes, six.text_type)):
+        return ord(value)
+    return value
+
+
+def _tag(header, tag_name, default=None):
+    """
+    Read a tag from a header.
+
+    :param header: The rpm header.
+    :type header: rpm.hdr
+    :param tag_name: Name of the RPMTAG_* constant.
+    :type tag_name: str
+    :return: The value of the tag or the default if the tag is not known to
+        the rpm bindings or is not present in the header.
+    """
+    tag = getattr(rpm, tag_name, None)
+    if tag is None:
+        return default
+
+    value = header[tag]
+    if value is None or value == []:
+        return default
+    return value
+
+
+def get_header_files(header):
+    """
+    Get the metadata of the files of a package.
+
+    :param header: The rpm header of an installed package.
+    :type header: rpm.hdr
+    :return: The files in the order rpm verifies them.
+    :rtype: list[RpmFile]
+    """
+    basenames = _tag(header, "RPMTAG_BASENAMES", [])
+    if not basenames:
+        return []
+
+    count = len(basenames)
+    dirnames = _tag(header, "RPMTAG_DIRNAMES", [])
+    dirindexes = _tag(header, "RPMTAG_DIRINDEXES", [])
+    sizes = _tag(header, "RPMTAG_LONGFILESIZES") or _tag(header, "RPMTAG_FILESIZES", [0] * count)
+    states = _tag(header, "RPMTAG_FILESTATES", [RPMFILE_STATE_NORMAL] * count)
+    digests = _tag(header, "RPMTAG_FILEDIGESTS") or _tag(header, "RPMTAG_FILEMD5S", [""] * count)
+    # rpm verifies all attributes of files without verify flags
+    verify_flags = _tag(header, "RPMTAG_FILEVERIFYFLAGS", [-1] * count)
+    modes = header[rpm.RPMTAG_FILEMODES]
+    mtimes = header[rpm.RPMTAG_FILEMTIMES]
+    linktos = header[rpm.RPMTAG_FILELINKTOS]
+    users = header[rpm.RPMTAG_FILEUSERNAME]
+    groups = header[rpm.RPMTAG_FILEGROUPNAME]
+    file_flags = header[rpm.RPMTAG_FILEFLAGS]
+    rdevs = header[rpm.RPMTAG_FILERDEVS]
+
+    files = []
+    for index in range(count):
+        files.append(
+            RpmFile(
+                path=_to_native_str(dirnames[dirindexes[index]]) + _to_native_str(basenames[index]),
+                mode=modes[index] & 0xFFFF,
+                size=sizes[index],
+                mtime=mtimes[index],
+                digest=_to_native_str(digests[index]).lower(),
+                linkto=_to_native_str(linktos[index]),
+                user=_to_native_str(users[index]),
+                group=_to_native_str(groups[index]),
+                flags=file_flags[index],
+                verify_flags=verify_flags[index] & 0xFFFFFFFF,
+                state=_to_int(states[index]),
+                rdev=rdevs[index] & 0xFFFF,
+            )
+        )
+
+    return files
+
+
+def file_attr_char(flags):
+    """
+    Get the character rpm -V shows for the attributes of a file.
+
+    :param flags: The file attributes (RPMTAG_FILEFLAGS).
+    :type flags: int
+    :return: The first attribute in the rpm order (``c`` for %config, ``d``
+        for %doc, ...) or a space.
+    :rtype: str
+    """
+    for attr, char in _FILE_ATTR_CHARS:
+        if flags & attr:
+            return char
+    return " "
+
+
+def verify_string(result):
+    """
+    Format the verification result the way rpm -V does it, e.g. ``S.5....T.``.
+
+    :param result: Bitmask of RPMVERIFY_* results.
+    :type result: int
+    :rtype: str
+    """
+
+    def _verify(attr, char):
+        return char if result & attr else "."
+
+    return "".join(
+        (
+            _verify(RPMVERIFY_FILESIZE, "S"),
+            _verify(RPMVERIFY_MODE, "M"),
+            "?" if result & RPMVERIFY_READFAIL else _verify(RPMVERIFY_FILEDIGEST, "5"),
+            _verify(RPMVERIFY_RDEV, "D"),
+            "?" if result & RPMVERIFY_READLINKFAIL else _verify(RPMVERIFY_LINKTO, "L"),
+            _verify(RPMVERIFY_USER, "U"),
+            _verify(RPMVERIFY_GROUP, "G"),
+            _verify(RPMVERIFY_MTIME, "T"),
+            _verify(RPMVERIFY_CAPS, "P"),
+        )
+    )
+
+
+def _file_digest(path, algorithm):
+    """
+    Compute the digest of a file.
+
+    :return: 2-tuple with the hexadecimal digest and the number of bytes read.
+    :rtype: tuple[str, int]
+    """
+    try:
+        digest = hashlib.new(algorithm)
+    except ValueError:
+        # The algorithm is not available, e.g. md5 in FIPS mode
+        raise _UseRpmVerify("Digest algorithm {} is not available.".format(algorithm))
+
+    size = 0
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return digest.hexdigest(), size
+
+
+def _has_extended_acl(path):
+    """Whether the file has an access ACL that cannot be expressed by its mode bits."""
+    # os.getxattr() is not available on Python 2
+    if not hasattr(os, "getxattr"):
+        return False
+
+    try:
+        os.getxattr(path, "system.posix_acl_access", follow_symlinks=False)
+    except (OSError, IOError):
+        return False
+
+    # The kernel does not store an ACL that is equivalent to the mode bits
+    return True
+
+
+class _IdCache:
+    """Cache of the user and group database lookups done while verifying the file owners."""
+
+    def __init__(self):
+        self._names = {}
+        self._ids = {}
+
+    def _lookup(self, cache, key, func):
+        if key not in cache:
+            try:
+                cache[key] = func(key)
+            except KeyError:
+                cache[key] = None
+        return cache[key]
+
+    def owner_matches(self, name, st_id, is_group=False):
+        """
+        Whether the owner recorded in the rpmdb matches the owner of the file
+        either by name or by id.
+        """
+        if is_group:
+            current_name = self._lookup(self._names, ("g", st_id), lambda key: grp.getgrgid(key[1]).gr_name)
+            expected_id = self._lookup(self._ids, ("g", name), lambda key: grp.getgrnam(key[1]).gr_gid)
+        else:
+            current_name = self._lookup(self._names, ("u", st_id), lambda key: pwd.getpwuid(key[1]).pw_name)
+            expected_id = self._lookup(self._ids, ("u", name), lambda key: pwd.getpwnam(key[1]).pw_uid)
+
+        return current_name == name or expected_id == st_id
+
+
+def verify_file(rpm_file, digest_algorithm=_DEFAULT_DIGEST_ALGORITHM, id_cache=None):
+    """
+    Verify a single file of a package.
+
+    This mirrors rpmVerifyFile() from rpm's lib/verify.c.
+
+    :param rpm_file: Metadata of the file from the rpmdb.
+    :type rpm_file: RpmFile
+    :param digest_algorithm: The RPMTAG_FILEDIGESTALGO of the package.
+    :type digest_algorithm: int
+    :param id_cache: Cache for the user and group lookups.
+    :type id_cache: _IdCache | None
+    :return: 2-tuple with the bitmask of RPMVERIFY_* results and, when the
+        file could not be lstat'ed, the errno of the failure (otherwise None).
+    :rtype: tuple[int, int | None]
+    """
+    if rpm_file.state != RPMFILE_STATE_NORMAL:
+        return 0, None
+
+    try:
+        st = os.lstat(rpm_file.path)
+    except OSError as err:
+        return RPMVERIFY_LSTATFAIL, err.errno
+
+    flags = rpm_file.verify_flags
+    if stat.S_ISDIR(st.st_mode) or stat.S_ISFIFO(st.st_mode) or stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+        flags &= ~_CONTENT_ATTRS
+    elif stat.S_ISLNK(st.st_mode):
+        flags &= ~((_CONTENT_ATTRS & ~RPMVERIFY_LINKTO) | RPMVERIFY_MODE)
+    else:
+        flags &= ~RPMVERIFY_LINKTO
+
+    # Content checks of %ghost files are meaningless
+    if rpm_file.flags & RPMFILE_GHOST:
+        flags &= ~(RPMVERIFY_FILEDIGEST | RPMVERIFY_FILESIZE | RPMVERIFY_MTIME | RPMVERIFY_LINKTO)
+
+    result = 0
+    st_size = st.st_size
+
+    if flags & RPMVERIFY_FILEDIGEST:
+        if rpm_file.digest:
+            algorithm = _DIGEST_ALGORITHMS.get(digest_algorithm)
+            if algorithm is None:
+                raise _UseRpmVerify("Unknown digest algorithm {}.".format(digest_algorithm))
+            try:
+                digest, st_size = _file_digest(rpm_file.path, algorithm)
+            except (OSError, IOError):
+                result |= RPMVERIFY_READFAIL | RPMVERIFY_FILEDIGEST
+            else:
+                if digest != rpm_file.digest:
+                    result |= RPMVERIFY_FILEDIGEST
+        else:
+            result |= RPMVERIFY_FILEDIGEST
+
+    if flags & RPMVERIFY_LINKTO:
+        try:
+            linkto = os.readlink(rpm_file.path)
+        except OSError:
+            result |= RPMVERIFY_READLINKFAIL | RPMVERIFY_LINKTO
+        else:
+            if linkto != rpm_file.linkto:
+                result |= RPMVERIFY_LINKTO
+
+    if flags & RPMVERIFY_FILESIZE and st_size != rpm_file.size:
+        result |= RPMVERIFY_FILESIZE
+
+    if flags & RPMVERIFY_MODE:
+        metamode = rpm_file.mode
+        filemode = st.st_mode & 0xFFFF
+        # Comparing the type of %ghost files is meaningless, but perms are OK
+        if rpm_file.flags & RPMFILE_GHOST:
+            metamode &= ~0xF000
+            filemode &= ~0xF000
+        if metamode != filemode or _has_extended_acl(rpm_file.path):
+            result |= RPMVERIFY_MODE
+
+    if flags & RPMVERIFY_RDEV:
+        if stat.S_ISCHR(rpm_file.mode) != stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(rpm_file.mode) != stat.S_ISBLK(
+            st.st_mode
+        ):
+            result |= RPMVERIFY_RDEV
+        elif (stat.S_ISCHR(rpm_file.mode) or stat.S_ISBLK(rpm_file.mode)) and (st.st_rdev & 0xFFFF) != rpm_file.rdev:
+            result |= RPMVERIFY_RDEV
+
+    if flags & RPMVERIFY_MTIME and int(st.st_mtime) != rpm_file.mtime:
+        result |= RPMVERIFY_MTIME
+
+    id_cache = id_cache or _IdCache()
+    if flags & RPMVERIFY_USER and not id_cache.owner_matches(rpm_file.user, st.st_uid):
+        result |= RPMVERIFY_USER
+
+    if flags & RPMVERIFY_GROUP and not id_cache.owner_matches(rpm_file.group, st.st_gid, is_group=True):
+        result |= RPMVERIFY_GROUP
+
+    return result, None
+
+
+def format_result(rpm_file, result, lstat_errno=None):
+    """
+    Format the verification result of a file as a line of the rpm -V output.
+
+    :param rpm_file: The verified file.
+    :type rpm_file: RpmFile
+    :param result: Result of :func:`verify_file`.
+    :type result: int
+    :param lstat_errno: errno of the failed lstat, as returned by :func:`verify_file`.
+    :type lstat_errno: int | None
+    :return: The line without the trailing newline or None if rpm does not
+        print anything for the file.
+    :rtype: str | None
+    """
+    attr_char = file_attr_char(rpm_file.flags)
+
+    if result & RPMVERIFY_LSTATFAIL:
+        # Missing %ghost and %missingok files are reported only in verbose mode
+        if rpm_file.flags & (RPMFILE_MISSINGOK | RPMFILE_GHOST):
+            return None
+
+        line = "missing   {} {}".format(attr_char, rpm_file.path)
+        if lstat_errno is not None and lstat_errno != errno.ENOENT:
+            line += " ({})".format(os.strerror(lstat_errno))
+        return line
+
+    if result:
+        return "{}  {} {}".format(verify_string(result), attr_char, rpm_file.path)
+
+    return None
+
+
+def _stat_snapshot(path):
+    """
+    Get the values that change whenever a file is modified.
+
+    The mode and owner are included as the ctime resolution may not be fine
+    enough to tell apart changes done right after the verification.
+
+    :return: The inode, size, mtime, ctime, mode, uid and gid of the file or
+        None if the file cannot be lstat'ed.
+    :rtype: list | None
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_size, st.st_mtime, st.st_ctime, st.st_mode, st.st_uid, st.st_gid]
+
+
+def verify_header_files(ts, header, id_cache=None, cached_files=None):
+    """
+    Verify all files of an installed package.
+
+    :param ts: Transaction set used to look up the owners of a file.
+    :type ts: rpm.TransactionSet
+    :param header: The rpm header of the package.
+    :type header: rpm.hdr
+    :param id_cache: Cache for the user and group lookups.
+    :type id_cache: _IdCache | None
+    :param cached_files: Results of a previous verification of the same
+        package, see :func:`load_cache`. Files which did not change since
+        then are not verified again.
+    :type cached_files: dict[str, tuple[list | None, str | None]] | None
+    :raises _UseRpmVerify: When the package has checks that can be done
+        only by rpm itself.
+    :return: 3-tuples with the path of each file, the snapshot of its stat
+        taken before the file was verified and the line rpm -V prints for the
+        file (or None).
+    :rtype: list[tuple[str, list | None, str | None]]
+    """
+    if _tag(header, "RPMTAG_VERIFYSCRIPT"):
+        raise _UseRpmVerify("The package has a verify script.")
+    if any(_tag(header, "RPMTAG_FILECAPS", [])):
+        raise _UseRpmVerify("The package has files with capabilities.")
+
+    digest_algorithm = _tag(header, "RPMTAG_FILEDIGESTALGO", _DEFAULT_DIGEST_ALGORITHM)
+    id_cache = id_cache or _IdCache()
+    cached_files = cached_files or {}
+
+    results = []
+    for rpm_file in get_header_files(header):
+        snapshot = _stat_snapshot(rpm_file.path)
+
+        cached = cached_files.get(rpm_file.path)
+        if snapshot is not None and cached is not None and cached[0] == snapshot:
+            results.append((rpm_file.path, snapshot, cached[1]))
+            continue
+
+        result, lstat_errno = verify_file(rpm_file, digest_algorithm, id_cache)
+
+        # Filter out timestamp differences of files shared with other packages
+        if result & RPMVERIFY_MTIME and not result & RPMVERIFY_LSTATFAIL:
+            if ts.dbMatch("basenames", rpm_file.path).count() > 1:
+                result &= ~RPMVERIFY_MTIME
+
+        results.append((rpm_file.path, snapshot, format_result(rpm_file, result, lstat_errno)))
+
+    return results
+
+
+def verify_header(ts, header, id_cache=None):
+    """
+    Verify all files of an installed package.
+
+    :param ts: Transaction set used to look up the owners of a file.
+    :type ts: rpm.TransactionSet
+    :param header: The rpm header of the package.
+    :type header: rpm.hdr
+    :param id_cache: Cache for the user and group lookups.
+    :type id_cache: _IdCache | None
+    :raises _UseRpmVerify: When the package has checks that can be done
+        only by rpm itself.
+    :return: The lines rpm -V prints for the package.
+    :rtype: list[str]
+    """
+    return [line for _, _, line in verify_header_files(ts, header, id_cache) if line is not None]
+
+
+def _package_key(header):
+    """
+    Get the key under which the results of a package are cached.
+
+    The install time is part of the key so that a package replaced by one
+    with the same NEVRA (e.g. during the conversion) is verified again.
+    """
+    return _to_native_str(
+        header.sprintf("%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH} %{INSTALLTIME}")
+    )
+
+
+def load_cache(cache_file):
+    """
+    Load the results of a previous verification.
+
+    :param cache_file: Path to the cache written by :func:`write_rpm_va`.
+    :type cache_file: str
+    :return: The results of each package indexed by the package key and the
+        file path. An empty dict if the cache cannot be read.
+    :rtype: dict[str, dict[str, tuple[list | None, str | None]]]
+    """
+    cache = {}
+    try:
+        with open(cache_file, "r") as handler:
+            for entry in handler:
+                package = json.loads(entry)
+                cache[package["package"]] = dict(
+                    (path, (snapshot, _to_output_str(line))) for path, snapshot, line in package["files"]
+                )
+    except (IOError, OSError, ValueError, KeyError) as e:
+        logger.debug("Unable to load the verification cache {}: {}".format(cache_file, e))
+        return {}
+
+    return cache
+
+
+def _to_output_str(value):
+    """Convert the unicode strings loaded from JSON to str on Python 2."""
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode("utf-8")
+    return value
+
+
+# State of a worker process of the verification pool
+_worker_ts = None
+_worker_id_cache = None
+_worker_cache = None
+
+
+def _init_worker(cache=None):
+    """Prepare a worker process of the verification pool."""
+    global _worker_ts, _worker_id_cache, _worker_cache
+
+    # The main process takes care of SIGINT and terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_ts = rpm.TransactionSet()
+    _worker_id_cache = _IdCache()
+    _worker_cache = cache or {}
+
+
+def _verify_instance(instance):
+    """
+    Verify the package stored under the given rpmdb instance number.
+
+    :return: 3-tuple with the key of the package, the lines rpm -V prints for
+        the package and the results of each file to be cached (None if the
+        package was verified by rpm itself).
+    :rtype: tuple[str, list[str], list | None]
+    """
+    for header in _worker_ts.dbMatch(rpm.RPMDBI_PACKAGES, instance):
+        key = _package_key(header)
+        try:
+            results = verify_header_files(_worker_ts, header, _worker_id_cache, _worker_cache.get(key))
+        except _UseRpmVerify:
+            nvra = _to_native_str(header.sprintf("%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}"))
+            if nvra.endswith(".(none)"):
+                nvra = nvra[:-7]
+            output, _ = utils.run_subprocess(["rpm", "-V", "--nodeps", nvra], print_cmd=False, print_output=False)
+            return key, output.splitlines(), None
+
+        return key, [line for _, _, line in results if line is not None], results
+
+    # The package was removed in the meantime
+    return None, [], None
+
+
+def write_rpm_va(output_file, processes=None, cache_file=None, incremental=False):
+    """
+    Verify all installed packages and write the results to a file.
+
+    The output is the same as the one of ``rpm -Va --nodeps``. It is written
+    to the file as soon as the results of each package are known.
+
+    :param output_file: Path to the file to write the results to.
+    :type output_file: str
+    :param processes: Number of worker processes. Defaults to the number of
+        CPUs.
+    :type processes: int | None
+    :param cache_file: Path to a file to store the results of each file in,
+        together with a snapshot of the file stat.
+    :type cache_file: str | None
+    :param incremental: Reuse the results stored in the cache_file by a
+        previous call for the files of packages that were not replaced and
+        whose stat did not change since then.
+    :type incremental: bool
+    """
+    instances = pkghandler.installed_package_index.instances
+    processes = processes or multiprocessing.cpu_count()
+    cache = load_cache(cache_file) if cache_file and incremental else {}
+    logger.debug(
+        "Verifying {} packages using {} processes, {} packages have cached results.".format(
+            len(instances), processes, len(cache)
+        )
+    )
+
+    if cache_file:
+        files.mkdir_p(os.path.dirname(cache_file))
+        new_cache_file = "{}.new".format(cache_file)
+    else:
+        new_cache_file = os.devnull
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(cache,))
+    try:
+        with open(output_file, "w") as handler, open(new_cache_file, "w") as cache_handler:
+            results = pool.imap(_verify_instance, instances, chunksize=_CHUNK_SIZE)
+            while True:
+                try:
+                    # Waiting without a timeout cannot be interrupted by
+                    # Ctrl + C on Python 2
+                    key, lines, file_results = results.next(timeout=1)
+                except multiprocessing.TimeoutError:
+                    continue
+                except StopIteration:
+                    break
+
+                for line in lines:
+                    handler.write(line + "\n")
+                handler.flush()
+
+                if file_results is not None:
+                    cache_handler.write(json.dumps({"package": key, "files": file_results}) + "\n")
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    if cache_file:
+        os.rename(new_cache_file, cache_file)
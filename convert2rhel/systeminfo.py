@@ -403,12 +403,15 @@ class SystemInfo:
         logger.debug("Booted kernel VRA (version, release, architecture): {0}".format(kernel_vra))
         return kernel_vra
 
-    def generate_rpm_va(self, log_filename=PRE_RPM_VA_LOG_FILENAME):
+    def generate_rpm_va(self, log_filename=PRE_RPM_VA_LOG_FILENAME, incremental=False):
         """RPM is able to detect if any file installed as part of a package has been changed in any way after the
         package installation.
 
         Here we are getting a list of changed package files of all the installed packages. Such a list is useful for
-        debug and support purposes. It's being saved to the default log folder as log_filename."""
+        debug and support purposes. It's being saved to the default log folder as log_filename.
+
+        With incremental=True only the files that changed since the previous call, or that belong to packages
+        replaced since then, are verified again. The results of the other files are taken from the previous call."""
         if tool_opts.no_rpm_va:
             logger.info("Skipping the execution of 'rpm -Va'.")
             return
@@ -418,17 +421,32 @@ class SystemInfo:
             " minutes. It can be disabled by using the"
             " --no-rpm-va option."
         )
-        # Discussed under RHELC-1427, `--nodeps` will skip verification of package dependencies,
-        # avoiding unnecessary packages lookup.
-        rpm_va, _ = utils.run_subprocess(["rpm", "-Va", "--nodeps"], print_output=False)
         output_file = os.path.join(LOG_DIR, log_filename)
-        utils.store_content_to_file(output_file, rpm_va)
+
+        # rpmverify imports pkghandler which imports this module so import it
+        # here to avoid a circular import.
+        from convert2rhel import rpmverify
+
+        try:
+            rpmverify.write_rpm_va(output_file, cache_file=rpmverify.RPM_VA_CACHE_FILE, incremental=incremental)
+        except Exception as e:
+            logger.warning("Unable to verify the installed packages natively: {}. Falling back to 'rpm -Va'.".format(e))
+            # Discussed under RHELC-1427, `--nodeps` will skip verification of package dependencies,
+            # avoiding unnecessary packages lookup.
+            with open(output_file, "w") as handler:
+                utils.run_subprocess(
+                    ["rpm", "-Va", "--nodeps"], print_output=False, callback=handler.write, keep_output=False
+                )
+
         logger.info("The 'rpm -Va' output has been stored in the {} file.".format(output_file))
 
     @staticmethod
     def is_rpm_installed(name):
-        _, return_code = run_subprocess(["rpm", "-q", name], print_cmd=False, print_output=False)
-        return return_code == 0
+        # pkghandler imports this module so import it here to avoid a circular
+        # import.
+        from convert2rhel.pkghandler import installed_package_index
+
+        return installed_package_index.is_installed(name)
 
     def get_enabled_rhel_repos(self):
         """Get a list of enabled repositories containing RHEL packages.
@@ -557,3 +575,5 @@ def is_systemd_managed_service_running(service):
 
 # Code to be executed upon module import
 system_info = SystemInfo()
+# The functions run by the child process worker read the system info as well
+utils.child_process_worker.share_state(system_info)
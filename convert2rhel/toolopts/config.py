@@ -35,6 +35,8 @@ _COMMAND_TO_ACTIVITY = {
     "convert": "conversion",
     "analyze": "analysis",
     "analyse": "analysis",
+    # A bundle is created from the analysis of the system
+    "bundle": "analysis",
 }
 
 # Mapping of supported headers and options for each configuration in the
@@ -235,6 +237,9 @@ class CliConfig(BaseConfig):
         self.els = False  # type: bool
         self.activity = None  # type: str | None
         self.serverurl = None  # type: str | None
+        self.jobs = 1  # type: int
+        self.bundle = None  # type: str | None
+        self.bundle_output = None  # type: str | None
 
         self._opts = opts  # type: arpgparse.Namepsace
 
@@ -254,6 +259,11 @@ class CliConfig(BaseConfig):
         unparsed_opts["disablerepo"] = opts.get("disablerepo") if opts["disablerepo"] else ["*"]
         unparsed_opts["enablerepo"] = opts.get("enablerepo") if opts["enablerepo"] else []
         unparsed_opts["autoaccept"] = opts.get("auto_accept") if opts["auto_accept"] else False
+        unparsed_opts["bundle_output"] = opts.get("bundle_output")
+
+        # The repositories of the bundle are used instead of the ones available through RHSM.
+        if opts.get("bundle"):
+            unparsed_opts["no_rhsm"] = True
 
         # Conversion only opts.
         if unparsed_opts["activity"] == "conversion":
@@ -312,6 +322,18 @@ class CliConfig(BaseConfig):
                 message += "\nThis ambiguity may have unintended consequences."
                 loggerinst.warning(message)
 
-        if opts["no_rhsm"]:
+        if opts.get("bundle"):
+            if opts["bundle_output"]:
+                loggerinst.critical("The --bundle option can't be used when creating a bundle.")
+
+            if opts["enablerepo"]:
+                loggerinst.critical(
+                    "The --enablerepo option can't be used together with --bundle. The repositories of the bundle"
+                    " are enabled instead."
+                )
+        elif opts["no_rhsm"]:
             if not opts["enablerepo"]:
                 loggerinst.critical("The --enablerepo option is required when --no-rhsm is used.")
+
+        if opts.get("jobs") is not None and opts["jobs"] < 1:
+            loggerinst.critical("The --jobs option requires a number greater than or equal to 1.")
@@ -17,6 +17,7 @@
 __metaclass__ = type
 
 import collections
+import fnmatch
 import functools
 import itertools
 import os
@@ -35,6 +36,7 @@ from convert2rhel import (
     main,
     pkghandler,
     pkgmanager,
+    repometa,
     subscription,
     systeminfo,
     utils,
@@ -703,7 +705,20 @@ class RunSubprocessMocked(MockFunctionObject):
         self.cmd = cmd
         self.cmds.append(cmd)
 
-        return super(RunSubprocessMocked, self).__call__(cmd, *args, **kwargs)
+        return _stream_mocked_output(super(RunSubprocessMocked, self).__call__(cmd, *args, **kwargs), **kwargs)
+
+
+def _stream_mocked_output(result, callback=None, keep_output=True, **kwargs):
+    """Pass the mocked output of run_subprocess to the callback line by line as the real function does."""
+    if not isinstance(result, tuple):
+        return result
+
+    output, return_code = result
+    if callback:
+        for line in output.splitlines(True):
+            callback(line)
+
+    return (output if keep_output else ""), return_code
 
 
 class RunCmdInPtyMocked(RunSubprocessMocked):
@@ -756,13 +771,66 @@ def run_subprocess_side_effect(*stubs):
     def factory(*args, **kwargs):
         for kws, result in stubs:
             if all(kw in args[0] for kw in kws):
-                return result
+                return _stream_mocked_output(result, **kwargs)
 
         return run_subprocess(*args, **kwargs)
 
     return factory
 
 
+def create_repo_package(nevra, buildtime=0, repoid="rhel-repo"):
+    """Create a repometa.RepoPackage from a name-epoch:version-release.arch string."""
+    name_epoch, version_release_arch = nevra.split(":", 1)
+    name, epoch = name_epoch.rsplit("-", 1)
+    version_release, arch = version_release_arch.rsplit(".", 1)
+    version, release = version_release.rsplit("-", 1)
+    return repometa.RepoPackage(name, epoch, version, release, arch, buildtime, repoid)
+
+
+class RepoMetadataMocked:
+    """
+    In-memory replacement of repometa.RepoMetadata.
+
+    Example:
+    >>> metadata = RepoMetadataMocked(
+    >>>     [create_repo_package("kernel-core-0:4.18.0-240.el8.x86_64")],
+    >>>     files={"kernel-core-0:4.18.0-240.el8.x86_64": ["/lib/modules/4.18.0-240.el8.x86_64/kernel/lib/a.ko.xz"]},
+    >>> )
+    >>> monkeypatch.setattr(repometa, "get_repo_metadata", mock.Mock(return_value=metadata))
+    """
+
+    def __init__(self, packages=(), files=None):
+        self.packages = list(packages)
+        self.files = files or {}
+
+    @property
+    def repoids(self):
+        return sorted(set(pkg.repoid for pkg in self.packages))
+
+    def _filter(self, packages, arches):
+        return [pkg for pkg in packages if not arches or pkg.arch in arches]
+
+    def get_packages(self, patterns, arches=None):
+        packages = [pkg for pattern in patterns for pkg in self.packages if fnmatch.fnmatchcase(pkg.name, pattern)]
+        return self._filter(packages, arches)
+
+    def get_latest(self, name, arches=None):
+        # The packages are expected to be listed from the oldest to the newest
+        packages = self.get_packages([name], arches)
+        return packages[-1] if packages else None
+
+    def get_packages_by_file(self, pattern, arches=None):
+        packages = [
+            pkg
+            for pkg in self.packages
+            if any(fnmatch.fnmatchcase(path, pattern) for path in self.files.get(pkg.nevra, ()))
+        ]
+        return self._filter(packages, arches)
+
+    def get_files(self, packages):
+        return [path for pkg in packages for path in self.files.get(pkg.nevra, ())]
+
+
 def mock_decorator(func):
     @functools.wraps(func)
     def wrapped(*args, **kwargs):
@@ -879,6 +947,9 @@ class FilePathRestorable(MinimalRestorable):
             return self.backup_path == value.backup_path
         return super(FilePathRestorable, self).__eq__(value)
 
+    def __hash__(self):
+        return hash(self.backup_path) if self.backup_path else super(FilePathRestorable, self).__hash__()
+
 
 class ErrorOnRestoreRestorable(MinimalRestorable):
     def __init__(self, exception=None):
@@ -17,6 +17,7 @@
 
 __metaclass__ = type
 
+import itertools
 import os.path
 import re
 
@@ -407,6 +408,92 @@ class TestStage:
         assert sorted(action.id for action in actual.failures) == sorted(expected[1])
         assert sorted(action.id for action in actual.skips) == sorted(expected[2])
 
+    @pytest.mark.parametrize(
+        ("stage_dirs",),
+        (
+            (("good_deps1",),),
+            (("all_status_actions",),),
+            (("action_exceptions",),),
+            (("deps_on_1", "good_deps1"),),
+        ),
+    )
+    @pytest.mark.parametrize("jobs", (2, 4))
+    def test_run_parallel_same_as_sequential(self, stage_actions, stage_dirs, jobs, monkeypatch, global_tool_opts):
+        monkeypatch.setattr(actions, "tool_opts", global_tool_opts)
+        results = []
+        for parallel, max_workers in ((False, 1), (True, jobs)):
+            global_tool_opts.jobs = max_workers
+            stage = None
+            for stage_dir in stage_dirs:
+                stage = actions.Stage(stage_dir, next_stage=stage, parallel=parallel)
+
+            actual = stage.run()
+            results.append(
+                tuple(
+                    [(action.id, action.result.level, action.result.diagnosis) for action in category]
+                    for category in actual
+                )
+            )
+
+        # The order of the results and the skipped actions must not depend
+        # on which action finished first.
+        assert results[0] == results[1]
+
+    def test_run_parallel_respects_dependencies(self, stage_actions, monkeypatch, global_tool_opts):
+        monkeypatch.setattr(actions, "tool_opts", global_tool_opts)
+        global_tool_opts.jobs = 4
+        finished = []
+        real_execute_action = actions._execute_action
+
+        def _execute_action(action_class, failed_action_ids):
+            for dependency in action_class.dependencies:
+                assert dependency in finished
+            result = real_execute_action(action_class, failed_action_ids)
+            finished.append(action_class.id)
+            return result
+
+        monkeypatch.setattr(actions, "_execute_action", _execute_action)
+        stage = actions.Stage("good_deps1", parallel=True)
+
+        actual = stage.run()
+
+        assert sorted(finished) == sorted(["REALTEST", "SECONDTEST", "THIRDTEST", "FOURTHTEST"])
+        assert len(actual.successes) == 4
+
+    def test_run_parallel_starts_child_process_worker_first(self, stage_actions, monkeypatch, global_tool_opts):
+        monkeypatch.setattr(actions, "tool_opts", global_tool_opts)
+        global_tool_opts.jobs = 4
+        events = []
+        monkeypatch.setattr(actions.utils.child_process_worker, "start", lambda: events.append("start"))
+        real_execute_action = actions._execute_action
+
+        def _execute_action(action_class, failed_action_ids):
+            events.append(action_class.id)
+            return real_execute_action(action_class, failed_action_ids)
+
+        monkeypatch.setattr(actions, "_execute_action", _execute_action)
+
+        actions.Stage("good_deps1", parallel=True).run()
+
+        # The worker is not forked while the threads of the Actions run
+        assert events[0] == "start"
+        assert len(events) == 5
+
+    @pytest.mark.parametrize(("parallel", "jobs"), ((False, 1), (True, 4)))
+    def test_run_on_action_finished(self, stage_actions, parallel, jobs, monkeypatch, global_tool_opts):
+        monkeypatch.setattr(actions, "tool_opts", global_tool_opts)
+        global_tool_opts.jobs = jobs
+        on_action_finished = mock.Mock()
+        stage = actions.Stage("deps_on_1", parallel=parallel)
+        stage = actions.Stage("good_deps1", next_stage=stage, parallel=parallel)
+
+        actual = stage.run(on_action_finished=on_action_finished)
+
+        finished_actions = [call[0][0] for call in on_action_finished.call_args_list]
+        assert sorted(action.id for action in finished_actions) == sorted(
+            action.id for action in itertools.chain(*actual)
+        )
+
     def test_stages_cannot_be_run_twice(self, stage_actions):
         """Test that an Action can only be run once."""
         stage = actions.Stage("good_deps1")
@@ -415,6 +502,17 @@ class TestStage:
         with pytest.raises(actions.ActionError, match="Stage good_deps1 has already run"):
             stage.run()
 
+    def test_order_is_resolved_once(self, stage_actions, monkeypatch):
+        resolve_action_order_mock = mock.Mock(side_effect=actions.resolve_action_order)
+        monkeypatch.setattr(actions, "resolve_action_order", resolve_action_order_mock)
+        stage = actions.Stage("deps_on_1", next_stage=None)
+        stage = actions.Stage("good_deps1", next_stage=stage)
+
+        stage.check_dependencies()
+        stage.run()
+
+        assert resolve_action_order_mock.call_count == 2
+
 
 class TestResolveActionOrder:
     @pytest.mark.parametrize(
@@ -738,6 +836,27 @@ class TestResolveActionOrder:
         with pytest.raises(actions.DependencyError):
             list(actions.resolve_action_order(potential, previous))
 
+    def test_long_chain_in_reverse_id_order(self):
+        """Each Action depends on the Action whose id sorts after its own."""
+        potential_actions = [
+            _ActionForTesting(id="A{:05d}".format(i), dependencies=("A{:05d}".format(i + 1),) if i < 9999 else ())
+            for i in range(10000)
+        ]
+
+        computed_action_ids = [action.id for action in actions.resolve_action_order(potential_actions)]
+
+        assert computed_action_ids == ["A{:05d}".format(i) for i in reversed(range(10000))]
+
+    def test_unsatisfied_dependencies_message(self):
+        potential_actions = [
+            _ActionForTesting(id="One"),
+            _ActionForTesting(id="Two", dependencies=("Unknown",)),
+            _ActionForTesting(id="Three", dependencies=("Two",)),
+        ]
+
+        with pytest.raises(actions.DependencyError, match="Unsatisfied dependencies in these actions: Three, Two$"):
+            list(actions.resolve_action_order(potential_actions))
+
 
 class TestRunActions:
     @pytest.mark.parametrize(
@@ -2734,3 +2853,48 @@ def test_format_action_status_message(status_code, action_id, id, result, expect
 )
 def test_parse_action_results(results, expected):
     assert actions.parse_action_results(results) == expected
+
+
+def test_parse_action_results_timing():
+    timing = actions.ActionTiming()
+    timing.wall_time = 1.5
+    timing.subprocesses = 2
+    result = ActionResult(level="SUCCESS", id="SUCCESS")
+    results = [
+        [_ActionForTesting(id="One", timing=timing, result=result)],
+        [_ActionForTesting(id="Two", result=result)],
+    ]
+
+    formatted_results = actions.parse_action_results(results)
+
+    assert formatted_results["One"]["timing"] == {
+        "wall_time": 1.5,
+        "cpu_time": 0.0,
+        "children_cpu_time": 0.0,
+        "process_peak_rss": 0,
+        "process_children_peak_rss": 0,
+        "subprocesses": 2,
+    }
+    assert "timing" not in formatted_results["Two"]
+
+
+class TestActionTiming:
+    def test_stop(self, monkeypatch):
+        monkeypatch.setattr(actions.timeit, "default_timer", mock.Mock(side_effect=[10.0, 12.5]))
+        spawned = mock.Mock(side_effect=[3, 5])
+        monkeypatch.setattr(actions.utils, "get_spawned_subprocesses_count", spawned)
+
+        timing = actions.ActionTiming().stop()
+
+        assert timing.wall_time == 2.5
+        assert timing.subprocesses == 2
+        assert timing.cpu_time >= 0
+        assert timing.children_cpu_time >= 0
+        assert timing.process_peak_rss > 0
+
+    def test_execute_action_records_timing(self):
+        action, skipped = actions._execute_action(_ActionForTesting, set())
+
+        assert not skipped
+        assert isinstance(action.timing, actions.ActionTiming)
+        assert action.timing.wall_time >= 0
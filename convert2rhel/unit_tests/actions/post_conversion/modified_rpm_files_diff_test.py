@@ -20,7 +20,7 @@ import logging
 import pytest
 import six
 
-from convert2rhel import actions, logger, systeminfo, utils
+from convert2rhel import actions, logger, rpmverify, systeminfo, utils
 from convert2rhel.actions.post_conversion import modified_rpm_files_diff
 from convert2rhel.systeminfo import system_info
 
@@ -34,6 +34,13 @@ def modified_rpm_files_diff_instance():
     return modified_rpm_files_diff.ModifiedRPMFilesDiff()
 
 
+def _write_rpm_va_mocked(output):
+    def _write_rpm_va(output_file, processes=None, cache_file=None, incremental=False):
+        utils.store_content_to_file(output_file, output)
+
+    return mock.Mock(side_effect=_write_rpm_va)
+
+
 def test_modified_rpm_files_diff_with_no_rpm_va(
     monkeypatch, modified_rpm_files_diff_instance, caplog, global_tool_opts
 ):
@@ -103,7 +110,7 @@ def test_modified_rpm_files_diff_without_differences_after_conversion(
     global_tool_opts,
 ):
     monkeypatch.setattr(systeminfo, "tool_opts", global_tool_opts)
-    monkeypatch.setattr(utils, "run_subprocess", mock.Mock(return_value=(rpm_va_pre_output, 0)))
+    monkeypatch.setattr(rpmverify, "write_rpm_va", _write_rpm_va_mocked(rpm_va_pre_output))
     monkeypatch.setattr(logger, "LOG_DIR", str(tmpdir))
     monkeypatch.setattr(systeminfo, "LOG_DIR", str(tmpdir))
     # Need to patch explicitly since the modified_rpm_files_diff is already instanciated in the fixture
@@ -115,10 +122,13 @@ def test_modified_rpm_files_diff_without_differences_after_conversion(
     system_info.generate_rpm_va()
 
     # Change the output to the post conversion output
-    monkeypatch.setattr(utils, "run_subprocess", mock.Mock(return_value=(rpm_va_post_output, 0)))
+    monkeypatch.setattr(rpmverify, "write_rpm_va", _write_rpm_va_mocked(rpm_va_post_output))
 
     modified_rpm_files_diff_instance.run()
 
+    # Only the changes since the pre-conversion run are verified
+    assert rpmverify.write_rpm_va.call_args[1]["incremental"]
+
     if different:
         # Add the test paths to the right places of diff
         expected_raw.description = expected_raw.description.format(path=str(tmpdir))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import logging
+import os
+
+import pytest
+import six
+
+from convert2rhel import actions, bundle
+from convert2rhel.actions.post_conversion import remove_bundle_repofile
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
+@pytest.fixture
+def remove_bundle_repofile_instance():
+    return remove_bundle_repofile.RemoveBundleRepofile()
+
+
+@pytest.fixture
+def repofile(monkeypatch, tmpdir, global_tool_opts):
+    monkeypatch.setattr(remove_bundle_repofile, "tool_opts", global_tool_opts)
+    global_tool_opts.bundle = "/srv/convert2rhel-bundle.tar"
+    repofile = tmpdir.join("convert2rhel-bundle.repo")
+    repofile.write("[rhel-8-for-x86_64-baseos-rpms]\n")
+    monkeypatch.setattr(bundle, "BUNDLE_REPOFILE", str(repofile))
+    return str(repofile)
+
+
+def test_remove_bundle_repofile(remove_bundle_repofile_instance, repofile, caplog):
+    caplog.set_level(logging.INFO)
+
+    remove_bundle_repofile_instance.run()
+
+    assert "Repofile {} removed".format(repofile) in caplog.text
+    assert not os.path.exists(repofile)
+
+
+def test_remove_bundle_repofile_without_bundle(remove_bundle_repofile_instance, repofile, global_tool_opts):
+    global_tool_opts.bundle = None
+
+    remove_bundle_repofile_instance.run()
+
+    assert os.path.exists(repofile)
+
+
+def test_remove_bundle_repofile_failure(remove_bundle_repofile_instance, repofile, monkeypatch, caplog):
+    monkeypatch.setattr(bundle, "remove_repofile", mock.Mock(side_effect=OSError(13, "Permission denied")))
+
+    remove_bundle_repofile_instance.run()
+
+    assert "Unable to remove {}".format(repofile) in caplog.text
+    assert [message.id for message in remove_bundle_repofile_instance.messages] == [
+        "UNSUCCESSFUL_REMOVE_BUNDLE_REPOFILE"
+    ]
+    assert all(isinstance(message, actions.ActionMessage) for message in remove_bundle_repofile_instance.messages)
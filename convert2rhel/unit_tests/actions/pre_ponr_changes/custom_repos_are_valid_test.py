@@ -18,9 +18,15 @@
 __metaclass__ = type
 
 import pytest
+import six
 
-from convert2rhel import unit_tests
+from convert2rhel import repometa, unit_tests
 from convert2rhel.actions.pre_ponr_changes import custom_repos_are_valid
+from convert2rhel.unit_tests import RepoMetadataMocked, create_repo_package
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
 
 
 @pytest.fixture
@@ -33,24 +39,40 @@ def apply_global_tool_opts(monkeypatch, global_tool_opts):
     monkeypatch.setattr(custom_repos_are_valid, "tool_opts", global_tool_opts)
 
 
+@pytest.fixture(autouse=True)
+def apply_global_system_info(monkeypatch, global_system_info):
+    monkeypatch.setattr(custom_repos_are_valid, "system_info", global_system_info)
+    monkeypatch.setattr(global_system_info, "get_enabled_rhel_repos", lambda: ["rhel-7-server-optional-rpms"])
+    monkeypatch.setattr(global_system_info, "releasever", "7Server")
+
+
 def test_custom_repos_are_valid(custom_repos_are_valid_action, monkeypatch, caplog):
-    monkeypatch.setattr(
-        custom_repos_are_valid,
-        "call_yum_cmd",
-        unit_tests.CallYumCmdMocked(return_code=0, return_string="Abcdef"),
+    get_repo_metadata_mocked = mock.Mock(
+        return_value=RepoMetadataMocked(
+            [create_repo_package("bash-0:4.2.46-34.el7.x86_64", repoid="rhel-7-server-optional-rpms")]
+        )
     )
+    monkeypatch.setattr(repometa, "get_repo_metadata", get_repo_metadata_mocked)
     monkeypatch.setattr(custom_repos_are_valid.tool_opts, "enablerepo", ["rhel-7-server-optional-rpms"])
+    monkeypatch.setattr(custom_repos_are_valid.tool_opts, "disablerepo", ["*"])
 
     custom_repos_are_valid_action.run()
 
+    get_repo_metadata_mocked.assert_called_once_with(
+        disable_repos=["*"],
+        enable_repos=["rhel-7-server-optional-rpms"],
+        releasever="7Server",
+        skip_if_unavailable=False,
+    )
+    assert "Loaded the metadata of the repositories: rhel-7-server-optional-rpms" in caplog.text
     assert "The repositories passed through the --enablerepo option are all accessible." in caplog.text
 
 
 def test_custom_repos_are_invalid(custom_repos_are_valid_action, monkeypatch):
     monkeypatch.setattr(
-        custom_repos_are_valid,
-        "call_yum_cmd",
-        unit_tests.CallYumCmdMocked(return_code=1, return_string="YUM/DNF failed"),
+        repometa,
+        "get_repo_metadata",
+        mock.Mock(side_effect=repometa.RepoMetadataError("YUM/DNF failed")),
     )
     monkeypatch.setattr(custom_repos_are_valid.tool_opts, "enablerepo", ["rhel-7-server-optional-rpms"])
 
@@ -63,7 +85,7 @@ def test_custom_repos_are_invalid(custom_repos_are_valid_action, monkeypatch):
         title="Unable to access repositories",
         description="Access could not be made to the custom repositories.",
         diagnosis="Unable to access the repositories passed through the --enablerepo option.",
-        remediations="For more details, see YUM/DNF output:\nYUM/DNF failed",
+        remediations="For more details, see the YUM/DNF error:\nYUM/DNF failed",
     )
 
 
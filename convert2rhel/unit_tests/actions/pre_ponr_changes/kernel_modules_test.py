@@ -21,6 +21,7 @@ import re
 import pytest
 import six
 
+from convert2rhel import repometa
 from convert2rhel.actions import STATUS_CODE
 from convert2rhel.actions.pre_ponr_changes import kernel_modules
 from convert2rhel.actions.pre_ponr_changes.kernel_modules import (
@@ -28,7 +29,12 @@ from convert2rhel.actions.pre_ponr_changes.kernel_modules import (
     RHELKernelModuleNotFound,
 )
 from convert2rhel.systeminfo import system_info
-from convert2rhel.unit_tests import assert_actions_result, run_subprocess_side_effect
+from convert2rhel.unit_tests import (
+    RepoMetadataMocked,
+    assert_actions_result,
+    create_repo_package,
+    run_subprocess_side_effect,
+)
 from convert2rhel.unit_tests.conftest import centos7, centos8
 from convert2rhel.utils import run_subprocess
 
@@ -58,32 +64,39 @@ HOST_MODULES_STUB_BAD = frozenset(
     )
 )
 
-REPOQUERY_F_STUB_GOOD = (
-    "kernel-core-0:4.18.0-240.10.1.el8_3.x86_64\n"
-    "kernel-core-0:4.18.0-240.15.1.el8_3.x86_64\n"
-    "kernel-debug-core-0:4.18.0-240.10.1.el8_3.x86_64\n"
-    "kernel-debug-core-0:4.18.0-240.15.1.el8_3.x86_64\n"
-)
-REPOQUERY_F_STUB_BAD = (
-    "kernel-idontexpectyou-core-sdsdsd.ell8_3.x86_64\n"
-    "kernel-core-0:4.18.0-240.15.1.el8_3.x86_64\n"
-    "kernel-debug-core-0:4.18.0-240.10.1.el8_3.x86_64\n"
-    "kernel-debug-core-0:4.18.0-240.15.1.el8_3.x86_64\n"
+KMOD_PKGS_STUB = (
+    "kernel-core-0:4.18.0-240.10.1.el8_3.x86_64",
+    "kernel-core-0:4.18.0-240.15.1.el8_3.x86_64",
+    "kernel-debug-core-0:4.18.0-240.10.1.el8_3.x86_64",
+    "kernel-debug-core-0:4.18.0-240.15.1.el8_3.x86_64",
 )
-REPOQUERY_L_STUB_GOOD = (
-    "/lib/modules/5.8.0-7642-generic/kernel/lib/a.ko.xz\n"
-    "/lib/modules/5.8.0-7642-generic/kernel/lib/a.ko\n"
-    "/lib/modules/5.8.0-7642-generic/kernel/lib/b.ko.xz\n"
-    "/lib/modules/5.8.0-7642-generic/kernel/lib/c.ko.xz\n"
-    "/lib/modules/5.8.0-7642-generic/kernel/lib/c.ko\n"
+KMOD_FILES_STUB = (
+    "/lib/modules/5.8.0-7642-generic/kernel/lib/a.ko.xz",
+    "/lib/modules/5.8.0-7642-generic/kernel/lib/a.ko",
+    "/lib/modules/5.8.0-7642-generic/kernel/lib/b.ko.xz",
+    "/lib/modules/5.8.0-7642-generic/kernel/lib/c.ko.xz",
+    "/lib/modules/5.8.0-7642-generic/kernel/lib/c.ko",
+    "/usr/share/doc/kernel/README",
 )
 
 
+def _kmod_repo_metadata(kmod_pkgs=KMOD_PKGS_STUB):
+    packages = [create_repo_package(nevra) for nevra in kmod_pkgs]
+    return RepoMetadataMocked(packages, files=dict((pkg.nevra, KMOD_FILES_STUB) for pkg in packages))
+
+
 @pytest.fixture
 def ensure_kernel_modules_compatibility_instance():
     return kernel_modules.EnsureKernelModulesCompatibility()
 
 
+@pytest.fixture
+def repo_metadata(monkeypatch):
+    get_repo_metadata_mocked = mock.Mock(return_value=_kmod_repo_metadata())
+    monkeypatch.setattr(repometa, "get_repo_metadata", get_repo_metadata_mocked)
+    return get_repo_metadata_mocked
+
+
 @pytest.mark.parametrize(
     (
         "host_kmods",
@@ -105,23 +118,11 @@ def test_ensure_compatibility_of_kmods(
     host_kmods,
     should_be_in_logs,
     global_tool_opts,
+    repo_metadata,
 ):
     monkeypatch.setattr(
         ensure_kernel_modules_compatibility_instance, "_get_loaded_kmods", mock.Mock(return_value=host_kmods)
     )
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (("uname",), ("5.8.0-7642-generic\n", 0)),
-            (("yum", "makecache"), ("", 0)),
-            (("repoquery", "-f"), (REPOQUERY_F_STUB_GOOD, 0)),
-            (("repoquery", "-l"), (REPOQUERY_L_STUB_GOOD, 0)),
-        )
-    )
-    monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
-    )
     monkeypatch.setattr(kernel_modules, "tool_opts", global_tool_opts)
 
     ensure_kernel_modules_compatibility_instance.run()
@@ -134,39 +135,32 @@ def test_ensure_compatibility_of_kmods(
     (
         "host_kmods",
         "repo_kmod_pkgs",
-        "makecache_output",
+        "metadata_error",
         "error_id",
         "level",
     ),
     (
         (
             HOST_MODULES_STUB_BAD,
-            REPOQUERY_F_STUB_GOOD,
-            ("", 0),
+            KMOD_PKGS_STUB,
+            None,
             "UNSUPPORTED_KERNEL_MODULES",
             "OVERRIDABLE",
         ),
         (
             HOST_MODULES_STUB_BAD,
-            REPOQUERY_F_STUB_GOOD,
-            ("Insufficient space to run makecache", 1),
+            KMOD_PKGS_STUB,
+            repometa.RepoMetadataError("No space left on device"),
             "PROBLEM_WITH_PACKAGE_REPO",
             "ERROR",
         ),
         (
             HOST_MODULES_STUB_BAD,
-            "",
-            ("", 0),
+            (),
+            None,
             "NO_RHEL_KERNEL_MODULES_FOUND",
             "ERROR",
         ),
-        (
-            HOST_MODULES_STUB_BAD,
-            "kernel-core-0:4.18.0-240.10.1.el8_3.x86_64\n" "kernel-core-0:4.19.0-240.10.1.el8_3.i486\n",
-            ("", 0),
-            "CANNOT_COMPARE_PACKAGE_VERSIONS",
-            "ERROR",
-        ),
     ),
 )
 @centos8
@@ -176,7 +170,7 @@ def test_ensure_compatibility_of_kmods_failure(
     pretend_os,
     host_kmods,
     repo_kmod_pkgs,
-    makecache_output,
+    metadata_error,
     error_id,
     level,
     global_tool_opts,
@@ -184,18 +178,10 @@ def test_ensure_compatibility_of_kmods_failure(
     monkeypatch.setattr(
         ensure_kernel_modules_compatibility_instance, "_get_loaded_kmods", mock.Mock(return_value=host_kmods)
     )
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (("uname",), ("5.8.0-7642-generic\n", 0)),
-            (("yum", "makecache"), makecache_output),
-            (("repoquery", "-f"), (repo_kmod_pkgs, 0)),
-            (("repoquery", "-l"), (REPOQUERY_L_STUB_GOOD, 0)),
-        )
-    )
     monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
+        repometa,
+        "get_repo_metadata",
+        mock.Mock(return_value=_kmod_repo_metadata(repo_kmod_pkgs), side_effect=metadata_error),
     )
     monkeypatch.setattr(kernel_modules, "tool_opts", global_tool_opts)
 
@@ -204,28 +190,38 @@ def test_ensure_compatibility_of_kmods_failure(
 
 
 @centos8
-def test_ensure_compatibility_of_kmods_check_env_and_message(
+def test_ensure_compatibility_of_kmods_cannot_compare(
     ensure_kernel_modules_compatibility_instance,
     monkeypatch,
     pretend_os,
-    caplog,
+    global_tool_opts,
+    repo_metadata,
 ):
-    monkeypatch.setattr(os, "environ", {"CONVERT2RHEL_ALLOW_UNAVAILABLE_KMODS": "1"})
     monkeypatch.setattr(
         ensure_kernel_modules_compatibility_instance, "_get_loaded_kmods", mock.Mock(return_value=HOST_MODULES_STUB_BAD)
     )
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (("uname",), ("5.8.0-7642-generic\n", 0)),
-            (("yum", "makecache"), ("", 0)),
-            (("repoquery", "-f"), (REPOQUERY_F_STUB_GOOD, 0)),
-            (("repoquery", "-l"), (REPOQUERY_L_STUB_GOOD, 0)),
-        )
+    monkeypatch.setattr(
+        kernel_modules.pkghandler, "sort_pkgs_by_version", mock.Mock(side_effect=ValueError("Invalid package"))
+    )
+    monkeypatch.setattr(kernel_modules, "tool_opts", global_tool_opts)
+
+    ensure_kernel_modules_compatibility_instance.run()
+    assert_actions_result(
+        ensure_kernel_modules_compatibility_instance, level="ERROR", id="CANNOT_COMPARE_PACKAGE_VERSIONS"
     )
+
+
+@centos8
+def test_ensure_compatibility_of_kmods_check_env_and_message(
+    ensure_kernel_modules_compatibility_instance,
+    monkeypatch,
+    pretend_os,
+    caplog,
+    repo_metadata,
+):
+    monkeypatch.setattr(os, "environ", {"CONVERT2RHEL_ALLOW_UNAVAILABLE_KMODS": "1"})
     monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
+        ensure_kernel_modules_compatibility_instance, "_get_loaded_kmods", mock.Mock(return_value=HOST_MODULES_STUB_BAD)
     )
 
     ensure_kernel_modules_compatibility_instance.run()
@@ -279,6 +275,7 @@ def test_ensure_compatibility_of_kmods_excluded(
     msg_not_in_logs,
     exception,
     global_tool_opts,
+    repo_metadata,
 ):
     monkeypatch.setattr(
         ensure_kernel_modules_compatibility_instance,
@@ -288,20 +285,6 @@ def test_ensure_compatibility_of_kmods_excluded(
         ),
     )
     get_unsupported_kmods_mocked = mock.Mock(wraps=ensure_kernel_modules_compatibility_instance._get_unsupported_kmods)
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (("uname",), ("5.8.0-7642-generic\n", 0)),
-            (("yum", "makecache"), ("", 0)),
-            # EL7 uses name-based query (kernel*, kmod*) instead of -f
-            (("repoquery", "kernel*"), (REPOQUERY_F_STUB_GOOD, 0)),
-            (("repoquery", "-l"), (REPOQUERY_L_STUB_GOOD, 0)),
-        )
-    )
-    monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
-    )
     monkeypatch.setattr(
         ensure_kernel_modules_compatibility_instance,
         "_get_unsupported_kmods",
@@ -351,7 +334,54 @@ def test_ensure_compatibility_of_kmods_excluded(
         assert all(msg_not_in_logs not in record.message for record in caplog.records)
 
 
-def test_get_loaded_kmods(ensure_kernel_modules_compatibility_instance, monkeypatch):
+@pytest.fixture
+def kmod_indexes(tmpdir, monkeypatch):
+    monkeypatch.setattr(system_info, "booted_kernel", "5.8.0-7642-generic")
+    monkeypatch.setattr(kernel_modules, "MODULES_DIR", str(tmpdir))
+    modules_dir = tmpdir.mkdir("5.8.0-7642-generic")
+    modules_dir.join("modules.dep").write(
+        "kernel/lib/a.ko.xz:\n"
+        "kernel/lib/b-dash.ko.xz: kernel/lib/a.ko.xz\n"
+        "kernel/drivers/net/e1000e.ko.xz:\n"
+        "kernel/lib/c.ko.xz:\n"
+    )
+    modules_dir.join("modules.builtin").write("kernel/fs/ext4/ext4.ko\n")
+
+    return modules_dir
+
+
+@pytest.mark.parametrize(
+    ("proc_modules", "expected"),
+    (
+        (
+            "a 81920 4 - Live 0x0000000000000000\nb_dash 49152 0 - Live 0x0000000000000000\n",
+            frozenset(("kernel/lib/a.ko.xz", "kernel/lib/b-dash.ko.xz")),
+        ),
+        # Built-in modules
+        (
+            "c 40960 1 - Live 0x0000000000000000\n"
+            "e1000e 40960 1 - Live 0x0000000000000000\n"
+            "ext4 40960 1 - Live 0x0000000000000000\n",
+            frozenset(("kernel/lib/c.ko.xz", "kernel/drivers/net/e1000e.ko.xz")),
+        ),
+    ),
+)
+def test_get_loaded_kmods(
+    proc_modules, expected, ensure_kernel_modules_compatibility_instance, kmod_indexes, tmpdir, monkeypatch
+):
+    proc_modules_file = tmpdir.join("modules")
+    proc_modules_file.write(proc_modules)
+    monkeypatch.setattr(kernel_modules, "PROC_MODULES", str(proc_modules_file))
+    run_subprocess_mocked = mock.Mock(spec=run_subprocess)
+    monkeypatch.setattr(kernel_modules, "run_subprocess", value=run_subprocess_mocked)
+
+    assert ensure_kernel_modules_compatibility_instance._get_loaded_kmods() == expected
+    # All the modules are resolved through the indexes of the booted kernel
+    assert not run_subprocess_mocked.called
+
+
+def test_get_loaded_kmods_not_indexed(ensure_kernel_modules_compatibility_instance, kmod_indexes, tmpdir, monkeypatch):
+    monkeypatch.setattr(kernel_modules, "PROC_MODULES", str(tmpdir.join("nonexisting")))
     run_subprocess_mocked = mock.Mock(
         spec=run_subprocess,
         side_effect=run_subprocess_side_effect(
@@ -360,11 +390,39 @@ def test_get_loaded_kmods(ensure_kernel_modules_compatibility_instance, monkeypa
                 (
                     "Module                  Size  Used by\n"
                     "a                 81920  4\n"
-                    "b    49152  0\n"
-                    "c              40960  1\n",
+                    "d    49152  0\n"
+                    "e              40960  1\n",
                     0,
                 ),
             ),
+            (
+                ("/usr/sbin/modinfo", "-F", "filename", "d"),
+                ("/lib/modules/5.8.0-7642-generic/extra/d.ko.xz\n", 0),
+            ),
+            (
+                ("/usr/sbin/modinfo", "-F", "filename", "e"),
+                ("/lib/modules/5.8.0-7642-generic/extra/e.ko.xz\n", 0),
+            ),
+        ),
+    )
+    monkeypatch.setattr(kernel_modules, "run_subprocess", value=run_subprocess_mocked)
+
+    assert ensure_kernel_modules_compatibility_instance._get_loaded_kmods() == frozenset(
+        ("kernel/lib/a.ko.xz", "extra/d.ko.xz", "extra/e.ko.xz")
+    )
+    # modinfo is called only for the modules missing in the indexes
+    assert run_subprocess_mocked.call_count == 3
+
+
+def test_get_loaded_kmods_no_indexes(ensure_kernel_modules_compatibility_instance, tmpdir, monkeypatch):
+    monkeypatch.setattr(system_info, "booted_kernel", "5.8.0-7642-generic")
+    monkeypatch.setattr(kernel_modules, "MODULES_DIR", str(tmpdir))
+    proc_modules_file = tmpdir.join("modules")
+    proc_modules_file.write("a 81920 4 - Live 0x0000000000000000\nb 49152 0 - Live 0x0000000000000000\n")
+    monkeypatch.setattr(kernel_modules, "PROC_MODULES", str(proc_modules_file))
+    run_subprocess_mocked = mock.Mock(
+        spec=run_subprocess,
+        side_effect=run_subprocess_side_effect(
             (
                 ("/usr/sbin/modinfo", "-F", "filename", "a"),
                 (MODINFO_STUB.split()[0] + "\n", 0),
@@ -373,59 +431,21 @@ def test_get_loaded_kmods(ensure_kernel_modules_compatibility_instance, monkeypa
                 ("/usr/sbin/modinfo", "-F", "filename", "b"),
                 (MODINFO_STUB.split()[1] + "\n", 0),
             ),
-            (
-                ("/usr/sbin/modinfo", "-F", "filename", "c"),
-                (MODINFO_STUB.split()[2] + "\n", 0),
-            ),
         ),
     )
-    monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mocked,
-    )
+    monkeypatch.setattr(kernel_modules, "run_subprocess", value=run_subprocess_mocked)
+
     assert ensure_kernel_modules_compatibility_instance._get_loaded_kmods() == frozenset(
-        ("kernel/lib/c.ko.xz", "kernel/lib/a.ko.xz", "kernel/lib/b.ko.xz")
+        ("kernel/lib/a.ko.xz", "kernel/lib/b.ko.xz")
     )
 
 
-@pytest.mark.parametrize(
-    ("repoquery_f_stub", "repoquery_l_stub"),
-    (
-        (REPOQUERY_F_STUB_GOOD, REPOQUERY_L_STUB_GOOD),
-        (REPOQUERY_F_STUB_BAD, REPOQUERY_L_STUB_GOOD),
-    ),
-)
 @centos8
 def test_get_rhel_supported_kmods(
     ensure_kernel_modules_compatibility_instance,
-    monkeypatch,
     pretend_os,
-    repoquery_f_stub,
-    repoquery_l_stub,
+    repo_metadata,
 ):
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (
-                ("repoquery", "-f"),
-                (repoquery_f_stub, 0),
-            ),
-            (
-                ("repoquery", "-l"),
-                (repoquery_l_stub, 0),
-            ),
-            (
-                ("yum", "makecache"),
-                ("", 0),
-            ),
-        )
-    )
-    monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
-    )
-
     res = ensure_kernel_modules_compatibility_instance._get_rhel_supported_kmods()
     assert res == set(
         (
@@ -436,71 +456,51 @@ def test_get_rhel_supported_kmods(
             "kernel/lib/c.ko",
         )
     )
+    repo_metadata.assert_called_once_with(
+        disable_repos=["*"],
+        enable_repos=system_info.get_enabled_rhel_repos(),
+        releasever=system_info.releasever,
+        filelists=True,
+        skip_if_unavailable=False,
+    )
 
 
 @pytest.mark.parametrize(
     (
-        "repoquery_f_return",
-        "repoquery_l_return",
-        "makecache_return",
+        "kmod_pkgs",
+        "metadata_error",
         "exception",
         "exception_msg",
     ),
     (
         (
-            (REPOQUERY_F_STUB_GOOD, 0),
-            (REPOQUERY_L_STUB_GOOD, 0),
-            ("", 1),
-            kernel_modules.PackageRepositoryError,
-            "We were unable to download the repository metadata for (.*) to determine packages containing kernel modules.  Can be caused by not enough disk space in /var/cache or too little memory.  The yum output below may have a clue for what went wrong in this case:\n\n.*",
-        ),
-        (
-            (REPOQUERY_F_STUB_BAD, 1),
-            (REPOQUERY_L_STUB_GOOD, 0),
-            ("", 0),
+            KMOD_PKGS_STUB,
+            repometa.RepoMetadataError("No space left on device"),
             kernel_modules.PackageRepositoryError,
-            "We were unable to query the repositories (.*) to determine packages containing kernel modules. Output from the failed repoquery command:\n\n.*",
+            "We were unable to download the repository metadata for (.*) to determine packages containing kernel modules.  Can be caused by not enough disk space in /var/cache or too little memory.  The error below may have a clue for what went wrong in this case:\n\nNo space left on device",
         ),
         (
-            ("", 0),
-            (REPOQUERY_L_STUB_GOOD, 0),
-            ("", 0),
+            (),
+            None,
             kernel_modules.RHELKernelModuleNotFound,
             "No packages containing kernel modules available in the enabled repositories (.*).",
         ),
     ),
 )
 @centos8
-def test_get_rhel_supported_kmods_repoquery_fails(
+def test_get_rhel_supported_kmods_repo_metadata_fails(
     ensure_kernel_modules_compatibility_instance,
     monkeypatch,
     pretend_os,
-    repoquery_f_return,
-    repoquery_l_return,
-    makecache_return,
+    kmod_pkgs,
+    metadata_error,
     exception,
     exception_msg,
 ):
-    run_subprocess_mock = mock.Mock(
-        side_effect=run_subprocess_side_effect(
-            (
-                ("repoquery", "-f"),
-                repoquery_f_return,
-            ),
-            (
-                ("repoquery", "-l"),
-                repoquery_l_return,
-            ),
-            (
-                ("yum", "makecache"),
-                makecache_return,
-            ),
-        )
-    )
     monkeypatch.setattr(
-        kernel_modules,
-        "run_subprocess",
-        value=run_subprocess_mock,
+        repometa,
+        "get_repo_metadata",
+        mock.Mock(return_value=_kmod_repo_metadata(kmod_pkgs), side_effect=metadata_error),
     )
 
     with pytest.raises(exception, match=exception_msg):
@@ -17,9 +17,10 @@ __metaclass__ = type
 import pytest
 import six
 
-from convert2rhel import exceptions, pkgmanager, unit_tests
+from convert2rhel import actions, exceptions, pkgmanager, unit_tests, utils
 from convert2rhel.actions import STATUS_CODE
-from convert2rhel.actions.pre_ponr_changes import transaction
+from convert2rhel.actions.pre_ponr_changes import kernel_modules, transaction
+from convert2rhel.pkgmanager import prefetch
 from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase
 from convert2rhel.unit_tests.conftest import all_systems
 
@@ -33,6 +34,23 @@ def validate_package_manager_transaction():
     return transaction.ValidatePackageManagerTransaction()
 
 
+@pytest.fixture(autouse=True)
+def package_prefetch(monkeypatch):
+    package_prefetch = mock.Mock(spec=prefetch.PackagePrefetch)
+    monkeypatch.setattr(prefetch, "package_prefetch", package_prefetch)
+    return package_prefetch
+
+
+def test_prefetch_transaction_packages(package_prefetch):
+    action = transaction.PrefetchTransactionPackages()
+
+    action.run()
+
+    assert action.dependencies == ("SUBSCRIBE_SYSTEM",)
+    assert package_prefetch.start.call_count == 1
+    assert action.result.level == STATUS_CODE["SUCCESS"]
+
+
 def test_validate_package_manager_transaction_dependency_order(validate_package_manager_transaction):
     expected_dependencies = (
         "INSTALL_RED_HAT_GPG_KEY",
@@ -41,27 +59,73 @@ def test_validate_package_manager_transaction_dependency_order(validate_package_
         "ENSURE_KERNEL_MODULES_COMPATIBILITY",
         "SUBSCRIBE_SYSTEM",
         "BACKUP_PACKAGE_FILES",
+        "PREFETCH_TRANSACTION_PACKAGES",
     )
 
     assert expected_dependencies == validate_package_manager_transaction.dependencies
 
 
 @all_systems
-def test_validate_package_manager_transaction(pretend_os, validate_package_manager_transaction, monkeypatch):
+def test_validate_package_manager_transaction(
+    pretend_os, validate_package_manager_transaction, package_prefetch, monkeypatch
+):
     transaction_handler_instance = mock.create_autospec(TransactionHandlerBase)
     monkeypatch.setattr(
         pkgmanager,
         "create_transaction_handler",
         mock.Mock(spec=pkgmanager.create_transaction_handler, return_value=transaction_handler_instance),
     )
+    child_process_worker = mock.Mock(spec=utils.ChildProcessWorker)
+    monkeypatch.setattr(utils, "child_process_worker", child_process_worker)
 
     validate_package_manager_transaction.run()
 
+    assert child_process_worker.stop.call_count == 1
     assert transaction_handler_instance.run_transaction.call_count == 1
     assert transaction_handler_instance.run_transaction.call_args == mock.call(validate_transaction=True)
+    assert package_prefetch.finish.call_count == 1
     assert validate_package_manager_transaction.result.level == STATUS_CODE["SUCCESS"]
 
 
+def test_prefetch_runs_alongside_other_actions(monkeypatch, tmpdir):
+    monkeypatch.setattr(prefetch, "PREFETCH_CACHE_DIR", str(tmpdir.join("cache")))
+    process = mock.Mock(spec=utils.Process)
+    process.is_alive.return_value = True
+    monkeypatch.setattr(utils, "Process", mock.Mock(return_value=process))
+    monkeypatch.setattr(prefetch, "package_prefetch", prefetch.PackagePrefetch())
+    monkeypatch.setattr(pkgmanager, "create_transaction_handler", mock.Mock())
+    monkeypatch.setattr(utils, "child_process_worker", mock.Mock(spec=utils.ChildProcessWorker))
+    prefetch_running = []
+    monkeypatch.setattr(
+        kernel_modules.EnsureKernelModulesCompatibility,
+        "run",
+        lambda self: prefetch_running.append(prefetch.package_prefetch.running),
+    )
+    pre_ponr_changes = actions.Stage("pre_ponr_changes")
+    actions.Stage("system_checks", next_stage=pre_ponr_changes).check_dependencies()
+
+    # Run the actions of the prefetch in the order of the stage
+    run_actions = []
+    for action_class in pre_ponr_changes._resolved_order[1]:
+        if action_class.id in (
+            "PREFETCH_TRANSACTION_PACKAGES",
+            "ENSURE_KERNEL_MODULES_COMPATIBILITY",
+            "VALIDATE_PACKAGE_MANAGER_TRANSACTION",
+        ):
+            action_class().run()
+            run_actions.append(action_class.id)
+
+    assert run_actions == [
+        "PREFETCH_TRANSACTION_PACKAGES",
+        "ENSURE_KERNEL_MODULES_COMPATIBILITY",
+        "VALIDATE_PACKAGE_MANAGER_TRANSACTION",
+    ]
+    assert prefetch_running == [True]
+    # The validation stops the prefetch
+    assert process.terminate.call_count == 1
+    assert not prefetch.package_prefetch.running
+
+
 @all_systems
 def test_validate_package_manager_transaction_unknown_error(
     pretend_os, validate_package_manager_transaction, monkeypatch
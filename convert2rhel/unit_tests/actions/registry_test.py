@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import importlib
+import os.path
+import sys
+import types
+
+import pytest
+
+from convert2rhel import actions
+from convert2rhel.actions import registry
+from convert2rhel.unit_tests.actions.data import stage_tests
+
+
+STAGE_TESTS_PACKAGE = "convert2rhel.unit_tests.actions.data.stage_tests"
+
+
+@pytest.fixture
+def stage_tests_registry(monkeypatch):
+    """Install a registry generated from the Stages used in the unit tests."""
+    registry_module = types.ModuleType(registry.REGISTRY_MODULE)
+    registry_module.ACTIONS = registry.scan_actions(os.path.dirname(stage_tests.__file__), STAGE_TESTS_PACKAGE)
+    monkeypatch.setitem(sys.modules, registry.REGISTRY_MODULE, registry_module)
+    monkeypatch.setattr(actions.Stage, "_actions_dir", STAGE_TESTS_PACKAGE + ".%s")
+    return registry_module
+
+
+@pytest.mark.parametrize("stage_name", ("system_checks", "pre_ponr_changes", "conversion", "post_conversion"))
+def test_scan_actions_matches_discovered_actions(stage_name):
+    """The registry generated from the source lists the same Actions as the runtime discovery."""
+    scanned = registry.scan_actions(os.path.dirname(actions.__file__))
+
+    stage_package = importlib.import_module("convert2rhel.actions.{}".format(stage_name))
+    discovered = actions.get_actions(stage_package.__path__, stage_package.__name__ + ".")
+
+    assert sorted(scanned[stage_package.__name__]) == sorted(
+        (action.id, tuple(action.dependencies), action.__module__, action.__name__) for action in discovered
+    )
+
+
+def test_scan_module_non_literal_id(tmpdir):
+    module = tmpdir.join("bad_action.py")
+    module.write("ID = 'BAD'\n\nclass BadAction(actions.Action):\n    id = ID\n")
+
+    with pytest.raises(registry.RegistryError, match="stage.bad_action.BadAction must be literals"):
+        registry.scan_module(str(module), "stage.bad_action")
+
+
+def test_write_registry(tmpdir):
+    stage_dir = tmpdir.mkdir("stage")
+    stage_dir.join("__init__.py").write("")
+    stage_dir.join("checks.py").write(
+        "class One(actions.Action):\n"
+        "    id = 'ONE'\n"
+        "\n"
+        "class Two(Action):\n"
+        "    id = 'TWO'\n"
+        "    dependencies = ('ONE',)\n"
+        "\n"
+        "class NotAnAction(Exception):\n"
+        "    id = 'NOT_AN_ACTION'\n"
+    )
+
+    path = registry.write_registry(str(tmpdir))
+
+    namespace = {}
+    exec(compile(tmpdir.join(registry.REGISTRY_FILENAME).read(), path, "exec"), namespace)
+    assert namespace["ACTIONS"] == {
+        "convert2rhel.actions.stage": (
+            ("ONE", (), "convert2rhel.actions.stage.checks", "One"),
+            ("TWO", ("ONE",), "convert2rhel.actions.stage.checks", "Two"),
+        )
+    }
+
+
+def test_get_registered_actions_without_registry(monkeypatch):
+    monkeypatch.setattr(registry, "REGISTRY_MODULE", "convert2rhel.actions._nonexistent_registry")
+
+    assert registry.get_registered_actions("convert2rhel.actions.system_checks") is None
+
+
+def test_get_registered_actions_unknown_stage(stage_tests_registry):
+    assert registry.get_registered_actions("convert2rhel.actions.plugin_stage") is None
+
+
+def test_stage_uses_registry(stage_tests_registry):
+    stage = actions.Stage("good_deps1")
+
+    assert all(isinstance(action, registry.RegisteredAction) for action in stage.actions)
+    assert sorted(a.id for a in stage.actions) == sorted(["REALTEST", "SECONDTEST", "THIRDTEST", "FOURTHTEST"])
+
+    actual = stage.run()
+
+    assert sorted(action.id for action in actual.successes) == sorted(
+        ["REALTEST", "SECONDTEST", "THIRDTEST", "FOURTHTEST"]
+    )
+    assert all(isinstance(action, actions.Action) for action in actual.successes)
+
+
+def test_registered_action_is_instantiated_lazily(stage_tests_registry):
+    registered_action = registry.RegisteredAction("REALTEST", (), STAGE_TESTS_PACKAGE + ".good_deps1.test", "RealTest")
+
+    action = registered_action()
+
+    assert isinstance(action, registered_action.load())
+    assert action.id == "REALTEST"
@@ -22,14 +22,13 @@ import re
 import pytest
 import six
 
-from convert2rhel.actions import STATUS_CODE, report
+from convert2rhel.actions import STATUS_CODE, ActionResult, report
 from convert2rhel.logger import bcolors
-
+from convert2rhel.unit_tests.conftest import centos7
 
 six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
 from six.moves import mock
 
-
 #: _LONG_MESSAGE since we do line wrapping
 _LONG_MESSAGE = {
     "title": "Will Robinson! Will Robinson!",
@@ -60,7 +59,7 @@ _LONG_MESSAGE = {
                 },
             },
             {
-                "format_version": "1.1",
+                "format_version": "1.4",
                 "status": "WARNING",
                 "actions": {
                     "CONVERT2RHEL_LATEST_VERSION": {
@@ -96,7 +95,7 @@ _LONG_MESSAGE = {
                 },
             },
             {
-                "format_version": "1.1",
+                "format_version": "1.4",
                 "status": "WARNING",
                 "actions": {
                     "CONVERT2RHEL_LATEST_VERSION": {
@@ -117,9 +116,10 @@ _LONG_MESSAGE = {
         ),
     ),
 )
-def test_summary_as_json(results, expected, tmpdir):
+def test_summary_as_json(results, expected, tmpdir, monkeypatch):
     """Test that the results that we're given are what is written to the json log file."""
     json_report_file = os.path.join(str(tmpdir), "c2r-assessment.json")
+    monkeypatch.setattr(report, "get_system_description", lambda: None)
 
     report.summary_as_json(results, json_report_file)
 
@@ -129,6 +129,110 @@ def test_summary_as_json(results, expected, tmpdir):
     assert file_contents == expected
 
 
+@centos7
+def test_summary_as_json_system(pretend_os, tmpdir):
+    json_report_file = os.path.join(str(tmpdir), "c2r-assessment.json")
+    results = {
+        "CONVERT2RHEL_LATEST_VERSION": {"result": {"level": STATUS_CODE["SUCCESS"], "id": "SUCCESS"}, "messages": []}
+    }
+
+    report.summary_as_json(results, json_report_file)
+
+    with open(json_report_file, "r") as f:
+        file_contents = json.load(f)
+
+    assert file_contents["system"] == {"id": "centos", "name": "CentOS Linux", "version": "7.9", "arch": "x86_64"}
+
+
+class TestJsonReportWriter:
+    @staticmethod
+    def _action_results(level):
+        return {"result": {"level": STATUS_CODE[level], "id": level}, "messages": []}
+
+    def test_partial_report(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(report, "get_system_description", lambda: None)
+        json_file = str(tmpdir.join("c2r-assessment.json"))
+        report_writer = report.JsonReportWriter(json_file)
+
+        report_writer.add_action_results("ONE", self._action_results("SUCCESS"))
+        with open(report_writer.partial_file) as f:
+            assert json.load(f) == {
+                "format_version": "1.4",
+                "status": "SUCCESS",
+                "actions": {"ONE": {"result": {"level": "SUCCESS", "id": "SUCCESS"}, "messages": []}},
+            }
+
+        report_writer.add_action_results("TWO", self._action_results("ERROR"))
+        report_writer.add_action_results("THREE", self._action_results("WARNING"))
+        with open(report_writer.partial_file) as f:
+            partial_report = json.load(f)
+        assert partial_report["status"] == "ERROR"
+        assert sorted(partial_report["actions"]) == ["ONE", "THREE", "TWO"]
+        assert not os.path.exists(json_file)
+
+        report_writer.finish()
+
+        assert not os.path.exists(report_writer.partial_file)
+        with open(json_file) as f:
+            assert json.load(f) == partial_report
+
+    @pytest.mark.parametrize(
+        ("json_file", "report_name"),
+        (
+            (report.CONVERT2RHEL_PRE_CONVERSION_JSON_RESULTS, "pre-conversion"),
+            (report.CONVERT2RHEL_POST_CONVERSION_JSON_RESULTS, "post-conversion"),
+        ),
+    )
+    def test_report_name(self, json_file, report_name, tmpdir, monkeypatch):
+        monkeypatch.setattr(report, "get_system_description", lambda: None)
+        json_file = tmpdir.join(os.path.basename(json_file))
+
+        report.JsonReportWriter(str(json_file)).finish()
+
+        assert json.loads(json_file.read())["report"] == report_name
+
+    def test_finish_without_actions(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(report, "get_system_description", lambda: None)
+        json_file = tmpdir.join("c2r-assessment.json")
+        json_file.write("Results of the previous run")
+
+        report.JsonReportWriter(str(json_file)).finish()
+
+        assert json.loads(json_file.read()) == {"format_version": "1.4", "status": "SUCCESS", "actions": {}}
+
+    def test_add_finished_action(self, tmpdir):
+        report_writer = report.JsonReportWriter(str(tmpdir.join("c2r-assessment.json")))
+        result = ActionResult(level="ERROR", id="ERROR", title="Error", description="Failed")
+        action = mock.Mock(id="ONE", messages=[], result=result, timing=None)
+
+        report_writer.add_finished_action(action)
+
+        with open(report_writer.partial_file) as f:
+            assert json.load(f)["actions"]["ONE"]["result"]["level"] == "ERROR"
+
+    def test_add_finished_action_failure(self, tmpdir, caplog):
+        report_writer = report.JsonReportWriter(str(tmpdir.join("missing", "c2r-assessment.json")))
+        action = mock.Mock(id="ONE", messages=[], result=ActionResult(level="SUCCESS", id="SUCCESS"), timing=None)
+
+        report_writer.add_finished_action(action)
+        # Not retried for the next actions
+        report_writer.add_finished_action(action)
+
+        warnings = [record.message for record in caplog.records if record.levelname == "WARNING"]
+        assert len(warnings) == 1
+        assert "Unable to write the results of ONE" in warnings[0]
+
+    def test_discard(self, tmpdir):
+        report_writer = report.JsonReportWriter(str(tmpdir.join("c2r-assessment.json")))
+        report_writer.add_action_results("ONE", self._action_results("SUCCESS"))
+
+        report_writer.discard()
+        # Discarding a missing report is fine
+        report_writer.discard()
+
+        assert not os.path.exists(report_writer.partial_file)
+
+
 @pytest.mark.parametrize(
     ("results", "include_all_reports", "expected_results"),
     (
@@ -1539,6 +1643,8 @@ def test_summary_as_txt_file_exists(results, text_lines, tmpdir):
     convert2rhel_txt_results.write("test")
     report.summary_as_txt(results, str(convert2rhel_txt_results))
 
+    assert not os.path.exists(str(convert2rhel_txt_results) + ".partial")
+
     for expected in text_lines:
         assert (
             expected.format(begin_fail=bcolors.FAIL, begin_warning=bcolors.WARNING, end=bcolors.ENDC)
@@ -1783,3 +1889,104 @@ def test_post_conversion_report(monkeypatch, caplog):
     monkeypatch.setattr(report, "_summary", mock.Mock())
     report.post_conversion_report({})
     assert "Post-conversion report" in caplog.records[-1].message
+
+
+def _timing(wall_time, subprocesses=0):
+    return {
+        "wall_time": wall_time,
+        "cpu_time": 0.25,
+        "children_cpu_time": 0.5,
+        "process_peak_rss": 1024,
+        "process_children_peak_rss": 512,
+        "subprocesses": subprocesses,
+    }
+
+
+def _success_result():
+    return {
+        "level": STATUS_CODE["SUCCESS"],
+        "id": "SUCCESS",
+        "title": "",
+        "description": "",
+        "diagnosis": "",
+        "remediations": "",
+        "variables": {},
+    }
+
+
+def test_summary_as_txt_is_stripped(tmpdir, monkeypatch):
+    monkeypatch.setattr(report, "colorize", lambda message, color: message)
+    results = {
+        "WarningAction": {
+            "messages": [],
+            "result": {
+                "level": STATUS_CODE["WARNING"],
+                "id": "WARNING",
+                "title": "Warning",
+                "description": "Action warning",
+                "diagnosis": "User warning",
+                "remediations": "move on",
+                "variables": {},
+            },
+        },
+    }
+    convert2rhel_txt_results = tmpdir.join("convert2rhel-pre-conversion.txt")
+
+    report.summary_as_txt(results, str(convert2rhel_txt_results))
+
+    assert convert2rhel_txt_results.read() == (
+        "(WARNING) WarningAction::WARNING - Warning\n"
+        " Description: Action warning\n"
+        " Diagnosis: User warning\n"
+        " Remediations: move on"
+    )
+
+
+@pytest.mark.parametrize(
+    ("texts", "expected"),
+    (
+        ([], ""),
+        (["  \n", "\n"], ""),
+        (["\n first\n", "second \n"], "first\nsecond"),
+        (["first\n", " \n", "second\n"], "first\n \nsecond"),
+    ),
+)
+def test_stripped_text_writer(texts, expected):
+    file = six.StringIO()
+    txt_result = report._StrippedTextWriter(file)
+
+    for text in texts:
+        txt_result.write(text)
+
+    assert file.getvalue() == expected
+    assert txt_result.empty == (not expected)
+
+
+@pytest.mark.parametrize(
+    ("slowest_actions", "expected"),
+    (
+        (0, ""),
+        (
+            2,
+            "========== Slowest actions ==========\n"
+            "Slow: 3.00s wall, 0.25s CPU, 0.50s CPU in 4 subprocesses\n"
+            "Medium: 2.00s wall, 0.25s CPU, 0.50s CPU in 0 subprocesses",
+        ),
+    ),
+)
+def test_summary_as_txt_slowest_actions(slowest_actions, expected, tmpdir):
+    results = {
+        "Fast": {"messages": [], "result": _success_result(), "timing": _timing(1.0)},
+        "Slow": {"messages": [], "result": _success_result(), "timing": _timing(3.0, subprocesses=4)},
+        "Medium": {"messages": [], "result": _success_result(), "timing": _timing(2.0)},
+        "NotRun": {"messages": [], "result": _success_result()},
+    }
+    convert2rhel_txt_results = tmpdir.join("convert2rhel-pre-conversion.txt")
+
+    report.summary_as_txt(results, str(convert2rhel_txt_results), slowest_actions=slowest_actions)
+
+    assert convert2rhel_txt_results.read() == expected
+
+
+def test_format_slowest_actions_without_timing():
+    assert report.format_slowest_actions({"NotRun": {"messages": [], "result": _success_result()}}, 10) == ""
@@ -26,8 +26,9 @@ import six
 six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
 from six.moves import mock
 
-from convert2rhel import actions, exceptions, repo, systeminfo, unit_tests, utils
+from convert2rhel import actions, exceptions, repo, repometa, systeminfo, unit_tests, utils
 from convert2rhel.actions.system_checks import convert2rhel_latest
+from convert2rhel.unit_tests import RepoMetadataMocked, create_repo_package
 
 
 @pytest.fixture
@@ -52,10 +53,14 @@ def prepare_convert2rhel_latest_action(monkeypatch, tmpdir, request, global_syst
         mock.Mock(return_value="/test/path.py"),
     )
     monkeypatch.setattr(convert2rhel_latest, "running_convert2rhel_version", marker["local_version"])
+    monkeypatch.setattr(
+        repometa,
+        "get_repo_metadata",
+        mock.Mock(return_value=RepoMetadataMocked([create_repo_package(pkg) for pkg in marker["repo_packages"]])),
+    )
 
     # Mocking run_subprocess for different command outputs
     command_outputs = [
-        (marker["package_version_repoquery"], 0),  # Output for repoquery
         (marker["package_version_qf"], 0),  # Output for rpm -qf
         (marker["package_version_V"], 0),  # Output for rpm -V
     ]
@@ -84,7 +89,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.21",
                     "package_version": "C2R convert2rhel-0:0.22-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.22-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.22-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.21-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -96,7 +101,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.21",
                     "package_version": "C2R convert2rhel-0:1.10-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.10-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.10-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.21-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -108,7 +113,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.21.0",
                     "package_version": "C2R convert2rhel-0:1.21.1-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.21.1-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.21.1-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.21.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -120,7 +125,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.21",
                     "package_version": "C2R convert2rhel-0:1.21.1-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.21.1-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.21.1-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.21-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -132,7 +137,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.21.1",
                     "package_version": "C2R convert2rhel-0:1.22-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.22-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.22-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.21.1-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -172,7 +177,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.0",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.22.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "6",
@@ -185,7 +190,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.1",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.22.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.18.1-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -198,7 +203,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.3",
                     "package_version": "C2R convert2rhel-0:0.22.1-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.22.1-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.22.1-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.18.3-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -211,7 +216,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18",
                     "package_version": "C2R convert2rhel-0:1.10.2-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.10.2-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.10.2-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.18-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -224,7 +229,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.0",
                     "package_version": "C2R convert2rhel-0:1.10-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.10-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.10-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -259,7 +264,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.17.0",
                     "package_version": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.17.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "6",
@@ -271,7 +276,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.17.0",
                     "package_version": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.17.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -283,7 +288,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.17.0",
                     "package_version": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.17.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -295,7 +300,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.25.0",
                     "package_version": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.17.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.25.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "6",
@@ -307,7 +312,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.25.0",
                     "package_version": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.17.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.17.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.25.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -319,7 +324,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.25.0",
                     "package_version": "C2R convert2rhel-:0.18.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.25.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -331,7 +336,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.10.0",
                     "package_version": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.10.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -343,7 +348,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.10.1",
                     "package_version": "C2R convert2rhel-0:1.10.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:1.10.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:1.10.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.10.1-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -369,7 +374,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.10.0",
                     "package_version": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.10.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -381,7 +386,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.10",
                     "package_version": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.10-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -393,7 +398,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "1.10.0",
                     "package_version": "C2R convert2rhel-:0.18-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:1.10.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -404,11 +409,13 @@ class TestCheckConvert2rhelLatest:
         ),
         indirect=True,
     )
-    def test_convert2rhel_latest_repoquery_error(
+    def test_convert2rhel_latest_repo_metadata_error(
         self, caplog, monkeypatch, convert2rhel_latest_action_instance, prepare_convert2rhel_latest_action
     ):
         monkeypatch.setattr(
-            utils, "run_subprocess", unit_tests.RunSubprocessMocked(return_value=("Repoquery did not run", 1))
+            repometa,
+            "get_repo_metadata",
+            mock.Mock(side_effect=repometa.RepoMetadataError("Cannot download repomd.xml")),
         )
         expected = {
             actions.ActionMessage(
@@ -418,7 +425,7 @@ class TestCheckConvert2rhelLatest:
                 description="Did not perform the convert2hel latest version check",
                 diagnosis=(
                     "Couldn't check if the current installed convert2rhel is the latest version.\n"
-                    "repoquery failed with the following output:\nRepoquery did not run"
+                    "Loading the repository metadata failed with the following error:\nCannot download repomd.xml"
                 ),
                 remediations=None,
             )
@@ -427,7 +434,7 @@ class TestCheckConvert2rhelLatest:
 
         log_msg = (
             "Couldn't check if the current installed convert2rhel is the latest version.\n"
-            "repoquery failed with the following output:\nRepoquery did not run"
+            "Loading the repository metadata failed with the following error:\nCannot download repomd.xml"
         )
         assert log_msg in caplog.text
         assert expected.issuperset(convert2rhel_latest_action_instance.messages)
@@ -440,7 +447,11 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.19.0",
                     "package_version": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nC2R convert2rhel-0:0.17.0-1.el7.noarch\nC2R convert2rhel-0:0.20.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nC2R convert2rhel-0:0.17.0-1.el7.noarch\nC2R convert2rhel-0:0.20.0-1.el7.noarch",
+                    "repo_packages": [
+                        "convert2rhel-0:0.18.0-1.el7.noarch",
+                        "convert2rhel-0:0.17.0-1.el7.noarch",
+                        "convert2rhel-0:0.20.0-1.el7.noarch",
+                    ],
                     "package_version_qf": "C2R convert2rhel-0:0.19.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -452,7 +463,11 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.19",
                     "package_version": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nC2R convert2rhel-0:0.17.0-1.el7.noarch\nC2R convert2rhel-0:0.20.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nC2R convert2rhel-0:0.17.0-1.el7.noarch\nC2R convert2rhel-0:0.20.0-1.el7.noarch",
+                    "repo_packages": [
+                        "convert2rhel-0:0.18.0-1.el7.noarch",
+                        "convert2rhel-0:0.17.0-1.el7.noarch",
+                        "convert2rhel-0:0.20.0-1.el7.noarch",
+                    ],
                     "package_version_qf": "C2R convert2rhel-0:0.19-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -464,7 +479,11 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.19.0",
                     "package_version": "C2R convert2rhel-0:0.18-1.el7.noarch\nC2R convert2rhel-0:0.17-1.el7.noarch\nC2R convert2rhel-0:0.20-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nC2R convert2rhel-0:0.17.0-1.el7.noarch\nC2R convert2rhel-0:0.20-1.el7.noarch",
+                    "repo_packages": [
+                        "convert2rhel-0:0.18.0-1.el7.noarch",
+                        "convert2rhel-0:0.17.0-1.el7.noarch",
+                        "convert2rhel-0:0.20-1.el7.noarch",
+                    ],
                     "package_version_qf": "C2R convert2rhel-0:0.19.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -502,7 +521,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.0",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": 1,
                     "pmajor": "6",
@@ -514,7 +533,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.1",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": 1,
                     "pmajor": "7",
@@ -526,7 +545,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.3",
                     "package_version": "C2R convert2rhel-0:0.22.1-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": 1,
                     "pmajor": "8",
@@ -572,7 +591,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.0",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": " ",
                     "pmajor": "6",
@@ -584,7 +603,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.1",
                     "package_version": "C2R convert2rhel-0:0.22.0-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "7",
@@ -596,7 +615,7 @@ class TestCheckConvert2rhelLatest:
                 {
                     "local_version": "0.18.3",
                     "package_version": "C2R convert2rhel-0:0.22.1-1.el7.noarch",
-                    "package_version_repoquery": "C2R convert2rhel-0.18-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0.18-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
@@ -611,9 +630,7 @@ class TestCheckConvert2rhelLatest:
         self, caplog, monkeypatch, convert2rhel_latest_action_instance, prepare_convert2rhel_latest_action
     ):
         def mock_run_subprocess(cmd, print_output=False):
-            if "repoquery" in cmd:
-                return ("C2R convert2rhel-0:0.18.0-1.el7.noarch", 0)
-            elif "--qf" in cmd:
+            if "--qf" in cmd:
                 return ("", 1)
             return ("", 0)
 
@@ -638,7 +655,7 @@ class TestCheckConvert2rhelLatest:
             [
                 {
                     "local_version": "0.19.0",
-                    "package_version_repoquery": "C2R convert2rhel-0:0.18.0-1.el7.noarch\nNot a NEVRA that we was not filtered due to a bug\nC2R convert2rhel-0:0.20.0-1.el7.noarch",
+                    "repo_packages": ["convert2rhel-0:0.18.0-1.el7.noarch", "convert2rhel-0:0.20.0-1.el7.noarch"],
                     "package_version_qf": "C2R convert2rhel-0:0.19.0-1.el7.noarch",
                     "package_version_V": 0,
                     "pmajor": "8",
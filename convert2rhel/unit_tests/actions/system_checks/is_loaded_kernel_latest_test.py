@@ -24,13 +24,12 @@ from collections import namedtuple
 import pytest
 import six
 
-from convert2rhel import actions, pkgmanager, repo, unit_tests
+from convert2rhel import actions, pkgmanager, repo, repometa, unit_tests
 from convert2rhel.actions.system_checks import is_loaded_kernel_latest
-from convert2rhel.unit_tests import run_subprocess_side_effect
+from convert2rhel.unit_tests import RepoMetadataMocked, run_subprocess_side_effect
 from convert2rhel.unit_tests.conftest import centos7, centos8, oracle8
 from convert2rhel.utils import run_subprocess
 
-
 six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
 from six.moves import mock
 
@@ -45,6 +44,22 @@ def apply_global_tool_opts(monkeypatch, global_tool_opts):
     monkeypatch.setattr(repo, "tool_opts", global_tool_opts)
 
 
+@pytest.fixture(autouse=True)
+def system_arch(monkeypatch):
+    monkeypatch.setattr(is_loaded_kernel_latest.system_info, "arch", "x86_64")
+
+
+def _kernel_pkg(version_release, name="kernel-core", buildtime=1634146676, repoid="baseos", arch="x86_64"):
+    version, release = version_release.rsplit("-", 1)
+    return repometa.RepoPackage(name, "0", version, release, arch, buildtime, repoid)
+
+
+def _mock_repo_metadata(monkeypatch, packages=(), side_effect=None):
+    get_repo_metadata_mocked = mock.Mock(return_value=RepoMetadataMocked(packages), side_effect=side_effect)
+    monkeypatch.setattr(repometa, "get_repo_metadata", get_repo_metadata_mocked)
+    return get_repo_metadata_mocked
+
+
 class TestIsLoadedKernelLatest:
     @oracle8
     def test_is_loaded_kernel_latest_skip_on_not_latest_ol(
@@ -59,16 +74,14 @@ class TestIsLoadedKernelLatest:
 
     @pytest.mark.parametrize(
         (
-            "repoquery_version",
+            "repo_kernel_version",
             "uname_version",
-            "return_code",
             "package_name",
         ),
         (
             (
-                "C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos",
+                "3.10.0-1160.45.1.el7",
                 "3.10.0-1160.42.2.el7.x86_64",
-                0,
                 "kernel-core",
             ),
         ),
@@ -77,33 +90,18 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_eus_system_invalid_kernel_version(
         self,
         pretend_os,
-        repoquery_version,
+        repo_kernel_version,
         uname_version,
-        return_code,
         package_name,
         monkeypatch,
         is_loaded_kernel_latest_action,
         global_tool_opts,
     ):
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg(repo_kernel_version, name=package_name)])
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        package_name,
-                    ),
-                    (
-                        repoquery_version,
-                        return_code,
-                    ),
-                ),
-                (("uname", "-r"), (uname_version, return_code)),
+                (("uname", "-r"), (uname_version, 0)),
             ),
         )
         monkeypatch.setattr(
@@ -126,9 +124,8 @@ class TestIsLoadedKernelLatest:
 
     @pytest.mark.parametrize(
         (
-            "repoquery_version",
+            "repo_kernel_version",
             "uname_version",
-            "return_code",
             "package_name",
             "title",
             "description",
@@ -137,9 +134,8 @@ class TestIsLoadedKernelLatest:
         ),
         (
             (
-                "C2R\t1634146676\t1-1.01-5.02\tbaseos",
+                "1-1.01-5.02",
                 "2-1.01-5.02",
-                0,
                 "kernel-core",
                 "Invalid kernel package found",
                 "Please refer to the diagnosis for further information",
@@ -147,9 +143,8 @@ class TestIsLoadedKernelLatest:
                 None,
             ),
             (
-                "C2R\t1634146676\t1 .01-5.02\tbaseos",
+                "1 .01-5.02",
                 "1 .01-5.03",
-                0,
                 "kernel-core",
                 "Invalid kernel package found",
                 "Please refer to the diagnosis for further information",
@@ -163,9 +158,8 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_invalid_kernel_package_dnf(
         self,
         pretend_os,
-        repoquery_version,
+        repo_kernel_version,
         uname_version,
-        return_code,
         package_name,
         title,
         description,
@@ -175,25 +169,11 @@ class TestIsLoadedKernelLatest:
         is_loaded_kernel_latest_action,
         global_tool_opts,
     ):
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg(repo_kernel_version, name=package_name)])
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        package_name,
-                    ),
-                    (
-                        repoquery_version,
-                        return_code,
-                    ),
-                ),
-                (("uname", "-r"), (uname_version, return_code)),
+                (("uname", "-r"), (uname_version, 0)),
             ),
         )
         monkeypatch.setattr(
@@ -222,9 +202,8 @@ class TestIsLoadedKernelLatest:
 
     @pytest.mark.parametrize(
         (
-            "repoquery_version",
+            "repo_kernel_version",
             "uname_version",
-            "return_code",
             "package_name",
             "title",
             "description",
@@ -233,9 +212,8 @@ class TestIsLoadedKernelLatest:
         ),
         (
             (
-                "C2R\t1634146676\t1-1.01-5.02\tbaseos",
+                "1-1.01-5.02",
                 "2-1.01-5.02",
-                0,
                 "kernel",
                 "Invalid kernel package found",
                 "Please refer to the diagnosis for further information",
@@ -243,9 +221,8 @@ class TestIsLoadedKernelLatest:
                 None,
             ),
             (
-                "C2R\t1634146676\t1 .01-5.02\tbaseos",
+                "1 .01-5.02",
                 "1 .01-5.03",
-                0,
                 "kernel",
                 "Invalid kernel package found",
                 "Please refer to the diagnosis for further information",
@@ -259,9 +236,8 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_invalid_kernel_package_yum(
         self,
         pretend_os,
-        repoquery_version,
+        repo_kernel_version,
         uname_version,
-        return_code,
         package_name,
         title,
         description,
@@ -271,25 +247,11 @@ class TestIsLoadedKernelLatest:
         is_loaded_kernel_latest_action,
         global_tool_opts,
     ):
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg(repo_kernel_version, name=package_name)])
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        package_name,
-                    ),
-                    (
-                        repoquery_version,
-                        return_code,
-                    ),
-                ),
-                (("uname", "-r"), (uname_version, return_code)),
+                (("uname", "-r"), (uname_version, 0)),
             ),
         )
         monkeypatch.setattr(
@@ -320,24 +282,10 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_eus_system(
         self, pretend_os, monkeypatch, caplog, is_loaded_kernel_latest_action, global_tool_opts
     ):
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg("3.10.0-1160.45.1.el7")])
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        "kernel-core",
-                    ),
-                    (
-                        "C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos",
-                        0,
-                    ),
-                ),
                 (("uname", "-r"), ("3.10.0-1160.45.1.el7.x86_64", 0)),
             ),
         )
@@ -354,8 +302,6 @@ class TestIsLoadedKernelLatest:
     @centos8
     @pytest.mark.parametrize(
         (
-            "repoquery_stdout",
-            "return_code",
             "skip_check",
             "level",
             "id",
@@ -366,8 +312,6 @@ class TestIsLoadedKernelLatest:
         ),
         (
             pytest.param(
-                "",
-                0,
                 "1",
                 "WARNING",
                 "UNSUPPORTED_SKIP_KERNEL_CURRENCY_CHECK_DETECTED",
@@ -382,8 +326,6 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_skip_warnings(
         self,
         pretend_os,
-        repoquery_stdout,
-        return_code,
         skip_check,
         level,
         id,
@@ -395,31 +337,7 @@ class TestIsLoadedKernelLatest:
         caplog,
         is_loaded_kernel_latest_action,
     ):
-        run_subprocess_mocked = mock.Mock(
-            spec=run_subprocess,
-            side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        "kernel-core",
-                    ),
-                    (
-                        repoquery_stdout,
-                        return_code,
-                    ),
-                ),
-            ),
-        )
-        monkeypatch.setattr(
-            is_loaded_kernel_latest,
-            "run_subprocess",
-            value=run_subprocess_mocked,
-        )
+        get_repo_metadata_mocked = _mock_repo_metadata(monkeypatch)
         monkeypatch.setattr(
             os,
             "environ",
@@ -442,12 +360,12 @@ class TestIsLoadedKernelLatest:
         assert description in caplog.records[-1].message
         assert expected_set.issuperset(is_loaded_kernel_latest_action.messages)
         assert expected_set.issubset(is_loaded_kernel_latest_action.messages)
+        # The repository metadata is not loaded at all
+        assert not get_repo_metadata_mocked.called
 
     @centos8
     @pytest.mark.parametrize(
         (
-            "repoquery_stdout",
-            "return_code",
             "level",
             "id",
             "title",
@@ -457,8 +375,6 @@ class TestIsLoadedKernelLatest:
         ),
         (
             pytest.param(
-                "",
-                1,
                 "WARNING",
                 "UNABLE_TO_FETCH_RECENT_KERNELS",
                 "Unable to fetch recent kernels",
@@ -475,8 +391,6 @@ class TestIsLoadedKernelLatest:
     def test_is_loaded_kernel_latest_unable_to_fetch_kernels(
         self,
         pretend_os,
-        repoquery_stdout,
-        return_code,
         level,
         id,
         title,
@@ -488,30 +402,8 @@ class TestIsLoadedKernelLatest:
         is_loaded_kernel_latest_action,
         global_tool_opts,
     ):
-        run_subprocess_mocked = mock.Mock(
-            spec=run_subprocess,
-            side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        "kernel-core",
-                    ),
-                    (
-                        repoquery_stdout,
-                        return_code,
-                    ),
-                ),
-            ),
-        )
-        monkeypatch.setattr(
-            is_loaded_kernel_latest,
-            "run_subprocess",
-            value=run_subprocess_mocked,
+        _mock_repo_metadata(
+            monkeypatch, side_effect=repometa.RepoMetadataError("Error getting repository data for baseos")
         )
         monkeypatch.setattr(is_loaded_kernel_latest, "tool_opts", global_tool_opts)
 
@@ -535,8 +427,6 @@ class TestIsLoadedKernelLatest:
     @centos8
     @pytest.mark.parametrize(
         (
-            "repoquery_version",
-            "return_code",
             "package_name",
             "title",
             "description",
@@ -545,8 +435,6 @@ class TestIsLoadedKernelLatest:
         ),
         (
             pytest.param(
-                "",
-                0,
                 "kernel-core",
                 "Kernel currency check failed",
                 "Please refer to the diagnosis for further information",
@@ -556,15 +444,13 @@ class TestIsLoadedKernelLatest:
                     "If you wish to disregard this message, set the skip_kernel_currency_check inhibitor override in"
                     " the /etc/convert2rhel.ini config file to true."
                 ),
-                id="Repoquery failure without environment var",
+                id="No kernel in the repositories without environment var",
             ),
         ),
     )
     def test_is_loaded_kernel_latest_unsupported_skip_error(
         self,
         pretend_os,
-        repoquery_version,
-        return_code,
         package_name,
         title,
         description,
@@ -574,31 +460,8 @@ class TestIsLoadedKernelLatest:
         is_loaded_kernel_latest_action,
         global_tool_opts,
     ):
-        run_subprocess_mocked = mock.Mock(
-            spec=run_subprocess,
-            side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        package_name,
-                    ),
-                    (
-                        repoquery_version,
-                        return_code,
-                    ),
-                ),
-            ),
-        )
-        monkeypatch.setattr(
-            is_loaded_kernel_latest,
-            "run_subprocess",
-            value=run_subprocess_mocked,
-        )
+        # Only an unrelated package is available
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg("3.10.0-1160.45.1.el7", name="kernel-tools")])
         monkeypatch.setattr(is_loaded_kernel_latest, "tool_opts", global_tool_opts)
         is_loaded_kernel_latest_action.run()
         diagnosis = diagnosis.format(package_name)
@@ -614,68 +477,65 @@ class TestIsLoadedKernelLatest:
 
     @pytest.mark.parametrize(
         (
-            "repoquery_version",
+            "repo_kernels",
             "uname_version",
-            "return_code",
+            "metadata_error",
             "major_ver",
-            "package_name",
             "expected_message",
         ),
         (
             (
-                "C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos",
+                [_kernel_pkg("3.10.0-1160.45.1.el7")],
                 "3.10.0-1160.42.2.el7.x86_64",
-                1,
+                repometa.RepoMetadataError("Error getting repository data for baseos"),
                 8,
-                "kernel-core",
                 "Couldn't fetch the list of the most recent kernels available in the repositories.",
             ),
             (
-                "C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos",
+                [_kernel_pkg("3.10.0-1160.45.1.el7", name="kernel")],
                 "3.10.0-1160.45.1.el7.x86_64",
-                0,
+                None,
                 7,
-                "kernel",
                 "The currently loaded kernel is at the latest version.",
             ),
             (
-                """
-                Repository base is listed more than once in the configuration\n
-                Repository updates is listed more than once in the configuration\n
-                Repository extras is listed more than once in the configuration\n
-                Repository centosplus is listed more than once in the configuration\n
-                C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos\n
-                Could not retrieve mirrorlist http://mirorlist.centos.org/?release=7&arch=x86_64&repo=os&infra=stock error was\n
-                14: curl#6 - "Could not resolve host: mirorlist.centos.org; Unknown error"\n
-                Repo convert2rhel-for-rhel-7-rpms forced skip_if_unavailable=True due to: /etc/rhsm/ca/redhat-uep.pem\n
-                """,
+                [_kernel_pkg("3.10.0-1160.45.1.el7")],
                 "3.10.0-1160.45.1.el7.x86_64",
-                0,
+                None,
                 8,
-                "kernel-core",
                 "The currently loaded kernel is at the latest version.",
             ),
+            # The most recently built kernel is the latest one
             (
-                """
-                gargabe-output before the good line\n
-                C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos\n
-                more garbage\n
-                """,
+                [
+                    _kernel_pkg("3.10.0-1160.42.2.el7", buildtime=1630000000),
+                    _kernel_pkg("3.10.0-1160.45.1.el7", buildtime=1634146676, repoid="updates"),
+                    _kernel_pkg("3.10.0-1160.el7", buildtime=1600000000),
+                ],
                 "3.10.0-1160.45.1.el7.x86_64",
-                0,
+                None,
+                8,
+                "The currently loaded kernel is at the latest version.",
+            ),
+            # The kernels of other architectures are ignored
+            (
+                [
+                    _kernel_pkg("3.10.0-1160.45.1.el7", buildtime=1634146676),
+                    _kernel_pkg("3.10.0-1160.49.1.el7", buildtime=1640000000, arch="i686"),
+                ],
+                "3.10.0-1160.45.1.el7.x86_64",
+                None,
                 8,
-                "kernel-core",
                 "The currently loaded kernel is at the latest version.",
             ),
         ),
     )
     def test_is_loaded_kernel_latest(
         self,
-        repoquery_version,
+        repo_kernels,
         uname_version,
-        return_code,
+        metadata_error,
         major_ver,
-        package_name,
         expected_message,
         monkeypatch,
         caplog,
@@ -694,25 +554,11 @@ class TestIsLoadedKernelLatest:
             value=Version(major=major_ver, minor=99),
         )
         monkeypatch.setattr(is_loaded_kernel_latest.system_info, "id", "centos")
+        _mock_repo_metadata(monkeypatch, repo_kernels, side_effect=metadata_error)
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        package_name,
-                    ),
-                    (
-                        repoquery_version,
-                        return_code,
-                    ),
-                ),
-                (("uname", "-r"), (uname_version, return_code)),
+                (("uname", "-r"), (uname_version, 0)),
             ),
         )
         monkeypatch.setattr(is_loaded_kernel_latest, "tool_opts", global_tool_opts)
@@ -726,7 +572,6 @@ class TestIsLoadedKernelLatest:
         assert expected_message in caplog.records[-1].message
 
     def test_is_loaded_kernel_latest_system_exit(self, monkeypatch, is_loaded_kernel_latest_action, global_tool_opts):
-        repoquery_version = "C2R\t1634146676\t3.10.0-1160.45.1.el7\tbaseos"
         uname_version = "3.10.0-1160.42.2.el7.x86_64"
 
         # Using the minor version as 99, so the tests should never fail because
@@ -741,24 +586,10 @@ class TestIsLoadedKernelLatest:
             value=Version(major=8, minor=99),
         )
         monkeypatch.setattr(is_loaded_kernel_latest.system_info, "id", "centos")
+        _mock_repo_metadata(monkeypatch, [_kernel_pkg("3.10.0-1160.45.1.el7")])
         run_subprocess_mocked = mock.Mock(
             spec=run_subprocess,
             side_effect=run_subprocess_side_effect(
-                (
-                    (
-                        "repoquery",
-                        "--setopt=exclude=",
-                        "--quiet",
-                        "--disablerepo=rhel*",
-                        "--qf",
-                        "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                        "kernel-core",
-                    ),
-                    (
-                        repoquery_version,
-                        0,
-                    ),
-                ),
                 (("uname", "-r"), (uname_version, 0)),
             ),
         )
@@ -781,58 +612,21 @@ class TestIsLoadedKernelLatest:
         )
 
     @centos7
-    @pytest.mark.parametrize(
-        ("enablerepos", "expected_cmd"),
-        (
-            (
-                [],
-                [
-                    "repoquery",
-                    "--setopt=exclude=",
-                    "--quiet",
-                    "--disablerepo=rhel*",
-                    "--qf",
-                    "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                    "kernel",
-                ],
-            ),
-            (
-                ["test-repo"],
-                [
-                    "repoquery",
-                    "--setopt=exclude=",
-                    "--quiet",
-                    "--disablerepo=rhel*",
-                    "--qf",
-                    "C2R\\t%{BUILDTIME}\\t%{VERSION}-%{RELEASE}\\t%{REPOID}",
-                    "kernel",
-                ],
-            ),
-        ),
-    )
+    @pytest.mark.parametrize("enablerepos", ([], ["test-repo"]))
     def test_is_loaded_kernel_latest_disable_repos(
         self,
         monkeypatch,
         enablerepos,
-        expected_cmd,
         is_loaded_kernel_latest_action,
         pretend_os,
         global_tool_opts,
     ):
-        """Test if the --disablerepo part of the command is built propertly."""
-        run_subprocess = mock.Mock(return_value=[None, None])
-        monkeypatch.setattr(
-            is_loaded_kernel_latest,
-            "run_subprocess",
-            run_subprocess,
-        )
+        """Test if the RHEL repositories are disabled when querying the available kernels."""
+        get_repo_metadata_mocked = _mock_repo_metadata(monkeypatch)
         global_tool_opts.enablerepos = enablerepos
         monkeypatch.setattr(is_loaded_kernel_latest, "tool_opts", global_tool_opts)
         monkeypatch.setattr(repo, "tool_opts", global_tool_opts)
 
         is_loaded_kernel_latest_action.run()
 
-        run_subprocess.assert_called_with(
-            expected_cmd,
-            print_output=False,
-        )
+        get_repo_metadata_mocked.assert_called_with(disable_repos=["rhel*"])
@@ -1,13 +1,36 @@
 __metaclass__ = type
 
 import hashlib
+import threading
+import time
 
 import pytest
 
 from convert2rhel import backup
+from convert2rhel.logger import root_logger
 from convert2rhel.unit_tests import ErrorOnRestoreRestorable, FilePathRestorable, MinimalRestorable
 
 
+class ParallelRestorable(MinimalRestorable):
+    parallel_safe = True
+
+    def __init__(self, filepath, exception=None):
+        self.filepath = filepath
+        self.exception = exception
+        self.thread_name = None
+        super(ParallelRestorable, self).__init__()
+
+    def restore(self):
+        super(ParallelRestorable, self).restore()
+        self.thread_name = threading.current_thread().name
+        root_logger.task("Restore {}".format(self.filepath))
+        # Give the other threads the chance to log in the middle of the restore
+        time.sleep(0.01)
+        root_logger.info("Restored {}".format(self.filepath))
+        if self.exception:
+            raise self.exception
+
+
 @pytest.fixture
 def backup_controller():
     return backup.BackupController()
@@ -48,6 +71,18 @@ class TestBackupController:
         assert restorable1.called["restore"] == 1
         assert restorable2.called["restore"] == 0
 
+    def test_backup_same_paths_after_pop(self, backup_controller):
+        restorable1 = FilePathRestorable("samepath")
+        restorable2 = FilePathRestorable("samepath")
+
+        backup_controller.push(restorable1)
+        backup_controller.pop()
+        backup_controller.push(restorable2)
+
+        # Once restored, the same path can be backed up again
+        assert restorable2.called["enable"] == 1
+        assert backup_controller._restorables == [restorable2]
+
     def test_pop_multiple(self, backup_controller):
         restorable1 = MinimalRestorable()
         restorable2 = MinimalRestorable()
@@ -139,6 +174,82 @@ class TestBackupController:
             "Error while rolling back a ErrorOnRestoreRestorable: Restorable2 failed"
         ]
 
+    def test_pop_all_parallel(self, backup_controller, caplog):
+        restorable1 = ParallelRestorable("/etc/file1", exception=ValueError("file1 failed"))
+        restorable2 = ParallelRestorable("/etc/file2", exception=ValueError("file2 failed"))
+        restorable3 = ParallelRestorable("/etc/file3")
+
+        backup_controller.push(restorable1)
+        backup_controller.push(restorable2)
+        backup_controller.push(restorable3)
+
+        popped_restorables = backup_controller.pop_all()
+
+        assert popped_restorables == [restorable3, restorable2, restorable1]
+        assert all(r.called["restore"] == 1 for r in popped_restorables)
+        assert all(r.thread_name.startswith("rollback-") for r in popped_restorables)
+        assert len(backup_controller) == 0
+        # The failures are reported in the rollback order no matter which thread finished first
+        assert backup_controller.rollback_failures == [
+            "Error while rolling back a ParallelRestorable: file2 failed",
+            "Error while rolling back a ParallelRestorable: file1 failed",
+        ]
+        assert [r.message for r in caplog.records if r.levelname == "WARNING"] == backup_controller.rollback_failures
+
+    def test_pop_all_parallel_log_order(self, backup_controller, caplog):
+        restorables = [ParallelRestorable("/etc/file{}".format(number)) for number in range(4)]
+        restorables[2].exception = ValueError("file2 failed")
+        for restorable in restorables:
+            backup_controller.push(restorable)
+
+        backup_controller.pop_all()
+
+        # The messages of each restorable are logged together and in the rollback order
+        assert [r.message for r in caplog.records] == [
+            "Restore /etc/file3",
+            "Restored /etc/file3",
+            "Restore /etc/file2",
+            "Restored /etc/file2",
+            "Error while rolling back a ParallelRestorable: file2 failed",
+            "Restore /etc/file1",
+            "Restored /etc/file1",
+            "Restore /etc/file0",
+            "Restored /etc/file0",
+        ]
+        # Nothing is held back after the rollback
+        root_logger.info("After the rollback")
+        assert caplog.records[-1].message == "After the rollback"
+
+
+@pytest.mark.parametrize(
+    ("restorables", "expected"),
+    (
+        ([], []),
+        (
+            [ParallelRestorable("/a"), ParallelRestorable("/b"), ParallelRestorable("/c")],
+            [[0, 1, 2]],
+        ),
+        # Changes which aren't parallel safe are barriers
+        (
+            [ParallelRestorable("/a"), MinimalRestorable(), ParallelRestorable("/b"), ParallelRestorable("/c")],
+            [[0], [1], [2, 3]],
+        ),
+        (
+            [MinimalRestorable(), MinimalRestorable()],
+            [[0], [1]],
+        ),
+        # The same path can't be restored twice at the same time
+        (
+            [ParallelRestorable("/a"), ParallelRestorable("/b"), ParallelRestorable("/a"), ParallelRestorable("/c")],
+            [[0, 1], [2, 3]],
+        ),
+    ),
+)
+def test_plan_rollback(restorables, expected):
+    batches = backup._plan_rollback(restorables)
+
+    assert [[restorables.index(r) for r in batch] for batch in batches] == expected
+
 
 def test_get_backedup_system_repos(monkeypatch):
     # Just so we can generate the same hash all the time.
@@ -4,6 +4,7 @@ import hashlib
 import os
 
 import pytest
+import six
 
 from convert2rhel import exceptions
 from convert2rhel.backup import files
@@ -11,6 +12,10 @@ from convert2rhel.backup.files import InstalledFile, MissingFile, RestorableFile
 from convert2rhel.unit_tests.conftest import centos7, centos8
 
 
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
 class TestRestorableFile:
     @pytest.fixture
     def get_backup_file_dir(self, tmpdir, filename="filename", content="content", backup_dir_name="backup"):
@@ -283,6 +288,68 @@ class TestRestorableFile:
 
         assert "Error(13): Permission denied" in caplog.records[-1].message
 
+    def test_restorable_file_same_content_stored_once(self, tmpdir, monkeypatch, global_backup_control):
+        backup_dir = str(tmpdir.mkdir("backup"))
+        monkeypatch.setattr(files, "BACKUP_DIR", backup_dir)
+        file1 = tmpdir.mkdir("dir1").join("file.conf")
+        file1.write("content")
+        file2 = tmpdir.mkdir("dir2").join("file.conf")
+        file2.write("content")
+        file1.chmod(0o644)
+        file2.chmod(0o600)
+        restorable1 = RestorableFile(str(file1))
+        restorable2 = RestorableFile(str(file2))
+
+        global_backup_control.push(restorable1)
+        global_backup_control.push(restorable2)
+
+        assert restorable1.content_path == restorable2.content_path
+        assert os.path.samefile(restorable1.backup_path, restorable2.backup_path)
+        content_dir = os.path.dirname(restorable1.content_path)
+        assert os.listdir(content_dir) == [os.path.basename(restorable1.content_path)]
+
+        file1.remove()
+        file2.write("modified")
+        global_backup_control.pop_all()
+
+        # Each file gets its own permissions back even though the content is shared
+        assert file1.read() == file2.read() == "content"
+        assert os.stat(str(file1)).st_mode & 0o777 == 0o644
+        assert os.stat(str(file2)).st_mode & 0o777 == 0o600
+        assert not os.path.exists(restorable1.content_path)
+
+    def test_restorable_file_content_kept_while_referenced(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(files, "BACKUP_DIR", str(tmpdir.mkdir("backup")))
+        file1 = tmpdir.join("file1")
+        file1.write("content")
+        file2 = tmpdir.join("file2")
+        file2.write("content")
+        restorable1 = RestorableFile(str(file1))
+        restorable2 = RestorableFile(str(file2))
+        restorable1.enable()
+        restorable2.enable()
+
+        restorable2.restore()
+
+        assert os.path.isfile(restorable1.content_path)
+        restorable1.restore()
+        assert not os.path.exists(restorable1.content_path)
+
+    def test_store_file_content_no_reflink(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(files, "BACKUP_DIR", str(tmpdir))
+        monkeypatch.setattr(files.fcntl, "ioctl", mock.Mock(side_effect=IOError(95, "Operation not supported")))
+        original = tmpdir.join("file")
+        original.write("content")
+
+        content_path = files.store_file_content(str(original))
+
+        assert content_path == os.path.join(
+            str(tmpdir), "content", hashlib.sha256(b"content").hexdigest()[:2], hashlib.sha256(b"content").hexdigest()
+        )
+        with open(content_path) as f:
+            assert f.read() == "content"
+        assert os.stat(content_path).st_mode & 0o777 == 0o600
+
     @pytest.mark.parametrize(
         ("filepath",),
         (
@@ -28,7 +28,6 @@ from convert2rhel.backup.packages import RestorablePackage, RestorablePackageSet
 from convert2rhel.systeminfo import Version
 from convert2rhel.unit_tests import (
     CallYumCmdMocked,
-    DownloadPkgMocked,
     MockFunctionObject,
     RemovePkgsMocked,
     RunSubprocessMocked,
@@ -98,27 +97,32 @@ class TestRestorablePackage:
 
     def test_enable(self, monkeypatch, tmpdir, global_backup_control):
         monkeypatch.setattr(packages, "BACKUP_DIR", str(tmpdir))
-        monkeypatch.setattr(utils, "download_pkg", DownloadPkgMocked())
         pkgs = ["pkg1", "pkg2", "pkg3"]
+        monkeypatch.setattr(
+            utils, "download_pkgs", DownloadPkgsMocked(return_value=["/path/to/{}.rpm".format(pkg) for pkg in pkgs])
+        )
         rp = RestorablePackage(pkgs=pkgs)
         global_backup_control.push(rp)
 
-        assert utils.download_pkg.call_count == len(pkgs)
+        # All the packages are downloaded at once
+        assert utils.download_pkgs.call_count == 1
+        assert utils.download_pkgs.pkgs == pkgs
+        assert utils.download_pkgs.dest == str(tmpdir)
         assert len(global_backup_control._restorables) == 1
         assert len(rp._backedup_pkgs_paths) == len(pkgs)
 
     def test_package_already_enabled(self, monkeypatch, tmpdir):
         monkeypatch.setattr(packages, "BACKUP_DIR", str(tmpdir))
-        monkeypatch.setattr(utils, "download_pkg", DownloadPkgMocked())
+        monkeypatch.setattr(utils, "download_pkgs", DownloadPkgsMocked())
 
         rp = RestorablePackage(pkgs=["test.rpm"])
         rp.enable()
-        assert utils.download_pkg.call_count == 1
+        assert utils.download_pkgs.call_count == 1
 
         rp.enable()
         # Assert that we are still at call_count 1 meaning that we returning
         # earlier without going through the backup.
-        assert utils.download_pkg.call_count == 1
+        assert utils.download_pkgs.call_count == 1
 
     def test_restore(self, monkeypatch):
         monkeypatch.setattr(
@@ -17,7 +17,9 @@
 
 __metaclass__ = type
 
+import collections
 import json
+import os
 
 import pytest
 import six
@@ -230,6 +232,67 @@ def test_write_obj_to_array_json(tmpdir, file, content, key, out):
         assert sorted(json.loads(path.read())) == sorted(json.loads(out))
 
 
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{"key": [{"some_key": "old_data"}]}\n',
+        json.dumps({"key": [{"some_key": "old_data"}, {"some_key": "older_data"}]}, indent=4),
+        '{"key": [{"some_key": "old_data"}], "diff_key": "other_data"}',
+        '{"key": [{"some_key": "old_data"}], "leapp": [{"other_key": "other_data"}]}',
+    ],
+)
+def test_write_obj_to_array_json_keeps_content(tmpdir, content):
+    path = tmpdir.join("migration-results")
+    path.write(content)
+    expected = json.loads(content)
+    expected["key"].append({"some_key": "some_data"})
+
+    breadcrumbs._write_obj_to_array_json(str(path), {"some_key": "some_data"}, "key")
+
+    assert json.loads(path.read()) == expected
+    # The keys written by other tools keep their order
+    assert list(json.loads(path.read(), object_pairs_hook=collections.OrderedDict)) == list(
+        json.loads(content, object_pairs_hook=collections.OrderedDict)
+    )
+    assert tmpdir.listdir() == [path]
+
+
+def test_write_obj_to_array_json_corrupted_in_the_middle(tmpdir):
+    path = tmpdir.join("migration-results")
+    content = '{"key": [{"some_key": "old_data"}, not json {"some_key": "older_data"}]}'
+    path.write(content)
+
+    breadcrumbs._write_obj_to_array_json(str(path), {"some_key": "some_data"}, "key")
+
+    # The corrupted content stays there and the object is not appended to it
+    assert path.read().startswith(content)
+    assert json.loads(path.read()[len(content) :]) == {"key": [{"some_key": "some_data"}]}
+
+
+def test_write_obj_to_array_json_rewrite_fails(tmpdir, monkeypatch):
+    path = tmpdir.join("migration-results")
+    content = '{"key": [{"some_key": "old_data"}], "diff_key": "other_data"}'
+    path.write(content)
+    monkeypatch.setattr(breadcrumbs.os, "rename", mock.Mock(side_effect=OSError("No space left on device")))
+
+    with pytest.raises(OSError):
+        breadcrumbs._write_obj_to_array_json(str(path), {"some_key": "some_data"}, "key")
+
+    # The file is only replaced once the new content is complete
+    assert path.read() == content
+    assert tmpdir.listdir() == [path]
+
+
+def test_write_obj_to_array_json_many(tmpdir):
+    path = tmpdir.join("migration-results")
+
+    for index in range(3):
+        breadcrumbs._write_obj_to_array_json(str(path), {"some_key": index}, "key")
+
+    assert json.loads(path.read()) == {"key": [{"some_key": 0}, {"some_key": 1}, {"some_key": 2}]}
+    assert oct(os.stat(str(path)).st_mode & 0o777) == oct(0o600)
+
+
 @centos7
 def test_save_rhsm_facts(pretend_os, monkeypatch, tmpdir, caplog):
     rhsm_file = str(tmpdir.join("convert2rhel.facts"))
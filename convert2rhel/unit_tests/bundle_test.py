@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import gzip
+import json
+import os
+import tarfile
+
+import pytest
+import six
+
+from convert2rhel import bundle, repometa, utils
+from convert2rhel.backup.files import InstalledFile
+from convert2rhel.pkgmanager.handlers import base
+from convert2rhel.pkgmanager.handlers.base import ValidatedTransaction
+from convert2rhel.systeminfo import Version
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
+REPOMD_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo" xmlns:rpm="http://linux.duke.edu/metadata/rpm">
+  <revision>1700000000</revision>
+  <data type="primary">
+    <checksum type="sha256">aaa</checksum>
+    <location href="repodata/aaa-primary.xml.gz"/>
+  </data>
+  <data type="other">
+    <checksum type="sha256">bbb</checksum>
+    <location href="repodata/bbb-other.xml.gz"/>
+  </data>
+</repomd>
+"""
+
+PRIMARY_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="2">
+<package type="rpm">
+  <name>bash</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="4.2.46" rel="35.el7_9"/>
+  <location href="Packages/bash-4.2.46-35.el7_9.x86_64.rpm"/>
+</package>
+<package type="rpm">
+  <name>redhat-release-server</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="7.9" rel="6.el7_9"/>
+  <location href="Packages/redhat-release-server-7.9-6.el7_9.x86_64.rpm"/>
+</package>
+</metadata>
+"""
+
+
+@pytest.fixture
+def reference_system(monkeypatch, tmpdir, global_tool_opts):
+    """The cache of the package manager and the validated transaction of a system the bundle is created on."""
+    monkeypatch.setattr(bundle.system_info, "id", "centos")
+    monkeypatch.setattr(bundle.system_info, "version", Version(7, 9))
+    monkeypatch.setattr(bundle.system_info, "arch", "x86_64")
+    monkeypatch.setattr(bundle.system_info, "releasever", "7Server")
+    monkeypatch.setattr(bundle.system_info, "get_enabled_rhel_repos", mock.Mock(return_value=["rhel-7-server-rpms"]))
+    monkeypatch.setattr(bundle, "tool_opts", global_tool_opts)
+
+    repodata = tmpdir.mkdir("cache").mkdir("rhel-7-server-rpms").mkdir("repodata")
+    repodata.join("repomd.xml").write(REPOMD_XML)
+    primary = str(repodata.join("aaa-primary.xml.gz"))
+    with gzip.open(primary, "wb") as primary_file:
+        primary_file.write(PRIMARY_XML.encode("utf-8"))
+    package = repodata.dirpath().mkdir("packages").join("bash-4.2.46-35.el7_9.x86_64.rpm")
+    package.write("bash")
+    monkeypatch.setattr(
+        repometa,
+        "get_metadata_files",
+        mock.Mock(return_value=[repometa.RepoMetadataFiles("rhel-7-server-rpms", primary, None)]),
+    )
+
+    data_dir = tmpdir.mkdir("data")
+    data_dir.mkdir("gpg-keys").join("RPM-GPG-KEY-redhat-release").write("key")
+    monkeypatch.setattr(utils, "DATA_DIR", str(data_dir))
+
+    validated_transaction_file = str(tmpdir.join("validated-transaction.json"))
+    monkeypatch.setattr(base, "VALIDATED_TRANSACTION_FILE", validated_transaction_file)
+    ValidatedTransaction(
+        (1, 2, 3),
+        {"rhel-7-server-rpms": "abc"},
+        [["upgrade", "bash-0:4.2.46-35.el7_9.x86_64", str(package)], ["remove", "centos-logos-0:70.0.6-3.el7", None]],
+    ).save()
+
+    return str(package)
+
+
+@pytest.fixture
+def bundle_path(reference_system, tmpdir):
+    path = str(tmpdir.join("convert2rhel-bundle.tar"))
+    bundle.create_bundle(path)
+    return path
+
+
+@pytest.fixture
+def bundle_dir(monkeypatch, tmpdir, global_backup_control):
+    bundle_dir = str(tmpdir.join("bundle"))
+    monkeypatch.setattr(bundle, "BUNDLE_DIR", bundle_dir)
+    monkeypatch.setattr(bundle, "BUNDLE_REPOFILE", str(tmpdir.join("convert2rhel-bundle.repo")))
+    return bundle_dir
+
+
+def _rewrite_bundle(path, replace_member):
+    """Rewrite a bundle, replacing the content of its members by the result of replace_member(name, content)."""
+    members = []
+    with tarfile.open(path) as archive:
+        for member in archive:
+            members.append((member, replace_member(member.name, archive.extractfile(member).read())))
+
+    with tarfile.open(path, "w") as archive:
+        for member, content in members:
+            member.size = len(content)
+            archive.addfile(member, six.BytesIO(content))
+
+
+class TestCreateBundle:
+    def test_create_bundle(self, bundle_path):
+        with tarfile.open(bundle_path) as archive:
+            names = archive.getnames()
+            manifest = json.loads(archive.extractfile(bundle.MANIFEST_FILENAME).read().decode("utf-8"))
+            repomd = archive.extractfile("repos/rhel-7-server-rpms/repodata/repomd.xml").read().decode("utf-8")
+
+        assert names[0] == bundle.MANIFEST_FILENAME
+        assert sorted(names[1:]) == sorted(manifest["files"])
+        assert sorted(manifest["files"]) == [
+            "gpg-keys/RPM-GPG-KEY-redhat-release",
+            "repos/rhel-7-server-rpms/Packages/bash-4.2.46-35.el7_9.x86_64.rpm",
+            "repos/rhel-7-server-rpms/repodata/aaa-primary.xml.gz",
+            "repos/rhel-7-server-rpms/repodata/repomd.xml",
+        ]
+        assert manifest["system"] == {"id": "centos", "version": "7.9", "arch": "x86_64"}
+        assert manifest["repos"] == ["rhel-7-server-rpms"]
+        assert manifest["packages"] == [
+            ["upgrade", "bash-0:4.2.46-35.el7_9.x86_64"],
+            ["remove", "centos-logos-0:70.0.6-3.el7"],
+        ]
+        # The metadata that was not downloaded is not listed
+        assert "aaa-primary.xml.gz" in repomd
+        assert "bbb-other.xml.gz" not in repomd
+        assert not os.path.exists(bundle_path + ".staging")
+
+    def test_create_bundle_without_validated_transaction(self, reference_system, tmpdir):
+        ValidatedTransaction.discard()
+
+        with pytest.raises(bundle.BundleError, match="only after the transaction is validated"):
+            bundle.create_bundle(str(tmpdir.join("convert2rhel-bundle.tar")))
+
+    def test_create_bundle_package_not_in_repositories(self, reference_system, tmpdir):
+        ValidatedTransaction(
+            (1, 2, 3), {}, [["install", "vim-0:7.4.629-8.el7_9.x86_64", "/cache/vim-7.4.629-8.el7_9.x86_64.rpm"]]
+        ).save()
+
+        with pytest.raises(bundle.BundleError, match="vim-7.4.629-8.el7_9.x86_64.rpm"):
+            bundle.create_bundle(str(tmpdir.join("convert2rhel-bundle.tar")))
+
+    def test_create_bundle_metadata_unavailable(self, reference_system, tmpdir):
+        repometa.get_metadata_files.side_effect = repometa.RepoMetadataError(
+            "Error getting repository data for rhel-7-server-rpms"
+        )
+
+        with pytest.raises(bundle.BundleError, match="Error getting repository data for rhel-7-server-rpms"):
+            bundle.create_bundle(str(tmpdir.join("convert2rhel-bundle.tar")))
+
+
+class TestUseBundle:
+    def test_use_bundle(self, bundle_path, bundle_dir, global_backup_control):
+        assert bundle.use_bundle(bundle_path) == ["rhel-7-server-rpms"]
+
+        with open(os.path.join(bundle_dir, "repos/rhel-7-server-rpms/Packages/bash-4.2.46-35.el7_9.x86_64.rpm")) as f:
+            assert f.read() == "bash"
+        with open(bundle.BUNDLE_REPOFILE) as repofile:
+            assert repofile.read() == (
+                "[rhel-7-server-rpms]\n"
+                "name=rhel-7-server-rpms from the conversion bundle\n"
+                "baseurl=file://{0}/repos/rhel-7-server-rpms\n"
+                "enabled=0\n"
+                "gpgcheck=1\n"
+                "gpgkey=file://{0}/gpg-keys/RPM-GPG-KEY-redhat-release\n".format(bundle_dir)
+            )
+        assert len(global_backup_control._restorables) == 1
+        restorable = global_backup_control._restorables[0]
+        assert isinstance(restorable, InstalledFile)
+        assert restorable.filepath == bundle.BUNDLE_REPOFILE
+        assert restorable.enabled
+
+    def test_use_bundle_other_system(self, bundle_path, bundle_dir, monkeypatch):
+        monkeypatch.setattr(bundle.system_info, "version", Version(7, 8))
+
+        with pytest.raises(bundle.BundleError, match="created for centos 7.9 x86_64"):
+            bundle.use_bundle(bundle_path)
+
+        assert not os.path.exists(bundle.BUNDLE_REPOFILE)
+
+
+class TestExtractBundle:
+    def test_extract_bundle_removes_previous_content(self, bundle_path, tmpdir):
+        directory = tmpdir.mkdir("extracted")
+        directory.join("stale").write("")
+
+        manifest = bundle.extract_bundle(bundle_path, str(directory))
+
+        assert manifest["repos"] == ["rhel-7-server-rpms"]
+        assert not directory.join("stale").exists()
+
+    def test_checksum_mismatch(self, bundle_path, tmpdir):
+        _rewrite_bundle(bundle_path, lambda name, content: b"tampered" if name.endswith(".rpm") else content)
+
+        with pytest.raises(bundle.BundleError, match="checksum of .*bash-4.2.46-35.el7_9.x86_64.rpm does not match"):
+            bundle.extract_bundle(bundle_path, str(tmpdir.join("extracted")))
+
+    def test_unsupported_version(self, bundle_path, tmpdir):
+        def replace_manifest(name, content):
+            if name != bundle.MANIFEST_FILENAME:
+                return content
+            manifest = json.loads(content.decode("utf-8"))
+            manifest["format_version"] = bundle.BUNDLE_FORMAT_VERSION + 1
+            return json.dumps(manifest).encode("utf-8")
+
+        _rewrite_bundle(bundle_path, replace_manifest)
+
+        with pytest.raises(bundle.BundleError, match="Unsupported version"):
+            bundle.extract_bundle(bundle_path, str(tmpdir.join("extracted")))
+
+    def test_member_outside_of_bundle(self, tmpdir):
+        path = str(tmpdir.join("convert2rhel-bundle.tar"))
+        manifest = tmpdir.join(bundle.MANIFEST_FILENAME)
+        manifest.write(json.dumps({"format_version": bundle.BUNDLE_FORMAT_VERSION, "files": {"../escape": "abc"}}))
+        with tarfile.open(path, "w") as archive:
+            archive.add(str(manifest), bundle.MANIFEST_FILENAME)
+            archive.add(str(manifest), "../escape")
+
+        with pytest.raises(bundle.BundleError, match="outside of the bundle"):
+            bundle.extract_bundle(path, str(tmpdir.join("extracted")))
+
+        assert not tmpdir.join("escape").exists()
+
+    @pytest.mark.parametrize(("content",), ((None,), ("not a tar file",)))
+    def test_unreadable_bundle(self, content, tmpdir):
+        path = tmpdir.join("convert2rhel-bundle.tar")
+        if content is not None:
+            path.write(content)
+
+        with pytest.raises(bundle.BundleError, match="Unable to read the conversion bundle"):
+            bundle.extract_bundle(str(path), str(tmpdir.join("extracted")))
+
+
+def test_remove_repofile(tmpdir, monkeypatch):
+    repofile = tmpdir.join("convert2rhel-bundle.repo")
+    repofile.write("")
+    monkeypatch.setattr(bundle, "BUNDLE_REPOFILE", str(repofile))
+
+    bundle.remove_repofile()
+    # Removing a missing repofile is fine
+    bundle.remove_repofile()
+
+    assert not repofile.exists()
@@ -449,6 +449,31 @@ def test_pre_assessment_set(argv, expected, monkeypatch, global_tool_opts):
     assert cli.tool_opts.activity == expected
 
 
+@pytest.mark.parametrize(
+    ("argv", "expected"),
+    (
+        (mock_cli_arguments(["analyze"]), 1),
+        (mock_cli_arguments(["analyze", "--jobs", "4"]), 4),
+        (mock_cli_arguments(["-j", "2"]), 2),
+    ),
+)
+def test_jobs_option(argv, expected, monkeypatch):
+    monkeypatch.setattr(sys, "argv", argv)
+
+    cli.CLI()
+
+    assert cli.tool_opts.jobs == expected
+
+
+def test_jobs_option_invalid(monkeypatch, caplog):
+    monkeypatch.setattr(sys, "argv", mock_cli_arguments(["analyze", "--jobs", "0"]))
+
+    with pytest.raises(SystemExit):
+        cli.CLI()
+
+    assert "The --jobs option requires a number greater than or equal to 1." in caplog.records[-1].message
+
+
 @pytest.mark.parametrize(
     ("argv", "expected"),
     (
@@ -495,12 +520,60 @@ def test_disable_and_enable_repos_with_different_repos(argv, expected, monkeypat
     assert expected not in caplog.records[-1].message
 
 
+def test_bundle_create(monkeypatch, global_tool_opts):
+    monkeypatch.setattr(cli, "tool_opts", global_tool_opts)
+    monkeypatch.setattr(
+        sys, "argv", mock_cli_arguments(["bundle", "create", "/srv/bundle.tar", "--no-rhsm", "--enablerepo", "rhel"])
+    )
+
+    cli.CLI()
+
+    assert cli.tool_opts.activity == "analysis"
+    assert cli.tool_opts.bundle_output == "/srv/bundle.tar"
+    assert not cli.tool_opts.bundle
+
+
+def test_bundle_option(monkeypatch, global_tool_opts):
+    monkeypatch.setattr(cli, "tool_opts", global_tool_opts)
+    monkeypatch.setattr(sys, "argv", mock_cli_arguments(["convert", "--bundle", "/srv/bundle.tar"]))
+
+    cli.CLI()
+
+    assert cli.tool_opts.bundle == "/srv/bundle.tar"
+    assert cli.tool_opts.no_rhsm
+    assert not cli.tool_opts.bundle_output
+
+
+@pytest.mark.parametrize(
+    ("argv", "message"),
+    (
+        (
+            ["bundle", "create", "/srv/new-bundle.tar", "--bundle", "/srv/bundle.tar"],
+            "The --bundle option can't be used when creating a bundle.",
+        ),
+        (
+            ["analyze", "--bundle", "/srv/bundle.tar", "--enablerepo", "rhel"],
+            "The --enablerepo option can't be used together with --bundle.",
+        ),
+    ),
+)
+def test_bundle_option_conflicts(argv, message, monkeypatch, caplog):
+    monkeypatch.setattr(sys, "argv", mock_cli_arguments(argv))
+
+    with pytest.raises(SystemExit):
+        cli.CLI()
+
+    assert message in caplog.records[-1].message
+
+
 @pytest.mark.parametrize(
     ("argv", "expected"),
     (
         ([], ["convert"]),
         (["--debug"], ["convert", "--debug"]),
         (["analyze", "--debug"], ["analyze", "--debug"]),
+        (["bundle", "create", "/srv/bundle.tar"], ["bundle", "create", "/srv/bundle.tar"]),
+        (["--bundle", "/srv/bundle.tar"], ["convert", "--bundle", "/srv/bundle.tar"]),
         (["--password=convert", "--debug"], ["convert", "--password=convert", "--debug"]),
     ),
 )
@@ -7,7 +7,7 @@ import sys
 import pytest
 import six
 
-from convert2rhel import backup, pkgmanager, redhatrelease, systeminfo, toolopts, utils
+from convert2rhel import backup, pkghandler, pkgmanager, redhatrelease, systeminfo, toolopts, utils
 from convert2rhel.backup.certs import RestorablePEMCert
 from convert2rhel.logger import setup_logger_handler
 from convert2rhel.systeminfo import system_info
@@ -84,6 +84,21 @@ def setup_logger(request):
         logger.removeHandler(handler)
 
 
+@pytest.fixture(autouse=True)
+def stop_child_process_worker():
+    """Stop the child process worker after each test so that it does not outlive the test's monkeypatching."""
+    yield
+    utils.child_process_worker.stop()
+
+
+@pytest.fixture(autouse=True)
+def sack_sessions(monkeypatch):
+    """Do not share the yum/dnf bases between tests."""
+    sack_sessions = pkghandler.SackSessionManager()
+    monkeypatch.setattr(pkghandler, "sack_sessions", sack_sessions)
+    return sack_sessions
+
+
 @pytest.fixture
 def system_cert_with_target_path(tmpdir):
     """
@@ -133,6 +148,9 @@ class CliConfigMock:
         self.els = None
         self.activity = None
         self.serverurl = None
+        self.jobs = 1
+        self.bundle = None
+        self.bundle_output = None
 
     def run(self):
         pass
@@ -181,6 +199,30 @@ def global_backup_control(monkeypatch):
     return local_backup_control
 
 
+@pytest.fixture
+def installed_package_index(monkeypatch, tmpdir):
+    """
+    Index of installed packages reading a fake rpmdb.
+
+    Use ``installed_package_index.set_rpmdb(*lines)`` to set the formatted
+    headers the index reads. The index is rebuilt when a file in ``tmpdir``
+    changes.
+    """
+    read_rpmdb = mock.Mock(return_value=[])
+    monkeypatch.setattr(pkghandler, "_read_rpmdb", read_rpmdb)
+    # Read the fake rpmdb in this process so that the mock is called
+    monkeypatch.setattr(utils, "run_as_child_process", lambda func: func)
+
+    local_index = pkghandler.InstalledPackageIndex(rpmdb_path=str(tmpdir))
+
+    def set_rpmdb(*formatted_headers):
+        read_rpmdb.return_value = list(enumerate(formatted_headers))
+
+    local_index.set_rpmdb = set_rpmdb
+    monkeypatch.setattr(pkghandler, "installed_package_index", local_index)
+    return local_index
+
+
 @pytest.fixture()
 def pretend_os(request, pkg_root, monkeypatch, global_tool_opts):
     """Parametric fixture to pretend to be one of the available OSes for conversion.
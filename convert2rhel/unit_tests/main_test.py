@@ -27,7 +27,7 @@ import six
 six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
 from six.moves import mock
 
-from convert2rhel import actions, applock, backup, cli, exceptions
+from convert2rhel import actions, applock, backup, bundle, cli, exceptions
 from convert2rhel import logger as logger_module
 from convert2rhel import main, pkghandler, pkgmanager, subscription, toolopts, utils
 from convert2rhel.actions import report
@@ -56,6 +56,26 @@ def apply_global_tool_opts(monkeypatch, global_tool_opts):
     monkeypatch.setattr(main, "tool_opts", global_tool_opts)
 
 
+@pytest.fixture(autouse=True)
+def trace_log_dir(monkeypatch, tmpdir):
+    monkeypatch.setattr(logger_module, "LOG_DIR", str(tmpdir))
+
+
+def test_write_command_trace(tmpdir):
+    main._write_command_trace()
+
+    assert tmpdir.join("convert2rhel-commands.jsonl").check()
+    assert tmpdir.join("convert2rhel-commands-timeline.json").check()
+
+
+def test_write_command_trace_error(monkeypatch, caplog):
+    monkeypatch.setattr(logger_module, "LOG_DIR", "/nonexistent/directory")
+
+    main._write_command_trace()
+
+    assert "Unable to write the trace of the executed commands" in caplog.records[-1].message
+
+
 class TestRollbackChanges:
     def test_rollback_changes(self, monkeypatch, global_backup_control):
         monkeypatch.setattr(global_backup_control, "pop_all", mock.Mock())
@@ -847,3 +867,44 @@ def test_confirm_user_backup(monkeypatch, caplog):
 
     assert message in caplog.records[-1].message
     assert ask_to_continue_mock.call_count == 1
+
+
+def test_prepare_system_with_bundle(monkeypatch, global_tool_opts):
+    monkeypatch.setattr(pkghandler, "clear_versionlock", mock.Mock())
+    monkeypatch.setattr(pkgmanager, "clean_yum_metadata", mock.Mock())
+    monkeypatch.setattr(bundle, "use_bundle", mock.Mock(return_value=["rhel-7-server-rpms"]))
+    global_tool_opts.bundle = "/srv/convert2rhel-bundle.tar"
+
+    main.prepare_system()
+
+    bundle.use_bundle.assert_called_once_with("/srv/convert2rhel-bundle.tar")
+    assert global_tool_opts.enablerepo == ["rhel-7-server-rpms"]
+
+
+def test_prepare_system_with_invalid_bundle(monkeypatch, global_tool_opts, caplog):
+    monkeypatch.setattr(pkghandler, "clear_versionlock", mock.Mock())
+    monkeypatch.setattr(pkgmanager, "clean_yum_metadata", mock.Mock())
+    monkeypatch.setattr(bundle, "use_bundle", mock.Mock(side_effect=bundle.BundleError("Invalid conversion bundle")))
+    global_tool_opts.bundle = "/srv/convert2rhel-bundle.tar"
+
+    with pytest.raises(SystemExit):
+        main.prepare_system()
+
+    assert "Invalid conversion bundle" in caplog.records[-1].message
+
+
+@pytest.mark.parametrize(
+    ("failed_actions", "create_error", "expected"),
+    (
+        ([], None, True),
+        (["CHECK_FIREWALLD_AVAILABILITY"], None, False),
+        ([], bundle.BundleError("Unable to write the conversion bundle"), False),
+    ),
+)
+def test_create_bundle(failed_actions, create_error, expected, monkeypatch, global_tool_opts):
+    monkeypatch.setattr(main, "_get_failed_actions", mock.Mock(return_value=failed_actions))
+    monkeypatch.setattr(bundle, "create_bundle", mock.Mock(side_effect=create_error))
+    global_tool_opts.bundle_output = "/srv/convert2rhel-bundle.tar"
+
+    assert main.create_bundle({}) == expected
+    assert bundle.create_bundle.call_count == (0 if failed_actions else 1)
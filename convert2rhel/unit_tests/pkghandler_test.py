@@ -27,7 +27,7 @@ import pytest
 import rpm
 import six
 
-from convert2rhel import pkghandler, pkgmanager, repo, systeminfo, unit_tests, utils
+from convert2rhel import pkghandler, pkgmanager, repo, repometa, systeminfo, unit_tests, utils
 from convert2rhel.backup.certs import RestorableRpmKey
 from convert2rhel.backup.files import RestorableFile
 from convert2rhel.pkghandler import (
@@ -45,11 +45,13 @@ from convert2rhel.unit_tests import (
     GetInstalledPkgInformationMocked,
     GetInstalledPkgsWDifferentKeyIdMocked,
     RemovePkgsMocked,
+    RepoMetadataMocked,
     RunSubprocessMocked,
     SysExitCallableObject,
     TestPkgObj,
     create_pkg_information,
     create_pkg_obj,
+    create_repo_package,
     is_rpm_based_os,
     mock_decorator,
 )
@@ -477,43 +479,14 @@ PACKAGE_FORMATS = (
 )
 
 
-@pytest.mark.skipif(pkgmanager.TYPE == "yum", reason="cannot test dnf backend if dnf is not present")
-def test_parse_pkg_string_dnf_called(monkeypatch):
-    package = "kernel-core-0:4.18.0-240.10.1.el8_3.i86"
-    parse_pkg_with_dnf_mock = mock.Mock(return_value=("kernel-core", "0", "4.18.0", "240.10.1.el8_3", "i86"))
-    monkeypatch.setattr(pkghandler, "_parse_pkg_with_dnf", value=parse_pkg_with_dnf_mock)
-    pkghandler.parse_pkg_string(package)
-    parse_pkg_with_dnf_mock.assert_called_once()
-
-
-@pytest.mark.skipif(pkgmanager.TYPE == "dnf", reason="cannot test yum backend if yum is not present")
-def test_parse_pkg_string_yum_called(monkeypatch):
-    package = "kernel-core-0:4.18.0-240.10.1.el8_3.i86"
-    parse_pkg_with_yum_mock = mock.Mock(return_value=("kernel-core", "0", "4.18.0", "240.10.1.el8_3", "i86"))
-    monkeypatch.setattr(pkghandler, "_parse_pkg_with_yum", value=parse_pkg_with_yum_mock)
-    pkghandler.parse_pkg_string(package)
-    parse_pkg_with_yum_mock.assert_called_once()
-
-
-@pytest.mark.skipif(pkgmanager.TYPE == "dnf", reason="cannot test yum backend if yum is not present")
 @pytest.mark.parametrize(
     ("package", "expected"),
     (PACKAGE_FORMATS),
 )
-def test_parse_pkg_with_yum(package, expected):
-    assert pkghandler._parse_pkg_with_yum(package) == expected
+def test_parse_pkg_string(package, expected):
+    assert pkghandler.parse_pkg_string(package) == expected
 
 
-@pytest.mark.skipif(pkgmanager.TYPE == "yum", reason="cannot test dnf backend if dnf is not present")
-@pytest.mark.parametrize(
-    ("package", "expected"),
-    (PACKAGE_FORMATS),
-)
-def test_parse_pkg_with_dnf(package, expected):
-    assert pkghandler._parse_pkg_with_dnf(package) == expected
-
-
-@pytest.mark.skipif(pkgmanager.TYPE == "yum", reason="cannot test dnf backend if dnf is not present")
 @pytest.mark.parametrize(
     ("package"),
     (
@@ -524,12 +497,71 @@ def test_parse_pkg_with_dnf(package, expected):
         ("foo-15.x86_64"),
     ),
 )
-def test_parse_pkg_with_dnf_value_error(package):
+def test_parse_pkg_string_value_error(package):
     with pytest.raises(ValueError):
-        pkghandler._parse_pkg_with_dnf(package)
+        pkghandler.parse_pkg_string(package)
+
+
+def test_parse_pkg_string_cache(monkeypatch):
+    monkeypatch.setattr(pkghandler, "PARSED_PKGS_CACHE_SIZE", 2)
+    monkeypatch.setattr(pkghandler, "_parsed_pkgs", pkghandler.OrderedDict())
+    parse_pkg_mock = mock.Mock(side_effect=pkghandler._parse_pkg)
+    monkeypatch.setattr(pkghandler, "_parse_pkg", parse_pkg_mock)
+
+    for package in ("kernel-0:4.18.0-1.el8.x86_64", "kernel-0:4.18.0-2.el8.x86_64", "kernel-0:4.18.0-1.el8.x86_64"):
+        pkghandler.parse_pkg_string(package)
+    assert parse_pkg_mock.call_count == 2
+
+    # The least recently used package is dropped from the cache
+    pkghandler.parse_pkg_string("kernel-0:4.18.0-3.el8.x86_64")
+    assert list(pkghandler._parsed_pkgs) == ["kernel-0:4.18.0-1.el8.x86_64", "kernel-0:4.18.0-3.el8.x86_64"]
+
+
+def test_parse_pkg_strings():
+    assert pkghandler.parse_pkg_strings(["libgcc-8.5.0-4.el8_5.i686", "1:NetworkManager-1.18.8-2.0.1.el7_9"]) == [
+        ("libgcc", None, "8.5.0", "4.el8_5", "i686"),
+        ("NetworkManager", "1", "1.18.8", "2.0.1.el7_9", None),
+    ]
+
+
+@pytest.mark.parametrize("reverse", (False, True))
+def test_sort_pkgs_by_version(reverse):
+    packages = [
+        "kernel-0:6.10.5-500.fc40.x86_64",
+        "kernel-6.8.5-301.fc40.x86_64",
+        "kernel-1:1.1.5-101.fc40.x86_64",
+        "kernel-0:6.8.6-301.fc40",
+    ]
+    expected = [
+        "kernel-6.8.5-301.fc40.x86_64",
+        "kernel-0:6.8.6-301.fc40",
+        "kernel-0:6.10.5-500.fc40.x86_64",
+        "kernel-1:1.1.5-101.fc40.x86_64",
+    ]
+
+    assert pkghandler.sort_pkgs_by_version(packages, reverse=reverse) == (expected[::-1] if reverse else expected)
+
+
+@pytest.mark.parametrize(
+    ("packages", "exception_message"),
+    (
+        (
+            ["kernel-core-0:390-287.fc36", "kernel-0:390-287.fc36"],
+            re.escape(
+                "The package names ('kernel', 'kernel-core') do not match. Can only compare versions for the same packages."
+            ),
+        ),
+        (
+            ["kernel-core-0:390-287.fc36.aarch64", "kernel-core-0:391-287.fc36.i86"],
+            re.escape("The arches ('aarch64', 'i86') do not match."),
+        ),
+    ),
+)
+def test_sort_pkgs_by_version_mismatch(packages, exception_message):
+    with pytest.raises(ValueError, match=exception_message):
+        pkghandler.sort_pkgs_by_version(packages)
 
 
-@pytest.mark.skipif(pkgmanager.TYPE == "dnf", reason="dnf parsing function will raise a different valueError")
 @pytest.mark.parametrize(
     ("package", "name", "epoch", "version", "release", "arch", "expected"),
     (
@@ -623,7 +655,6 @@ def test_validate_parsed_fields_invalid(package, name, epoch, version, release,
         pkghandler._validate_parsed_fields(package, name, epoch, version, release, arch)
 
 
-@pytest.mark.skipif(pkgmanager.TYPE == "dnf", reason="dnf parsing function will raise a different valueError")
 @pytest.mark.parametrize(
     ("package", "expected"),
     (
@@ -634,13 +665,13 @@ def test_validate_parsed_fields_invalid(package, name, epoch, version, release,
         (
             "foo-15.x86_64",
             re.escape(
-                "Invalid package - foo-15.x86_64, packages need to be in one of the following formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR. Reason: The total length of the parsed package fields does not equal the package length,"
+                "Invalid package - foo-15.x86_64, packages need to be in one of the following formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR."
             ),
         ),
         (
             "notavalidpackage",
             re.escape(
-                "Invalid package - notavalidpackage, packages need to be in one of the following formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR. Reason: The total length of the parsed package fields does not equal the package length,"
+                "Invalid package - notavalidpackage, packages need to be in one of the following formats: NEVRA, NEVR, NVRA, NVR, ENVRA, ENVR."
             ),
         ),
     ),
@@ -1287,16 +1318,14 @@ def test_format_pkg_info_yum(pretend_os, monkeypatch):
     ]
 
     monkeypatch.setattr(
-        utils,
-        "run_subprocess",
+        repometa,
+        "get_repo_metadata",
         mock.Mock(
-            return_value=(
-                """\
-C2R 0:pkg1-0.1-1.x86_64&anaconda
-C2R 0:pkg2-0.1-1.x86_64&
-C2R 0:gpg-pubkey-0.1-1.x86_64&test
-    """,
-                0,
+            return_value=RepoMetadataMocked(
+                [
+                    create_repo_package("pkg1-0:0.1-1.x86_64", repoid="anaconda"),
+                    create_repo_package("gpg-pubkey-0:0.1-1.x86_64", repoid="test"),
+                ]
             )
         ),
     )
@@ -1359,16 +1388,14 @@ def test_format_pkg_info_dnf(pretend_os, monkeypatch):
     ]
 
     monkeypatch.setattr(
-        utils,
-        "run_subprocess",
+        repometa,
+        "get_repo_metadata",
         mock.Mock(
-            return_value=(
-                """\
-C2R pkg1-0:0.1-1.x86_64&anaconda
-C2R pkg2-0:0.1-1.x86_64&@@System
-C2R gpg-pubkey-0:0.1-1.x86_64&test
-    """,
-                0,
+            return_value=RepoMetadataMocked(
+                [
+                    create_repo_package("pkg1-0:0.1-1.x86_64", repoid="anaconda"),
+                    create_repo_package("gpg-pubkey-0:0.1-1.x86_64", repoid="test"),
+                ]
             )
         ),
     )
@@ -1380,7 +1407,7 @@ C2R gpg-pubkey-0:0.1-1.x86_64&test
         result,
         re.MULTILINE,
     )
-    assert re.search(r"^pkg2-0:0\.1-1\.x86_64\s+N/A\s+@@System$", result, re.MULTILINE)
+    assert re.search(r"^pkg2-0:0\.1-1\.x86_64\s+N/A\s+N/A$", result, re.MULTILINE)
     assert re.search(
         r"^gpg-pubkey-0:0\.1-1\.x86_64\s+N/A\s+test$",
         result,
@@ -1517,7 +1544,7 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
 
 
 @pytest.mark.parametrize(
-    ("package_name", "subprocess_output", "expected", "expected_command"),
+    ("package_name", "rpmdb_output", "expected"),
     (
         (
             "libgcc*",
@@ -1537,13 +1564,6 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Fri Nov 12 21:15:26 2021, Key ID 05b555b38483c65d",
                 )
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-qa",
-                "libgcc*",
-            ],
         ),
         pytest.param(
             "gpg-pubkey",
@@ -1563,13 +1583,6 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="(none)",
                 )
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-q",
-                "gpg-pubkey",
-            ],
             id="gpg-pubkey case with .(none) as arch",
         ),
         (
@@ -1590,13 +1603,6 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Fri Nov 12 21:15:26 2021, Key ID 05b555b38483c65d",
                 )
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-q",
-                "libgcc-0:8.5.0-4.el8_5.i686",
-            ],
         ),
         (
             "rpmlint-fedora-license-data-0:1.17-1.fc37.noarch",
@@ -1612,13 +1618,6 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Wed 05 Apr 2023 14:27:35 -03, Key ID f55ad3fb5323552a",
                 )
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-q",
-                "rpmlint-fedora-license-data-0:1.17-1.fc37.noarch",
-            ],
         ),
         (
             "rpmlint-fedora-license-data-0:1.17-1.fc37.noarch",
@@ -1637,25 +1636,11 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Wed 05 Apr 2023 14:27:35 -03, Key ID f55ad3fb5323552a",
                 )
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-q",
-                "rpmlint-fedora-license-data-0:1.17-1.fc37.noarch",
-            ],
         ),
         (
             "whatever",
             "random line",
             [],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-q",
-                "whatever",
-            ],
         ),
         (
             "*",
@@ -1683,13 +1668,6 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Thu 21 Jul 2022 02:54:29 -03, Key ID f55ad3fb5323552a",
                 ),
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-qa",
-                "*",
-            ],
         ),
         (
             "*",
@@ -1718,43 +1696,184 @@ def test_get_third_party_pkgs(key_id_orig_os, expected_count, expected_pkgs, mon
                     signature="RSA/SHA256, Thu 21 Jul 2022 02:54:29 -03, Key ID f55ad3fb5323552a",
                 ),
             ],
-            [
-                "rpm",
-                "--qf",
-                "C2R %{PACKAGER}&%{VENDOR}&%{NAME}-%|EPOCH?{%{EPOCH}}:{0}|:%{VERSION}-%{RELEASE}.%{ARCH}&%|DSAHEADER?{%{DSAHEADER:pgpsig}}:{%|RSAHEADER?{%{RSAHEADER:pgpsig}}:{%|SIGGPG?{%{SIGGPG:pgpsig}}:{%|SIGPGP?{%{SIGPGP:pgpsig}}:{(none)}|}|}|}|\n",
-                "-qa",
-                "*",
-            ],
         ),
     ),
 )
-def test_get_installed_pkg_information(package_name, subprocess_output, expected, expected_command, monkeypatch):
-    monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_string=subprocess_output))
+def test_get_installed_pkg_information(package_name, rpmdb_output, expected, installed_package_index):
+    installed_package_index.set_rpmdb(rpmdb_output)
 
     result = pkghandler.get_installed_pkg_information(package_name)
-    assert utils.run_subprocess.cmd == expected_command
     assert result == expected
 
 
-def test_get_installed_pkg_information_value_error(monkeypatch, caplog):
+def test_get_installed_pkg_information_value_error(installed_package_index, caplog):
     output = "C2R Fedora Project&Fedora Project&fonts-filesystem-a:aabb.d.1-l.fc37.noarch&RSA/SHA256, Tue 23 Aug 2022 08:06:00 -03, Key ID f55ad3fb5323552a"
-    monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_string=output))
+    installed_package_index.set_rpmdb(output)
 
     result = pkghandler.get_installed_pkg_information()
     assert not result
-    assert "Failed to parse a package" in caplog.records[-1].message
+    assert "Failed to parse a package" in caplog.text
+
+
+class TestInstalledPackageIndex:
+    RPMDB_OUTPUT = (
+        "C2R CentOS Buildsys <bugs@centos.org>&CentOS&libgcc-0:8.5.0-4.el8_5.i686&RSA/SHA256, Fri Nov 12 21:15:26 2021, Key ID 05b555b38483c65d\n",
+        "C2R CentOS Buildsys <bugs@centos.org>&CentOS&libgcc-0:8.5.0-4.el8_5.x86_64&RSA/SHA256, Fri Nov 12 21:15:26 2021, Key ID 05b555b38483c65d\n",
+        "C2R Fedora Project&Fedora Project&fonts-filesystem-1:2.0.5-9.fc37.noarch&RSA/SHA256, Tue 23 Aug 2022 08:06:00 -03, Key ID f55ad3fb5323552a\n",
+        "C2R Fedora (37) <fedora-37-primary@fedoraproject.org>&(none)&gpg-pubkey-0:5323552a-6112bcdc.(none)&(none)\n",
+    )
+
+    @pytest.mark.parametrize(
+        ("pattern", "expected_names"),
+        (
+            ("*", ["libgcc.i686", "libgcc.x86_64", "fonts-filesystem.noarch", "gpg-pubkey.None"]),
+            ("libgcc", ["libgcc.i686", "libgcc.x86_64"]),
+            ("libgcc.x86_64", ["libgcc.x86_64"]),
+            ("libgcc-8.5.0-4.el8_5.i686", ["libgcc.i686"]),
+            ("libgcc-0:8.5.0-4.el8_5.i686", ["libgcc.i686"]),
+            ("fonts-filesystem-1:2.0.5-9.fc37", ["fonts-filesystem.noarch"]),
+            ("fonts-*", ["fonts-filesystem.noarch"]),
+            ("gpg-pubkey", ["gpg-pubkey.None"]),
+            ("libgcc.s390x", []),
+            ("", []),
+        ),
+    )
+    def test_query(self, pattern, expected_names, installed_package_index):
+        installed_package_index.set_rpmdb(*self.RPMDB_OUTPUT)
+
+        result = installed_package_index.query(pattern)
+
+        assert ["{}.{}".format(pkg.nevra.name, pkg.nevra.arch) for pkg in result] == expected_names
+        assert installed_package_index.is_installed(pattern) == bool(expected_names)
+
+    def test_get_by_name_arch_and_key_id(self, installed_package_index):
+        installed_package_index.set_rpmdb(*self.RPMDB_OUTPUT)
+
+        assert [pkg.nevra.arch for pkg in installed_package_index.get_by_name("libgcc")] == ["i686", "x86_64"]
+        assert [pkg.nevra.name for pkg in installed_package_index.get_by_name_arch("libgcc.i686")] == ["libgcc"]
+        assert [pkg.nevra.name for pkg in installed_package_index.get_by_key_id("f55ad3fb5323552a")] == [
+            "fonts-filesystem"
+        ]
+        assert [pkg.nevra.name for pkg in installed_package_index.get_by_key_id("none")] == ["gpg-pubkey"]
+
+    def test_rpmdb_read_once(self, installed_package_index):
+        installed_package_index.set_rpmdb(*self.RPMDB_OUTPUT)
+
+        installed_package_index.query("libgcc")
+        installed_package_index.query("fonts-filesystem")
+        installed_package_index.get_by_key_id("05b555b38483c65d")
+
+        assert pkghandler._read_rpmdb.call_count == 1
+
+    def test_invalidated_on_rpmdb_change(self, installed_package_index, tmpdir):
+        installed_package_index.set_rpmdb(*self.RPMDB_OUTPUT)
+        assert installed_package_index.is_installed("libgcc")
+
+        installed_package_index.set_rpmdb(self.RPMDB_OUTPUT[2])
+        # Nothing changed in the rpmdb directory so the cached data are used
+        assert installed_package_index.is_installed("libgcc")
+
+        tmpdir.join("Packages").write("changed")
+        assert not installed_package_index.is_installed("libgcc")
+        assert installed_package_index.is_installed("fonts-filesystem")
+        assert pkghandler._read_rpmdb.call_count == 2
+
+    def test_invalidate(self, installed_package_index):
+        installed_package_index.set_rpmdb(*self.RPMDB_OUTPUT)
+        installed_package_index.query("*")
+
+        installed_package_index.invalidate()
+        installed_package_index.query("*")
+
+        assert pkghandler._read_rpmdb.call_count == 2
+
+
+def test_get_installed_packages_checksum(installed_package_index, tmpdir):
+    rpmdb = TestInstalledPackageIndex.RPMDB_OUTPUT
+    installed_package_index.set_rpmdb(*rpmdb)
+    checksum = pkghandler.get_installed_packages_checksum()
+
+    # rpm writes to the files of the rpmdb even when it only reads it
+    tmpdir.join("__db.001").write("changed")
+    installed_package_index.set_rpmdb(*reversed(rpmdb))
+    assert pkghandler.get_installed_packages_checksum() == checksum
+
+    tmpdir.join("Packages").write("changed")
+    installed_package_index.set_rpmdb(*rpmdb[1:])
+    assert pkghandler.get_installed_packages_checksum() not in (checksum, None)
+
+    tmpdir.join("Packages").write("all removed")
+    installed_package_index.set_rpmdb()
+    assert pkghandler.get_installed_packages_checksum() is None
+
+
+class TestSackSessionManager:
+    @pytest.fixture
+    def create_base(self, monkeypatch):
+        create_base = mock.Mock(side_effect=lambda *args: mock.Mock())
+        monkeypatch.setattr(pkghandler, "_create_base", create_base)
+        return create_base
+
+    def test_session_shared_per_configuration(self, create_base, tmpdir):
+        sack_sessions = pkghandler.SackSessionManager(rpmdb_path=str(tmpdir))
+
+        with sack_sessions.session(disable_repos=["rhel*"]) as base1:
+            pass
+        with sack_sessions.session(disable_repos=["rhel*"]) as base2:
+            pass
+        with sack_sessions.session(load_available_repos=False) as base3:
+            pass
+
+        assert base1 is base2
+        assert base3 is not base1
+        assert create_base.call_args_list == [mock.call(True, ("rhel*",), None), mock.call(False, (), None)]
+        assert not base1.close.called
+
+    def test_session_dropped_on_rpmdb_change(self, create_base, tmpdir):
+        sack_sessions = pkghandler.SackSessionManager(rpmdb_path=str(tmpdir))
+
+        with sack_sessions.session() as base1:
+            pass
+        tmpdir.join("Packages").write("changed")
+        with sack_sessions.session() as base2:
+            pass
+
+        assert base2 is not base1
+        assert base1.close.call_count == 1
+
+    def test_session_in_use_closed_on_release(self, create_base, tmpdir):
+        sack_sessions = pkghandler.SackSessionManager(rpmdb_path=str(tmpdir))
+
+        with sack_sessions.session() as base:
+            sack_sessions.invalidate()
+            assert not base.close.called
+
+        assert base.close.call_count == 1
+        with sack_sessions.session() as new_base:
+            assert new_base is not base
+
+    def test_session_not_shared_without_rpmdb(self, create_base, tmpdir):
+        sack_sessions = pkghandler.SackSessionManager(rpmdb_path=str(tmpdir.join("nonexistent")))
+
+        with sack_sessions.session() as base1:
+            pass
+        with sack_sessions.session() as base2:
+            pass
+
+        assert base2 is not base1
 
 
 @pytest.mark.parametrize(
-    ("packages", "subprocess_output", "expected_result"),
+    ("package_manager_type", "packages", "repo_packages", "expected_result"),
     (
         (
+            "yum",
             ["0:eog-44.1-1.fc38.x86_64", "0:gnome-backgrounds-44.0-1.fc38.noarch", "0:gnome-maps-44.1-1.fc38.x86_64"],
-            """\
-                C2R 0:eog-44.1-1.fc38.x86_64&updates
-                C2R 0:gnome-backgrounds-44.0-1.fc38.noarch&fedora
-                C2R 0:gnome-maps-44.1-1.fc38.x86_64&updates
-            """,
+            (
+                ("eog-0:44.1-1.fc38.x86_64", "updates"),
+                ("gnome-backgrounds-0:44.0-1.fc38.noarch", "fedora"),
+                ("gnome-maps-0:44.1-1.fc38.x86_64", "updates"),
+            ),
             {
                 "0:eog-44.1-1.fc38.x86_64": "updates",
                 "0:gnome-backgrounds-44.0-1.fc38.noarch": "fedora",
@@ -1762,12 +1881,13 @@ def test_get_installed_pkg_information_value_error(monkeypatch, caplog):
             },
         ),
         (
+            "yum",
             ["2:eog-44.1-1.fc38.x86_64", "2:gnome-backgrounds-44.0-1.fc38.noarch", "2:gnome-maps-44.1-1.fc38.x86_64"],
-            """\
-                C2R 2:eog-44.1-1.fc38.x86_64&updates
-                C2R 2:gnome-backgrounds-44.0-1.fc38.noarch&fedora
-                C2R 2:gnome-maps-44.1-1.fc38.x86_64&updates
-            """,
+            (
+                ("eog-2:44.1-1.fc38.x86_64", "updates"),
+                ("gnome-backgrounds-2:44.0-1.fc38.noarch", "fedora"),
+                ("gnome-maps-2:44.1-1.fc38.x86_64", "updates"),
+            ),
             {
                 "2:eog-44.1-1.fc38.x86_64": "updates",
                 "2:gnome-backgrounds-44.0-1.fc38.noarch": "fedora",
@@ -1775,67 +1895,87 @@ def test_get_installed_pkg_information_value_error(monkeypatch, caplog):
             },
         ),
         (
-            ["0:eog-44.1-1.fc38.x86_64", "0:gnome-backgrounds-44.0-1.fc38.noarch", "0:gnome-maps-44.1-1.fc38.x86_64"],
-            """\
-                C2R 0:eog-44.1-1.fc38.x86_64&updates
-                C2R 0:gnome-backgrounds-44.0-1.fc38.noarch&fedora
-                C2R 0:gnome-maps-44.1-1.fc38.x86_64&updates
-                test line without identifier
-            """,
+            "dnf",
+            ["eog-0:44.1-1.fc38.x86_64", "gnome-backgrounds-0:44.0-1.fc38.noarch", "gnome-maps-0:44.1-1.fc38.x86_64"],
+            (
+                ("eog-0:44.1-1.fc38.x86_64", "updates"),
+                ("gnome-backgrounds-0:44.0-1.fc38.noarch", "fedora"),
+                ("gnome-maps-0:44.1-1.fc38.x86_64", "updates"),
+            ),
             {
-                "0:eog-44.1-1.fc38.x86_64": "updates",
-                "0:gnome-backgrounds-44.0-1.fc38.noarch": "fedora",
-                "0:gnome-maps-44.1-1.fc38.x86_64": "updates",
+                "eog-0:44.1-1.fc38.x86_64": "updates",
+                "gnome-backgrounds-0:44.0-1.fc38.noarch": "fedora",
+                "gnome-maps-0:44.1-1.fc38.x86_64": "updates",
             },
         ),
+        # Only the exact NEVRA counts and the first repository offering it wins
         (
+            "dnf",
+            ["eog-0:44.1-1.fc38.x86_64", "gnome-maps-0:44.1-1.fc38.x86_64"],
+            (
+                ("eog-0:44.0-1.fc38.x86_64", "fedora"),
+                ("eog-0:44.1-1.fc38.i686", "updates"),
+                ("gnome-maps-0:44.1-1.fc38.x86_64", "updates"),
+                ("gnome-maps-0:44.1-1.fc38.x86_64", "updates-testing"),
+            ),
+            {
+                "gnome-maps-0:44.1-1.fc38.x86_64": "updates",
+            },
+        ),
+        (
+            "yum",
             ["0:eog-44.1-1.fc38.x86_64", "0:gnome-backgrounds-44.0-1.fc38.noarch", "0:gnome-maps-44.1-1.fc38.x86_64"],
-            """\
-                test line without identifier
-            """,
+            (),
             {},
         ),
     ),
 )
-@centos7
-def test_get_package_repositories(pretend_os, packages, subprocess_output, expected_result, monkeypatch, caplog):
-    monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_string=subprocess_output))
+def test_get_package_repositories(package_manager_type, packages, repo_packages, expected_result, monkeypatch):
+    monkeypatch.setattr(pkgmanager, "TYPE", package_manager_type)
+    get_repo_metadata_mocked = mock.Mock(
+        return_value=RepoMetadataMocked([create_repo_package(nevra, repoid=repoid) for nevra, repoid in repo_packages])
+    )
+    monkeypatch.setattr(repometa, "get_repo_metadata", get_repo_metadata_mocked)
+
+    result = pkghandler._get_package_repositories(packages, disable_repos=["rhel*"])
 
-    result = pkghandler._get_package_repositories(packages)
     assert expected_result == result
-    assert utils.run_subprocess.cmd[0] == "repoquery"
-    assert "--installed" in utils.run_subprocess.cmd
-    if caplog.records[-1].message:
-        assert "Got a line without the C2R identifier" in caplog.records[-1].message
+    get_repo_metadata_mocked.assert_called_once_with(disable_repos=["rhel*"])
 
 
-@centos7
-def test_get_package_repositories_repoquery_failure(pretend_os, monkeypatch, caplog):
-    monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_code=1, return_string="failed"))
+def test_get_package_repositories_repo_metadata_failure(monkeypatch, caplog):
+    monkeypatch.setattr(
+        repometa, "get_repo_metadata", mock.Mock(side_effect=repometa.RepoMetadataError("Cannot download repomd.xml"))
+    )
 
     packages = ["0:gnome-backgrounds-44.0-1.fc38.noarch", "0:eog-44.1-1.fc38.x86_64", "0:gnome-maps-44.1-1.fc38.x86_64"]
     result = pkghandler._get_package_repositories(packages)
 
-    assert "Repoquery exited with return code 1 and with output: failed" in caplog.records[-1].message
+    assert "Unable to load the repository metadata: Cannot download repomd.xml" in caplog.records[-1].message
     for package, package_repo in result.items():
         assert package in packages
         assert package_repo == "N/A"
 
 
 def test_get_files_owned_by_package(monkeypatch):
-    monkeypatch.setattr(utils, "run_subprocess", mock.Mock(return_value=(b"/etc/yum.conf\n/etc/yum.repos.d", 0)))
+    run_subprocess_mock = RunSubprocessMocked(return_string="/etc/yum.conf\n/etc/yum.repos.d\n")
+    monkeypatch.setattr(utils, "run_subprocess", run_subprocess_mock)
 
     result = pkghandler.get_files_owned_by_package.__wrapped__("yum")
 
     assert result == ["/etc/yum.conf", "/etc/yum.repos.d"]
+    assert run_subprocess_mock.call_args[1]["keep_output"] is False
 
 
-def test_get_files_owned_by_package_failure(monkeypatch):
-    monkeypatch.setattr(utils, "run_subprocess", mock.Mock(return_value=("rpm query failed", 1)))
+def test_get_files_owned_by_package_failure(monkeypatch, caplog):
+    monkeypatch.setattr(
+        utils, "run_subprocess", RunSubprocessMocked(return_string="package yum is not installed\n", return_code=1)
+    )
 
     result = pkghandler.get_files_owned_by_package.__wrapped__("yum")
 
     assert result == []
+    assert "Failed to list files for package yum: package yum is not installed" in caplog.text
 
 
 @pytest.mark.parametrize(
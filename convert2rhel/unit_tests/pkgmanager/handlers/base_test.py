@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+__metaclass__ = type
+
+import json
+
+import pytest
+import six
+
+from convert2rhel import pkghandler, pkgmanager, utils
+from convert2rhel.actions.conversion.transaction import ConvertSystemPackages
+from convert2rhel.actions.pre_ponr_changes.transaction import ValidatePackageManagerTransaction
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers import base
+from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase, ValidatedTransaction
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
+RPMDB_OUTPUT = (
+    "C2R CentOS Buildsys <bugs@centos.org>&CentOS&pkg-1-0:1.0.0-1.el7.x86_64&(none)\n",
+    "C2R CentOS Buildsys <bugs@centos.org>&CentOS&pkg-2-0:1.0.0-1.el7.x86_64&(none)\n",
+)
+
+
+class TestValidatedTransaction:
+    def test_save_and_load(self, tmpdir):
+        path = str(tmpdir.join("validated", "validated-transaction.json"))
+        ValidatedTransaction("123", {"rhel": "abc"}, [["upgrade", "pkg-1-0:1.0.1-1.x86_64", "/cache/pkg-1.rpm"]]).save(
+            path
+        )
+
+        validated_transaction = ValidatedTransaction.load(path)
+
+        assert validated_transaction.installed_packages == "123"
+        assert validated_transaction.repo_checksums == {"rhel": "abc"}
+        assert validated_transaction.packages == [["upgrade", "pkg-1-0:1.0.1-1.x86_64", "/cache/pkg-1.rpm"]]
+        assert validated_transaction.transaction_file is None
+
+    @pytest.mark.parametrize(
+        ("content",),
+        (
+            (None,),
+            ("not json",),
+            (json.dumps({"format_version": 0}),),
+            # Recorded with the rpmdb fingerprint
+            (json.dumps({"format_version": 1}),),
+        ),
+    )
+    def test_load_unusable(self, content, tmpdir):
+        path = tmpdir.join("validated-transaction.json")
+        if content is not None:
+            path.write(content)
+
+        assert ValidatedTransaction.load(str(path)) is None
+
+    def test_discard(self, tmpdir):
+        path = str(tmpdir.join("validated-transaction.json"))
+        ValidatedTransaction("123", {}, []).save(path)
+
+        ValidatedTransaction.discard(path)
+        # Discarding a missing record is fine
+        ValidatedTransaction.discard(path)
+
+        assert ValidatedTransaction.load(path) is None
+
+    @pytest.mark.parametrize(
+        ("installed_packages", "repo_checksums", "transaction_file_exists", "expected"),
+        (
+            ("123", {"rhel": "abc"}, True, True),
+            (None, {"rhel": "abc"}, True, False),
+            ("124", {"rhel": "abc"}, True, False),
+            ("123", {"rhel": "def"}, True, False),
+            ("123", {"rhel": "abc", "extras": "def"}, True, False),
+            ("123", {"rhel": "abc"}, False, False),
+        ),
+    )
+    def test_is_current(self, installed_packages, repo_checksums, transaction_file_exists, expected, tmpdir):
+        path = str(tmpdir.join("validated-transaction.json"))
+        transaction_file = tmpdir.join("validated-transaction.yumtx")
+        if transaction_file_exists:
+            transaction_file.write("")
+        ValidatedTransaction("123", {"rhel": "abc"}, [], str(transaction_file)).save(path)
+
+        validated_transaction = ValidatedTransaction.load(path)
+
+        assert validated_transaction.is_current(installed_packages, repo_checksums) == expected
+
+
+class _TransactionHandlerForTesting(TransactionHandlerBase):
+    """Handler recording the transaction it validates and replaying it in the conversion if it can."""
+
+    def __init__(self, rpmdb_dir):
+        super(_TransactionHandlerForTesting, self).__init__()
+        self.rpmdb_dir = rpmdb_dir
+        self.replayed = None
+
+    def run_transaction(self, validate_transaction=False):
+        if validate_transaction:
+            # rpm writes to the files of the rpmdb when testing the transaction
+            self.rpmdb_dir.join("__db.001").write("test transaction")
+            self._record_validated_transaction([["u", "pkg-1-0:1.0.1-1.el8.x86_64", None]])
+            return
+
+        validated_transaction = ValidatedTransaction.load()
+        ValidatedTransaction.discard()
+        self.replayed = validated_transaction is not None and self._can_replay(validated_transaction)
+
+    def prefetch_packages(self, max_parallel_downloads, bandwidth_limit):
+        pass
+
+    def _get_repo_checksums(self):
+        return {"rhel": "abc"}
+
+
+@pytest.mark.parametrize(
+    ("installed_after_validation", "replayed"),
+    (
+        ((), True),
+        (("C2R Fedora Project&Fedora Project&pkg-3-0:1.0.0-1.fc37.x86_64&(none)\n",), False),
+    ),
+)
+def test_validated_transaction_replayed_in_conversion(
+    installed_after_validation, replayed, installed_package_index, monkeypatch, tmpdir
+):
+    monkeypatch.setattr(base, "VALIDATED_TRANSACTION_FILE", str(tmpdir.join("validated-transaction.json")))
+    monkeypatch.setattr(prefetch, "package_prefetch", mock.Mock(spec=prefetch.PackagePrefetch))
+    monkeypatch.setattr(utils, "child_process_worker", mock.Mock(spec=utils.ChildProcessWorker))
+    handler = _TransactionHandlerForTesting(tmpdir)
+    monkeypatch.setattr(pkgmanager, "create_transaction_handler", mock.Mock(return_value=handler))
+    installed_package_index.set_rpmdb(*RPMDB_OUTPUT)
+
+    ValidatePackageManagerTransaction().run()
+    rpmdb_fingerprint = pkghandler.get_rpmdb_fingerprint(str(tmpdir))
+    # Reading the rpmdb between the validation and the conversion writes to its files as well
+    tmpdir.join("__db.001").write("read")
+    installed_package_index.set_rpmdb(*(RPMDB_OUTPUT + installed_after_validation))
+    ConvertSystemPackages().run()
+
+    assert pkghandler.get_rpmdb_fingerprint(str(tmpdir)) != rpmdb_fingerprint
+    assert handler.replayed == replayed
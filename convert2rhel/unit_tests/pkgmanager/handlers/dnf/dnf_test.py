@@ -20,6 +20,8 @@ import pytest
 import six
 
 from convert2rhel import exceptions, pkghandler, pkgmanager
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers.base import ValidatedTransaction
 from convert2rhel.pkgmanager.handlers.dnf import DnfTransactionHandler
 from convert2rhel.pkgmanager.handlers.dnf.callback import DependencySolverProgressIndicatorCallback
 from convert2rhel.systeminfo import system_info
@@ -128,6 +130,14 @@ class TestDnfTransactionHandler:
         monkeypatch.setattr(pkgmanager.Base, "install", value=mock.Mock())
         monkeypatch.setattr(pkgmanager.Base, "remove", value=mock.Mock())
 
+    @pytest.fixture(autouse=True)
+    def _validated_transaction_file(self, monkeypatch, tmpdir):
+        """Record the validated transactions in a temporary directory"""
+        monkeypatch.setattr(
+            pkgmanager.handlers.base, "VALIDATED_TRANSACTION_FILE", str(tmpdir.join("validated-transaction.json"))
+        )
+        monkeypatch.setattr(DnfTransactionHandler, "_get_repo_checksums", mock.Mock(return_value={"rhel": "abc"}))
+
     @centos8
     def test_set_up_base(self, pretend_os):
         instance = DnfTransactionHandler()
@@ -372,6 +382,9 @@ class TestDnfTransactionHandler:
         monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_perform_operations", mock.Mock())
         monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_resolve_dependencies", mock.Mock())
         monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(
+            pkgmanager.handlers.dnf.DnfTransactionHandler, "_get_transaction_packages", mock.Mock(return_value=[])
+        )
         instance = DnfTransactionHandler()
 
         instance.run_transaction(validate_transaction=validate_transaction)
@@ -380,6 +393,92 @@ class TestDnfTransactionHandler:
         assert instance._perform_operations.call_count == 1
         assert instance._resolve_dependencies.call_count == 1
         assert instance._process_transaction.call_count == 1
+        assert (ValidatedTransaction.load() is not None) == validate_transaction
+
+    @centos8
+    @pytest.mark.parametrize(
+        ("installed_packages", "replayed"),
+        (
+            ("123", True),
+            ("124", False),
+        ),
+    )
+    def test_run_transaction_replays_validated_transaction(
+        self, pretend_os, installed_packages, replayed, caplog, monkeypatch
+    ):
+        monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_enable_repos", mock.Mock())
+        monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_perform_operations", mock.Mock())
+        monkeypatch.setattr(
+            pkgmanager.handlers.dnf.DnfTransactionHandler,
+            "_replay_validated_transaction",
+            mock.Mock(return_value=True),
+        )
+        monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_resolve_dependencies", mock.Mock())
+        monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(pkghandler, "get_installed_packages_checksum", mock.Mock(return_value=installed_packages))
+        ValidatedTransaction("123", {"rhel": "abc"}, [["upgrade", "pkg-1-0:1.0.1-1.x86_64", None]]).save()
+        instance = DnfTransactionHandler()
+
+        instance.run_transaction(validate_transaction=False)
+
+        assert instance._replay_validated_transaction.call_count == (1 if replayed else 0)
+        assert instance._perform_operations.call_count == (0 if replayed else 1)
+        assert instance._process_transaction.call_count == 1
+        # The record is replayed only once
+        assert ValidatedTransaction.load() is None
+        if not replayed:
+            assert "The system changed since the transaction was validated." in caplog.text
+
+    @centos8
+    @pytest.mark.parametrize("download_error", (False, True))
+    def test_prefetch_packages(self, pretend_os, download_error, monkeypatch, tmpdir):
+        monkeypatch.setattr(pkgmanager.handlers.dnf.DnfTransactionHandler, "_enable_repos", mock.Mock())
+        monkeypatch.setattr(
+            pkgmanager.handlers.dnf,
+            "get_system_packages_for_replacement",
+            mock.Mock(return_value=["pkg-1.x86_64", "pkg-2.x86_64", "pkg-4.x86_64"]),
+        )
+        monkeypatch.setattr(pkgmanager.Base, "sack", value=mock.Mock())
+        monkeypatch.setattr(prefetch, "hand_over", mock.Mock())
+        latest_pkgs = []
+        for name, arch in (("pkg-1", "x86_64"), ("pkg-2", "i686"), ("pkg-3", "x86_64"), ("pkg-4", "x86_64")):
+            pkg = mock.Mock(arch=arch)
+            pkg.name = name
+            pkg.localPkg.return_value = str(tmpdir.join("{}.rpm".format(name)))
+            latest_pkgs.append(pkg)
+        pkgmanager.Base.sack.query.return_value.available.return_value.latest.return_value = latest_pkgs
+        tmpdir.join("pkg-1.rpm").write("")
+        if download_error:
+            pkgmanager.Base.download_packages.side_effect = pkgmanager.exceptions.DownloadError({"pkg-4": "test"})
+        else:
+            tmpdir.join("pkg-4.rpm").write("")
+
+        instance = DnfTransactionHandler()
+        instance.prefetch_packages(2, 1024)
+
+        assert instance._enable_repos.call_count == 1
+        pkgmanager.Base.download_packages.assert_called_once_with([latest_pkgs[0], latest_pkgs[3]])
+        # Only the downloaded packages are handed over
+        handed_over = [latest_pkgs[0]] if download_error else [latest_pkgs[0], latest_pkgs[3]]
+        assert prefetch.hand_over.call_args_list == [mock.call(pkg.localPkg(), pkg.repoid) for pkg in handed_over]
+
+    @centos8
+    def test_replay_validated_transaction_missing_package(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(pkgmanager.Base, "sack", value=mock.Mock())
+        monkeypatch.setattr(pkgmanager.Base, "package_upgrade", value=mock.Mock(), raising=False)
+        monkeypatch.setattr(pkgmanager.Base, "reset", value=mock.Mock())
+        pkgmanager.Base.sack.query.return_value.available.return_value.filter.side_effect = [["pkg-1"], []]
+        validated_transaction = ValidatedTransaction(
+            [1, 2, 3],
+            {},
+            [["upgrade", "pkg-1-0:1.0.1-1.x86_64", None], ["upgrade", "pkg-2-0:1.0.1-1.x86_64", None]],
+        )
+        instance = DnfTransactionHandler()
+        instance._set_up_base()
+
+        assert not instance._replay_validated_transaction(validated_transaction)
+        pkgmanager.Base.package_upgrade.assert_called_once_with("pkg-1")
+        pkgmanager.Base.reset.assert_called_once_with(goal=True)
 
     @centos8
     @pytest.mark.parametrize(
@@ -27,6 +27,8 @@ six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
 from six.moves import mock
 
 from convert2rhel import backup, exceptions, pkghandler, pkgmanager
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers.base import ValidatedTransaction
 from convert2rhel.pkgmanager.handlers.yum import YumTransactionHandler
 from convert2rhel.repo import DEFAULT_YUM_REPOFILE_DIR
 from convert2rhel.systeminfo import system_info
@@ -90,6 +92,27 @@ class TestYumTransactionHandler:
         monkeypatch.setattr(pkgmanager.YumBase, "remove", value=mock.Mock())
         monkeypatch.setattr(pkgmanager.YumBase, "close", value=mock.Mock())
 
+    @pytest.fixture(autouse=True)
+    def _validated_transaction_file(self, monkeypatch, tmpdir):
+        """Record the validated transactions in a temporary directory"""
+        monkeypatch.setattr(
+            pkgmanager.handlers.base, "VALIDATED_TRANSACTION_FILE", str(tmpdir.join("validated-transaction.json"))
+        )
+        monkeypatch.setattr(
+            pkgmanager.handlers.yum, "VALIDATED_YUM_TRANSACTION_FILE", str(tmpdir.join("validated-transaction.yumtx"))
+        )
+        monkeypatch.setattr(YumTransactionHandler, "_get_repo_checksums", mock.Mock(return_value={"rhel": "abc"}))
+
+    @pytest.fixture(autouse=True)
+    def _previous_attempt(self, monkeypatch):
+        """Start every test without the yum base of a previous attempt and discard it in this process"""
+        monkeypatch.setattr(pkgmanager.handlers.yum, "_previous_attempt", None)
+        monkeypatch.setattr(
+            pkgmanager.handlers.yum,
+            "_discard_previous_attempt",
+            mock.Mock(wraps=pkgmanager.handlers.yum._discard_previous_attempt.__wrapped__),
+        )
+
     @centos7
     def test_set_up_base(self, pretend_os):
         instance = YumTransactionHandler()
@@ -97,6 +120,7 @@ class TestYumTransactionHandler:
 
         assert isinstance(instance._base, pkgmanager.YumBase)
         assert instance._base.conf.yumvar["releasever"] == "7Server"
+        assert instance._base.conf.keepcache is True
 
     @centos7
     @pytest.mark.parametrize(
@@ -328,6 +352,7 @@ class TestYumTransactionHandler:
         monkeypatch.setattr(YumTransactionHandler, "_perform_operations", mock.Mock())
         monkeypatch.setattr(YumTransactionHandler, "_resolve_dependencies", mock.Mock(return_value=messages))
         monkeypatch.setattr(YumTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_save_transaction", mock.Mock(return_value=None))
 
         original_func = YumTransactionHandler._run_transaction_subprocess.__wrapped__
         monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock_decorator(original_func))
@@ -340,9 +365,222 @@ class TestYumTransactionHandler:
 
         if not messages:
             assert instance._process_transaction.call_count == 1
+            assert instance._save_transaction.call_count == 1
 
         assert result == expected
 
+    @centos7
+    def test_run_transaction_subprocess_resumes_previous_attempt(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(YumTransactionHandler, "_perform_operations", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_forget_removed_packages", mock.Mock())
+        monkeypatch.setattr(
+            YumTransactionHandler, "_resolve_dependencies", mock.Mock(side_effect=["Test message", None])
+        )
+        monkeypatch.setattr(YumTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_save_transaction", mock.Mock(return_value=None))
+
+        original_func = YumTransactionHandler._run_transaction_subprocess.__wrapped__
+        monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock_decorator(original_func))
+
+        instance = YumTransactionHandler()
+        assert instance._run_transaction_subprocess(True) == "Test message"
+        assert pkgmanager.handlers.yum._previous_attempt is instance
+
+        # The next attempt is run by a new copy of the handler, like in the child process worker
+        assert YumTransactionHandler()._run_transaction_subprocess(True, ["pkg-1-1.0.0-1.x86_64"]) is None
+
+        assert instance._perform_operations.call_count == 1
+        instance._forget_removed_packages.assert_called_once_with(["pkg-1-1.0.0-1.x86_64"])
+        assert instance._process_transaction.call_count == 1
+        assert pkgmanager.handlers.yum._previous_attempt is None
+        assert instance._base is None
+
+    @centos7
+    def test_run_transaction_subprocess_closes_base_on_exception(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(
+            YumTransactionHandler,
+            "_forget_removed_packages",
+            mock.Mock(side_effect=pkgmanager.Errors.YumBaseError("rpmdb error")),
+        )
+        monkeypatch.setattr(YumTransactionHandler, "_close_yum_base", mock.Mock())
+        previous_attempt = YumTransactionHandler()
+        monkeypatch.setattr(pkgmanager.handlers.yum, "_previous_attempt", previous_attempt)
+
+        original_func = YumTransactionHandler._run_transaction_subprocess.__wrapped__
+        monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock_decorator(original_func))
+
+        with pytest.raises(pkgmanager.Errors.YumBaseError):
+            YumTransactionHandler()._run_transaction_subprocess(True, ["pkg-1-1.0.0-1.x86_64"])
+
+        assert previous_attempt._close_yum_base.call_count == 1
+        assert pkgmanager.handlers.yum._previous_attempt is None
+
+    @centos7
+    def test_discard_previous_attempt(self, pretend_os, monkeypatch):
+        previous_attempt = mock.Mock(spec=YumTransactionHandler)
+        monkeypatch.setattr(pkgmanager.handlers.yum, "_previous_attempt", previous_attempt)
+
+        pkgmanager.handlers.yum._discard_previous_attempt()
+        # Nothing to discard anymore
+        pkgmanager.handlers.yum._discard_previous_attempt()
+
+        assert previous_attempt._close_yum_base.call_count == 1
+        assert pkgmanager.handlers.yum._previous_attempt is None
+
+    @centos7
+    def test_run_transaction_subprocess_without_previous_attempt(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(YumTransactionHandler, "_perform_operations", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_forget_removed_packages", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_resolve_dependencies", mock.Mock(return_value=None))
+        monkeypatch.setattr(YumTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_save_transaction", mock.Mock(return_value=None))
+
+        original_func = YumTransactionHandler._run_transaction_subprocess.__wrapped__
+        monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock_decorator(original_func))
+
+        instance = YumTransactionHandler()
+        instance._run_transaction_subprocess(True, ["pkg-1-1.0.0-1.x86_64"])
+
+        # The transaction is built from scratch, like in a new child process
+        assert instance._perform_operations.call_count == 1
+        assert instance._forget_removed_packages.call_count == 0
+
+    @centos7
+    def test_prefetch_packages(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(YumTransactionHandler, "_enable_repos", mock.Mock())
+        monkeypatch.setattr(
+            pkgmanager.handlers.yum,
+            "get_system_packages_for_replacement",
+            mock.Mock(return_value=["pkg-1.x86_64", "pkg-2.x86_64"]),
+        )
+        newest_pkgs = []
+        for name, arch in (("pkg-1", "x86_64"), ("pkg-2", "i686"), ("pkg-3", "x86_64")):
+            pkg = mock.Mock(arch=arch)
+            pkg.name = name
+            newest_pkgs.append(pkg)
+        pkg_sack = mock.Mock()
+        pkg_sack.returnNewestByNameArch.return_value = newest_pkgs
+        monkeypatch.setattr(pkgmanager.YumBase, "pkgSack", pkg_sack, raising=False)
+        monkeypatch.setattr(pkgmanager.YumBase, "downloadPkgs", mock.Mock(return_value={}))
+        monkeypatch.setattr(prefetch, "hand_over", mock.Mock())
+
+        instance = YumTransactionHandler()
+        instance.prefetch_packages(2, 1024)
+
+        assert instance._enable_repos.call_count == 1
+        pkgmanager.YumBase.downloadPkgs.assert_called_once_with([newest_pkgs[0]])
+        prefetch.hand_over.assert_called_once_with(newest_pkgs[0].localPkg(), newest_pkgs[0].repoid)
+        assert instance._base is None
+
+    @centos7
+    def test_prefetch_packages_failure(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(YumTransactionHandler, "_enable_repos", mock.Mock())
+        monkeypatch.setattr(
+            pkgmanager.handlers.yum,
+            "get_system_packages_for_replacement",
+            mock.Mock(return_value=["pkg-1.x86_64", "pkg-2.x86_64"]),
+        )
+        newest_pkgs = []
+        for name in ("pkg-1", "pkg-2"):
+            pkg = mock.Mock(arch="x86_64")
+            pkg.name = name
+            newest_pkgs.append(pkg)
+        pkg_sack = mock.Mock()
+        pkg_sack.returnNewestByNameArch.return_value = newest_pkgs
+        monkeypatch.setattr(pkgmanager.YumBase, "pkgSack", pkg_sack, raising=False)
+        monkeypatch.setattr(
+            pkgmanager.YumBase, "downloadPkgs", mock.Mock(return_value={newest_pkgs[1]: ["Connection reset"]})
+        )
+        monkeypatch.setattr(prefetch, "hand_over", mock.Mock())
+
+        instance = YumTransactionHandler()
+        instance.prefetch_packages(2, 1024)
+
+        # Only the downloaded packages are handed over
+        prefetch.hand_over.assert_called_once_with(newest_pkgs[0].localPkg(), newest_pkgs[0].repoid)
+
+    @centos7
+    def test_forget_removed_packages(self, pretend_os):
+        instance = YumTransactionHandler()
+        instance._base = mock.Mock()
+        tsinfo = instance._base.tsInfo
+        txmbr = mock.Mock(pkgtup=("pkg-1", "x86_64", "0", "1.0.0", "1"))
+        tsinfo.matchNaevr.return_value = [txmbr]
+
+        instance._forget_removed_packages(["pkg-1-1.0.0-1.x86_64"])
+
+        instance._base.closeRpmDB.assert_called_once_with()
+        assert instance._base.tsInfo is tsinfo
+        tsinfo.setDatabases.assert_called_once_with(instance._base.rpmdb, instance._base.pkgSack)
+        tsinfo.matchNaevr.assert_called_once_with(name="pkg-1", arch="x86_64")
+        tsinfo.remove.assert_called_once_with(txmbr.pkgtup)
+        tsinfo.resetResolved.assert_called_once_with(hard=True)
+
+    @centos7
+    def test_run_transaction_subprocess_records_validated_transaction(self, pretend_os, monkeypatch, tmpdir):
+        transaction_file = str(tmpdir.join("validated-transaction.yumtx"))
+        monkeypatch.setattr(YumTransactionHandler, "_perform_operations", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_resolve_dependencies", mock.Mock(return_value=None))
+        monkeypatch.setattr(YumTransactionHandler, "_process_transaction", mock.Mock())
+        monkeypatch.setattr(YumTransactionHandler, "_save_transaction", mock.Mock(return_value=transaction_file))
+        monkeypatch.setattr(
+            YumTransactionHandler,
+            "_get_transaction_packages",
+            mock.Mock(return_value=[["u", "pkg-1-1.0.1-1.x86_64", None]]),
+        )
+        monkeypatch.setattr(pkghandler, "get_installed_packages_checksum", mock.Mock(return_value="123"))
+
+        original_func = YumTransactionHandler._run_transaction_subprocess.__wrapped__
+        monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock_decorator(original_func))
+
+        instance = YumTransactionHandler()
+        instance._run_transaction_subprocess(validate_transaction=True)
+
+        validated_transaction = ValidatedTransaction.load()
+        assert validated_transaction.installed_packages == "123"
+        assert validated_transaction.repo_checksums == {"rhel": "abc"}
+        assert validated_transaction.packages == [["u", "pkg-1-1.0.1-1.x86_64", None]]
+        assert validated_transaction.transaction_file == transaction_file
+
+    @centos7
+    @pytest.mark.parametrize(
+        ("installed_packages", "load_ts_fails", "loaded"),
+        (
+            ("123", False, True),
+            ("124", False, False),
+            ("123", True, False),
+        ),
+    )
+    def test_load_validated_transaction(
+        self, pretend_os, installed_packages, load_ts_fails, loaded, monkeypatch, tmpdir
+    ):
+        transaction_file = tmpdir.join("validated-transaction.yumtx")
+        transaction_file.write("")
+        monkeypatch.setattr(YumTransactionHandler, "_enable_repos", mock.Mock())
+        load_ts_side_effect = pkgmanager.Errors.YumBaseError("rpmdb version mismatch") if load_ts_fails else None
+        monkeypatch.setattr(pkgmanager.YumBase, "load_ts", mock.Mock(side_effect=load_ts_side_effect))
+        monkeypatch.setattr(pkghandler, "get_installed_packages_checksum", mock.Mock(return_value=installed_packages))
+        ValidatedTransaction("123", {"rhel": "abc"}, [], str(transaction_file)).save()
+
+        instance = YumTransactionHandler()
+        instance._set_up_base()
+        base = instance._base
+
+        assert instance._load_validated_transaction() == loaded
+        # A base with an empty transaction set is used to resolve the transaction again
+        assert (instance._base is base) == loaded
+        assert ValidatedTransaction.load() is None
+
+    @centos7
+    def test_load_validated_transaction_without_record(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(YumTransactionHandler, "_enable_repos", mock.Mock())
+
+        instance = YumTransactionHandler()
+        instance._set_up_base()
+
+        assert not instance._load_validated_transaction()
+        assert instance._enable_repos.call_count == 0
+
     @centos7
     def test_run_transaction(self, pretend_os, monkeypatch, caplog):
         monkeypatch.setattr(YumTransactionHandler, "_run_transaction_subprocess", mock.Mock(return_value=None))
@@ -351,6 +589,28 @@ class TestYumTransactionHandler:
 
         # No messages in the output, meaning that it worked.
         assert len(caplog.records) == 0
+        # Only the attempts of a previous transaction are discarded
+        assert pkgmanager.handlers.yum._discard_previous_attempt.call_count == 1
+
+    @centos7
+    def test_run_transaction_passes_removed_packages(self, pretend_os, monkeypatch):
+        monkeypatch.setattr(
+            YumTransactionHandler,
+            "_run_transaction_subprocess",
+            mock.Mock(side_effect=["pkg-1-1.0.0-1.x86_64 requires pkg-2", None]),
+        )
+        monkeypatch.setattr(
+            pkgmanager.handlers.yum,
+            "_resolve_yum_problematic_dependencies",
+            mock.Mock(return_value=["pkg-1-1.0.0-1.x86_64"]),
+        )
+        instance = YumTransactionHandler()
+        instance.run_transaction(True)
+
+        assert instance._run_transaction_subprocess.call_args_list == [
+            mock.call(True, None),
+            mock.call(True, ["pkg-1-1.0.0-1.x86_64"]),
+        ]
 
     @centos7
     def test_run_transaction_reached_loop_max_attempts(self, pretend_os, monkeypatch, caplog):
@@ -366,6 +626,8 @@ class TestYumTransactionHandler:
 
         assert "Retrying to resolve dependencies 1" in caplog.records[-2].message
         assert "Failed to resolve dependencies in the transaction." in caplog.records[-1].message
+        # The yum base of the last attempt is closed when giving up
+        assert pkgmanager.handlers.yum._discard_previous_attempt.call_count == 2
 
     @centos7
     def test_run_transaction_critical_error_exception(self, _mock_yum_api_calls, pretend_os, monkeypatch, caplog):
@@ -443,7 +705,9 @@ def test_resolve_yum_problematic_dependencies(
     monkeypatch.setattr(pkgmanager.handlers.yum.backup, "backup_control", mock.Mock())
     monkeypatch.setattr(pkgmanager.handlers.yum, "RestorablePackage", mock.Mock())
     monkeypatch.setattr(pkgmanager.handlers.yum, "remove_pkgs", RemovePkgsMocked())
-    pkgmanager.handlers.yum._resolve_yum_problematic_dependencies(output)
+    removed_pkgs = pkgmanager.handlers.yum._resolve_yum_problematic_dependencies(output)
+
+    assert sorted(removed_pkgs) == sorted(expected_remove_pkgs)
 
     if expected_remove_pkgs:
         assert pkgmanager.handlers.yum.remove_pkgs.called
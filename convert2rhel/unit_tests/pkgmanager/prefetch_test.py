@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import logging
+import os
+
+import pytest
+import six
+
+from convert2rhel import exceptions, pkgmanager, utils
+from convert2rhel.pkgmanager import prefetch
+from convert2rhel.pkgmanager.handlers.base import TransactionHandlerBase
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
+@pytest.fixture
+def process(monkeypatch):
+    process = mock.Mock(spec=utils.Process)
+    process.is_alive.return_value = True
+    monkeypatch.setattr(utils, "Process", mock.Mock(return_value=process))
+    return process
+
+
+@pytest.fixture
+def prefetch_dir(monkeypatch, tmpdir):
+    prefetch_dir = tmpdir.join("prefetch")
+    monkeypatch.setattr(prefetch, "PREFETCH_DIR", str(prefetch_dir))
+    monkeypatch.setattr(prefetch, "PREFETCH_CACHE_DIR", str(prefetch_dir.join("cache")))
+    monkeypatch.setattr(prefetch, "PREFETCHED_PACKAGES_DIR", str(prefetch_dir.join("packages")))
+    return prefetch_dir
+
+
+@pytest.fixture
+def transaction_handler(monkeypatch):
+    transaction_handler = mock.create_autospec(TransactionHandlerBase)
+    monkeypatch.setattr(pkgmanager, "create_transaction_handler", mock.Mock(return_value=transaction_handler))
+    # The background process disables the messages of the package manager
+    monkeypatch.setattr(logging, "disable", mock.Mock())
+    return transaction_handler
+
+
+def test_prefetch_packages(transaction_handler):
+    prefetch._prefetch_packages()
+
+    transaction_handler.prefetch_packages.assert_called_once_with(
+        prefetch.PREFETCH_MAX_PARALLEL_DOWNLOADS, prefetch.PREFETCH_BANDWIDTH_LIMIT
+    )
+
+
+def test_prefetch_packages_failure(transaction_handler, caplog):
+    transaction_handler.prefetch_packages.side_effect = exceptions.CriticalError(
+        id_="FAILED_TO_ENABLE_REPOS", title="Failed to enable repositories.", description="Description"
+    )
+
+    prefetch._prefetch_packages()
+
+    assert "Unable to download the packages of the transaction in the background" in caplog.records[-1].message
+
+
+def test_hand_over(prefetch_dir):
+    package = prefetch_dir.join("cache", "rhel-7-server-rpms", "packages", "pkg-1.rpm")
+    package.write("pkg-1", ensure=True)
+
+    prefetch.hand_over(str(package), "rhel-7-server-rpms")
+
+    assert not package.exists()
+    assert prefetch_dir.join("packages", "rhel-7-server-rpms", "pkg-1.rpm").read() == "pkg-1"
+
+
+def test_import_packages(prefetch_dir, tmpdir, caplog):
+    for repoid, filename in (
+        ("rhel-7-server-rpms", "pkg-1.rpm"),
+        ("rhel-7-server-rpms", "pkg-2.rpm"),
+        ("other", "pkg-3.rpm"),
+    ):
+        prefetch_dir.join("packages", repoid, filename).write(filename, ensure=True)
+    package_dirs = {
+        "rhel-7-server-rpms": str(tmpdir.join("rhel-7-server-rpms", "packages")),
+        "rhel-7-server-optional-rpms": str(tmpdir.join("rhel-7-server-optional-rpms", "packages")),
+    }
+
+    assert prefetch.import_packages(package_dirs) == 2
+
+    assert sorted(os.listdir(package_dirs["rhel-7-server-rpms"])) == ["pkg-1.rpm", "pkg-2.rpm"]
+    assert not os.path.exists(package_dirs["rhel-7-server-optional-rpms"])
+    # The packages of the repositories not enabled in the transaction are left alone
+    assert prefetch_dir.join("packages", "other", "pkg-3.rpm").exists()
+    assert "Using 2 packages downloaded in the background." in caplog.text
+
+
+def test_import_packages_nothing_prefetched(prefetch_dir, tmpdir, caplog):
+    assert prefetch.import_packages({"rhel-7-server-rpms": str(tmpdir.join("packages"))}) == 0
+
+    assert "downloaded in the background" not in caplog.text
+
+
+class TestPackagePrefetch:
+    def test_start(self, process):
+        package_prefetch = prefetch.PackagePrefetch()
+
+        package_prefetch.start()
+        # Already running
+        package_prefetch.start()
+
+        utils.Process.assert_called_once_with(target=prefetch._prefetch_packages)
+        assert process.daemon
+        assert process.start.call_count == 1
+        assert package_prefetch.running
+
+    def test_finish(self, process, prefetch_dir):
+        prefetch_dir.join("cache", "rhel-7-server-rpms", "packages", "pkg-1.rpm.part").write("", ensure=True)
+        prefetch_dir.join("packages", "rhel-7-server-rpms", "pkg-2.rpm").write("", ensure=True)
+        package_prefetch = prefetch.PackagePrefetch()
+        package_prefetch.start()
+
+        package_prefetch.finish()
+
+        assert process.terminate.call_count == 1
+        assert process.join.call_count == 1
+        assert not package_prefetch.running
+        # The handed over packages are left to the transaction
+        assert not prefetch_dir.join("cache").exists()
+        assert prefetch_dir.join("packages", "rhel-7-server-rpms", "pkg-2.rpm").exists()
+
+    def test_finish_already_done(self, process, prefetch_dir):
+        package_prefetch = prefetch.PackagePrefetch()
+        package_prefetch.start()
+        process.is_alive.return_value = False
+
+        package_prefetch.finish()
+
+        assert process.terminate.call_count == 0
+        assert process.join.call_count == 1
+
+    def test_cancel(self, process, prefetch_dir):
+        prefetch_dir.join("packages", "rhel-7-server-rpms", "pkg-2.rpm").write("", ensure=True)
+        package_prefetch = prefetch.PackagePrefetch()
+        package_prefetch.start()
+
+        package_prefetch.cancel()
+
+        assert process.terminate.call_count == 1
+        assert process.join.call_count == 1
+        assert not package_prefetch.running
+        assert not prefetch_dir.exists()
+
+    def test_not_started(self, process, prefetch_dir):
+        prefetch_dir.join("packages", "rhel-7-server-rpms", "pkg-2.rpm").write("", ensure=True)
+        package_prefetch = prefetch.PackagePrefetch()
+
+        package_prefetch.finish()
+        package_prefetch.cancel()
+
+        assert not package_prefetch.running
+        assert process.join.call_count == 0
+        assert prefetch_dir.exists()
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import gzip
+import os
+
+import pytest
+import six
+
+from convert2rhel import repometa, utils
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+PRIMARY_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common" xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="3">
+<package type="rpm">
+  <name>kernel-core</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="4.18.0" rel="240.el8"/>
+  <checksum type="sha256" pkgid="YES">aaa</checksum>
+  <location href="Packages/k/kernel-core-4.18.0-240.el8.x86_64.rpm"/>
+  <time file="1605000000" build="1604000000"/>
+  <format>
+    <rpm:provides>
+      <rpm:entry name="kernel-core" flags="EQ" epoch="0" ver="4.18.0" rel="240.el8"/>
+      <rpm:entry name="kernel-x86_64"/>
+    </rpm:provides>
+  </format>
+</package>
+<package type="rpm">
+  <name>kernel-core</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="4.18.0" rel="305.el8"/>
+  <checksum type="sha256" pkgid="YES">bbb</checksum>
+  <location href="Packages/k/kernel-core-4.18.0-305.el8.x86_64.rpm"/>
+  <time file="1621000000" build="1620000000"/>
+  <format>
+    <rpm:provides>
+      <rpm:entry name="kernel-core" flags="EQ" epoch="0" ver="4.18.0" rel="305.el8"/>
+    </rpm:provides>
+  </format>
+</package>
+<package type="rpm">
+  <name>bash</name>
+  <arch>x86_64</arch>
+  <version epoch="0" ver="4.4.19" rel="14.el8"/>
+  <checksum type="sha256" pkgid="YES">ccc</checksum>
+  <location href="Packages/b/bash-4.4.19-14.el8.x86_64.rpm"/>
+  <time file="1600000000" build="1590000000"/>
+  <format>
+    <rpm:provides>
+      <rpm:entry name="config(bash)" flags="EQ" epoch="0" ver="4.4.19" rel="14.el8"/>
+    </rpm:provides>
+    <file>/usr/bin/bash</file>
+  </format>
+</package>
+</metadata>
+"""
+
+FILELISTS_XML = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<filelists xmlns="http://linux.duke.edu/metadata/filelists" packages="3">
+<package pkgid="aaa" name="kernel-core" arch="x86_64">
+  <version epoch="0" ver="4.18.0" rel="240.el8"/>
+  <file>/lib/modules/4.18.0-240.el8.x86_64/kernel/fs/xfs/xfs.ko.xz</file>
+  <file>/lib/modules/4.18.0-240.el8.x86_64/modules.order</file>
+</package>
+<package pkgid="bbb" name="kernel-core" arch="x86_64">
+  <version epoch="0" ver="4.18.0" rel="305.el8"/>
+  <file>/lib/modules/4.18.0-305.el8.x86_64/kernel/fs/xfs/xfs.ko.xz</file>
+</package>
+<package pkgid="ccc" name="bash" arch="x86_64">
+  <version epoch="0" ver="4.4.19" rel="14.el8"/>
+  <file>/usr/bin/bash</file>
+  <file type="dir">/usr/share/doc/bash</file>
+</package>
+</filelists>
+"""
+
+
+def _write_gzip(path, content):
+    with gzip.open(str(path), "wb") as metadata:
+        metadata.write(content.encode("utf-8"))
+    return str(path)
+
+
+@pytest.fixture
+def repo_metadata_files(tmpdir):
+    """Downloaded metadata of a repository, laid out the same way as in the yum/dnf cache."""
+    repodata = tmpdir.mkdir("cache").mkdir("repodata")
+    repodata.join("repomd.xml").write("<repomd>1</repomd>")
+    return repometa.RepoMetadataFiles(
+        "baseos",
+        _write_gzip(repodata.join("primary.xml.gz"), PRIMARY_XML),
+        _write_gzip(repodata.join("filelists.xml.gz"), FILELISTS_XML),
+    )
+
+
+@pytest.fixture
+def store_dir(tmpdir, monkeypatch):
+    store_dir = str(tmpdir.join("repometa"))
+    monkeypatch.setattr(repometa, "REPOMETA_DIR", store_dir)
+    return store_dir
+
+
+@pytest.fixture
+def store(repo_metadata_files, store_dir):
+    store = repometa.RepoMetadataStore(*repo_metadata_files)
+    yield store
+    store.close()
+
+
+def test_get_package_locations(repo_metadata_files):
+    assert repometa.get_package_locations(repo_metadata_files.primary) == {
+        "kernel-core-4.18.0-240.el8.x86_64.rpm": "Packages/k/kernel-core-4.18.0-240.el8.x86_64.rpm",
+        "kernel-core-4.18.0-305.el8.x86_64.rpm": "Packages/k/kernel-core-4.18.0-305.el8.x86_64.rpm",
+        "bash-4.4.19-14.el8.x86_64.rpm": "Packages/b/bash-4.4.19-14.el8.x86_64.rpm",
+    }
+
+
+class TestRepoMetadataStore:
+    def test_get_packages(self, store):
+        packages = store.get_packages("kernel*")
+
+        assert [pkg.nevra for pkg in packages] == [
+            "kernel-core-0:4.18.0-240.el8.x86_64",
+            "kernel-core-0:4.18.0-305.el8.x86_64",
+        ]
+        assert packages[0] == repometa.RepoPackage(
+            "kernel-core", "0", "4.18.0", "240.el8", "x86_64", 1604000000, "baseos"
+        )
+
+    @pytest.mark.parametrize(
+        ("name", "expected"),
+        (
+            ("kernel-x86_64", ["kernel-core-0:4.18.0-240.el8.x86_64"]),
+            ("config(bash)", ["bash-0:4.4.19-14.el8.x86_64"]),
+            # Files listed in the primary metadata are found without the file lists
+            ("/usr/bin/bash", ["bash-0:4.4.19-14.el8.x86_64"]),
+            ("nothing", []),
+        ),
+    )
+    def test_get_packages_by_provide(self, name, expected, store):
+        assert [pkg.nevra for pkg in store.get_packages_by_provide(name)] == expected
+        assert not store._filelists_loaded()
+
+    def test_get_packages_by_file(self, store):
+        packages = store.get_packages_by_file("/lib/modules/*.ko*")
+
+        assert [pkg.nevra for pkg in packages] == [
+            "kernel-core-0:4.18.0-240.el8.x86_64",
+            "kernel-core-0:4.18.0-305.el8.x86_64",
+        ]
+        assert store.get_files(packages[0]) == [
+            "/lib/modules/4.18.0-240.el8.x86_64/kernel/fs/xfs/xfs.ko.xz",
+            "/lib/modules/4.18.0-240.el8.x86_64/modules.order",
+        ]
+
+    @pytest.mark.parametrize(
+        ("excludes", "expected"),
+        (
+            (("kernel*",), ["bash-0:4.4.19-14.el8.x86_64"]),
+            (("kernel-core-4.18.0-240.el8",), ["kernel-core-0:4.18.0-305.el8.x86_64", "bash-0:4.4.19-14.el8.x86_64"]),
+            (
+                ("*.i686",),
+                [
+                    "kernel-core-0:4.18.0-240.el8.x86_64",
+                    "kernel-core-0:4.18.0-305.el8.x86_64",
+                    "bash-0:4.4.19-14.el8.x86_64",
+                ],
+            ),
+        ),
+    )
+    def test_excludes(self, excludes, expected, repo_metadata_files, store_dir):
+        store = repometa.RepoMetadataStore(*repo_metadata_files._replace(excludes=excludes))
+
+        assert [pkg.nevra for pkg in store.get_packages("*")] == expected
+        assert [pkg.nevra for pkg in store.get_packages_by_file("/usr/bin/bash")] == [
+            nevra for nevra in expected if nevra.startswith("bash")
+        ]
+        store.close()
+
+    def test_reuse_parsed_metadata(self, repo_metadata_files, store, monkeypatch):
+        store.get_packages_by_file("/usr/bin/*")
+        iter_primary_mocked = mock.Mock()
+        monkeypatch.setattr(repometa, "_iter_primary", iter_primary_mocked)
+
+        reused_store = repometa.RepoMetadataStore(repo_metadata_files.repoid, repo_metadata_files.primary)
+
+        assert reused_store.path == store.path
+        assert not iter_primary_mocked.called
+        # The file lists parsed by the previous run are kept as well
+        assert reused_store.has_filelists
+        assert [pkg.name for pkg in reused_store.get_packages_by_file("/usr/bin/*")] == ["bash"]
+        reused_store.close()
+
+    def test_outdated_metadata_removed(self, repo_metadata_files, store, store_dir):
+        repomd = os.path.join(os.path.dirname(repo_metadata_files.primary), "repomd.xml")
+        with open(repomd, "w") as f:
+            f.write("<repomd>2</repomd>")
+
+        new_store = repometa.RepoMetadataStore(*repo_metadata_files)
+
+        assert new_store.path != store.path
+        assert os.listdir(store_dir) == [os.path.basename(new_store.path)]
+        new_store.close()
+
+    def test_invalid_metadata(self, tmpdir, store_dir):
+        primary = _write_gzip(tmpdir.join("primary.xml.gz"), "<metadata><package>")
+
+        with pytest.raises(repometa.RepoMetadataError, match="Unable to read the metadata of the baseos repository"):
+            repometa.RepoMetadataStore("baseos", primary)
+
+        assert os.listdir(store_dir) == []
+
+    def test_unsupported_format(self, tmpdir, store_dir):
+        primary = tmpdir.join("primary.sqlite.zst")
+        primary.write("")
+
+        with pytest.raises(repometa.RepoMetadataError, match="Unsupported format"):
+            repometa.RepoMetadataStore("baseos", str(primary))
+
+    def test_file_query_without_filelists(self, repo_metadata_files, store_dir):
+        store = repometa.RepoMetadataStore(repo_metadata_files.repoid, repo_metadata_files.primary)
+
+        assert not store.has_filelists
+        with pytest.raises(repometa.RepoMetadataError, match="file lists of the baseos repository"):
+            store.get_packages_by_file("/usr/bin/bash")
+        store.close()
+
+
+class TestRepoMetadata:
+    @pytest.fixture
+    def metadata(self, repo_metadata_files, store_dir, tmpdir):
+        updates = tmpdir.mkdir("updates")
+        # A newer kernel-core and bash for a different architecture
+        updates_primary = _write_gzip(
+            updates.join("primary.xml.gz"),
+            PRIMARY_XML.replace('rel="305.el8"', 'rel="305.10.el8"').replace(
+                "<name>bash</name>\n  <arch>x86_64</arch>", "<name>bash</name>\n  <arch>i686</arch>"
+            ),
+        )
+        metadata = repometa.RepoMetadata(
+            [
+                repometa.RepoMetadataStore(*repo_metadata_files),
+                repometa.RepoMetadataStore(
+                    "updates", updates_primary, _write_gzip(updates.join("filelists.xml.gz"), FILELISTS_XML)
+                ),
+            ]
+        )
+        yield metadata
+        metadata.close()
+
+    def test_repoids(self, metadata):
+        assert metadata.repoids == ["baseos", "updates"]
+        assert metadata.has_filelists
+
+    def test_get_packages(self, metadata):
+        packages = metadata.get_packages(["bash", "nothing*"])
+
+        assert [(pkg.arch, pkg.repoid) for pkg in packages] == [("x86_64", "baseos"), ("i686", "updates")]
+        assert [pkg.repoid for pkg in metadata.get_packages(["bash"], arches=["i686"])] == ["updates"]
+
+    def test_get_latest(self, metadata):
+        latest = metadata.get_latest("kernel-core")
+
+        assert latest.nevra == "kernel-core-0:4.18.0-305.10.el8.x86_64"
+        assert latest.repoid == "updates"
+        assert metadata.get_latest("nothing") is None
+
+    def test_get_files(self, metadata):
+        packages = metadata.get_packages_by_file("/usr/bin/bash", arches=["i686"])
+
+        assert [pkg.repoid for pkg in packages] == ["updates"]
+        assert metadata.get_files(packages) == ["/usr/bin/bash", "/usr/share/doc/bash"]
+
+
+class TestGetRepoMetadata:
+    @pytest.fixture(autouse=True)
+    def _sessions(self, monkeypatch, store_dir):
+        monkeypatch.setattr(repometa, "_sessions", {})
+        # Run the download in the same process so that it can be mocked
+        monkeypatch.setattr(utils, "run_as_child_process", lambda func: func)
+
+    def test_get_repo_metadata(self, repo_metadata_files, monkeypatch):
+        download_metadata_mocked = mock.Mock(return_value=[repo_metadata_files])
+        monkeypatch.setattr(repometa, "_download_metadata", download_metadata_mocked)
+
+        metadata = repometa.get_repo_metadata(disable_repos=["rhel*"], releasever="8")
+
+        download_metadata_mocked.assert_called_once_with(["rhel*"], [], None, "8", False, None)
+        assert [pkg.name for pkg in metadata.get_packages(["bash"])] == ["bash"]
+
+    def test_session_shared(self, repo_metadata_files, monkeypatch):
+        download_metadata_mocked = mock.Mock(return_value=[repo_metadata_files._replace(filelists=None)])
+        monkeypatch.setattr(repometa, "_download_metadata", download_metadata_mocked)
+
+        metadata = repometa.get_repo_metadata(disable_repos=["rhel*"])
+
+        assert repometa.get_repo_metadata(disable_repos=["rhel*"]) is metadata
+        assert download_metadata_mocked.call_count == 1
+        # Different repositories need their own metadata
+        assert repometa.get_repo_metadata(disable_repos=["*"]) is not metadata
+        assert download_metadata_mocked.call_count == 2
+
+    def test_session_reloaded_for_filelists(self, repo_metadata_files, monkeypatch):
+        monkeypatch.setattr(
+            repometa,
+            "_download_metadata",
+            mock.Mock(side_effect=[[repo_metadata_files._replace(filelists=None)], [repo_metadata_files]]),
+        )
+
+        metadata = repometa.get_repo_metadata()
+        metadata_with_filelists = repometa.get_repo_metadata(filelists=True)
+
+        assert metadata_with_filelists is not metadata
+        assert metadata_with_filelists.has_filelists
+        # The session with file lists can answer the queries without them
+        assert repometa.get_repo_metadata() is metadata_with_filelists
+
+    def test_download_error(self, monkeypatch):
+        monkeypatch.setattr(
+            repometa,
+            "_download_metadata",
+            mock.Mock(side_effect=repometa.RepoMetadataError("Error getting repository data for baseos")),
+        )
+
+        with pytest.raises(repometa.RepoMetadataError, match="Error getting repository data for baseos"):
+            repometa.get_repo_metadata()
+
+        assert not repometa._sessions
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from convert2rhel import report_aggregate
+from convert2rhel.actions import STATUS_CODE, report
+
+
+def _message(level, id_, remediations=""):
+    return {
+        "level": level,
+        "id": id_,
+        "title": "Title of {}".format(id_),
+        "description": "",
+        "diagnosis": "",
+        "remediations": remediations,
+        "variables": {},
+    }
+
+
+def _report(status, system=None, kernel_level="SUCCESS", latest_version_messages=(), report_name=None):
+    envelope = {
+        "format_version": "1.4",
+        "status": status,
+        "actions": {
+            "RHEL_COMPATIBLE_KERNEL": {
+                "result": _message(
+                    kernel_level,
+                    "SUCCESS" if kernel_level == "SUCCESS" else "INVALID_KERNEL_VERSION",
+                    "Update the kernel." if kernel_level != "SUCCESS" else "",
+                ),
+                "messages": [],
+            },
+            "CONVERT2RHEL_LATEST_VERSION": {
+                "result": _message("SUCCESS", "SUCCESS"),
+                "messages": list(latest_version_messages),
+            },
+        },
+    }
+    if system:
+        envelope["system"] = system
+    if report_name:
+        envelope["report"] = report_name
+    return envelope
+
+
+CENTOS7 = {"id": "centos", "name": "CentOS Linux", "version": "7.9", "arch": "x86_64"}
+
+
+@pytest.fixture
+def reports(tmpdir):
+    """Reports of four systems, one of them unreadable, and other files which are not assessment reports."""
+    fleet = tmpdir.mkdir("fleet")
+    host1 = fleet.mkdir("host1")
+    host1.join(report_aggregate.REPORT_FILENAME).write(
+        json.dumps(_report("ERROR", CENTOS7, kernel_level="ERROR", report_name="pre-conversion"))
+    )
+    host1.join("convert2rhel-post-conversion.json").write(
+        json.dumps(_report("WARNING", CENTOS7, kernel_level="WARNING", report_name="post-conversion"))
+    )
+    fleet.mkdir("host2").join(report_aggregate.REPORT_FILENAME).write(
+        json.dumps(
+            _report(
+                "ERROR",
+                CENTOS7,
+                kernel_level="ERROR",
+                latest_version_messages=[_message("WARNING", "OUTDATED", "Update convert2rhel.")],
+            )
+        )
+    )
+    fleet.mkdir("host3").join(report_aggregate.REPORT_FILENAME).write(
+        json.dumps(_report("INFO", latest_version_messages=[_message("INFO", "LATEST_VERSION")]))
+    )
+    fleet.mkdir("host4").join(report_aggregate.REPORT_FILENAME).write("{not json")
+    fleet.join("host5.json").write(json.dumps(_report("ERROR", CENTOS7, kernel_level="ERROR")))
+    fleet.join("notes.txt").write("Not a report")
+    return str(fleet)
+
+
+def test_import_without_convert2rhel_dependencies():
+    # The reports are aggregated on systems without the dependencies of convert2rhel
+    code = "import sys, convert2rhel.report_aggregate; assert 'convert2rhel.actions' not in sys.modules"
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_constants():
+    assert report_aggregate.REPORT_FILENAME == os.path.basename(report.CONVERT2RHEL_PRE_CONVERSION_JSON_RESULTS)
+    assert report_aggregate.STATUS_CODE == STATUS_CODE
+
+
+@pytest.mark.parametrize(
+    ("path", "expected"),
+    (
+        ("/fleet/host1/convert2rhel-pre-conversion.json", "host1"),
+        ("/fleet/host1.json", "host1"),
+    ),
+)
+def test_get_host_name(path, expected):
+    assert report_aggregate.get_host_name(path) == expected
+
+
+def test_find_reports(reports, tmpdir):
+    other_report = str(tmpdir.join("host6.json"))
+
+    found = list(report_aggregate.find_reports([reports, other_report]))
+
+    assert [report_aggregate.get_host_name(path) for path in found] == ["host1", "host2", "host3", "host4", "host6"]
+    assert all(os.path.basename(path) == report_aggregate.REPORT_FILENAME for path in found[:-1])
+
+
+def test_summarize_report(reports):
+    summary = report_aggregate.summarize_report(reports + "/host2/" + report_aggregate.REPORT_FILENAME)
+
+    assert summary.host == "host2"
+    assert summary.distro == "CentOS Linux 7.9"
+    assert summary.status == "ERROR"
+    assert sorted(summary.findings) == [
+        ("CONVERT2RHEL_LATEST_VERSION::OUTDATED", 51, "Title of OUTDATED", "Update convert2rhel."),
+        (
+            "RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION",
+            202,
+            "Title of INVALID_KERNEL_VERSION",
+            "Update the kernel.",
+        ),
+    ]
+    assert summary.error is None
+
+
+def test_summarize_post_conversion_report(reports):
+    assert report_aggregate.summarize_report(reports + "/host1/convert2rhel-post-conversion.json") is None
+
+
+@pytest.mark.parametrize(
+    ("content",),
+    (
+        (None,),
+        ("{not json",),
+        (json.dumps({"format_version": "1.4"}),),
+        (json.dumps(_report("ERROR", kernel_level="UNKNOWN")),),
+    ),
+)
+def test_summarize_report_unreadable(content, tmpdir):
+    path = tmpdir.join("host.json")
+    if content is not None:
+        path.write(content)
+
+    summary = report_aggregate.summarize_report(str(path))
+
+    assert summary.host == "host"
+    assert summary.error
+
+
+@pytest.mark.parametrize(("jobs",), ((1,), (2,)))
+def test_aggregate_reports(jobs, reports):
+    summary = report_aggregate.aggregate_reports(
+        report_aggregate.find_reports([reports]), jobs=jobs, max_example_hosts=1
+    ).to_dict()
+
+    assert summary["hosts"] == 3
+    assert summary["unreadable"]["count"] == 1
+    assert summary["unreadable"]["examples"][0]["path"].endswith("host4/" + report_aggregate.REPORT_FILENAME)
+    assert summary["statuses"] == {"ERROR": 2, "INFO": 1}
+    assert summary["distros"] == {
+        "CentOS Linux 7.9": {
+            "hosts": 2,
+            "inhibited": 2,
+            "statuses": {"ERROR": 2},
+            "messages": {
+                "RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION": 2,
+                "CONVERT2RHEL_LATEST_VERSION::OUTDATED": 1,
+            },
+        },
+        report_aggregate.UNKNOWN_DISTRO: {"hosts": 1, "inhibited": 0, "statuses": {"INFO": 1}, "messages": {}},
+    }
+    assert [(message["id"], message["level"], message["hosts"]) for message in summary["messages"]] == [
+        ("RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION", "ERROR", 2),
+        ("CONVERT2RHEL_LATEST_VERSION::OUTDATED", "WARNING", 1),
+    ]
+    assert [inhibitor["id"] for inhibitor in summary["top_inhibitors"]] == [
+        "RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION"
+    ]
+    kernel_remediation = summary["remediations"][0]
+    assert kernel_remediation["id"] == "RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION"
+    assert kernel_remediation["remediations"] == "Update the kernel."
+    assert kernel_remediation["hosts"] == 2
+    assert len(kernel_remediation["example_hosts"]) == 1
+
+
+def test_to_dict_top():
+    assessment_aggregate = report_aggregate.AssessmentAggregate()
+    for index in range(3):
+        assessment_aggregate.add(
+            report_aggregate.HostSummary(
+                "host{}".format(index),
+                "/fleet/host{}.json".format(index),
+                "CentOS Linux 7.9",
+                "ERROR",
+                [("ACTION::ERROR{}".format(number), 202, "Title", "") for number in range(index + 1)],
+                None,
+            )
+        )
+
+    summary = assessment_aggregate.to_dict(top=2)
+
+    assert [inhibitor["id"] for inhibitor in summary["top_inhibitors"]] == ["ACTION::ERROR0", "ACTION::ERROR1"]
+    assert [inhibitor["hosts"] for inhibitor in summary["top_inhibitors"]] == [3, 2]
+    assert summary["remediations"] == []
+
+
+def test_run(reports, tmpdir, capsys):
+    json_output = str(tmpdir.join("summary.json"))
+    txt_output = str(tmpdir.join("summary.txt"))
+
+    assert (
+        report_aggregate.run(
+            ["aggregate", "--jobs", "1", "--json-output", json_output, "--txt-output", txt_output, reports]
+        )
+        == 0
+    )
+
+    with open(json_output) as f:
+        assert json.load(f)["hosts"] == 3
+    with open(txt_output) as f:
+        txt = f.read()
+    assert "2 systems - (ERROR) RHEL_COMPATIBLE_KERNEL::INVALID_KERNEL_VERSION" in txt
+    assert "CentOS Linux 7.9: 2 systems, 2 inhibited" in txt
+    assert "Unreadable reports: 1" in txt
+    assert capsys.readouterr().out == ""
+
+
+def test_run_prints_txt(reports, capsys):
+    assert report_aggregate.run(["aggregate", "-j", "1", reports]) == 0
+
+    assert "Systems: 3" in capsys.readouterr().out
+
+
+def test_run_invalid_jobs(reports, capsys):
+    assert report_aggregate.run(["aggregate", "--jobs", "0", reports]) == 2
+
+    assert "--jobs must be at least 1" in capsys.readouterr().err
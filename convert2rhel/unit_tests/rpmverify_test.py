@@ -0,0 +1,260 @@
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import errno
+import grp
+import hashlib
+import os
+import pwd
+import re
+
+import pytest
+import six
+
+from convert2rhel import rpmverify
+from convert2rhel.actions.pre_ponr_changes.backup_system import RPM_VA_REGEX
+
+
+six.add_move(six.MovedModule("mock", "mock", "unittest.mock"))
+from six.moves import mock
+
+
+@pytest.fixture
+def regular_file(tmpdir):
+    path = tmpdir.join("file.conf")
+    path.write("content\n")
+    os.chmod(str(path), 0o644)
+    st = os.lstat(str(path))
+
+    return rpmverify.RpmFile(
+        path=str(path),
+        mode=st.st_mode,
+        size=st.st_size,
+        mtime=int(st.st_mtime),
+        digest=hashlib.sha256(b"content\n").hexdigest(),
+        linkto="",
+        user=pwd.getpwuid(st.st_uid).pw_name,
+        group=grp.getgrgid(st.st_gid).gr_name,
+        flags=rpmverify.RPMFILE_CONFIG,
+        verify_flags=0xFFFFFFFF,
+        state=rpmverify.RPMFILE_STATE_NORMAL,
+        rdev=0,
+    )
+
+
+@pytest.mark.parametrize(
+    ("result", "expected"),
+    (
+        (0, "........."),
+        (rpmverify.RPMVERIFY_FILESIZE | rpmverify.RPMVERIFY_FILEDIGEST | rpmverify.RPMVERIFY_MTIME, "S.5....T."),
+        (rpmverify.RPMVERIFY_READFAIL | rpmverify.RPMVERIFY_FILEDIGEST, "..?......"),
+        (rpmverify.RPMVERIFY_READLINKFAIL | rpmverify.RPMVERIFY_LINKTO, "....?...."),
+        (rpmverify.RPMVERIFY_MODE | rpmverify.RPMVERIFY_USER | rpmverify.RPMVERIFY_GROUP, ".M...UG.."),
+        (rpmverify.RPMVERIFY_RDEV | rpmverify.RPMVERIFY_CAPS, "...D....P"),
+    ),
+)
+def test_verify_string(result, expected):
+    assert rpmverify.verify_string(result) == expected
+
+
+@pytest.mark.parametrize(
+    ("flags", "expected"),
+    (
+        (0, " "),
+        (rpmverify.RPMFILE_CONFIG, "c"),
+        (rpmverify.RPMFILE_CONFIG | rpmverify.RPMFILE_NOREPLACE, "c"),
+        (rpmverify.RPMFILE_DOC | rpmverify.RPMFILE_CONFIG, "d"),
+        (rpmverify.RPMFILE_GHOST, "g"),
+        (rpmverify.RPMFILE_LICENSE, "l"),
+    ),
+)
+def test_file_attr_char(flags, expected):
+    assert rpmverify.file_attr_char(flags) == expected
+
+
+class TestVerifyFile:
+    def test_unchanged(self, regular_file):
+        assert rpmverify.verify_file(regular_file, 8) == (0, None)
+
+    def test_content_changed(self, regular_file):
+        with open(regular_file.path, "w") as f:
+            f.write("changed content\n")
+        os.utime(regular_file.path, (regular_file.mtime + 10, regular_file.mtime + 10))
+
+        result, _ = rpmverify.verify_file(regular_file, 8)
+
+        assert rpmverify.verify_string(result) == "S.5....T."
+
+    def test_mode_changed(self, regular_file):
+        os.chmod(regular_file.path, 0o600)
+
+        result, _ = rpmverify.verify_file(regular_file, 8)
+
+        assert rpmverify.verify_string(result) == ".M......."
+
+    def test_owner_changed(self, regular_file):
+        regular_file = regular_file._replace(user="c2r-nonexisting-user", group="c2r-nonexisting-group")
+
+        result, _ = rpmverify.verify_file(regular_file, 8)
+
+        assert rpmverify.verify_string(result) == ".....UG.."
+
+    def test_missing(self, regular_file):
+        os.remove(regular_file.path)
+
+        assert rpmverify.verify_file(regular_file, 8) == (rpmverify.RPMVERIFY_LSTATFAIL, errno.ENOENT)
+
+    def test_not_installed(self, regular_file):
+        os.remove(regular_file.path)
+        regular_file = regular_file._replace(state=2)
+
+        assert rpmverify.verify_file(regular_file, 8) == (0, None)
+
+    def test_ghost_content_not_verified(self, regular_file):
+        with open(regular_file.path, "w") as f:
+            f.write("changed content\n")
+        regular_file = regular_file._replace(flags=rpmverify.RPMFILE_GHOST)
+
+        assert rpmverify.verify_file(regular_file, 8) == (0, None)
+
+    def test_symlink(self, regular_file, tmpdir):
+        link = tmpdir.join("link")
+        os.symlink("file.conf", str(link))
+        st = os.lstat(str(link))
+        symlink = regular_file._replace(path=str(link), mode=st.st_mode, linkto="other.conf", digest="")
+
+        result, _ = rpmverify.verify_file(symlink, 8)
+
+        assert rpmverify.verify_string(result) == "....L...."
+
+    def test_directory(self, regular_file, tmpdir):
+        directory = tmpdir.mkdir("dir")
+        st = os.lstat(str(directory))
+        directory = regular_file._replace(path=str(directory), mode=st.st_mode, digest="", mtime=0, size=0)
+
+        assert rpmverify.verify_file(directory, 8) == (0, None)
+
+    def test_unavailable_digest_algorithm(self, regular_file):
+        with pytest.raises(rpmverify._UseRpmVerify):
+            rpmverify.verify_file(regular_file, 42)
+
+
+@pytest.mark.parametrize(
+    ("flags", "result", "lstat_errno", "expected"),
+    (
+        (rpmverify.RPMFILE_CONFIG, 0, None, None),
+        (
+            rpmverify.RPMFILE_CONFIG,
+            rpmverify.RPMVERIFY_FILESIZE | rpmverify.RPMVERIFY_FILEDIGEST | rpmverify.RPMVERIFY_MTIME,
+            None,
+            "S.5....T.  c /etc/file.conf",
+        ),
+        (0, rpmverify.RPMVERIFY_MODE, None, ".M.......    /etc/file.conf"),
+        (rpmverify.RPMFILE_CONFIG, rpmverify.RPMVERIFY_LSTATFAIL, errno.ENOENT, "missing   c /etc/file.conf"),
+        (0, rpmverify.RPMVERIFY_LSTATFAIL, errno.EACCES, "missing     /etc/file.conf (Permission denied)"),
+        (rpmverify.RPMFILE_GHOST, rpmverify.RPMVERIFY_LSTATFAIL, errno.ENOENT, None),
+        (rpmverify.RPMFILE_MISSINGOK, rpmverify.RPMVERIFY_LSTATFAIL, errno.ENOENT, None),
+    ),
+)
+def test_format_result(flags, result, lstat_errno, expected, regular_file):
+    rpm_file = regular_file._replace(path="/etc/file.conf", flags=flags)
+
+    line = rpmverify.format_result(rpm_file, result, lstat_errno)
+
+    assert line == expected
+    if line and "(" not in line:
+        # The output needs to be understood by the BackupPackageFiles action
+        assert re.match(RPM_VA_REGEX, line)
+
+
+def test_verify_header_shared_file_mtime(regular_file, monkeypatch):
+    os.utime(regular_file.path, (regular_file.mtime + 10, regular_file.mtime + 10))
+    ts = mock.Mock()
+    # The file is owned by two packages
+    ts.dbMatch.return_value.count.return_value = 2
+    monkeypatch.setattr(rpmverify, "get_header_files", lambda header: [regular_file])
+    monkeypatch.setattr(
+        rpmverify, "_tag", lambda header, name, default=None: 8 if name == "RPMTAG_FILEDIGESTALGO" else default
+    )
+
+    assert rpmverify.verify_header(ts, mock.Mock()) == []
+    ts.dbMatch.assert_called_once_with("basenames", regular_file.path)
+
+
+@pytest.mark.parametrize("tag_name", ("RPMTAG_VERIFYSCRIPT", "RPMTAG_FILECAPS"))
+def test_verify_header_use_rpm(tag_name, monkeypatch):
+    values = {"RPMTAG_VERIFYSCRIPT": "exit 0", "RPMTAG_FILECAPS": ["cap_net_raw=ep"]}
+    monkeypatch.setattr(
+        rpmverify, "_tag", lambda header, name, default=None: values[name] if name == tag_name else default
+    )
+
+    with pytest.raises(rpmverify._UseRpmVerify):
+        rpmverify.verify_header(mock.Mock(), mock.Mock())
+
+
+class TestVerificationCache:
+    @pytest.fixture(autouse=True)
+    def _digest_algorithm(self, monkeypatch):
+        monkeypatch.setattr(
+            rpmverify, "_tag", lambda header, name, default=None: 8 if name == "RPMTAG_FILEDIGESTALGO" else default
+        )
+
+    def test_unchanged_files_reuse_cached_results(self, regular_file, monkeypatch):
+        monkeypatch.setattr(rpmverify, "get_header_files", lambda header: [regular_file])
+        snapshot = rpmverify._stat_snapshot(regular_file.path)
+        cached_files = {regular_file.path: (snapshot, "S.5....T.  c " + regular_file.path)}
+        monkeypatch.setattr(rpmverify, "verify_file", mock.Mock())
+
+        results = rpmverify.verify_header_files(mock.Mock(), mock.Mock(), cached_files=cached_files)
+
+        assert results == [(regular_file.path, snapshot, "S.5....T.  c " + regular_file.path)]
+        assert not rpmverify.verify_file.called
+
+    def test_changed_files_are_verified(self, regular_file, monkeypatch):
+        monkeypatch.setattr(rpmverify, "get_header_files", lambda header: [regular_file])
+        cached_files = {regular_file.path: (rpmverify._stat_snapshot(regular_file.path), None)}
+        os.chmod(regular_file.path, 0o600)
+
+        results = rpmverify.verify_header_files(mock.Mock(), mock.Mock(), cached_files=cached_files)
+
+        assert results == [
+            (regular_file.path, rpmverify._stat_snapshot(regular_file.path), ".M.......  c " + regular_file.path)
+        ]
+
+    def test_load_cache(self, tmpdir):
+        cache_file = tmpdir.join("rpm_va_cache.jsonl")
+        cache_file.write(
+            '{"package": "bash-0:4.2.46-34.el7.x86_64 1700000000", "files": '
+            '[["/usr/bin/bash", [1, 2, 3.5, 4.5], null], ["/etc/skel/.bashrc", [5, 6, 7.0, 8.0], "S.5....T.  c /etc/skel/.bashrc"]]}\n'
+        )
+
+        cache = rpmverify.load_cache(str(cache_file))
+
+        assert cache == {
+            "bash-0:4.2.46-34.el7.x86_64 1700000000": {
+                "/usr/bin/bash": ([1, 2, 3.5, 4.5], None),
+                "/etc/skel/.bashrc": ([5, 6, 7.0, 8.0], "S.5....T.  c /etc/skel/.bashrc"),
+            }
+        }
+
+    @pytest.mark.parametrize("content", (None, "not a json\n", '{"files": []}\n'))
+    def test_load_cache_invalid(self, content, tmpdir):
+        cache_file = tmpdir.join("rpm_va_cache.jsonl")
+        if content is not None:
+            cache_file.write(content)
+
+        assert rpmverify.load_cache(str(cache_file)) == {}
@@ -24,7 +24,7 @@ import time
 import pytest
 import six
 
-from convert2rhel import logger, systeminfo, utils
+from convert2rhel import logger, rpmverify, systeminfo, utils
 from convert2rhel.systeminfo import RELEASE_VER_MAPPING, Version, system_info
 from convert2rhel.unit_tests import RunSubprocessMocked
 from convert2rhel.unit_tests.conftest import all_systems, centos8
@@ -46,13 +46,32 @@ class TestGenerateRPMVA:
         global_tool_opts.no_rpm_va = False
         monkeypatch.setattr(systeminfo, "tool_opts", global_tool_opts)
         monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_string="rpmva\n"))
+        monkeypatch.setattr(rpmverify, "write_rpm_va", mock.Mock())
         monkeypatch.setattr(logger, "LOG_DIR", str(tmpdir))
         monkeypatch.setattr(systeminfo, "LOG_DIR", str(tmpdir))
         rpmva_output_file = str(tmpdir / "rpm_va.log")
 
         system_info.generate_rpm_va()
 
-        # Check that rpm -Va is executed (default)
+        # Check that the packages are verified natively (default)
+        rpmverify.write_rpm_va.assert_called_once_with(
+            rpmva_output_file, cache_file=rpmverify.RPM_VA_CACHE_FILE, incremental=False
+        )
+        assert not utils.run_subprocess.called
+
+    def test_generate_rpm_va_fallback(self, global_tool_opts, monkeypatch, tmpdir, caplog):
+        global_tool_opts.no_rpm_va = False
+        monkeypatch.setattr(systeminfo, "tool_opts", global_tool_opts)
+        monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked(return_string="rpmva\n"))
+        monkeypatch.setattr(rpmverify, "write_rpm_va", mock.Mock(side_effect=OSError("Too many open files")))
+        monkeypatch.setattr(logger, "LOG_DIR", str(tmpdir))
+        monkeypatch.setattr(systeminfo, "LOG_DIR", str(tmpdir))
+        rpmva_output_file = str(tmpdir / "rpm_va.log")
+
+        system_info.generate_rpm_va()
+
+        # Check that rpm -Va is executed when the native verification fails
+        assert "Falling back to 'rpm -Va'" in caplog.text
         assert utils.run_subprocess.called
         assert utils.run_subprocess.call_args_list[0][0][0] == ["rpm", "-Va", "--nodeps"]
 
@@ -77,16 +96,19 @@ class TestGenerateRPMVA:
 @pytest.mark.parametrize(
     ("pkg_name", "present_on_system", "expected_return"),
     [
-        ("package A", True, True),
-        ("package A", False, False),
+        ("json-c", True, True),
+        ("json-c.i686", True, True),
+        ("json-c.x86_64", True, False),
+        ("json-c", False, False),
         ("", None, False),
     ],
 )
-def test_system_info_has_rpm(pkg_name, present_on_system, expected_return, monkeypatch):
-    run_subprocess_mocked = RunSubprocessMocked(return_value=("", 0) if present_on_system else ("", 1))
-    monkeypatch.setattr(systeminfo, "run_subprocess", value=run_subprocess_mocked)
+def test_system_info_has_rpm(pkg_name, present_on_system, expected_return, installed_package_index):
+    if present_on_system:
+        installed_package_index.set_rpmdb(
+            "C2R CentOS Buildsys <bugs@centos.org>&CentOS&json-c-0:0.11-4.el7_0.i686&RSA/SHA256, Fri Jul  4 01:29:33 2014, Key ID 24c6a8a7f4a80eb5"
+        )
     assert system_info.is_rpm_installed(pkg_name) == expected_return
-    assert run_subprocess_mocked.called
 
 
 @all_systems
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from convert2rhel import utils
+from convert2rhel.utils import trace
+
+
+@pytest.fixture
+def command_trace(monkeypatch):
+    command_trace = trace.CommandTrace()
+    monkeypatch.setattr(utils, "command_trace", command_trace)
+    return command_trace
+
+
+def test_record_action(command_trace):
+    command_trace.record(["rpm", "-qa"], 10.0, 11.0, 0, 100)
+    with command_trace.action("ACTION_ONE"):
+        command_trace.record(["yum", "check-update"], 11.0, 14.5, 100, 20)
+
+    records = command_trace.records
+    assert [record.action_id for record in records] == [None, "ACTION_ONE"]
+    assert records[1].to_dict() == {
+        "argv": ["yum", "check-update"],
+        "start": 11.0,
+        "end": 14.5,
+        "duration": 3.5,
+        "exit_code": 100,
+        "output_bytes": 20,
+        "action_id": "ACTION_ONE",
+    }
+
+
+def test_summarize(command_trace):
+    command_trace.record(["/usr/bin/repoquery", "kernel"], 0.0, 2.0, 0, 0)
+    command_trace.record(["rpm", "-qa"], 2.0, 3.0, 0, 0)
+    command_trace.record(["repoquery", "kernel-core"], 3.0, 7.0, 0, 0)
+
+    assert list(command_trace.summarize().items()) == [("repoquery", (2, 6.0)), ("rpm", (1, 1.0))]
+
+
+def test_to_timeline(command_trace):
+    with command_trace.action("ACTION_ONE"):
+        command_trace.record(["rpm", "-qa"], 1.5, 2.0, 0, 10)
+
+    events = command_trace.to_timeline()["traceEvents"]
+
+    assert len(events) == 1
+    assert events[0]["name"] == "rpm"
+    assert events[0]["cat"] == "ACTION_ONE"
+    assert events[0]["ph"] == "X"
+    assert events[0]["ts"] == 1500000
+    assert events[0]["dur"] == 500000
+    assert events[0]["args"] == {"argv": "rpm -qa", "exit_code": 0, "output_bytes": 10}
+
+
+def test_write(command_trace, tmpdir):
+    command_trace.record(["rpm", "-qa"], 1.0, 2.0, 0, 10)
+    command_trace.record(["rpm", "-Va"], 2.0, 3.0, 1, 20)
+
+    command_trace.write(str(tmpdir))
+
+    lines = tmpdir.join(trace.COMMAND_TRACE_FILENAME).read().splitlines()
+    assert [json.loads(line)["argv"] for line in lines] == [["rpm", "-qa"], ["rpm", "-Va"]]
+    timeline = json.loads(tmpdir.join(trace.COMMAND_TIMELINE_FILENAME).read())
+    assert len(timeline["traceEvents"]) == 2
+
+
+def test_run_subprocess_is_traced(command_trace):
+    utils.run_subprocess(["echo", "--password", "foobar"])
+
+    (record,) = command_trace.records
+    assert record.argv == ["echo", "--password", utils.OBFUSCATION_STRING]
+    assert record.exit_code == 0
+    assert record.output_bytes == len(b"--password foobar\n")
+    assert record.end >= record.start
+
+
+def test_run_cmd_in_pty_is_traced(command_trace, capfd):
+    with capfd.disabled():
+        utils.run_cmd_in_pty(["sh", "-c", "exit 3"])
+
+    (record,) = command_trace.records
+    assert record.argv == ["sh", "-c", "exit 3"]
+    assert record.exit_code == 3
@@ -24,6 +24,7 @@ import os
 import re
 import shutil
 import sys
+import threading
 
 from pickle import PicklingError
 
@@ -451,15 +452,13 @@ class TestDownload_pkg:
     def apply_cls_global_tool_opts(self, monkeypatch, global_tool_opts):
         monkeypatch.setattr(toolopts, "tool_opts", global_tool_opts)
 
-    def test_download_pkgs(self, monkeypatch):
-        monkeypatch.setattr(
-            utils,
-            "download_pkg",
-            lambda pkg, dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever: "/filepath/",
-        )
+    def test_download_pkgs_single(self, monkeypatch):
+        download_pkg_mocked = mock.Mock(return_value="/filepath/")
+        monkeypatch.setattr(utils, "download_pkg", download_pkg_mocked)
+        monkeypatch.setattr(utils, "run_cmd_in_pty", RunCmdInPtyMocked())
 
         paths = utils.download_pkgs(
-            pkgs=["pkg1", "pkg2"],
+            pkgs=["pkg1"],
             dest="/dest/",
             reposdir="/reposdir/",
             enable_repos=["repo1"],
@@ -468,7 +467,74 @@ class TestDownload_pkg:
             custom_releasever=8,
         )
 
-        assert paths == ["/filepath/", "/filepath/"]
+        assert paths == ["/filepath/"]
+        download_pkg_mocked.assert_called_once_with("pkg1", "/dest/", "/reposdir/", ["repo1"], ["repo2"], False, 8)
+        assert not utils.run_cmd_in_pty.called
+
+    @pytest.mark.parametrize(
+        ("major", "parallel_setopt"),
+        (
+            (7, "--setopt=max_connections=2"),
+            (8, "--setopt=max_parallel_downloads=2"),
+        ),
+    )
+    def test_download_pkgs(self, major, parallel_setopt, monkeypatch):
+        monkeypatch.setattr(system_info, "version", systeminfo.Version(major, 0))
+        monkeypatch.setattr(system_info, "releasever", str(major))
+        monkeypatch.setattr(
+            utils,
+            "run_cmd_in_pty",
+            RunCmdInPtyMocked(
+                return_string=(
+                    "(1/2): pkg2-1.0-1.el8.noarch.rpm         2.7 MB/s | 2.8 MB     00:01\n"
+                    "(2/2): pkg1-2.0-3.el8.x86_64.rpm         2.7 MB/s | 2.8 MB     00:01\n"
+                )
+            ),
+        )
+        download_pkg_mocked = mock.Mock()
+        monkeypatch.setattr(utils, "download_pkg", download_pkg_mocked)
+
+        paths = utils.download_pkgs(
+            pkgs=["pkg1", "pkg2-0:1.0-1.el8.noarch"],
+            dest="/dest/",
+            disable_repos=["rhel*"],
+            max_parallel_downloads=2,
+        )
+
+        assert paths == ["/dest/pkg1-2.0-3.el8.x86_64.rpm", "/dest/pkg2-1.0-1.el8.noarch.rpm"]
+        # One yumdownloader call for all the packages
+        assert utils.run_cmd_in_pty.call_count == 1
+        assert utils.run_cmd_in_pty.cmd[-3:] == [parallel_setopt, "pkg1", "pkg2-0:1.0-1.el8.noarch"]
+        assert "--disablerepo=rhel*" in utils.run_cmd_in_pty.cmd
+        assert not download_pkg_mocked.called
+
+    def test_download_pkgs_partial_failure(self, monkeypatch, tmpdir):
+        monkeypatch.setattr(system_info, "version", systeminfo.Version(7, 0))
+        monkeypatch.setattr(system_info, "releasever", "7Server")
+        tmpdir.join("pkg1-2.0-3.el7.x86_64.rpm").write("")
+        monkeypatch.setattr(
+            utils,
+            "run_cmd_in_pty",
+            RunCmdInPtyMocked(
+                return_code=1,
+                return_string=(
+                    "pkg1-2.0-3.el7.x86_64.rpm         2.7 MB/s | 2.8 MB     00:01\n"
+                    "pkg3-1.0-1.el7.x86_64.rpm: [Errno 256] No more mirrors to try.\n"
+                    "No Match for argument pkg2\n"
+                ),
+            ),
+        )
+        download_pkg_mocked = mock.Mock(side_effect=[None, "/path/pkg3-1.0-1.el7.x86_64.rpm"])
+        monkeypatch.setattr(utils, "download_pkg", download_pkg_mocked)
+
+        paths = utils.download_pkgs(pkgs=["pkg1", "pkg2", "pkg3"], dest=str(tmpdir))
+
+        # The packages missing after the batch download are downloaded one by one to report on the failure
+        assert paths == [str(tmpdir.join("pkg1-2.0-3.el7.x86_64.rpm")), None, "/path/pkg3-1.0-1.el7.x86_64.rpm"]
+        assert download_pkg_mocked.call_args_list == [
+            mock.call("pkg2", str(tmpdir), None, None, None, True, None),
+            mock.call("pkg3", str(tmpdir), None, None, None, True, None),
+        ]
 
     def test_download_pkg_success_with_all_params(self, monkeypatch):
         monkeypatch.setattr(system_info, "version", systeminfo.Version(8, 0))
@@ -577,6 +643,31 @@ def test_get_rpm_path_from_yumdownloader_output(output):
     assert path == os.path.join(utils.TMP_DIR, DOWNLOADED_RPM_FILENAME)
 
 
+@pytest.mark.parametrize(("output",), [[out] for out in YUMDOWNLOADER_OUTPUTS])
+def test_get_rpm_paths_from_yumdownloader_output(output):
+    paths = utils.get_rpm_paths_from_yumdownloader_output(output + "\nother-1.0-1.el8.noarch.rpm  | 21 MB", "/dest")
+
+    assert paths == [os.path.join("/dest", DOWNLOADED_RPM_FILENAME), "/dest/other-1.0-1.el8.noarch.rpm"]
+
+
+@pytest.mark.parametrize(
+    ("pkg", "expected"),
+    (
+        ("kernel", "/dest/kernel-4.18.0-193.28.1.el8_2.x86_64.rpm"),
+        ("kernel-4.18.0-193.28.1.el8_2", "/dest/kernel-4.18.0-193.28.1.el8_2.x86_64.rpm"),
+        ("kernel-4.18.0-193.28.1.el8_2.x86_64", "/dest/kernel-4.18.0-193.28.1.el8_2.x86_64.rpm"),
+        ("kernel-0:4.18.0-193.28.1.el8_2.x86_64", "/dest/kernel-4.18.0-193.28.1.el8_2.x86_64.rpm"),
+        ("7:oraclelinux-release-7.9-1.0.9.el7.x86_64", "/dest/oraclelinux-release-7.9-1.0.9.el7.x86_64.rpm"),
+        ("kernel-core", None),
+        ("kernel-4.18.0-193.el8.x86_64", None),
+    ),
+)
+def test_find_downloaded_rpm(pkg, expected):
+    paths = ["/dest/kernel-4.18.0-193.28.1.el8_2.x86_64.rpm", "/dest/oraclelinux-release-7.9-1.0.9.el7.x86_64.rpm"]
+
+    assert utils._find_downloaded_rpm(pkg, paths) == expected
+
+
 @pytest.mark.parametrize(
     ("envvar", "activity", "should_raise", "message"),
     (
@@ -934,6 +1025,83 @@ class TestRunSubprocess:
         assert "test of nonascii output: café" == output.encode("utf-8")
         assert 0 == rc
 
+    @pytest.mark.parametrize(("keep_output", "expected_output"), ((True, "foo\nbar\n"), (False, "")))
+    def test_run_subprocess_callback(self, keep_output, expected_output):
+        lines = []
+
+        output, code = utils.run_subprocess(
+            ["printf", "foo\\nbar\\n"], callback=lines.append, keep_output=keep_output
+        )
+
+        assert lines == ["foo\n", "bar\n"]
+        assert (output, code) == (expected_output, 0)
+
+    @pytest.mark.parametrize(("max_memory_size", "spilled"), ((None, [False, False]), (4, [False, True])))
+    def test_run_subprocess_max_memory_size(self, max_memory_size, spilled, monkeypatch):
+        buffers = []
+        output_buffer = utils.OutputBuffer
+
+        def record_buffer(*args, **kwargs):
+            buffers.append(output_buffer(*args, **kwargs))
+            return buffers[-1]
+
+        monkeypatch.setattr(utils, "OutputBuffer", record_buffer)
+        # The callback is called after each line is stored in the buffer
+        spilled_after_line = []
+
+        output, code = utils.run_subprocess(
+            ["printf", "foo\\nbar\\n"],
+            callback=lambda line: spilled_after_line.append(buffers[0].spilled),
+            max_memory_size=max_memory_size,
+        )
+
+        assert (output, code) == ("foo\nbar\n", 0)
+        assert spilled_after_line == spilled
+
+    def test_run_subprocess_default_max_memory_size(self, monkeypatch):
+        output_buffer = mock.Mock(wraps=utils.OutputBuffer)
+        monkeypatch.setattr(utils, "OutputBuffer", output_buffer)
+
+        utils.run_subprocess(["echo", "foo"])
+
+        output_buffer.assert_called_once_with(max_memory_size=utils.MAX_OUTPUT_MEMORY_SIZE)
+
+
+class TestOutputBuffer:
+    def test_in_memory(self):
+        with utils.OutputBuffer(max_memory_size=100) as output:
+            output.write("foo\n")
+            output.write("bar\n")
+
+            assert not output.spilled
+            assert list(output) == ["foo\n", "bar\n"]
+            assert output.getvalue() == "foo\nbar\n"
+
+    def test_spill_to_file(self):
+        with utils.OutputBuffer(max_memory_size=5) as output:
+            output.write("foo\n")
+            assert not output.spilled
+
+            output.write("bar\n")
+            assert output.spilled
+
+            output.write(u"café\n")
+
+            assert list(output) == ["foo\n", "bar\n", u"café\n"]
+            assert output.getvalue() == u"foo\nbar\ncafé\n"
+            # Reading the output does not prevent writing more of it
+            output.write("baz\n")
+            assert output.getvalue() == u"foo\nbar\ncafé\nbaz\n"
+
+    def test_close(self):
+        output = utils.OutputBuffer(max_memory_size=1)
+        output.write("foo\n")
+
+        output.close()
+
+        assert not output.spilled
+        assert output.getvalue() == ""
+
 
 def test_require_root_is_not_root(monkeypatch, caplog):
     monkeypatch.setattr(os, "geteuid", GetEUIDMocked(1000))
@@ -982,6 +1150,18 @@ class RunAsChildProcessFunctions:
     def raise_pickling_error_exception():
         raise PicklingError("pickling error")
 
+    @staticmethod
+    def return_pid(*args):
+        return os.getpid()
+
+    @staticmethod
+    def return_lock():
+        return threading.Lock()
+
+    @staticmethod
+    def return_enabled_rhel_repos():
+        return os.getpid(), system_info.get_enabled_rhel_repos()
+
 
 @pytest.mark.parametrize(
     ("func", "args", "kwargs", "expected"),
@@ -1068,6 +1248,123 @@ def test_run_as_child_process_with_keyboard_interrupt(monkeypatch):
         decorated((), {})
 
 
+def test_run_as_child_process_reuses_worker():
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    spawned = utils.get_spawned_subprocesses_count()
+
+    worker_pid = decorated()
+
+    assert worker_pid != os.getpid()
+    assert decorated() == worker_pid
+    assert utils.get_spawned_subprocesses_count() == spawned + 1
+
+
+def test_run_as_child_process_worker_survives_exceptions():
+    raise_system_exit = utils.run_as_child_process(RunAsChildProcessFunctions.raise_bare_system_exit_exception)
+    return_pid = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    worker_pid = return_pid()
+
+    with pytest.raises(SystemExit):
+        raise_system_exit()
+
+    assert return_pid() == worker_pid
+
+
+def test_run_as_child_process_worker_stop():
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    worker_pid = decorated()
+
+    utils.child_process_worker.stop()
+
+    assert decorated() not in (worker_pid, os.getpid())
+
+
+def test_run_as_child_process_worker_start():
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    spawned = utils.get_spawned_subprocesses_count()
+
+    utils.child_process_worker.start()
+    utils.child_process_worker.start()
+
+    assert utils.get_spawned_subprocesses_count() == spawned + 1
+    decorated()
+    assert utils.get_spawned_subprocesses_count() == spawned + 1
+
+
+def test_run_as_child_process_from_threads(monkeypatch):
+    monkeypatch.setattr(utils, "_run_in_new_child_process", mock.Mock(side_effect=AssertionError("forked")))
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    worker_pid = decorated()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(decorated())) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The threads waited for the worker instead of forking child processes
+    assert results == [worker_pid] * 4
+
+
+def test_run_as_child_process_worker_sees_state_changes(monkeypatch):
+    monkeypatch.setattr(toolopts.tool_opts, "no_rhsm", False, raising=False)
+    monkeypatch.setattr(system_info, "submgr_enabled_repos", [])
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_enabled_rhel_repos)
+    worker_pid, enabled_repos = decorated()
+    assert enabled_repos == []
+
+    # The repositories are enabled after the worker started, like when subscribing the system
+    system_info.submgr_enabled_repos = ["rhel-7-server-rpms"]
+
+    assert decorated() == (worker_pid, ["rhel-7-server-rpms"])
+
+
+def test_run_as_child_process_state_pickled_on_change(monkeypatch):
+    dump_shared_state = mock.Mock(wraps=utils.child_process_worker._dump_shared_state)
+    monkeypatch.setattr(utils.child_process_worker, "_dump_shared_state", dump_shared_state)
+    monkeypatch.setattr(system_info, "submgr_enabled_repos", [])
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+
+    decorated()
+    decorated()
+    assert dump_shared_state.call_count == 1
+
+    system_info.submgr_enabled_repos = ["rhel-7-server-rpms"]
+    decorated()
+    assert dump_shared_state.call_count == 2
+
+
+def test_run_as_child_process_unpicklable_state(monkeypatch, caplog):
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    worker_pid = decorated()
+    monkeypatch.setattr(utils.child_process_worker, "_reported_unpicklable_state", False)
+    monkeypatch.setattr(system_info, "unpicklable", threading.Lock(), raising=False)
+
+    # The state cannot be sent to the worker so the function runs in a new child process that sees it
+    assert decorated() not in (worker_pid, os.getpid())
+    assert decorated() not in (worker_pid, os.getpid())
+
+    # It is told once that the worker is not used
+    messages = [record for record in caplog.records if "Unable to send the state shared" in record.message]
+    assert [record.levelname for record in messages] == ["INFO", "DEBUG"]
+
+
+def test_run_as_child_process_unpicklable_arguments():
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_pid)
+    worker_pid = decorated()
+
+    # The lock cannot be sent to the worker so the function runs in a new child process
+    assert decorated(threading.Lock()) not in (worker_pid, os.getpid())
+
+
+def test_run_as_child_process_unpicklable_result():
+    decorated = utils.run_as_child_process(RunAsChildProcessFunctions.return_lock)
+
+    with pytest.raises(utils.UnableToSerialize):
+        decorated()
+
+
 class TestRemovePkgs:
     def test_remove_pkgs_without_backup(self, monkeypatch):
         monkeypatch.setattr(utils, "run_subprocess", RunSubprocessMocked())
@@ -19,6 +19,7 @@ __metaclass__ = type
 
 import fcntl
 import getpass
+import io
 import json
 import multiprocessing
 import os
@@ -29,6 +30,8 @@ import subprocess
 import sys
 import tempfile
 import termios
+import threading
+import time
 import traceback
 
 from functools import wraps
@@ -41,6 +44,7 @@ from six import moves
 from convert2rhel import exceptions, i18n
 from convert2rhel.logger import root_logger
 from convert2rhel.toolopts import tool_opts
+from convert2rhel.utils.trace import command_trace
 
 
 logger = root_logger.getChild(__name__)
@@ -70,6 +74,31 @@ class Color:
 DATA_DIR = "/usr/share/convert2rhel/"
 # Directory for temporary data to be stored during runtime
 TMP_DIR = "/var/lib/convert2rhel/"
+# Maximum number of rpms downloaded at the same time by download_pkgs()
+MAX_PARALLEL_DOWNLOADS = 4
+# Number of characters of a command output kept in memory by run_subprocess() before the output is moved to a
+# temporary file
+MAX_OUTPUT_MEMORY_SIZE = 16 * 1024 * 1024
+
+
+class _SpawnedSubprocesses(threading.local):
+    """Number of child processes spawned by a thread through the helpers in this module."""
+
+    count = 0
+
+
+_spawned_subprocesses = _SpawnedSubprocesses()
+
+
+def get_spawned_subprocesses_count():
+    """Get the number of child processes the current thread has spawned so far.
+
+    Only the processes spawned through :func:`run_subprocess`,
+    :func:`run_cmd_in_pty` and :func:`run_as_child_process` are counted.
+
+    :returns int: Number of the spawned child processes.
+    """
+    return _spawned_subprocesses.count
 
 
 class UnableToSerialize(Exception):
@@ -136,14 +165,358 @@ class Process(multiprocessing.Process):
         return self._exception
 
 
+def _are_same_attributes(old_attributes, new_attributes):
+    """Tell whether the attributes of objects are set to the very same values.
+
+    :param old_attributes: The ``__dict__`` of each object.
+    :type old_attributes: list[dict[str, Any]]
+    :param new_attributes: The ``__dict__`` of each object.
+    :type new_attributes: list[dict[str, Any]]
+    :rtype: bool
+    """
+    if len(old_attributes) != len(new_attributes):
+        return False
+
+    for old, new in zip(old_attributes, new_attributes):
+        if len(old) != len(new):
+            return False
+        for name, value in old.items():
+            if name not in new or new[name] is not value:
+                return False
+
+    return True
+
+
+# Seconds between two checks that the child process worker is still alive
+# while waiting for the result of a call.
+_CHILD_PROCESS_WORKER_POLL_INTERVAL = 0.1
+# Seconds to wait for the child process worker to exit before terminating it.
+_CHILD_PROCESS_WORKER_STOP_TIMEOUT = 5
+
+
+class ChildProcessWorker:
+    """Long-lived child process running the functions decorated with :func:`run_as_child_process`.
+
+    Forking a new process for every call means paying for the start of the
+    process and for the initialization of the rpm and yum/dnf state in it each
+    time. Instead, the worker is started on the first call and it serves the
+    following calls over a pipe, keeping the libraries initialized between
+    them.
+
+    .. important::
+        The worker is forked from the main process so it sees the state of the
+        main process (loaded modules, module globals, ...) at the time it was
+        started. The attributes of the objects passed to :meth:`share_state`,
+        like :data:`convert2rhel.toolopts.tool_opts` and
+        :data:`convert2rhel.systeminfo.system_info`, are sent to the worker
+        with the first call after any of them is set to another value. For
+        any other state, call :meth:`stop` when it changes in a way the
+        decorated functions depend on. The next call starts a new worker.
+
+    The calls made from several threads wait for each other, the worker runs
+    one function at a time. Forking a new child process while other threads
+    are running could copy the locks they hold, like the ones of the logging
+    handlers, and deadlock the child. Start the worker with :meth:`start`
+    before starting the threads for the same reason.
+
+    Calls whose arguments cannot be sent to the worker over the pipe are run
+    in a new child process, like it was done for every call before.
+    """
+
+    def __init__(self):
+        self._functions = {}
+        self._shared_objects = []
+        self._generation = 0
+        self._process = None
+        self._process_generation = None
+        self._conn = None
+        # The pickled attributes of the shared objects last sent to the worker
+        self._sent_state = None
+        # The attributes of the shared objects last pickled and the pickled
+        # attributes, None if they cannot be pickled
+        self._state_cache = None
+        self._reported_unpicklable_state = False
+        self._lock = threading.Lock()
+
+    def register(self, func):
+        """Make a function available to the worker.
+
+        The worker can only run the functions that were registered before it
+        was started. Registering a new function makes the next call start a
+        new worker.
+
+        :param func: The function to register.
+        :type func: Callable
+        :returns str: The key identifying the function in the requests sent to
+            the worker.
+        """
+        key = "{}.{}".format(func.__module__, getattr(func, "__qualname__", func.__name__))
+        if self._functions.get(key) is not func:
+            self._functions[key] = func
+            self._generation += 1
+        return key
+
+    def share_state(self, obj):
+        """Keep the attributes of an object in the worker the same as in the main process.
+
+        The attributes are sent to the worker together with the first call
+        made after any of them changed, so the functions run by the worker do
+        not see the values the object had when the worker was started.
+
+        Only setting an attribute to another value is noticed, not changing
+        the value of an attribute in place.
+
+        :param obj: The object whose attributes to share. They must be
+            picklable, otherwise the calls are run in a new child process.
+        :type obj: object
+        """
+        self._shared_objects.append(obj)
+        self._state_cache = None
+        self._generation += 1
+
+    def call(self, func, args, kwargs):
+        """Run a function in the worker and return its result.
+
+        :param func: The function to run.
+        :type func: Callable
+        :param args: Arguments of the function.
+        :type args: tuple
+        :param kwargs: Named arguments of the function.
+        :type kwargs: dict
+        :raises KeyboardInterrupt: If a SIGINT is caught while waiting for the
+            worker. The worker is terminated.
+        :raises Exception: Any exception raised by the function.
+        :returns: The value returned by the function.
+        :rtype: Any
+        """
+        key = self.register(func)
+        try:
+            request = moves.cPickle.dumps((key, args, kwargs), moves.cPickle.HIGHEST_PROTOCOL)
+        except (moves.cPickle.PicklingError, TypeError, AttributeError):
+            logger.debug("Unable to send the arguments of %s to the child process worker.", key)
+            return _run_in_new_child_process(func, args, kwargs)
+
+        # Wait for the calls made from other threads, this also keeps the
+        # yum/dnf sessions of the concurrent checks from using the package
+        # manager cache at the same time.
+        self._lock.acquire()
+        try:
+            state = self._get_shared_state()
+            if state is None:
+                # Tell once that the worker is not used, so that an attribute
+                # which cannot be pickled does not go unnoticed.
+                log = logger.debug if self._reported_unpicklable_state else logger.info
+                log(
+                    "Unable to send the state shared with the child process worker to it, running %s in a new"
+                    " child process instead.",
+                    key,
+                )
+                self._reported_unpicklable_state = True
+                return _run_in_new_child_process(func, args, kwargs)
+
+            self._ensure_started()
+
+            try:
+                self._conn.send_bytes(state if state != self._sent_state else b"")
+                self._sent_state = state
+                self._conn.send_bytes(request)
+            except (IOError, OSError):
+                # The worker exited, find out why when receiving the result
+                pass
+            return self._receive()
+        except KeyboardInterrupt:
+            logger.warning("Terminating child process...")
+            self._terminate()
+
+            # If there is a KeyboardInterrupt raised while the worker is
+            # running the function, let's just re-raise it to the stack and
+            # move on.
+            raise
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Start the worker if it is not running yet.
+
+        Call it before starting threads which use the worker, so that the
+        worker is not forked while they are running.
+        """
+        with self._lock:
+            self._ensure_started()
+
+    def stop(self):
+        """Stop the worker if it is running."""
+        with self._lock:
+            self._stop()
+
+    def _ensure_started(self):
+        if self._process is not None and not self._process.is_alive():
+            self._terminate()
+        if self._process is not None and self._process_generation != self._generation:
+            self._stop()
+        if self._process is None:
+            self._start()
+
+    def _start(self):
+        conn, worker_conn = multiprocessing.Pipe()
+        process = Process(target=self._serve, args=(worker_conn, conn))
+
+        # Running the process as a daemon prevents it from hanging if a SIGINT
+        # is raised, as all childs will be terminated with it.
+        # https://docs.python.org/2.7/library/multiprocessing.html#multiprocessing.Process.daemon
+        process.daemon = True
+        self._process = process
+        self._process_generation = self._generation
+        self._conn = conn
+        self._sent_state = None
+        process.start()
+        _spawned_subprocesses.count += 1
+        worker_conn.close()
+
+    def _receive(self):
+        while not self._conn.poll(_CHILD_PROCESS_WORKER_POLL_INTERVAL):
+            if self._process.exception or not self._process.is_alive():
+                break
+        else:
+            try:
+                status, value = self._conn.recv()
+            except EOFError:
+                pass
+            else:
+                if status == "exception":
+                    raise value
+                return value
+
+        # The worker exited without answering
+        exception = self._process.exception
+        self._terminate()
+        if exception:
+            raise exception
+
+        return None
+
+    def _stop(self):
+        if self._process is None:
+            return
+
+        # Closing the pipe makes the worker exit
+        self._conn.close()
+        self._process.join(_CHILD_PROCESS_WORKER_STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = self._conn = None
+
+    def _terminate(self):
+        if self._process is None:
+            return
+
+        # On Python2 it is most likely that some processes (That calls yum
+        # API) will keep executing until they finish their execution and
+        # ignore the call for termination issued by the parent.
+        if self._process.is_alive():
+            logger.debug("Process with pid %s is alive", self._process.pid)
+            self._process.terminate()
+
+        logger.debug("Process with pid %s exited", self._process.pid)
+        self._conn.close()
+        self._process = self._conn = None
+
+    def _get_shared_object_id(self, obj):
+        for index, shared_object in enumerate(self._shared_objects):
+            if obj is shared_object:
+                return index
+        return None
+
+    def _get_shared_state(self):
+        """Get the pickled attributes of the shared objects.
+
+        The attributes are only pickled again once any of them is set to
+        another value.
+
+        :return: The pickled attributes or None if they cannot be pickled.
+        :rtype: bytes | None
+        """
+        # The copies keep the values alive, so the ids of the values cannot be
+        # reused by other objects while they are compared.
+        attributes = [dict(obj.__dict__) for obj in self._shared_objects]
+        if self._state_cache is not None and _are_same_attributes(self._state_cache[0], attributes):
+            return self._state_cache[1]
+
+        try:
+            state = self._dump_shared_state()
+        except (moves.cPickle.PicklingError, TypeError, AttributeError):
+            state = None
+        self._state_cache = (attributes, state)
+        return state
+
+    def _dump_shared_state(self):
+        state = io.BytesIO()
+        pickler = moves.cPickle.Pickler(state, moves.cPickle.HIGHEST_PROTOCOL)
+        # The attributes can refer to the shared objects themselves (like
+        # their bound methods), those references are resolved to the objects
+        # of the worker instead of copies of them.
+        pickler.persistent_id = self._get_shared_object_id
+        pickler.dump([obj.__dict__ for obj in self._shared_objects])
+        return state.getvalue()
+
+    def _load_shared_state(self, state):
+        unpickler = moves.cPickle.Unpickler(io.BytesIO(state))
+        unpickler.persistent_load = self._shared_objects.__getitem__
+        for obj, attributes in zip(self._shared_objects, unpickler.load()):
+            obj.__dict__.clear()
+            obj.__dict__.update(attributes)
+
+    def _serve(self, conn, main_process_conn):
+        """Serve the calls sent by the main process until it closes the pipe."""
+        main_process_conn.close()
+        try:
+            while True:
+                try:
+                    state = conn.recv_bytes()
+                    key, args, kwargs = moves.cPickle.loads(conn.recv_bytes())
+                except EOFError:
+                    return
+
+                if state:
+                    self._load_shared_state(state)
+
+                try:
+                    response = ("result", self._functions[key](*args, **kwargs))
+                # Like in Process.run(), catch `SystemExit` *and* any
+                # `Exception` as we do a lot of logger.critical() and they do
+                # raise `SystemExit`.
+                except (Exception, SystemExit) as e:
+                    response = ("exception", e)
+
+                try:
+                    conn.send(response)
+                except (moves.cPickle.PicklingError, TypeError, AttributeError):
+                    status, value = response
+                    if status == "exception":
+                        message = "Child process raised {}: {}".format(type(value), str(value))
+                    else:
+                        message = "Child process returned {} which cannot be serialized".format(type(value))
+                    conn.send(("exception", UnableToSerialize(message)))
+        except KeyboardInterrupt:
+            # The main process terminates the worker when it catches the SIGINT
+            return
+
+
+child_process_worker = ChildProcessWorker()
+child_process_worker.share_state(tool_opts)
+
+
 def run_as_child_process(func):
     """Decorator to execute functions as child process.
 
-    This decorator will use `multiprocessing.Process` class to initiate the
-    function as a child process to the parent process with the intention to
-    execute that in its own process, thus, avoiding cases where libraries would
-    install signal handlers that could be propagated to the main thread if they
-    do not do a proper clean-up.
+    This decorator will run the function in a child process of the parent
+    process with the intention to execute that in its own process, thus,
+    avoiding cases where libraries would install signal handlers that could be
+    propagated to the main thread if they do not do a proper clean-up.
+
+    The calls are served by a long-lived child process, the
+    :data:`child_process_worker`, so the process and the libraries used by the
+    function are not initialized again for every call.
 
     .. note::
         This decorator is mostly intended to be used when dealing with
@@ -164,7 +537,8 @@ def run_as_child_process(func):
     .. important::
         It is important to know that if a function is using this decorator,
         then it won't be possible for that function to spawn new child
-        processes inside their workflow. This is a limitation imposed by the
+        processes inside their workflow. Functions decorated with this
+        decorator called from inside the child process are run directly in it. This is a limitation imposed by the
         `daemon` property used to spawn the the first child process (the
         function being decorated), as it won't let a grandchild process being
         created inside an child process.
@@ -207,76 +581,103 @@ def run_as_child_process(func):
         :raises Exception: Raise any general exception that can occur during
             the execution of the child process.
 
-        :return: If the Queue is not empty, return anything in it, otherwise,
-            return `None`.
+        :return: The value returned by the function.
         :rtype: Any
         """
+        # A daemonic child process is not allowed to spawn children of its own
+        # so run the function directly when we are already in one.
+        if multiprocessing.current_process().daemon:
+            return func(*args, **kwargs)
 
-        def inner_wrapper(*args, **kwargs):
-            """
-            Inner function wrapper to execute decorated functions without the
-            need to modify them to have a queue parameter.
-
-            :param args: Arguments tied to the function
-            :type args: tuple
-            :param kwargs: Named arguments tied to the function
-            :type kwargs: dict
-            """
-            func = kwargs.pop("func")
-            queue = kwargs.pop("queue")
-            result = func(*args, **kwargs)
-            queue.put(result)
-
-        queue = multiprocessing.Queue()
-        kwargs.update({"func": func, "queue": queue})
-        process = Process(target=inner_wrapper, args=args, kwargs=kwargs)
+        return child_process_worker.call(func, args, kwargs)
 
-        # Running the process as a daemon prevents it from hanging if a SIGINT
-        # is raised, as all childs will be terminated with it.
-        # https://docs.python.org/2.7/library/multiprocessing.html#multiprocessing.Process.daemon
-        process.daemon = True
-        try:
-            process.start()
-            process.join()
+    child_process_worker.register(func)
 
-            if process.exception:
-                raise process.exception
+    # Python2 and Python3 < 3.2 compatibility
+    if not hasattr(wrapper, "__wrapped__"):
+        wrapper.__wrapped__ = func
 
-            if process.is_alive():
-                # If the process is still alive for some reason, try to
-                # terminate it.
-                process.terminate()
+    return wrapper
 
-            if not queue.empty():
-                # We don't need to block the I/O as we are mostly done with
-                # the child process and no exception was raised, so we can
-                # instantly retrieve the item that was in the queue.
-                return queue.get(block=False)
 
-            return None
-        except KeyboardInterrupt:
-            # We have to check if the process if alive, and if it is (most
-            # probably it will be), then we can call for termination. On
-            # Python2 it is most likely that some processes (That calls yum
-            # API) will keep executing until they finish their execution and
-            # ignore the call for termination issued by the parent. To avoid
-            # having "zombie" processes, we need to wait for them to finish.
-            logger.warning("Terminating child process...")
-            if process.is_alive():
-                logger.debug("Process with pid %s is alive", process.pid)
-                process.terminate()
+def _run_in_new_child_process(func, args, kwargs):
+    """Run a function in a new child process and return its result.
 
-            logger.debug("Process with pid %s exited", process.pid)
+    :param func: The function to run.
+    :type func: Callable
+    :param args: Arguments of the function.
+    :type args: tuple
+    :param kwargs: Named arguments of the function.
+    :type kwargs: dict
+    :raises KeyboardInterrupt: Raises a `KeyboardInterrupt` if a SIGINT is
+        caught during the execution of the child process.
+    :raises Exception: Raise any general exception that can occur during the
+        execution of the child process.
+    :return: If the Queue is not empty, return anything in it, otherwise,
+        return `None`.
+    :rtype: Any
+    """
 
-            # If there is a KeyboardInterrupt raised while the child process is
-            # being executed, let's just re-raise it to the stack and move on.
-            raise
+    def inner_wrapper(*args, **kwargs):
+        """
+        Inner function wrapper to execute decorated functions without the
+        need to modify them to have a queue parameter.
 
-    # Python2 and Python3 < 3.2 compatibility
-    if not hasattr(wrapper, "__wrapped__"):
-        wrapper.__wrapped__ = func
+        :param args: Arguments tied to the function
+        :type args: tuple
+        :param kwargs: Named arguments tied to the function
+        :type kwargs: dict
+        """
+        func = kwargs.pop("func")
+        queue = kwargs.pop("queue")
+        result = func(*args, **kwargs)
+        queue.put(result)
+
+    queue = multiprocessing.Queue()
+    kwargs = dict(kwargs, func=func, queue=queue)
+    process = Process(target=inner_wrapper, args=args, kwargs=kwargs)
+
+    # Running the process as a daemon prevents it from hanging if a SIGINT
+    # is raised, as all childs will be terminated with it.
+    # https://docs.python.org/2.7/library/multiprocessing.html#multiprocessing.Process.daemon
+    process.daemon = True
+    try:
+        process.start()
+        _spawned_subprocesses.count += 1
+        process.join()
 
-    return wrapper
+        if process.exception:
+            raise process.exception
+
+        if process.is_alive():
+            # If the process is still alive for some reason, try to
+            # terminate it.
+            process.terminate()
+
+        if not queue.empty():
+            # We don't need to block the I/O as we are mostly done with
+            # the child process and no exception was raised, so we can
+            # instantly retrieve the item that was in the queue.
+            return queue.get(block=False)
+
+        return None
+    except KeyboardInterrupt:
+        # We have to check if the process if alive, and if it is (most
+        # probably it will be), then we can call for termination. On
+        # Python2 it is most likely that some processes (That calls yum
+        # API) will keep executing until they finish their execution and
+        # ignore the call for termination issued by the parent. To avoid
+        # having "zombie" processes, we need to wait for them to finish.
+        logger.warning("Terminating child process...")
+        if process.is_alive():
+            logger.debug("Process with pid %s is alive", process.pid)
+            process.terminate()
+
+        logger.debug("Process with pid %s exited", process.pid)
+
+        # If there is a KeyboardInterrupt raised while the child process is
+        # being executed, let's just re-raise it to the stack and move on.
+        raise
 
 
 def require_root():
@@ -327,13 +728,113 @@ def restart_system():
         logger.warning("In order to boot the RHEL kernel, restart of the system is needed.")
 
 
-def run_subprocess(cmd, print_cmd=True, print_output=True):
+class OutputBuffer:
+    """Memory-bounded buffer for the output of a command.
+
+    The lines are kept in a list and joined only when the whole output is
+    requested. Once the buffered lines take more than max_memory_size
+    characters, they are moved to a temporary file and any further lines are
+    appended to that file.
+
+    The bound holds only as long as the output is read through iteration.
+    getvalue() returns the whole output as one string no matter where it is
+    buffered.
+
+    Example:
+    >>> with OutputBuffer(max_memory_size=1024 * 1024) as output:
+    >>>     run_subprocess(["rpm", "-qal"], print_output=False, callback=output.write, keep_output=False)
+    >>>     for line in output:
+    >>>         ...
+    """
+
+    def __init__(self, max_memory_size=None):
+        self._max_memory_size = max_memory_size
+        self._lines = []
+        self._size = 0
+        self._spill_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def spilled(self):
+        """Whether the output has been moved to a temporary file."""
+        return self._spill_file is not None
+
+    def write(self, line):
+        """Append a line (including its newline character) to the buffer."""
+        if self._spill_file is not None:
+            self._spill_file.write(line.encode("utf-8"))
+            return
+
+        self._lines.append(line)
+        self._size += len(line)
+        if self._max_memory_size is not None and self._size > self._max_memory_size:
+            self._spill()
+
+    def _spill(self):
+        self._spill_file = tempfile.TemporaryFile()
+        for line in self._lines:
+            self._spill_file.write(line.encode("utf-8"))
+        self._lines = []
+        self._size = 0
+
+    def __iter__(self):
+        """Iterate over the buffered lines without loading all of them to memory."""
+        if self._spill_file is None:
+            for line in self._lines:
+                yield line
+            return
+
+        self._spill_file.flush()
+        self._spill_file.seek(0)
+        for line in self._spill_file:
+            yield line.decode("utf-8")
+        self._spill_file.seek(0, os.SEEK_END)
+
+    def getvalue(self):
+        """Return the whole buffered output as a string."""
+        if self._spill_file is None:
+            return "".join(self._lines)
+
+        self._spill_file.flush()
+        self._spill_file.seek(0)
+        content = self._spill_file.read().decode("utf-8")
+        self._spill_file.seek(0, os.SEEK_END)
+        return content
+
+    def close(self):
+        """Drop the buffered output."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._lines = []
+        self._size = 0
+
+
+def run_subprocess(
+    cmd, print_cmd=True, print_output=True, callback=None, keep_output=True, max_memory_size=MAX_OUTPUT_MEMORY_SIZE
+):
     """Call the passed command and optionally log the called command (print_cmd=True) and its
     output (print_output=True). Switching off printing the command can be useful in case it contains
     a password in plain text.
 
     The cmd is specified as a list starting with the command and followed by a list of arguments.
     Example: ["dnf", "repoquery", "kernel"]
+
+    The output can be consumed while the command is still running by passing a callback, which
+    is called with each line of the output (including the newline character) as soon as it is
+    read. Callers that consume the whole output this way can pass keep_output=False so that the
+    output is not kept in memory. An empty string is returned as the output in that case.
+
+    The kept output is stored in an OutputBuffer. Once it takes more than max_memory_size characters,
+    it is moved to a temporary file while the command is running. Pass None to keep the whole output
+    in memory. Note that the kept output is still returned as a single string, so this limits only
+    the memory used while the command runs. Commands with a large output should be consumed through
+    the callback with keep_output=False instead.
     """
     # This check is here because we passed in strings in the past and changed to a list
     # for security hardening.  Remove this once everyone is comfortable with using a list
@@ -344,6 +845,7 @@ def run_subprocess(cmd, print_cmd=True, print_output=True):
     if print_cmd:
         logger.debug("Calling command '{}'".format(" ".join(cmd)))
 
+    start = time.time()
     process = subprocess.Popen(
         # Popen is only a context manager in Python-3.2+
         cmd,
@@ -351,18 +853,25 @@ def run_subprocess(cmd, print_cmd=True, print_output=True):
         stderr=subprocess.STDOUT,
         bufsize=-1,
     )
-    output = ""
-    for line in iter(process.stdout.readline, b""):
-        line = line.decode("utf-8")
-        output += line
-        if print_output:
-            logger.info(line.rstrip("\n"))
-
-    # Call communicate() to wait for the process to terminate so that we can
-    # get the return code.
-    process.communicate()
-
-    return output, process.returncode
+    _spawned_subprocesses.count += 1
+    output_bytes = 0
+    with OutputBuffer(max_memory_size=max_memory_size) as output:
+        for line in iter(process.stdout.readline, b""):
+            output_bytes += len(line)
+            line = line.decode("utf-8")
+            if keep_output:
+                output.write(line)
+            if callback:
+                callback(line)
+            if print_output:
+                logger.info(line.rstrip("\n"))
+
+        # Call communicate() to wait for the process to terminate so that we can
+        # get the return code.
+        process.communicate()
+        command_trace.record(hide_secrets(cmd), start, time.time(), process.returncode, output_bytes)
+
+        return output.getvalue(), process.returncode
 
 
 def run_cmd_in_pty(cmd, expect_script=(), print_cmd=True, print_output=True, columns=150):
@@ -403,6 +912,7 @@ def run_cmd_in_pty(cmd, expect_script=(), print_cmd=True, print_output=True, col
     if print_cmd:
         logger.debug("Calling command '{}'".format(" ".join(cmd)))
 
+    start = time.time()
     process = PexpectSpawnWithDimensions(
         cmd[0],
         cmd[1:],
@@ -414,6 +924,7 @@ def run_cmd_in_pty(cmd, expect_script=(), print_cmd=True, print_output=True, col
         timeout=None,
         dimensions=(1, columns),
     )
+    _spawned_subprocesses.count += 1
 
     for expect, send in expect_script:
         process.expect(expect)
@@ -431,6 +942,7 @@ def run_cmd_in_pty(cmd, expect_script=(), print_cmd=True, print_output=True, col
     # Per the pexpect API, this is necessary in order to get the return code
     process.close()
     return_code = process.exitstatus
+    command_trace.record(hide_secrets(cmd), start, time.time(), return_code, len(process.before))
 
     output = process.before.decode()
     if print_output:
@@ -581,20 +1093,82 @@ def download_pkgs(
     disable_repos=None,
     set_releasever=True,
     custom_releasever=None,
+    max_parallel_downloads=MAX_PARALLEL_DOWNLOADS,
 ):
-    """A wrapper for the download_pkg function allowing to download multiple packages."""
-    return [
-        download_pkg(
-            pkg,
-            dest,
-            reposdir,
-            enable_repos,
-            disable_repos,
-            set_releasever,
-            custom_releasever,
-        )
-        for pkg in pkgs
-    ]
+    """Download multiple rpms using a single yumdownloader call and return their filepaths.
+
+    All the packages are resolved within one yumdownloader run, so yum/dnf
+    loads the repository metadata only once, and up to max_parallel_downloads
+    rpms are downloaded at the same time.
+
+    The packages that the batch download fails to fetch are downloaded one
+    by one through :func:`download_pkg`, so that each failure is reported on
+    the same way as when downloading a single package.
+
+    The rest of the parameters are the same as for :func:`download_pkg`.
+
+    :param pkgs: The packages that will be downloaded.
+    :type pkgs: list[str]
+    :param max_parallel_downloads: Maximum number of rpms downloaded at the same time.
+    :type max_parallel_downloads: int
+
+    :return: The filepaths of the downloaded packages in the order of pkgs. None for the packages that failed to
+        download.
+    :rtype: list[str | None]
+    """
+    from convert2rhel.systeminfo import system_info
+
+    if len(pkgs) < 2:
+        return [
+            download_pkg(pkg, dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever)
+            for pkg in pkgs
+        ]
+
+    logger.debug("Downloading the {} packages.".format(", ".join(pkgs)))
+
+    cmd = _get_yumdownloader_cmd(dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever)
+    if system_info.version.major >= 8:
+        cmd.append("--setopt=max_parallel_downloads={}".format(max_parallel_downloads))
+    else:
+        cmd.append("--setopt=max_connections={}".format(max_parallel_downloads))
+    cmd.extend(pkgs)
+
+    output, ret_code = run_cmd_in_pty(cmd, print_output=False)
+    downloaded_paths = get_rpm_paths_from_yumdownloader_output(output, dest)
+
+    paths = []
+    for pkg in pkgs:
+        path = _find_downloaded_rpm(pkg, downloaded_paths)
+        # When yumdownloader fails, only trust the rpms that actually made it to the disk
+        if path and (ret_code == 0 or os.path.isfile(path)):
+            logger.info("Successfully downloaded the {} package.".format(pkg))
+            logger.debug("Path of the downloaded package: {}".format(path))
+        else:
+            logger.debug("The {} package was not downloaded in a batch. Trying to download it alone.".format(pkg))
+            path = download_pkg(pkg, dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever)
+        paths.append(path)
+
+    return paths
+
+
+def _find_downloaded_rpm(pkg, paths):
+    """Find the rpm of a package among downloaded rpms.
+
+    :param pkg: The package as passed to yumdownloader - a name or a NEVRA in any of the yum/dnf notations.
+    :type pkg: str
+    :param paths: Paths to the downloaded rpms, named as N-V-R.A.rpm.
+    :type paths: list[str]
+    :return: The path to the rpm of the package or None if it's not among the paths.
+    :rtype: str | None
+    """
+    # The rpm filenames don't contain the epoch
+    pkg = re.sub(r"(^|-)\d+:", r"\1", pkg)
+    for path in paths:
+        nvra = os.path.basename(path)[: -len(".rpm")]
+        if pkg in (nvra, nvra.rsplit(".", 1)[0], nvra.rsplit("-", 2)[0]):
+            return path
+
+    return None
 
 
 def download_pkg(
@@ -629,10 +1203,34 @@ def download_pkg(
     :return: The filepath of the downloaded package.
     :rtype: str | None
     """
-    from convert2rhel.systeminfo import system_info
-
     logger.debug("Downloading the {} package.".format(pkg))
 
+    cmd = _get_yumdownloader_cmd(dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever)
+    cmd.append(pkg)
+
+    output, ret_code = run_cmd_in_pty(cmd, print_output=False)
+    if ret_code != 0:
+        report_on_a_download_error(output, pkg)
+        return None
+
+    path = get_rpm_path_from_yumdownloader_output(cmd, output, dest)
+    if not path:
+        report_on_a_download_error(output, pkg)
+        return None
+
+    logger.info("Successfully downloaded the {} package.".format(pkg))
+    logger.debug("Path of the downloaded package: {}".format(path))
+
+    return path
+
+
+def _get_yumdownloader_cmd(dest, reposdir, enable_repos, disable_repos, set_releasever, custom_releasever):
+    """Build the yumdownloader command line without the packages to download.
+
+    See :func:`download_pkg` for the parameters.
+    """
+    from convert2rhel.systeminfo import system_info
+
     # On RHEL 7, it's necessary to invoke yumdownloader with -v, otherwise there's no output to stdout.
     cmd = ["yumdownloader", "-v", "--setopt=exclude=", "--destdir={}".format(dest)]
     if reposdir:
@@ -658,22 +1256,7 @@ def download_pkg(
     if system_info.version.major >= 8:
         cmd.append("--setopt=module_platform_id=platform:el" + str(system_info.version.major))
 
-    cmd.append(pkg)
-
-    output, ret_code = run_cmd_in_pty(cmd, print_output=False)
-    if ret_code != 0:
-        report_on_a_download_error(output, pkg)
-        return None
-
-    path = get_rpm_path_from_yumdownloader_output(cmd, output, dest)
-    if not path:
-        report_on_a_download_error(output, pkg)
-        return None
-
-    logger.info("Successfully downloaded the {} package.".format(pkg))
-    logger.debug("Path of the downloaded package: {}".format(path))
-
-    return path
+    return cmd
 
 
 def remove_pkgs(pkgs_to_remove, critical=True):
@@ -835,6 +1418,24 @@ def get_rpm_path_from_yumdownloader_output(cmd, output, dest):
     return path
 
 
+def get_rpm_paths_from_yumdownloader_output(output, dest):
+    """Parse the output of yumdownloader to get the filepaths of all the downloaded rpms.
+
+    See :func:`get_rpm_path_from_yumdownloader_output` for the possible formats of the output.
+
+    :return: The filepaths in the order they appear in the output, without duplicates.
+    :rtype: list[str]
+    """
+    paths = []
+    for match in re.finditer(r"(\S+\.rpm)|using local copy of (?:\d+:)?(\S+)", output or ""):
+        rpm_name = os.path.basename(match.group(1)) if match.group(1) else match.group(2) + ".rpm"
+        path = os.path.join(dest, rpm_name)
+        if path not in paths:
+            paths.append(path)
+
+    return paths
+
+
 def get_package_name_from_rpm(rpm_path):
     """Return name of a package that is represented by a locally stored rpm file."""
     hdr = get_rpm_header(rpm_path)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__metaclass__ = type
+
+import collections
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+from convert2rhel.logger import LOG_DIR, root_logger
+
+
+logger = root_logger.getChild(__name__)
+
+#: Filename of the trace of the external commands in JSON Lines format
+COMMAND_TRACE_FILENAME = "convert2rhel-commands.jsonl"
+#: Filename of the trace of the external commands in the Chrome trace event
+#: format, viewable in chrome://tracing or https://ui.perfetto.dev
+COMMAND_TIMELINE_FILENAME = "convert2rhel-commands-timeline.json"
+
+
+class CommandRecord:
+    """
+    A single external command run by convert2rhel.
+
+    :ivar argv: The command and its arguments with the secrets hidden.
+    :ivar start: Time the command was started at, in seconds since the epoch.
+    :ivar end: Time the command finished at, in seconds since the epoch.
+    :ivar exit_code: The exit code of the command.
+    :ivar output_bytes: Number of bytes the command has written to its output.
+    :ivar action_id: Id of the Action which ran the command or None if it was
+        run outside of an Action.
+    :ivar thread_id: Identifier of the thread which ran the command.
+    """
+
+    def __init__(self, argv, start, end, exit_code, output_bytes, action_id, thread_id):
+        self.argv = argv
+        self.start = start
+        self.end = end
+        self.exit_code = exit_code
+        self.output_bytes = output_bytes
+        self.action_id = action_id
+        self.thread_id = thread_id
+
+    @property
+    def duration(self):
+        """Seconds the command has been running for."""
+        return self.end - self.start
+
+    def to_dict(self):
+        """
+        Returns a dictionary representation of the :class:`CommandRecord`.
+
+        :returns: The record expressed as a dictionary
+        :rtype: dict
+        """
+        return {
+            "argv": self.argv,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.duration, 6),
+            "exit_code": self.exit_code,
+            "output_bytes": self.output_bytes,
+            "action_id": self.action_id,
+        }
+
+
+class _CurrentAction(threading.local):
+    """Id of the Action running in a thread."""
+
+    action_id = None
+
+
+class CommandTrace:
+    """
+    Collect the external commands run by convert2rhel.
+
+    The commands are recorded by :func:`convert2rhel.utils.run_subprocess` and
+    :func:`convert2rhel.utils.run_cmd_in_pty`.  Each command is attributed to
+    the Action which was running in the same thread, see :meth:`action`.
+    """
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+        self._current_action = _CurrentAction()
+
+    @property
+    def records(self):
+        """List of the :class:`CommandRecord` collected so far."""
+        with self._lock:
+            return list(self._records)
+
+    @contextmanager
+    def action(self, action_id):
+        """
+        Attribute the commands run by the current thread to an Action.
+
+        :param action_id: Id of the Action being run.
+        :type action_id: str
+        """
+        previous_action_id = self._current_action.action_id
+        self._current_action.action_id = action_id
+        try:
+            yield
+        finally:
+            self._current_action.action_id = previous_action_id
+
+    def record(self, argv, start, end, exit_code, output_bytes):
+        """
+        Record a finished command.
+
+        :param argv: The command and its arguments.  The secrets must already
+            be hidden, see :func:`convert2rhel.utils.hide_secrets`.
+        :type argv: list[str]
+        :param start: Time the command was started at, as returned by
+            :func:`time.time`.
+        :type start: float
+        :param end: Time the command finished at, as returned by
+            :func:`time.time`.
+        :type end: float
+        :param exit_code: The exit code of the command.
+        :type exit_code: int
+        :param output_bytes: Number of bytes the command has written to its
+            output.
+        :type output_bytes: int
+        :returns: The new record.
+        :rtype: CommandRecord
+        """
+        command_record = CommandRecord(
+            argv=list(argv),
+            start=start,
+            end=end,
+            exit_code=exit_code,
+            output_bytes=output_bytes,
+            action_id=self._current_action.action_id,
+            thread_id=threading.current_thread().ident,
+        )
+        with self._lock:
+            self._records.append(command_record)
+        return command_record
+
+    def clear(self):
+        """Drop all the collected records."""
+        with self._lock:
+            self._records = []
+
+    def summarize(self):
+        """
+        Aggregate the records by the executable.
+
+        :returns: Mapping of the executable to a 2-tuple of the number of its
+            calls and the total seconds spent in them, ordered from the most
+            time consuming one.
+        :rtype: collections.OrderedDict
+        """
+        totals = collections.defaultdict(lambda: [0, 0.0])
+        for command_record in self.records:
+            executable = os.path.basename(command_record.argv[0]) if command_record.argv else ""
+            totals[executable][0] += 1
+            totals[executable][1] += command_record.duration
+
+        ordered = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return collections.OrderedDict((executable, tuple(total)) for executable, total in ordered)
+
+    def to_timeline(self):
+        """
+        Convert the records to the Chrome trace event format.
+
+        :returns: The trace events as a dictionary ready to be dumped as json.
+        :rtype: dict
+        """
+        pid = os.getpid()
+        events = []
+        for command_record in self.records:
+            events.append(
+                {
+                    "name": os.path.basename(command_record.argv[0]) if command_record.argv else "",
+                    "cat": command_record.action_id or "convert2rhel",
+                    "ph": "X",
+                    "ts": int(command_record.start * 1000000),
+                    "dur": int(command_record.duration * 1000000),
+                    "pid": pid,
+                    "tid": command_record.thread_id,
+                    "args": {
+                        "argv": " ".join(command_record.argv),
+                        "exit_code": command_record.exit_code,
+                        "output_bytes": command_record.output_bytes,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, log_dir=LOG_DIR):
+        """
+        Write the trace to the log directory and log a summary of it.
+
+        Both :data:`COMMAND_TRACE_FILENAME` and
+        :data:`COMMAND_TIMELINE_FILENAME` are written.  Any previous trace is
+        overwritten.
+
+        :keyword log_dir: The directory to write the trace files to.
+        :type log_dir: str
+        """
+        with open(os.path.join(log_dir, COMMAND_TRACE_FILENAME), "w") as trace_file:
+            for command_record in self.records:
+                trace_file.write(json.dumps(command_record.to_dict()))
+                trace_file.write("\n")
+
+        with open(os.path.join(log_dir, COMMAND_TIMELINE_FILENAME), "w") as timeline_file:
+            json.dump(self.to_timeline(), timeline_file)
+
+        for executable, (calls, total_time) in self.summarize().items():
+            logger.debug("{} was called {} times for {:.2f} seconds in total.".format(executable, calls, total_time))
+
+
+#: The trace of the external commands of this run
+command_trace = CommandTrace()
@@ -114,6 +114,7 @@ install -m 0600 config/convert2rhel.ini %{buildroot}%{_sysconfdir}/convert2rhel.
 %files
 
 %{_bindir}/%{name}
+%{_bindir}/%{name}-report
 %{_datadir}/%{name}/
 %{_sharedstatedir}/%{name}/
 %{python_sitelib}/%{name}*
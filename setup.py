@@ -17,9 +17,11 @@
 
 import os
 import re
+import runpy
 
 # from build_manpages import build_manpages
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py
 
 
 def read(fname):
@@ -48,6 +50,21 @@ def get_version():
             )
 
 
+class BuildPyWithActionRegistry(build_py):
+    """Generate the registry of the Actions next to the built Action modules."""
+
+    def run(self):
+        build_py.run(self)
+        if self.dry_run:
+            return
+
+        # Run the generator as a script so that convert2rhel (and its
+        # dependencies) do not have to be importable at build time.
+        registry = runpy.run_path(os.path.join("convert2rhel", "actions", "registry.py"))
+        registry_path = registry["write_registry"](os.path.join(self.build_lib, "convert2rhel", "actions"))
+        self.byte_compile([registry_path])
+
+
 setup(
     name="convert2rhel",
     version=get_version(),
@@ -62,10 +79,12 @@ setup(
     entry_points={
         "console_scripts": [
             "convert2rhel = convert2rhel.initialize:run",
+            "convert2rhel-report = convert2rhel.report_aggregate:run",
         ]
     },
     install_requires=[
         "six",
     ],
     include_package_data=True,
+    cmdclass={"build_py": BuildPyWithActionRegistry},
 )
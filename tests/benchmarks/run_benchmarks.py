@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright(C) 2024 Red Hat, Inc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Micro-benchmarks of the CPU-bound code paths of convert2rhel.
+
+The benchmarks run offline against synthetic data sized like the largest
+systems we convert.  They need the same environment as the unit tests (the
+rpm and yum/dnf python bindings), so run them in one of the test containers::
+
+    make bench                # Run the benchmarks, store the results
+    make bench-baseline       # Store the results as the baseline
+    make bench-compare        # Fail if any benchmark regressed
+
+Or directly::
+
+    python3 tests/benchmarks/run_benchmarks.py run --output current.json
+    python3 tests/benchmarks/run_benchmarks.py compare baseline.json current.json
+"""
+
+__metaclass__ = type
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+
+
+#: Version of the format of the results file
+RESULTS_FORMAT_VERSION = 1
+#: Default ratio of the current to the baseline time considered a regression
+DEFAULT_THRESHOLD = 1.25
+
+# The convert2rhel package is imported from the checkout the script is in.
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+_BENCHMARKS = []
+
+
+def benchmark(func):
+    """
+    Register a benchmark.
+
+    The decorated function prepares the synthetic data and returns a callable
+    running the measured code once.  Only the callable is timed.
+    """
+    _BENCHMARKS.append(func)
+    return func
+
+
+def _synthetic_nevras(count):
+    """Generate package NEVRAs in the formats convert2rhel has to parse."""
+    arches = ("x86_64", "noarch", "i686")
+    nevras = []
+    for i in range(count):
+        name = "package-{}".format(i % 5000)
+        version = "{}.{}.{}".format(i % 7, i % 13, i % 101)
+        release = "{}.el8_{}".format(i % 300, i % 10)
+        arch = arches[i % len(arches)]
+        if i % 2:
+            nevras.append("{}-{}:{}-{}.{}".format(name, i % 3, version, release, arch))
+        else:
+            nevras.append("{}-{}-{}.{}".format(name, version, release, arch))
+    return nevras
+
+
+@benchmark
+def resolve_action_order_500_actions():
+    from convert2rhel import actions
+
+    action_classes = []
+    for i in range(500):
+        # Every Action depends on up to three of the Actions defined after it
+        # so the dependency graph is deep and wide and its order is the
+        # opposite of the order of the ids.
+        dependencies = tuple("ACTION_{:03d}".format(dep) for dep in (i + 1, 2 * i + 1, 3 * i + 1) if dep < 500)
+        attributes = {"id": "ACTION_{:03d}".format(i), "dependencies": dependencies}
+        action_classes.append(type("Action{}".format(i), (actions.Action,), attributes))
+
+    def run():
+        list(actions.resolve_action_order(action_classes))
+
+    return run
+
+
+@benchmark
+def parse_pkg_string_50k_nevras():
+    from convert2rhel import pkghandler
+
+    nevras = _synthetic_nevras(50000)
+
+    def run():
+        # Measure the parsing, not the cache of the parsed packages which
+        # would answer every round but the first one.
+        pkghandler._parsed_pkgs.clear()
+        for nevra in nevras:
+            pkghandler.parse_pkg_string(nevra)
+
+    return run
+
+
+@benchmark
+def compare_package_versions_50k_nevras():
+    from convert2rhel import pkghandler
+
+    nevras = _synthetic_nevras(50000)
+    # Compare each package with another version of the same package
+    pairs = []
+    for nevra in nevras:
+        name, epoch, version, release, arch = pkghandler.parse_pkg_string(nevra)
+        pairs.append((nevra, "{}-{}-{}.1.{}".format(name, version, release, arch)))
+
+    def run():
+        # The setup above filled the cache of the parsed packages
+        pkghandler._parsed_pkgs.clear()
+        for version1, version2 in pairs:
+            pkghandler.compare_package_versions(version1, version2)
+
+    return run
+
+
+@benchmark
+def backup_package_files_parse_line_200k_lines():
+    from convert2rhel.actions.pre_ponr_changes import backup_system
+
+    statuses = ("S.5....T.", "missing  ", ".M.......", "..5....T.", "....L....", "S.5....T.")
+    file_types = ("c", "d", "g", "l", "r", " ")
+    lines = []
+    for i in range(200000):
+        lines.append(
+            "{}  {} /usr/share/package-{}/file-{}.conf".format(
+                statuses[i % len(statuses)], file_types[i % len(file_types)], i % 5000, i
+            )
+        )
+    action = backup_system.BackupPackageFiles()
+
+    def run():
+        for line in lines:
+            action._parse_line(line)
+
+    return run
+
+
+def _synthetic_results(action_count, messages_per_action):
+    from convert2rhel.actions import STATUS_CODE
+
+    levels = ("SUCCESS", "SKIP", "OVERRIDABLE", "ERROR")
+    results = {}
+    for i in range(action_count):
+        messages = []
+        for j in range(messages_per_action):
+            messages.append(
+                {
+                    "level": STATUS_CODE["WARNING"] if j % 2 else STATUS_CODE["INFO"],
+                    "id": "MESSAGE_{}".format(j),
+                    "title": "Message {} of action {}".format(j, i),
+                    "description": "Description of the message " * 5,
+                    "diagnosis": "Diagnosis of the message " * 5,
+                    "remediations": "Remediation of the message " * 5,
+                    "variables": {},
+                }
+            )
+        results["ACTION_{}".format(i)] = {
+            "messages": messages,
+            "result": {
+                "level": STATUS_CODE[levels[i % len(levels)]],
+                "id": "RESULT",
+                "title": "Result of action {}".format(i),
+                "description": "Description of the result " * 5,
+                "diagnosis": "Diagnosis of the result " * 5,
+                "remediations": "Remediation of the result " * 5,
+                "variables": {},
+            },
+        }
+    return results
+
+
+@benchmark
+def report_summary_5k_messages():
+    from convert2rhel.actions import report
+
+    results = _synthetic_results(500, 10)
+
+    def run():
+        report._summary(results, include_all_reports=True, disable_colors=False)
+
+    return run
+
+
+@benchmark
+def report_summary_as_json_5k_messages():
+    import tempfile
+
+    from convert2rhel.actions import report
+
+    results = _synthetic_results(500, 10)
+    json_file = os.path.join(tempfile.mkdtemp(), "convert2rhel-pre-conversion.json")
+
+    def run():
+        report.summary_as_json(results, json_file)
+
+    return run
+
+
+@benchmark
+def most_recent_unique_kernel_pkgs_20k_pkgs():
+    from convert2rhel.actions.pre_ponr_changes import kernel_modules
+
+    pkgs = []
+    for i in range(20000):
+        name = ("kernel-core", "kernel-modules", "kmod-debug-core", "kernel-modules-extra")[i % 4]
+        pkgs.append("{}-0:4.18.0-{}.{}.1.el8_{}.x86_64".format(name, i % 500, i % 30, i % 10))
+    action = kernel_modules.EnsureKernelModulesCompatibility()
+
+    def run():
+        action._get_most_recent_unique_kernel_pkgs(pkgs)
+
+    return run
+
+
+def run_benchmarks(rounds, selected=None):
+    """
+    Run the registered benchmarks.
+
+    :param rounds: How many times to time each benchmark.
+    :type rounds: int
+    :param selected: Names of the benchmarks to run. All of them if empty.
+    :type selected: list[str]
+    :returns: The results ready to be dumped as json.
+    :rtype: dict
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    # The report benchmarks log thousands of messages; measure the formatting
+    # rather than the terminal.
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for bench in _BENCHMARKS:
+        if selected and bench.__name__ not in selected:
+            continue
+
+        run = bench()
+        timings = sorted(timeit.repeat(run, number=1, repeat=rounds))
+        results[bench.__name__] = {
+            "min": timings[0],
+            "median": timings[len(timings) // 2],
+            "max": timings[-1],
+            "rounds": rounds,
+        }
+        sys.stdout.write("{:<50} {:>10.4f}s\n".format(bench.__name__, timings[0]))
+
+    return {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Compare the results of two runs of the benchmarks.
+
+    The fastest round of each benchmark is compared as it is the least affected
+    by the noise on the machine.
+
+    :param baseline: Results of the reference run.
+    :type baseline: dict
+    :param current: Results of the run to check.
+    :type current: dict
+    :param threshold: The ratio of the current to the baseline time above
+        which a benchmark is considered regressed.
+    :type threshold: float
+    :returns: Names of the regressed benchmarks.
+    :rtype: list[str]
+    """
+    for results in (baseline, current):
+        if results.get("format_version") != RESULTS_FORMAT_VERSION:
+            raise ValueError("Unsupported format of the benchmark results: {}".format(results.get("format_version")))
+
+    regressions = []
+    for name, baseline_result in sorted(baseline["benchmarks"].items()):
+        current_result = current["benchmarks"].get(name)
+        if current_result is None:
+            sys.stdout.write("{:<50} {:>10} (missing in the current results)\n".format(name, "-"))
+            continue
+
+        ratio = current_result["min"] / baseline_result["min"] if baseline_result["min"] else 1.0
+        verdict = ""
+        if ratio > threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        sys.stdout.write(
+            "{:<50} {:>10.4f}s {:>10.4f}s {:>7.2f}x {}\n".format(
+                name, baseline_result["min"], current_result["min"], ratio, verdict
+            )
+        )
+
+    return regressions
+
+
+def _load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run and compare the convert2rhel micro-benchmarks.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--output", help="File to store the results in.")
+    run_parser.add_argument("--rounds", type=int, default=5, help="How many times to time each benchmark.")
+    run_parser.add_argument("benchmarks", nargs="*", help="Names of the benchmarks to run. Default: all of them.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare the results with a baseline.")
+    compare_parser.add_argument("baseline", help="File with the baseline results.")
+    compare_parser.add_argument("current", help="File with the results to check.")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Ratio of the current to the baseline time considered a regression. Default: %(default)s",
+    )
+
+    subparsers.add_parser("list", help="List the benchmarks.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmarks(args.rounds, args.benchmarks)
+        if args.output:
+            output_dir = os.path.dirname(args.output)
+            if output_dir and not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=4, sort_keys=True)
+        return 0
+
+    if args.command == "compare":
+        regressions = compare_results(_load(args.baseline), _load(args.current), args.threshold)
+        if regressions:
+            sys.stdout.write("Regressed benchmarks: {}\n".format(", ".join(regressions)))
+            return 1
+        return 0
+
+    if args.command == "list":
+        for bench in _BENCHMARKS:
+            sys.stdout.write("{}\n".format(bench.__name__))
+        return 0
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
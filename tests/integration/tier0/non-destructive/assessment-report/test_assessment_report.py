@@ -10,7 +10,7 @@ from test_helpers.vars import TEST_VARS
 
 PRE_CONVERSION_REPORT_JSON = "/var/log/convert2rhel/convert2rhel-pre-conversion.json"
 PRE_CONVERSION_REPORT_TXT = "/var/log/convert2rhel/convert2rhel-pre-conversion.txt"
-PRE_CONVERSION_REPORT_JSON_SCHEMA = load_json_schema(path="../../../../../schemas/assessment-schema-1.2.json")
+PRE_CONVERSION_REPORT_JSON_SCHEMA = load_json_schema(path="../../../../../schemas/assessment-schema-1.4.json")
 
 
 def _validate_report():